@@ -1,3 +1,18 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import DocumentoIndexado, RespuestaPrecalculada
+
+
+@admin.register(DocumentoIndexado)
+class DocumentoIndexadoAdmin(admin.ModelAdmin):
+    list_display = ("nombre", "categoria", "tamano_bytes", "chunks", "generacion", "ingestado_en")
+    list_filter = ("categoria",)
+    search_fields = ("nombre", "sha256")
+
+
+@admin.register(RespuestaPrecalculada)
+class RespuestaPrecalculadaAdmin(admin.ModelAdmin):
+    list_display = ("pregunta", "categorias", "accion", "objeto", "generacion", "creado_en")
+    list_filter = ("categorias", "generacion")
+    search_fields = ("pregunta", "accion", "objeto")
+    exclude = ("embedding",)
@@ -0,0 +1,253 @@
+"""
+Almacén de chunks en SQLite para el índice FAISS (reemplaza al InMemoryDocstore pickleado).
+
+- Los campos de documento (source, filename, categoria, ...) se guardan una vez por archivo
+  en `documentos`; cada chunk solo guarda su fila FAISS, el documento, chunk_id/chunk_size y el texto.
+- El texto se lee bajo demanda (`search`), así el índice cargado no tiene un Document por chunk en RAM.
+- El id de docstore de cada chunk es su fila en FAISS (str), así no hace falta persistir el mapeo.
+
+Formato en `faiss_index/`: el índice vectorial (ver indice_vectorial) + `chunks.sqlite3`.
+Un índice antiguo (`index.faiss` + `index.pkl`) se migra automáticamente al cargarlo.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from . import indice_vectorial
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_CHUNKS = "chunks.sqlite3"
+ARCHIVO_LEGACY = "index.pkl"
+
+# Metadata común a todos los chunks de un archivo (DocumentProcessor.process_document)
+CAMPOS_DOCUMENTO = (
+    "source", "filename", "file_type", "file_size", "word_count",
+    "categoria", "role_filter", "content_hash", "total_chunks",
+)
+CAMPOS_CHUNK = ("chunk_id", "chunk_size")
+
+_ESQUEMA = f"""
+CREATE TABLE IF NOT EXISTS documentos (
+    id INTEGER PRIMARY KEY,
+    {", ".join(CAMPOS_DOCUMENTO)}
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    fila INTEGER PRIMARY KEY,
+    documento INTEGER NOT NULL REFERENCES documentos(id),
+    chunk_id INTEGER,
+    chunk_size INTEGER,
+    extra TEXT,
+    texto TEXT NOT NULL
+);
+"""
+
+
+class IdsPorFila:
+    """index_to_docstore_id implícito: la fila i tiene id str(i). No guarda nada por chunk."""
+
+    def __init__(self, total: int = 0):
+        self.total = total
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, fila):
+        if not 0 <= fila < self.total:
+            raise KeyError(fila)
+        return str(fila)
+
+    def get(self, fila, defecto=None):
+        return str(fila) if 0 <= fila < self.total else defecto
+
+    def update(self, nuevos: dict):
+        # FAISS.__add siempre agrega filas consecutivas al final
+        self.total += len(nuevos)
+
+    def items(self):
+        return ((i, str(i)) for i in range(self.total))
+
+    def values(self):
+        return (str(i) for i in range(self.total))
+
+    def __iter__(self):
+        return iter(range(self.total))
+
+
+class AlmacenChunks(Docstore, AddableMixin):
+    """Docstore de LangChain sobre SQLite. Las escrituras se confirman en `confirmar()`."""
+
+    def __init__(self, ruta):
+        self.ruta = Path(ruta)
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._conexion.executescript(_ESQUEMA)
+        # Los documentos (uno por archivo) sí viven en memoria: son pocos
+        self._documentos = {}
+        self._id_por_clave = {}
+        for fila in self._conexion.execute(f"SELECT id, {', '.join(CAMPOS_DOCUMENTO)} FROM documentos"):
+            self._registrar_documento(fila[0], fila[1:])
+
+    def _registrar_documento(self, doc_id: int, valores: tuple):
+        self._id_por_clave[valores] = doc_id
+        self._documentos[doc_id] = {c: v for c, v in zip(CAMPOS_DOCUMENTO, valores) if v is not None}
+
+    def _id_documento(self, metadata: dict) -> int:
+        valores = tuple(metadata.get(c) for c in CAMPOS_DOCUMENTO)
+        doc_id = self._id_por_clave.get(valores)
+        if doc_id is None:
+            cursor = self._conexion.execute(
+                f"INSERT INTO documentos ({', '.join(CAMPOS_DOCUMENTO)}) VALUES ({', '.join('?' * len(CAMPOS_DOCUMENTO))})",
+                valores,
+            )
+            doc_id = cursor.lastrowid
+            self._registrar_documento(doc_id, valores)
+        return doc_id
+
+    # --- Interfaz Docstore ---
+    def add(self, texts: dict):
+        filas = []
+        with self._lock:
+            for id_, doc in texts.items():
+                extra = {k: v for k, v in doc.metadata.items() if k not in CAMPOS_DOCUMENTO and k not in CAMPOS_CHUNK}
+                filas.append((
+                    int(id_), self._id_documento(doc.metadata),
+                    doc.metadata.get("chunk_id"), doc.metadata.get("chunk_size"),
+                    json.dumps(extra, ensure_ascii=False) if extra else None,
+                    doc.page_content,
+                ))
+            self._conexion.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?)", filas)
+
+    def search(self, search: str):
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT documento, chunk_id, chunk_size, extra, texto FROM chunks WHERE fila = ?", (int(search),)
+            ).fetchone()
+        if fila is None:
+            return f"ID {search} not found."
+        documento, chunk_id, chunk_size, extra, texto = fila
+        metadata = dict(self._documentos[documento])
+        if chunk_id is not None:
+            metadata["chunk_id"] = chunk_id
+        if chunk_size is not None:
+            metadata["chunk_size"] = chunk_size
+        if extra:
+            metadata.update(json.loads(extra))
+        return Document(id=str(search), page_content=texto, metadata=metadata)
+
+    # --- Operaciones propias ---
+    def confirmar(self):
+        with self._lock:
+            self._conexion.commit()
+
+    def truncar(self, total: int):
+        """
+        Descarta chunks sin vector (escritos antes de un corte entre commit e index.faiss) y los
+        documentos que quedan sin chunks: `hashes()` los daría por indexados y su re-subida se omitiría.
+        """
+        with self._lock:
+            borrados = self._conexion.execute("DELETE FROM chunks WHERE fila >= ?", (total,)).rowcount
+            huerfanos = [fila[0] for fila in self._conexion.execute(
+                "SELECT id FROM documentos WHERE id NOT IN (SELECT DISTINCT documento FROM chunks)"
+            )]
+            self._conexion.executemany("DELETE FROM documentos WHERE id = ?", [(i,) for i in huerfanos])
+            self._conexion.commit()
+            for doc_id in huerfanos:
+                documento = self._documentos.pop(doc_id)
+                self._id_por_clave.pop(tuple(documento.get(c) for c in CAMPOS_DOCUMENTO), None)
+        if borrados or huerfanos:
+            logger.warning(f"⚠️ {borrados} chunks sin vector y {len(huerfanos)} documentos sin chunks descartados del almacén.")
+
+    def vaciar(self):
+        with self._lock:
+            self._conexion.execute("DELETE FROM chunks")
+            self._conexion.execute("DELETE FROM documentos")
+            self._conexion.commit()
+            self._documentos.clear()
+            self._id_por_clave.clear()
+
+    def hashes(self) -> set:
+        """(content_hash, categoria) de los documentos almacenados."""
+        return {
+            (d["content_hash"], d.get("categoria"))
+            for d in self._documentos.values() if d.get("content_hash")
+        }
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.close()
+
+
+# --- CARGA / GUARDADO DEL ÍNDICE ---
+def nuevo_indice(directorio, embeddings, index) -> FAISS:
+    almacen = AlmacenChunks(Path(directorio) / ARCHIVO_CHUNKS)
+    # Sin índice guardado no hay datos válidos: restos de un primer guardado interrumpido
+    almacen.vaciar()
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=almacen,
+        index_to_docstore_id=IdsPorFila(),
+    )
+
+
+def ids_nuevos(vector_store: FAISS, cantidad: int) -> list:
+    """Ids para add_embeddings: las filas que ocuparán los vectores."""
+    inicio = vector_store.index.ntotal
+    return [str(i) for i in range(inicio, inicio + cantidad)]
+
+
+def guardar(vector_store: FAISS, directorio):
+    """Confirma los chunks y después escribe el índice vectorial (el llamador sostiene el lock)."""
+    directorio = Path(directorio)
+    directorio.mkdir(parents=True, exist_ok=True)
+    vector_store.docstore.confirmar()
+    indice_vectorial.guardar(vector_store.index, directorio)
+
+
+def cargar(directorio, embeddings):
+    """Devuelve el FAISS del directorio (migrando el formato pickle si hace falta) o None."""
+    directorio = Path(directorio)
+    if not (directorio / ARCHIVO_CHUNKS).exists() and (directorio / ARCHIVO_LEGACY).exists():
+        return _migrar_legacy(directorio, embeddings)
+
+    index = indice_vectorial.cargar(directorio)
+    if index is None:
+        return None
+    almacen = AlmacenChunks(directorio / ARCHIVO_CHUNKS)
+    almacen.truncar(index.ntotal)
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=almacen,
+        index_to_docstore_id=IdsPorFila(index.ntotal),
+    )
+
+
+def _migrar_legacy(directorio: Path, embeddings) -> FAISS:
+    logger.info("🔄 Migrando índice pickle (index.pkl) a chunks.sqlite3...")
+    legacy = FAISS.load_local(str(directorio), embeddings, allow_dangerous_deserialization=True)
+    almacen = AlmacenChunks(directorio / ARCHIVO_CHUNKS)
+    almacen.add({
+        str(fila): legacy.docstore.search(legacy.index_to_docstore_id[fila])
+        for fila in range(legacy.index.ntotal)
+    })
+    vector_store = FAISS(
+        embedding_function=embeddings,
+        index=legacy.index,
+        docstore=almacen,
+        index_to_docstore_id=IdsPorFila(legacy.index.ntotal),
+    )
+    guardar(vector_store, directorio)
+    # Se conserva el pickle original por si hay que volver atrás
+    os.replace(directorio / ARCHIVO_LEGACY, directorio / f"{ARCHIVO_LEGACY}.bak")
+    logger.info(f"✅ Migrados {legacy.index.ntotal} chunks; el pickle quedó como {ARCHIVO_LEGACY}.bak")
+    return vector_store
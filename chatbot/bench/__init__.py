@@ -0,0 +1 @@
+"""Utilidades compartidas por los comandos de benchmark (bench_*)."""
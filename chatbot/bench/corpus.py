@@ -0,0 +1,280 @@
+"""
+Corpus sintético tipo `documentos_unemi` para benchmarks.
+
+Genera reglamentos en TXT/MD por categoría (determinista según la semilla) y un set de
+preguntas etiquetadas con la fuente esperada, útil tanto para latencia como para recall.
+"""
+import random
+import textwrap
+from pathlib import Path
+
+import numpy as np
+
+# tema → (título del documento, frases propias del tema, preguntas de usuario)
+TEMAS = {
+    "matricula": (
+        "REGLAMENTO DE MATRÍCULA",
+        [
+            "La matrícula ordinaria se realiza dentro del período fijado en el calendario académico.",
+            "El estudiante deberá registrar las asignaturas en el sistema de gestión académica.",
+            "La matrícula extraordinaria tendrá un recargo y requiere autorización de la facultad.",
+            "Para la tercera matrícula en una misma asignatura se requiere aprobación del consejo directivo.",
+        ],
+        ["¿Cuáles son los requisitos para la matrícula?", "¿Cuándo es la matrícula extraordinaria?"],
+    ),
+    "becas": (
+        "REGLAMENTO DE BECAS Y AYUDAS ECONÓMICAS",
+        [
+            "Las becas socioeconómicas se otorgan a estudiantes en situación de vulnerabilidad económica.",
+            "La beca por excelencia académica exige un promedio mínimo de nueve sobre diez.",
+            "El bienestar universitario verificará la ficha socioeconómica del postulante a la beca.",
+            "La ayuda económica de emergencia cubre gastos de salud o calamidad doméstica.",
+        ],
+        ["¿Cómo solicito una beca socioeconómica?", "¿Qué promedio necesito para la beca de excelencia?"],
+    ),
+    "retiro": (
+        "INSTRUCTIVO DE RETIRO DE ASIGNATURAS",
+        [
+            "El retiro voluntario de asignatura procede dentro de los treinta días posteriores al inicio de clases.",
+            "El retiro de asignatura por caso fortuito requiere documentación de respaldo.",
+            "La asignatura retirada no se contabiliza para la pérdida de gratuidad.",
+            "La solicitud de retiro se presenta en la secretaría de la facultad.",
+        ],
+        ["¿Cuál es el plazo para el retiro de asignatura?", "¿Cómo borro una materia?"],
+    ),
+    "asistencia": (
+        "REGLAMENTO DE ASISTENCIA Y JUSTIFICACIÓN DE INASISTENCIAS",
+        [
+            "La justificación de inasistencia se presenta dentro de las cuarenta y ocho horas siguientes.",
+            "El certificado médico avalado justifica la inasistencia a clases y evaluaciones.",
+            "El estudiante que supere el treinta por ciento de inasistencias reprobará la asignatura.",
+            "El docente registrará la asistencia en el sistema al inicio de cada sesión.",
+        ],
+        ["¿Cómo justifico una inasistencia por enfermedad?", "¿Cuántas faltas puedo tener en una materia?"],
+    ),
+    "titulacion": (
+        "REGLAMENTO DE TITULACIÓN",
+        [
+            "La unidad de integración curricular comprende el trabajo de titulación o examen complexivo.",
+            "El trabajo de titulación será evaluado por un tribunal designado por la facultad.",
+            "Para obtener el título se requiere aprobar las prácticas preprofesionales y la vinculación.",
+            "El plazo máximo para culminar la titulación es de dos períodos académicos.",
+        ],
+        ["¿Qué necesito para la titulación?", "¿Quién evalúa el trabajo de titulación?"],
+    ),
+    "admision": (
+        "REGLAMENTO DE ADMISIÓN Y NIVELACIÓN",
+        [
+            "Los aspirantes deben rendir la evaluación de admisión en las fechas publicadas.",
+            "El curso de nivelación es obligatorio para los aspirantes que obtienen un cupo.",
+            "La aceptación del cupo se realiza en la plataforma de admisión.",
+            "Los postulantes con discapacidad cuentan con acciones afirmativas en el puntaje.",
+        ],
+        ["¿Cómo me inscribo en el proceso de admisión?", "¿Es obligatorio el curso de nivelación?"],
+    ),
+    "docencia": (
+        "REGLAMENTO DE CARRERA Y ESCALAFÓN DEL PERSONAL ACADÉMICO",
+        [
+            "El personal académico titular ingresa mediante concurso público de méritos y oposición.",
+            "La evaluación integral del desempeño docente se realiza cada período académico.",
+            "La promoción en el escalafón requiere publicaciones y horas de capacitación.",
+            "El docente deberá entregar el sílabo de la asignatura antes del inicio de clases.",
+        ],
+        ["¿Cómo se evalúa el desempeño docente?", "¿Qué se necesita para la promoción en el escalafón?"],
+    ),
+    "talento": (
+        "NORMATIVA DE TALENTO HUMANO",
+        [
+            "Los servidores administrativos registrarán su jornada en el sistema biométrico.",
+            "Las vacaciones del personal administrativo se planifican anualmente.",
+            "Los permisos con cargo a vacaciones se solicitan con tres días de anticipación.",
+            "La evaluación del desempeño administrativo es anual.",
+        ],
+        ["¿Cómo solicito vacaciones como administrativo?", "¿Con cuánta anticipación pido un permiso?"],
+    ),
+}
+
+# Preguntas que el corpus no responde (la recuperación solo encuentra coincidencias débiles)
+PREGUNTAS_SIN_RESPUESTA = [
+    "¿Cuál es el horario del comedor universitario?",
+    "¿Dónde está el parqueadero para visitantes?",
+    "¿Cómo me conecto al wifi del campus?",
+    "¿Qué deportes ofrece el club universitario?",
+    "¿Cuánto cuesta el carnet de la biblioteca?",
+    "¿Hay transporte gratuito desde el centro de la ciudad?",
+    "¿Dónde imprimo documentos dentro del campus?",
+    "¿Qué menú tiene la cafetería hoy?",
+]
+
+# categoría → temas que contiene
+CATEGORIAS = {
+    "general": ["matricula", "titulacion"],
+    "estudiantes": ["becas", "retiro", "asistencia"],
+    "docentes": ["docencia", "asistencia"],
+    "administrativos": ["talento"],
+    "admision": ["admision"],
+}
+
+_RELLENO = [
+    "Las disposiciones de este instrumento son de cumplimiento obligatorio para la comunidad universitaria.",
+    "Los casos no previstos serán resueltos por el órgano colegiado superior.",
+    "La presente normativa entrará en vigencia a partir de su aprobación.",
+    "Toda solicitud deberá presentarse por los canales oficiales de la universidad.",
+    "Se garantiza el debido proceso y el derecho a la defensa.",
+]
+
+
+def _documento(rng: random.Random, tema: str, indice: int, articulos: int) -> str:
+    titulo, frases, _ = TEMAS[tema]
+    lineas = [f"UNIVERSIDAD ESTATAL DE MILAGRO\n{titulo} (versión {indice + 1})\n"]
+    for n in range(1, articulos + 1):
+        cuerpo = [rng.choice(frases) for _ in range(3)] + [rng.choice(_RELLENO)]
+        lineas.append(f"Artículo {n}.- " + " ".join(cuerpo))
+    return "\n\n".join(lineas)
+
+
+def _preguntas(archivos: list) -> list:
+    preguntas = []
+    for tema, (_, _, consultas) in TEMAS.items():
+        fuentes = sorted(a["nombre"] for a in archivos if a["tema"] == tema)
+        categorias = sorted({a["categoria"] for a in archivos if a["tema"] == tema})
+        for consulta in consultas:
+            preguntas.append({"pregunta": consulta, "categorias": categorias, "fuentes": fuentes})
+    return preguntas
+
+
+def generar_corpus(directorio, archivos_por_tema: int = 2, articulos: int = 30, semilla: int = 42) -> dict:
+    """
+    Crea `directorio/<categoria>/<archivo>` y devuelve:
+    {"archivos": [{"categoria", "ruta", "tema"}], "preguntas": [{"pregunta", "categoria", "fuentes"}]}
+    """
+    rng = random.Random(semilla)
+    base = Path(directorio)
+    archivos = []
+    for categoria, temas in CATEGORIAS.items():
+        carpeta = base / categoria
+        carpeta.mkdir(parents=True, exist_ok=True)
+        for tema in temas:
+            for i in range(archivos_por_tema):
+                extension = "md" if i % 2 else "txt"
+                nombre = f"{TEMAS[tema][0].replace(' ', '_')}_{categoria}_{i + 1}.{extension}"
+                ruta = carpeta / nombre
+                ruta.write_text(_documento(rng, tema, i, articulos), encoding="utf-8")
+                archivos.append({"categoria": categoria, "ruta": str(ruta), "tema": tema, "nombre": nombre})
+
+    return {"archivos": archivos, "preguntas": _preguntas(archivos)}
+
+
+# Texto común a todos los PDF (preámbulo legal) y encabezado/pie de cada página
+_PREAMBULO = [
+    "EL ÓRGANO COLEGIADO SUPERIOR DE LA UNIVERSIDAD ESTATAL DE MILAGRO, CONSIDERANDO:",
+    "Que el artículo 350 de la Constitución de la República establece que el Sistema de Educación "
+    "Superior tiene como finalidad la formación académica y profesional con visión científica y humanista;",
+    "Que el artículo 355 de la Constitución reconoce a las universidades autonomía académica, "
+    "administrativa, financiera y orgánica, acorde con los objetivos del régimen de desarrollo;",
+    "Que la Ley Orgánica de Educación Superior determina que las instituciones expedirán su normativa "
+    "interna para el cumplimiento de sus fines, en ejercicio de su autonomía responsable;",
+    "En ejercicio de sus atribuciones, RESUELVE expedir la siguiente normativa:",
+]
+
+
+def escribir_pdf(ruta, paginas: list):
+    """PDF mínimo de texto (Helvetica, WinAnsi) con una lista de líneas por página."""
+    def escapar(linea):
+        return linea.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objetos = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    hojas = []
+    for lineas in paginas:
+        texto = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({escapar(l)}) Tj T*" for l in lineas) + " ET"
+        contenido = texto.encode("cp1252", errors="replace")
+        objetos.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(contenido), contenido))
+        objetos.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 3 0 R >> >> >>" % len(objetos))
+        hojas.append(len(objetos))
+    objetos[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % n for n in hojas), len(hojas))
+
+    salida = bytearray(b"%PDF-1.4\n")
+    posiciones = []
+    for numero, cuerpo in enumerate(objetos, start=1):
+        posiciones.append(len(salida))
+        salida += b"%d 0 obj\n%s\nendobj\n" % (numero, cuerpo)
+    xref = len(salida)
+    salida += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    salida += b"".join(b"%010d 00000 n \n" % p for p in posiciones)
+    salida += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objetos) + 1, xref)
+    Path(ruta).write_bytes(bytes(salida))
+
+
+def generar_corpus_pdf(directorio, archivos_por_tema: int = 2, articulos: int = 30,
+                       articulos_por_pagina: int = 4, semilla: int = 42) -> dict:
+    """
+    Como `generar_corpus`, pero en PDF con lo que repiten los documentos reales: encabezado
+    institucional y "Página N/M" en cada página y el mismo preámbulo legal en todos los archivos.
+    """
+    rng = random.Random(semilla)
+    base = Path(directorio)
+    archivos = []
+    for categoria, temas in CATEGORIAS.items():
+        carpeta = base / categoria
+        carpeta.mkdir(parents=True, exist_ok=True)
+        for tema in temas:
+            for i in range(archivos_por_tema):
+                titulo = TEMAS[tema][0]
+                bloques = [[titulo]] + [[p] for p in _PREAMBULO] + [
+                    [a] for a in _documento(rng, tema, i, articulos).split("\n\n")[1:]
+                ]
+                por_pagina = [bloques[n:n + articulos_por_pagina] for n in range(0, len(bloques), articulos_por_pagina)]
+                paginas = []
+                for numero, bloque in enumerate(por_pagina, start=1):
+                    lineas = ["UNIVERSIDAD ESTATAL DE MILAGRO - Secretaría General", f"{titulo} (versión {i + 1})", ""]
+                    for (parrafo,) in bloque:
+                        lineas += textwrap.wrap(parrafo, 100) + [""]
+                    lineas.append(f"Página {numero}/{len(por_pagina)} - Documento de uso público")
+                    paginas.append(lineas)
+                nombre = f"{titulo.replace(' ', '_')}_{categoria}_{i + 1}.pdf"
+                escribir_pdf(carpeta / nombre, paginas)
+                archivos.append({"categoria": categoria, "ruta": str(carpeta / nombre), "tema": tema, "nombre": nombre})
+
+    return {"archivos": archivos, "preguntas": _preguntas(archivos)}
+
+
+def sesion_para(categorias) -> dict:
+    """session_data mínimo (formato data_unemi.json) con los perfiles que dan acceso a `categorias`."""
+    banderas = {
+        "estudiantes": "es_estudiante",
+        "docentes": "es_profesor",
+        "administrativos": "es_administrativo",
+        "externos": "es_externo",
+        "admision": "es_inscripcionadmision",
+    }
+    perfil = {"status": True}
+    for categoria in categorias:
+        if categoria in banderas:
+            perfil[banderas[categoria]] = True
+    return {"0900000000": {"perfiles": [perfil]}}
+
+
+def normalizar(x: np.ndarray) -> np.ndarray:
+    return (x / np.linalg.norm(x, axis=-1, keepdims=True)).astype(np.float32)
+
+
+def vectores_jerarquicos(archivos: int, chunks_por_archivo: int, chunks_seccion: int, dimension: int,
+                         temas: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Embeddings sintéticos con estructura tema → documento → sección → chunk (cada nivel es el
+    centro del anterior más ruido; varios documentos comparten tema). Forma
+    (archivos, chunks_por_archivo, dimension): filas consecutivas por archivo, como en la ingesta.
+    """
+    secciones = -(-chunks_por_archivo // chunks_seccion)
+    centros_tema = normalizar(rng.standard_normal((temas, 1, dimension)))
+    centros_doc = normalizar(
+        centros_tema[rng.integers(0, temas, archivos)] + 0.8 * normalizar(rng.standard_normal((archivos, 1, dimension)))
+    )
+    centros_sec = normalizar(centros_doc + 0.8 * normalizar(rng.standard_normal((archivos, secciones, dimension))))
+    centros_chunk = np.repeat(centros_sec, chunks_seccion, axis=1)[:, :chunks_por_archivo]
+    ruido = normalizar(rng.standard_normal((archivos, chunks_por_archivo, dimension)))
+    return normalizar(centros_chunk + 0.7 * ruido)
+
@@ -0,0 +1,95 @@
+"""
+Entorno aislado para benchmarks: settings, LLM e índice apuntando a un stub y a un
+directorio temporal, sin tocar `documentos_unemi/` ni `faiss_index/` reales.
+"""
+import os
+import subprocess
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import override_settings
+from langchain_core.embeddings import Embeddings
+
+
+@contextmanager
+def entorno_benchmark(url_ollama: str, directorio, **otros_settings):
+    """
+    Durante el bloque, views/intent_parser/rag_service usan `url_ollama`,
+    `directorio/documentos_unemi` + `directorio/faiss_index` y una base de datos de prueba.
+    Devuelve el LocalRAGService aislado.
+    """
+    from chatbot import intent_parser, rag_service as rag_module, views
+
+    base = Path(directorio)
+    with ExitStack() as pila:
+        # Catálogo de documentos en una base de datos de prueba (no toca db.sqlite3)
+        nombre_original = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        pila.callback(connection.creation.destroy_test_db, nombre_original, verbosity=0)
+
+        pila.enter_context(override_settings(**{
+            "OLLAMA_BASE_URL": url_ollama,
+            # Todos los roles al stub salvo que el benchmark configure sus propios backends
+            "OLLAMA_BACKENDS_INTENCION": [],
+            "OLLAMA_BACKENDS_GENERACION": [],
+            "OLLAMA_BACKENDS_EMBEDDINGS": [],
+            "DOCUMENTOS_DIR": base / "documentos_unemi",
+            "FAISS_INDEX_PATH": base / "faiss_index",
+            "RAG_TRAZAS_ARCHIVO": str(base / "trazas.jsonl"),
+            **otros_settings,
+        }))
+        servicio = rag_module.LocalRAGService(index_path=base / "faiss_index")
+        pila.enter_context(mock.patch.object(intent_parser, "llm", intent_parser.crear_llm()))
+        pila.enter_context(mock.patch.object(intent_parser, "llm_escalado", intent_parser.crear_llm_escalado()))
+        pila.enter_context(mock.patch.object(rag_module, "rag_service", servicio))
+        pila.enter_context(mock.patch.object(views, "rag_service", servicio))
+        yield servicio
+
+
+class EmbeddingsNulos(Embeddings):
+    """
+    Para cargar/buscar índices por vector sin servidor de embeddings. Embeber texto es un
+    error del benchmark: se busca con vectores ya calculados (index.search / *_by_vector).
+    """
+
+    def _sin_servidor(self, operacion: str):
+        return RuntimeError(
+            f"Índice de benchmark sin servidor de embeddings: {operacion} no está disponible; "
+            "busca por vector o usa entorno_benchmark con StubOllama."
+        )
+
+    def embed_documents(self, textos):
+        raise self._sin_servidor(f"embed_documents ({len(textos)} textos)")
+
+    def embed_query(self, texto):
+        raise self._sin_servidor("embed_query")
+
+
+def rss_bytes() -> int:
+    """Memoria residente actual del proceso (Linux); 0 si no está disponible."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def bytes_en_disco(ruta) -> int:
+    ruta = Path(ruta)
+    if not ruta.exists():
+        return 0
+    return sum(p.stat().st_size for p in ruta.rglob("*") if p.is_file())
+
+
+def commit_actual() -> str:
+    try:
+        salida = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=10,
+        )
+        return salida.stdout.strip() or "desconocido"
+    except (OSError, subprocess.SubprocessError):
+        return "desconocido"
@@ -0,0 +1,24 @@
+"""Estadísticas simples para resultados de benchmark."""
+import statistics
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano (p en 0..100)."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    idx = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[idx]
+
+
+def resumen_latencias(valores_ms):
+    """Resumen estándar de una serie de latencias en milisegundos."""
+    if not valores_ms:
+        return {"n": 0, "prom_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    return {
+        "n": len(valores_ms),
+        "prom_ms": round(statistics.mean(valores_ms), 2),
+        "p50_ms": round(percentil(valores_ms, 50), 2),
+        "p95_ms": round(percentil(valores_ms, 95), 2),
+        "max_ms": round(max(valores_ms), 2),
+    }
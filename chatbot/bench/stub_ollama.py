@@ -0,0 +1,328 @@
+"""
+Servidor HTTP que imita la API de Ollama para benchmarks reproducibles sin modelos reales.
+
+- /api/embed y /api/embeddings: embeddings deterministas (hash de palabras → vector unitario),
+  de modo que textos con vocabulario común quedan cerca en el espacio vectorial.
+- /api/chat: respuestas JSON válidas para cada esquema del pipeline (intención, reformulación,
+  RAG), en streaming con latencia simulada por token.
+- Prefill simulado con caché de prefijo por slot, como hace Ollama: solo se cobra la parte
+  del prompt que no coincide con la última petición del slot.
+
+Uso:
+    stub = StubOllama(latencia_token_ms=20).iniciar()
+    ... settings.OLLAMA_BASE_URL = stub.url ...
+    stub.detener()
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+DIMENSION = 768
+CHARS_POR_TOKEN = 4
+
+_PALABRAS_OPERATIVAS = ("quiero solicitar", "solicito", "quiero hacer", "necesito solicitar", "tramitar")
+_PALABRAS_AMBIGUAS = ("falta", "baja", "dinero", "papeles", "ayuda")
+_PALABRAS_VACIAS = {"como", "cual", "cuales", "cuando", "donde", "que", "quien", "para", "los", "las", "del",
+                    "una", "uno", "por", "con", "puedo", "necesito", "tengo", "hay", "son", "mas"}
+
+
+def _normalizar(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def _palabras(texto: str) -> list:
+    return re.findall(r"[a-z0-9]{3,}", _normalizar(texto))
+
+
+class EmbeddingDeterminista:
+    """Suma de vectores pseudoaleatorios por palabra (semilla = hash de la palabra), normalizada."""
+
+    def __init__(self, dimension: int = DIMENSION):
+        self.dimension = dimension
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _vector_palabra(self, palabra: str) -> np.ndarray:
+        v = self._cache.get(palabra)
+        if v is None:
+            semilla = int.from_bytes(hashlib.blake2b(palabra.encode(), digest_size=8).digest(), "little")
+            v = np.random.default_rng(semilla).standard_normal(self.dimension).astype(np.float32)
+            with self._lock:
+                self._cache[palabra] = v
+        return v
+
+    def __call__(self, texto: str) -> list:
+        total = np.zeros(self.dimension, dtype=np.float32)
+        for palabra in _palabras(texto):
+            total += self._vector_palabra(palabra)
+        norma = float(np.linalg.norm(total))
+        if norma == 0:
+            total[0] = 1.0
+            norma = 1.0
+        return (total / norma).tolist()
+
+
+def _prefijo_comun(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class StubOllama:
+    """Servidor Ollama falso configurable. Todas las latencias en milisegundos."""
+
+    def __init__(self, host: str = "127.0.0.1", puerto: int = 0, latencia_token_ms: float = 0.0,
+                 latencia_prefill_ms_por_100_tokens: float = 0.0, latencia_embedding_ms: float = 0.0,
+                 slots: int = 1, modelos=None, max_paralelo: int = None):
+        self.host = host
+        self.puerto = puerto
+        self.latencia_token = latencia_token_ms / 1000
+        self.latencia_prefill = latencia_prefill_ms_por_100_tokens / 1000 / 100
+        self.latencia_embedding = latencia_embedding_ms / 1000
+        self.modelos = modelos or ["qwen2.5:3b-instruct-q4_K_M", "nomic-embed-text:latest"]
+        self.embedding = EmbeddingDeterminista()
+        self._slots = [""] * max(1, slots)
+        self._lock = threading.Lock()
+        # Requests atendidas a la vez (como OLLAMA_NUM_PARALLEL en un Ollama en CPU); None = sin límite
+        self._paralelo = threading.BoundedSemaphore(max_paralelo) if max_paralelo else None
+        self.estadisticas = {"chat": 0, "embed": 0, "textos_embebidos": 0, "tags": 0,
+                             "tokens_prompt": 0, "tokens_prefill": 0, "tokens_generados": 0}
+        self._servidor = None
+        self._hilo = None
+
+    # --- Ciclo de vida ---
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.puerto}"
+
+    def iniciar(self):
+        stub = self
+
+        class Handler(_Handler):
+            servidor_stub = stub
+
+        self._servidor = _Servidor((self.host, self.puerto), Handler)
+        self.puerto = self._servidor.server_address[1]
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        if self._servidor:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.detener()
+
+    def _contar(self, **valores):
+        with self._lock:
+            for k, v in valores.items():
+                self.estadisticas[k] += v
+
+    # --- Simulación de prefill con caché de prefijo ---
+    def _tokens_prefill(self, prompt: str) -> int:
+        """Asigna el slot con mayor prefijo común y devuelve los tokens que hay que evaluar."""
+        with self._lock:
+            mejor, comun = 0, -1
+            for i, previo in enumerate(self._slots):
+                c = _prefijo_comun(previo, prompt)
+                if c > comun:
+                    mejor, comun = i, c
+            self._slots[mejor] = prompt
+        return max(1, (len(prompt) - comun) // CHARS_POR_TOKEN)
+
+    # --- Respuestas del "modelo" ---
+    def responder_chat(self, mensajes: list, formato) -> str:
+        propiedades = formato.get("properties", {}) if isinstance(formato, dict) else {}
+        usuario = next((m.get("content", "") for m in reversed(mensajes) if m.get("role") == "user"), "")
+
+        if "has_information" in propiedades or "CONTEXTO:" in usuario:
+            return self._respuesta_rag(usuario)
+        if list(propiedades) == ["search_query"] or usuario.startswith("CONSULTA:"):
+            consulta = re.search(r'CONSULTA: "(.*)"', usuario)
+            texto = consulta.group(1) if consulta else usuario
+            return json.dumps({"search_query": _normalizar(texto).strip(" ¿?")}, ensure_ascii=False)
+        return self._respuesta_intencion(usuario, incluir_busqueda="search_query" in propiedades)
+
+    def _respuesta_intencion(self, usuario: str, incluir_busqueda: bool) -> str:
+        entrada = re.search(r'Input: "(.*)"', usuario, flags=re.S)
+        texto = entrada.group(1) if entrada else usuario
+        normal = _normalizar(texto)
+        palabras = _palabras(texto)
+
+        operativo = any(p in normal for p in _PALABRAS_OPERATIVAS)
+        ambiguo = len(palabras) <= 3 and any(p in palabras for p in _PALABRAS_AMBIGUAS)
+        datos = {
+            "intent_code": "otro",
+            "accion": palabras[0] if palabras else "",
+            "objeto": palabras[-1] if palabras else "",
+            "is_ambiguous": ambiguo,
+            "clarification_prompt": "¿Podrías darme más detalles?" if ambiguo else None,
+            "answer_type": "operational" if operativo else "informational",
+            "multi_intent": False,
+            "intents": [],
+        }
+        if incluir_busqueda:
+            datos["search_query"] = None if ambiguo else normal.strip(" ¿?")
+        return json.dumps(datos, ensure_ascii=False)
+
+    def _respuesta_rag(self, usuario: str) -> str:
+        fuentes = re.findall(r"DOC: (.+)", usuario)
+        textos = re.findall(r"TXT: (.+)", usuario)
+        # "Tiene información" si el contexto cubre la mayoría de las palabras de la consulta
+        contexto, _, consulta = usuario.partition("CONSULTA DEL USUARIO:")
+        palabras = {p for p in _palabras(consulta) if p not in _PALABRAS_VACIAS}
+        contexto = set(_palabras(contexto))
+        informacion = bool(textos) and (not palabras or len(palabras & contexto) / len(palabras) >= 0.5)
+        respuesta = textos[0][:300] if informacion else "No encontré información."
+        return json.dumps({
+            "has_information": informacion,
+            "need_contact": not informacion,
+            "response": respuesta,
+            "sources": list(dict.fromkeys(fuentes))[:5],
+        }, ensure_ascii=False)
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Los clientes cierran conexiones keep-alive ociosas: no es un error del stub
+        pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    servidor_stub: StubOllama = None
+    protocol_version = "HTTP/1.1"
+    # Sin Nagle: evita esperas de ~40 ms por delayed ACK entre encabezados y cuerpo
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _leer_json(self) -> dict:
+        largo = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(largo) or b"{}")
+
+    def _enviar_json(self, datos: dict, codigo: int = 200):
+        cuerpo = json.dumps(datos).encode()
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_GET(self):
+        stub = self.servidor_stub
+        if self.path.startswith("/api/tags"):
+            stub._contar(tags=1)
+            self._enviar_json({"models": [{"name": m, "model": m, "size": 0} for m in stub.modelos]})
+        elif self.path in ("/", "/api/version"):
+            self._enviar_json({"version": "0.0.0-stub"})
+        else:
+            self._enviar_json({"error": "not found"}, 404)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        stub = self.servidor_stub
+        cuerpo = self._leer_json()
+        if stub._paralelo is None:
+            self._atender(cuerpo)
+            return
+        with stub._paralelo:
+            self._atender(cuerpo)
+
+    def _atender(self, cuerpo: dict):
+        stub = self.servidor_stub
+        if self.path.startswith("/api/embed"):
+            entradas = cuerpo.get("input", cuerpo.get("prompt", ""))
+            if isinstance(entradas, str):
+                entradas = [entradas]
+            stub._contar(embed=1, textos_embebidos=len(entradas))
+            if stub.latencia_embedding:
+                time.sleep(stub.latencia_embedding * len(entradas))
+            vectores = [stub.embedding(t) for t in entradas]
+            if self.path.startswith("/api/embeddings"):
+                self._enviar_json({"embedding": vectores[0]})
+            else:
+                self._enviar_json({"model": cuerpo.get("model"), "embeddings": vectores})
+        elif self.path.startswith("/api/chat"):
+            self._chat(cuerpo)
+        else:
+            self._enviar_json({"error": "not found"}, 404)
+
+    def _chat(self, cuerpo: dict):
+        stub = self.servidor_stub
+        mensajes = cuerpo.get("messages", [])
+        prompt = "".join(f"<{m.get('role')}>{m.get('content', '')}" for m in mensajes)
+        tokens_prompt = max(1, len(prompt) // CHARS_POR_TOKEN)
+        tokens_prefill = stub._tokens_prefill(prompt)
+
+        inicio = time.perf_counter()
+        if stub.latencia_prefill:
+            time.sleep(tokens_prefill * stub.latencia_prefill)
+        prefill_ns = int((time.perf_counter() - inicio) * 1e9)
+
+        salida = stub.responder_chat(mensajes, cuerpo.get("format"))
+        fragmentos = [salida[i:i + CHARS_POR_TOKEN] for i in range(0, len(salida), CHARS_POR_TOKEN)]
+        stub._contar(chat=1, tokens_prompt=tokens_prompt, tokens_prefill=tokens_prefill,
+                     tokens_generados=len(fragmentos))
+        modelo = cuerpo.get("model", "")
+
+        final = {
+            "model": modelo, "created_at": "1970-01-01T00:00:00Z",
+            "message": {"role": "assistant", "content": ""},
+            "done": True, "done_reason": "stop",
+            "prompt_eval_count": tokens_prompt, "prompt_eval_duration": prefill_ns,
+            "eval_count": len(fragmentos),
+        }
+
+        if not cuerpo.get("stream", True):
+            time.sleep(stub.latencia_token * len(fragmentos))
+            final["message"]["content"] = salida
+            final["eval_duration"] = int(stub.latencia_token * len(fragmentos) * 1e9)
+            self._enviar_json(final)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        inicio_eval = time.perf_counter()
+        try:
+            for fragmento in fragmentos:
+                if stub.latencia_token:
+                    time.sleep(stub.latencia_token)
+                self._escribir_chunk({
+                    "model": modelo, "created_at": "1970-01-01T00:00:00Z",
+                    "message": {"role": "assistant", "content": fragmento}, "done": False,
+                })
+            final["eval_duration"] = int((time.perf_counter() - inicio_eval) * 1e9)
+            self._escribir_chunk(final)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente cortó el stream (parser incremental): igual que Ollama, dejamos de generar
+            self.close_connection = True
+
+    def _escribir_chunk(self, datos: dict):
+        linea = (json.dumps(datos, ensure_ascii=False) + "\n").encode()
+        self.wfile.write(f"{len(linea):x}\r\n".encode() + linea + b"\r\n")
+        self.wfile.flush()
@@ -0,0 +1,173 @@
+"""
+Metadatos de recuperación en arrays, alineados con las filas del índice FAISS.
+
+Por cada fila se guarda al ingestar: código de categoría, código de fuente, el id
+canónico del chunk (primera fila con el mismo contenido) y su SimHash (deduplicación de
+chunks casi iguales en la ingesta, ver deduplicacion.py). Con eso el filtrado de
+`recuperar` trabaja sobre los k candidatos con NumPy (umbral y categorías) y enteros (dedup
+y límite por fuente), y solo se construyen Documents para los chunks finales.
+"""
+import hashlib
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from .deduplicacion import IndiceSimhash, simhash
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO = "candidatos.npz"
+
+
+def _huella(texto: str) -> int:
+    return int.from_bytes(hashlib.blake2b(texto.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class TablaCandidatos:
+    def __init__(self):
+        self.categorias = []  # código → nombre de categoría
+        self.fuentes = []  # código → nombre de archivo
+        self._codigo_categoria = {}
+        self._codigo_fuente = {}
+        self._primera_por_huella = {}
+        self.categoria = np.empty(0, dtype=np.int16)
+        self.fuente = np.empty(0, dtype=np.int32)
+        self.canonico = np.empty(0, dtype=np.int64)
+        self.huella = np.empty(0, dtype=np.uint64)
+        self.simhash = np.empty(0, dtype=np.uint64)
+        self.similares = IndiceSimhash()
+        self.es_reglamento = np.empty(0, dtype=bool)  # por código de fuente
+
+    def __len__(self):
+        return len(self.categoria)
+
+    def _codigo(self, tabla: dict, nombres: list, nombre: str) -> int:
+        if nombre not in tabla:
+            tabla[nombre] = len(nombres)
+            nombres.append(nombre)
+        return tabla[nombre]
+
+    def codigo_categoria(self, nombre: str):
+        return self._codigo_categoria.get(nombre)
+
+    def agregar(self, textos: list, metadatas: list, simhashes: list = None):
+        """Registra filas nuevas, en el mismo orden en que se agregan al índice FAISS."""
+        base = len(self)
+        if simhashes is None:
+            simhashes = [simhash(t) for t in textos]
+        categorias, fuentes, canonicos, huellas = [], [], [], []
+        for i, (texto, metadata) in enumerate(zip(textos, metadatas)):
+            categorias.append(self._codigo(self._codigo_categoria, self.categorias, metadata.get("categoria") or ""))
+            fuentes.append(self._codigo(self._codigo_fuente, self.fuentes, Path(metadata.get("source", "desc")).name))
+            huellas.append(_huella(texto))
+            canonicos.append(self._primera_por_huella.setdefault(huellas[-1], base + i))
+            self.similares.agregar(simhashes[i], categorias[-1])
+
+        self.categoria = np.concatenate([self.categoria, np.array(categorias, dtype=np.int16)])
+        self.fuente = np.concatenate([self.fuente, np.array(fuentes, dtype=np.int32)])
+        self.canonico = np.concatenate([self.canonico, np.array(canonicos, dtype=np.int64)])
+        self.huella = np.concatenate([self.huella, np.array(huellas, dtype=np.uint64)])
+        self.simhash = np.concatenate([self.simhash, np.array(simhashes, dtype=np.uint64)])
+        self.es_reglamento = np.array(["REGLAMENTO" in f.upper() for f in self.fuentes], dtype=bool)
+
+    def mascara_categorias(self, categorias_permitidas) -> np.ndarray:
+        """Máscara booleana indexada por código de categoría."""
+        permitidas = np.zeros(len(self.categorias), dtype=bool)
+        for nombre in categorias_permitidas:
+            codigo = self._codigo_categoria.get(nombre)
+            if codigo is not None:
+                permitidas[codigo] = True
+        return permitidas
+
+    def filtrar(self, posiciones: np.ndarray, distancias: np.ndarray, categorias_permitidas, config: dict):
+        """
+        Mismas reglas que el bucle original de `recuperar`, sobre arrays en lugar de Documents.
+        `posiciones`/`distancias`: resultados de FAISS (todas las queries concatenadas).
+        Devuelve (filas, scores, candidatos) con las filas finales en orden de score.
+        """
+        validas = posiciones >= 0
+        posiciones, distancias = posiciones[validas], distancias[validas]
+
+        en_categoria = self.mascara_categorias(categorias_permitidas)[self.categoria[posiciones]]
+        candidatos = int(en_categoria.sum())
+
+        # Score vectorial normalizado (0 a 1)
+        scores = 1.0 / (1.0 + distancias)
+        mascara = en_categoria & (scores >= config["umbral"])
+        posiciones, scores = posiciones[mascara], scores[mascara]
+
+        orden = np.argsort(-scores, kind="stable")
+        posiciones, scores = posiciones[orden], scores[orden]
+
+        # Dedup por chunk canónico y límite por fuente, en orden de score: dependen de lo ya
+        # aceptado (una copia rechazada por el límite de su fuente no cuenta como vista, y la
+        # misma en otra fuente puede entrar), así que se recorren como enteros y se corta en
+        # max_total. Los dos primeros se aceptan siempre, igual que en el bucle original.
+        fuentes = self.fuente[posiciones]
+        limites = np.where(self.es_reglamento[fuentes], config["limite_reglamento"], config["limite_fuente"])
+        aceptados, vistos, conteos = [], set(), {}
+        for i, (canonico, fuente, limite) in enumerate(
+                zip(self.canonico[posiciones].tolist(), fuentes.tolist(), limites.tolist())):
+            if canonico in vistos:
+                continue
+            conteo = conteos.get(fuente, 0)
+            if conteo >= limite and len(aceptados) >= 2:
+                continue
+            conteos[fuente] = conteo + 1
+            vistos.add(canonico)
+            aceptados.append(i)
+            if len(aceptados) >= config["max_total"]:
+                break
+        return posiciones[aceptados], scores[aceptados], candidatos
+
+    # --- PERSISTENCIA ---
+    def guardar(self, directorio):
+        np.savez(
+            Path(directorio) / ARCHIVO,
+            categoria=self.categoria, fuente=self.fuente, canonico=self.canonico, huella=self.huella,
+            simhash=self.simhash,
+            categorias=np.array(self.categorias, dtype=str), fuentes=np.array(self.fuentes, dtype=str),
+        )
+
+    @classmethod
+    def cargar(cls, directorio, vector_store) -> "TablaCandidatos":
+        """Lee la tabla persistida; si falta o no coincide con el índice, la reconstruye del docstore."""
+        ruta = Path(directorio) / ARCHIVO
+        total = vector_store.index.ntotal
+        if ruta.exists():
+            try:
+                with np.load(ruta) as datos:
+                    tabla = cls()
+                    tabla.categoria = datos["categoria"]
+                    tabla.fuente = datos["fuente"]
+                    tabla.canonico = datos["canonico"]
+                    tabla.huella = datos["huella"]
+                    tabla.simhash = datos["simhash"]
+                    tabla.categorias = datos["categorias"].tolist()
+                    tabla.fuentes = datos["fuentes"].tolist()
+                if len(tabla) == total:
+                    tabla._reindexar()
+                    return tabla
+                logger.warning(f"⚠️ {ARCHIVO} desalineado con el índice ({len(tabla)} vs {total}); reconstruyendo.")
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo leer {ARCHIVO}: {e}; reconstruyendo.")
+        return cls.desde_faiss(vector_store)
+
+    @classmethod
+    def desde_faiss(cls, vector_store) -> "TablaCandidatos":
+        tabla = cls()
+        docs = [vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+                for i in range(vector_store.index.ntotal)]
+        tabla.agregar([d.page_content for d in docs], [d.metadata for d in docs])
+        return tabla
+
+    def _reindexar(self):
+        self._codigo_categoria = {nombre: i for i, nombre in enumerate(self.categorias)}
+        self._codigo_fuente = {nombre: i for i, nombre in enumerate(self.fuentes)}
+        canonicas = np.flatnonzero(self.canonico == np.arange(len(self)))
+        self._primera_por_huella = dict(zip(self.huella[canonicas].tolist(), canonicas.tolist()))
+        self.similares = IndiceSimhash()
+        for h, categoria in zip(self.simhash.tolist(), self.categoria.tolist()):
+            self.similares.agregar(h, categoria)
+        self.es_reglamento = np.array(["REGLAMENTO" in f.upper() for f in self.fuentes], dtype=bool)
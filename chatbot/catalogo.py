@@ -0,0 +1,138 @@
+"""
+Catálogo persistente de documentos (tabla DocumentoIndexado).
+
+La subida y la ingesta lo actualizan fila por fila; el listado de la base de
+conocimiento es una consulta paginada en vez de un recorrido de `documentos_unemi/`.
+En despliegues anteriores al catálogo la tabla empieza vacía: el primer listado de
+cada proceso la llena con `sincronizar` (ver `sincronizar_si_vacio`).
+"""
+import logging
+import threading
+from pathlib import Path
+
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import DocumentoIndexado
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONES_SOPORTADAS = {'.pdf', '.docx', '.txt', '.md'}
+POR_PAGINA_DEFECTO = 100
+POR_PAGINA_MAX = 1000
+
+_lock_sincronizacion = threading.Lock()
+_revisado = False  # el proceso ya comprobó si el catálogo estaba vacío
+
+
+def registrar_subida(categoria: str, nombre: str, tamano_bytes: int, sha256: str):
+    """Archivo guardado en disco (aún sin indexar o reemplazando una versión anterior)."""
+    DocumentoIndexado.objects.update_or_create(
+        categoria=categoria, nombre=nombre,
+        defaults={"tamano_bytes": tamano_bytes, "sha256": sha256, "error": ""},
+    )
+
+
+def registrar_ingesta(categoria: str, nombre: str, sha256: str, chunks: int, generacion: int):
+    DocumentoIndexado.objects.filter(categoria=categoria, nombre=nombre, sha256=sha256).update(
+        sha256_indexado=sha256, chunks=chunks, generacion=generacion,
+        ingestado_en=timezone.now(), error="",
+    )
+
+
+def registrar_error(categoria: str, nombre: str, error: str):
+    DocumentoIndexado.objects.filter(categoria=categoria, nombre=nombre).update(error=error[:1000])
+
+
+def listar(generacion_actual: int, categoria: str = None, pagina: int = 1, por_pagina: int = POR_PAGINA_DEFECTO) -> dict:
+    """Una página del catálogo agrupada por categoría, con estado indexado/desactualizado."""
+    por_pagina = max(1, min(por_pagina, POR_PAGINA_MAX))
+    pagina = max(1, pagina)
+    consulta = DocumentoIndexado.objects.all()
+    if categoria:
+        consulta = consulta.filter(categoria=categoria)
+
+    total = consulta.count()
+    por_categoria = dict(consulta.values_list("categoria").annotate(n=Count("id")).order_by())
+    inicio = (pagina - 1) * por_pagina
+
+    categorias = {}
+    for doc in consulta[inicio:inicio + por_pagina]:
+        categorias.setdefault(doc.categoria, []).append({
+            'name': doc.nombre,
+            'size_mb': round(doc.tamano_bytes / (1024 * 1024), 2),
+            'type': Path(doc.nombre).suffix.lower().lstrip('.'),
+            'status': doc.estado(generacion_actual),
+            'chunks': doc.chunks,
+            'ingested_at': doc.ingestado_en.isoformat() if doc.ingestado_en else None,
+        })
+
+    return {
+        'categories': categorias,
+        'stats': {
+            'total_categories': len(por_categoria),
+            'total_files': total,
+            'files_per_category': por_categoria,
+            'index_generation': generacion_actual,
+        },
+        'pagination': {
+            'page': pagina,
+            'page_size': por_pagina,
+            'total': total,
+            'pages': (total + por_pagina - 1) // por_pagina,
+        },
+    }
+
+
+def sincronizar_si_vacio(base_dir: Path, servicio, hash_archivo):
+    """
+    Llena el catálogo desde el disco si está vacío (una vez por proceso), para que los
+    documentos subidos antes de la tabla aparezcan sin correr `sincronizar_catalogo`.
+    """
+    global _revisado
+    if _revisado:
+        return None
+    with _lock_sincronizacion:
+        if _revisado:
+            return None
+        cambios = None
+        if not DocumentoIndexado.objects.exists() and Path(base_dir).exists():
+            cambios = sincronizar(base_dir, servicio, hash_archivo)
+            logger.info(f"🗂️ Catálogo vacío llenado desde {base_dir}: {cambios['nuevos']} documentos.")
+        _revisado = True
+        return cambios
+
+
+def sincronizar(base_dir: Path, servicio, hash_archivo) -> dict:
+    """
+    Reconcilia el catálogo con el disco (archivos copiados a mano, catálogo nuevo):
+    solo se rehashean archivos nuevos o cuyo tamaño cambió. Un archivo cuyo contenido
+    ya está en el índice se marca como indexado sin re-ingestarlo.
+    """
+    existentes = {(d.categoria, d.nombre): d for d in DocumentoIndexado.objects.all()}
+    vistos = set()
+    cambios = {"nuevos": 0, "actualizados": 0, "eliminados": 0}
+
+    for carpeta in sorted(p for p in Path(base_dir).iterdir() if p.is_dir() and not p.name.startswith('.')):
+        for ruta in sorted(carpeta.iterdir()):
+            if not ruta.is_file() or ruta.suffix.lower() not in EXTENSIONES_SOPORTADAS:
+                continue
+            clave = (carpeta.name, ruta.name)
+            vistos.add(clave)
+            tamano = ruta.stat().st_size
+            doc = existentes.get(clave)
+            if doc is not None and doc.tamano_bytes == tamano:
+                continue
+
+            sha256 = hash_archivo(str(ruta))
+            registrar_subida(carpeta.name, ruta.name, tamano, sha256)
+            if servicio.ya_indexado(sha256, carpeta.name):
+                DocumentoIndexado.objects.filter(categoria=carpeta.name, nombre=ruta.name).update(
+                    sha256_indexado=sha256, generacion=servicio.generacion,
+                )
+            cambios["actualizados" if doc else "nuevos"] += 1
+
+    faltantes = [existentes[c].pk for c in existentes.keys() - vistos]
+    if faltantes:
+        cambios["eliminados"] = DocumentoIndexado.objects.filter(pk__in=faltantes).delete()[0]
+    return cambios
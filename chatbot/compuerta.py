@@ -0,0 +1,213 @@
+"""
+Compuerta de confianza de la recuperación: evita la generación cuando la evidencia es débil.
+
+Con solo coincidencias débiles el LLM tarda varios segundos para terminar respondiendo
+`has_information: false`. Antes de generar, `consultar` calcula unas pocas características
+de los scores recuperados (1/(1+distancia)) y estima la probabilidad de que la respuesta
+tenga información:
+
+  - calibrada (FAISS_INDEX_PATH/compuerta.json, generado por `calibrar_compuerta`):
+    regresión logística sobre las características, con el umbral de probabilidad elegido
+    para no perder más de un porcentaje de respuestas útiles;
+  - sin calibrar: solo se omite la generación si el mejor score queda por debajo de
+    RAG_COMPUERTA_SCORE_MIN (0 = compuerta desactivada).
+
+Cada generación registra sus características y el `has_information` obtenido en
+FAISS_INDEX_PATH/compuerta_registro.jsonl, que es la entrada de la calibración. Una fracción
+RAG_COMPUERTA_EXPLORACION de las consultas que la compuerta omitiría se genera igual, para
+seguir midiendo el resultado en la zona que la compuerta descarta. Cada fila registra su
+probabilidad de muestreo, y la calibración pesa las de exploración por 1/probabilidad: si no,
+los positivos bajo el umbral quedan subrepresentados, el recall estimado se infla y cada
+recalibración sube el umbral.
+"""
+import json
+import logging
+import random
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_CALIBRACION = "compuerta.json"
+ARCHIVO_REGISTRO = "compuerta_registro.jsonl"
+CARACTERISTICAS = ("score_max", "score_medio_top3", "margen_top1", "docs")
+
+_lock = threading.Lock()
+_calibracion = None  # (ruta, mtime, datos)
+
+
+def ruta_calibracion() -> Path:
+    return Path(settings.FAISS_INDEX_PATH) / ARCHIVO_CALIBRACION
+
+
+def ruta_registro() -> Path:
+    return Path(settings.FAISS_INDEX_PATH) / ARCHIVO_REGISTRO
+
+
+def caracteristicas(scores) -> dict:
+    """Características de la recuperación a partir de los scores de los chunks finales."""
+    ordenados = sorted((float(s) for s in scores), reverse=True)
+    if not ordenados:
+        return {nombre: 0.0 for nombre in CARACTERISTICAS}
+    top3 = ordenados[:3]
+    return {
+        "score_max": ordenados[0],
+        "score_medio_top3": sum(top3) / len(top3),
+        "margen_top1": ordenados[0] - (ordenados[1] if len(ordenados) > 1 else 0.0),
+        "docs": float(len(ordenados)),
+    }
+
+
+def probabilidad(modelo: dict, valores: dict) -> float:
+    x = (np.array([valores[n] for n in modelo["caracteristicas"]]) - modelo["media"]) / modelo["escala"]
+    return float(1.0 / (1.0 + np.exp(-(x @ np.asarray(modelo["pesos"]) + modelo["sesgo"]))))
+
+
+def _cargar_calibracion():
+    """Calibración vigente (se relee si el archivo cambia), o None."""
+    global _calibracion
+    ruta = ruta_calibracion()
+    try:
+        mtime = ruta.stat().st_mtime
+    except OSError:
+        return None
+    with _lock:
+        if _calibracion is None or _calibracion[:2] != (ruta, mtime):
+            try:
+                _calibracion = (ruta, mtime, json.loads(ruta.read_text(encoding="utf-8")))
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Calibración de la compuerta ilegible ({ruta}): {e}")
+                return None
+        return _calibracion[2]
+
+
+def evaluar(scores) -> dict:
+    """
+    Decide si vale la pena generar: {"generar": bool, "decision", "probabilidad", "muestreo", "caracteristicas"}.
+    decision: "generar" | "omitir" | "exploracion" (se habría omitido, pero se genera para registrar).
+    muestreo: probabilidad con la que una consulta así se genera (1.0, o RAG_COMPUERTA_EXPLORACION).
+    """
+    valores = caracteristicas(scores)
+    calibracion = _cargar_calibracion()
+    if calibracion is not None:
+        p = probabilidad(calibracion, valores)
+        suficiente = p >= calibracion["umbral"]
+    else:
+        p = None
+        suficiente = valores["score_max"] >= settings.RAG_COMPUERTA_SCORE_MIN
+
+    muestreo = 1.0
+    if suficiente:
+        decision = "generar"
+    elif random.random() < settings.RAG_COMPUERTA_EXPLORACION:
+        decision = "exploracion"
+        muestreo = settings.RAG_COMPUERTA_EXPLORACION
+    else:
+        decision = "omitir"
+    metrics.incrementar("chatbot_compuerta_total", decision=decision)
+    metrics.anotar("compuerta", decision=decision, probabilidad=None if p is None else round(p, 3),
+                   score_max=round(valores["score_max"], 3))
+    return {"generar": decision != "omitir", "decision": decision, "probabilidad": p, "muestreo": muestreo,
+            "caracteristicas": valores}
+
+
+def registrar(evaluacion: dict, has_information: bool):
+    """Agrega el resultado de una generación al registro de calibración."""
+    if not settings.RAG_COMPUERTA_REGISTRAR:
+        return
+    linea = json.dumps({
+        **{k: round(v, 4) for k, v in evaluacion["caracteristicas"].items()},
+        "decision": evaluacion["decision"],
+        # Probabilidad de que una consulta como esta llegue al registro (peso = 1/muestreo)
+        "muestreo": evaluacion["muestreo"],
+        "has_information": bool(has_information),
+    })
+    try:
+        with _lock, open(ruta_registro(), "a", encoding="utf-8") as f:
+            f.write(linea + "\n")
+    except OSError as e:
+        logger.warning(f"⚠️ No se pudo escribir el registro de la compuerta: {e}")
+
+
+# --- CALIBRACIÓN (comando calibrar_compuerta) ---
+def leer_registro(ruta) -> tuple:
+    """
+    (X, y, pesos) del registro JSONL; ignora líneas ilegibles. El peso es 1/muestreo; las
+    filas de exploración anteriores a este campo usan RAG_COMPUERTA_EXPLORACION vigente.
+    """
+    filas, etiquetas, pesos = [], [], []
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            try:
+                datos = json.loads(linea)
+                fila = [float(datos[n]) for n in CARACTERISTICAS]
+                muestreo = float(datos.get("muestreo") or (
+                    settings.RAG_COMPUERTA_EXPLORACION if datos.get("decision") == "exploracion" else 1.0
+                ))
+                if muestreo <= 0:
+                    continue
+                filas.append(fila)
+                etiquetas.append(1.0 if datos["has_information"] else 0.0)
+                pesos.append(1.0 / muestreo)
+            except (ValueError, KeyError, TypeError):
+                continue
+    return (np.array(filas, dtype=np.float64).reshape(-1, len(CARACTERISTICAS)), np.array(etiquetas),
+            np.array(pesos))
+
+
+def ajustar(X: np.ndarray, y: np.ndarray, pesos: np.ndarray = None, l2: float = 1e-2, iteraciones: int = 50) -> dict:
+    """
+    Regresión logística ponderada (Newton-Raphson con regularización L2) sobre características
+    estandarizadas. Una fila con peso w cuenta como w filas iguales.
+    """
+    pesos = np.ones(len(y)) if pesos is None else np.asarray(pesos, dtype=np.float64)
+    media = np.average(X, axis=0, weights=pesos)
+    escala = np.sqrt(np.average((X - media) ** 2, axis=0, weights=pesos))
+    escala[escala == 0] = 1.0
+    Z = np.hstack([(X - media) / escala, np.ones((len(X), 1))])
+    w = np.zeros(Z.shape[1])
+    regularizacion = l2 * np.eye(Z.shape[1])
+    regularizacion[-1, -1] = 0.0  # el sesgo no se regulariza
+    for _ in range(iteraciones):
+        p = 1.0 / (1.0 + np.exp(-Z @ w))
+        gradiente = Z.T @ (pesos * (p - y)) + regularizacion @ w
+        hessiana = (Z * (pesos * p * (1 - p))[:, None]).T @ Z + regularizacion
+        paso = np.linalg.solve(hessiana + 1e-9 * np.eye(len(w)), gradiente)
+        w -= paso
+        if np.abs(paso).max() < 1e-8:
+            break
+    return {
+        "caracteristicas": list(CARACTERISTICAS),
+        "media": media.tolist(),
+        "escala": escala.tolist(),
+        "pesos": w[:-1].tolist(),
+        "sesgo": float(w[-1]),
+    }
+
+
+def elegir_umbral(probabilidades: np.ndarray, y: np.ndarray, recall_minimo: float, pesos: np.ndarray = None) -> dict:
+    """
+    Umbral más alto que conserva al menos `recall_minimo` de las respuestas con información.
+    Devuelve {"umbral", "recall", "omitidas"} (omitidas: fracción de generaciones evitadas).
+    Recall y omitidas se ponderan con `pesos` (1/probabilidad de muestreo).
+    """
+    pesos = np.ones(len(y)) if pesos is None else np.asarray(pesos, dtype=np.float64)
+    orden = np.argsort(probabilidades[y == 1], kind="stable")
+    positivas = probabilidades[y == 1][orden]
+    pesos_positivas = pesos[y == 1][orden]
+    if len(positivas) == 0:
+        return {"umbral": 0.0, "recall": 1.0, "omitidas": 0.0}
+    total = pesos_positivas.sum()
+    # Positivas (las de menor probabilidad) que se pueden perder sin bajar de recall_minimo
+    perdibles = int(np.searchsorted(np.cumsum(pesos_positivas), (1 - recall_minimo) * total + 1e-9, side="right"))
+    umbral = float(positivas[perdibles]) if perdibles < len(positivas) else 0.0
+    return {
+        "umbral": umbral,
+        "recall": float(pesos_positivas[positivas >= umbral].sum() / total),
+        "omitidas": float(pesos[probabilidades < umbral].sum() / pesos.sum()),
+    }
@@ -0,0 +1,109 @@
+"""
+Memoria de conversación por sesión.
+
+Cada sesión del chat (session_id generado por el frontend) guarda en la caché local
+`conversaciones` los últimos RAG_SESION_TURNOS turnos (pregunta, query de búsqueda,
+filas candidatas recuperadas) y, si se pidió una aclaración, la pregunta original.
+
+Con eso ChatView:
+  - fusiona la respuesta a una aclaración con la pregunta original en una sola pasada;
+  - responde seguimientos cortos ("¿y cuáles son los plazos?") de un turno RAG anterior
+    re-puntuando sus filas candidatas en vez de reformular y buscar de nuevo. La intención se
+    clasifica igual: un seguimiento operativo ("y quiero hablar con un asesor") va al handoff.
+"""
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+ALIAS_CACHE = "conversaciones"
+PREFIJO_CLAVE = "chat:sesion:"
+
+# Inicios típicos de una pregunta que continúa la anterior ("y " cubre "y si", "y cual", "y los"...)
+MARCADORES_SEGUIMIENTO = ("y ", "e ", "pero ", "tambien", "ademas", "entonces", "que mas")
+# Referencias a lo ya hablado
+PALABRAS_ANAFORICAS = {"eso", "esto", "ese", "esa", "esos", "esas", "ello", "aquello", "dicho", "dicha", "mismo", "misma"}
+
+
+def normalizar(texto: str) -> str:
+    texto = texto.lower().strip()
+    for origen, destino in zip("áéíóúü", "aeiouu"):
+        texto = texto.replace(origen, destino)
+    return re.sub(r"[^\w\s]", "", texto).strip()
+
+
+def es_seguimiento(texto: str, turno_anterior: dict) -> bool:
+    """
+    Mensaje corto que depende de la pregunta anterior para tener sentido. Solo hay seguimiento
+    si existe un turno anterior reutilizable (`EstadoConversacion.contexto_seguimiento`).
+    """
+    if turno_anterior is None:
+        return False
+    normalizado = normalizar(texto)
+    palabras = normalizado.split()
+    if not palabras or len(palabras) > settings.RAG_SESION_MAX_PALABRAS_SEGUIMIENTO:
+        return False
+    return normalizado.startswith(MARCADORES_SEGUIMIENTO) or bool(PALABRAS_ANAFORICAS & set(palabras))
+
+
+class EstadoConversacion:
+    """Turnos recientes de una sesión (buffer circular acotado) + aclaración pendiente."""
+
+    def __init__(self, session_id: str, turnos: list = None, aclaracion_pendiente: str = None):
+        self.session_id = session_id
+        self.turnos = turnos or []
+        self.aclaracion_pendiente = aclaracion_pendiente
+
+    @property
+    def ultimo(self):
+        return self.turnos[-1] if self.turnos else None
+
+    def agregar_turno(self, pregunta: str, tipo: str, query_busqueda: str = None, filas: list = None,
+                      categorias: list = None, generacion: int = None):
+        self.turnos.append({
+            "pregunta": pregunta,
+            "tipo": tipo,
+            "query_busqueda": query_busqueda,
+            "filas": list(filas or []),
+            "categorias": sorted(categorias or []),
+            "generacion": generacion,
+            "ts": time.time(),
+        })
+        del self.turnos[:-settings.RAG_SESION_TURNOS]
+
+    def contexto_seguimiento(self, categorias: list, generacion: int):
+        """
+        Turno RAG anterior reutilizable para un seguimiento: mismas categorías permitidas
+        y mismo índice (la generación cambia al guardar una ingesta). None si no aplica.
+        """
+        turno = self.ultimo
+        if (
+            turno is None or turno["tipo"] != "rag_response" or not turno["filas"]
+            or turno["categorias"] != sorted(categorias) or turno["generacion"] != generacion
+        ):
+            return None
+        return turno
+
+    # --- PERSISTENCIA EN CACHÉ ---
+    @classmethod
+    def cargar(cls, session_id: str) -> "EstadoConversacion":
+        datos = caches[ALIAS_CACHE].get(PREFIJO_CLAVE + session_id) or {}
+        return cls(session_id, datos.get("turnos"), datos.get("aclaracion_pendiente"))
+
+    def guardar(self):
+        caches[ALIAS_CACHE].set(
+            PREFIJO_CLAVE + self.session_id,
+            {"turnos": self.turnos, "aclaracion_pendiente": self.aclaracion_pendiente},
+            timeout=settings.RAG_SESION_TTL_S,
+        )
+
+
+def obtener(session_id) -> EstadoConversacion:
+    """Estado de la sesión, o None sin session_id válido (el chat sigue funcionando sin memoria)."""
+    if not isinstance(session_id, str) or not 8 <= len(session_id) <= 64:
+        return None
+    return EstadoConversacion.cargar(session_id)
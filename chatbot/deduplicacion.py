@@ -0,0 +1,159 @@
+"""
+Deduplicación en la ingesta, antes de embeber.
+
+Dos pasadas:
+  1. Encabezados y pies repetidos: en un PDF, las líneas de los márgenes de cada página
+     (las MARGEN_LINEAS primeras y últimas) que se repiten en al menos
+     RAG_DEDUP_FRACCION_PAGINAS de las páginas se quitan del texto antes de partirlo en
+     chunks. Solo se normaliza la paginación ("Página 3/40", un número suelto), así los
+     títulos como "Artículo 7.-" no se confunden entre sí. El lector inserta sus marcadores
+     de página después de limpiar cada página.
+  2. Chunks duplicados o casi duplicados: SimHash de 64 bits sobre trigramas de palabras. Un
+     chunk a distancia de Hamming <= RAG_DEDUP_DISTANCIA de otro ya indexado (o anterior en el
+     mismo documento) en la misma categoría no se embebe: la recuperación ya devolvería la
+     copia existente, y entre categorías se conserva para no perder acceso por permisos.
+
+Los chunks consecutivos que solo comparten el solapamiento (RAG_CHUNK_OVERLAP) quedan lejos
+en Hamming y no se consideran duplicados.
+"""
+import hashlib
+import logging
+import re
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+BITS = 64
+BANDAS = 4  # pigeonhole: con distancia <= BANDAS - 1, al menos una banda de 16 bits coincide
+_ANCHO_BANDA = BITS // BANDAS
+_MASCARA_BANDA = (1 << _ANCHO_BANDA) - 1
+MINIMO_PAGINAS = 3
+MARGEN_LINEAS = 3  # líneas (no vacías) al inicio y al final de cada página donde van encabezados y pies
+
+# "Página 3/40", "Pág. 3 de 40"; y líneas que son solo paginación ("3", "- 3 -", "3/40", "Página 3")
+_PAGINACION = re.compile(r"p[áa]g(?:ina)?\.?\s*\d+\s*(?:/|de)\s*\d+")
+_SOLO_PAGINA = re.compile(r"^[-–\s]*(?:p[áa]g(?:ina)?\.?\s*)?\d+(?:\s*(?:/|de)\s*\d+)?[-–\s]*$")
+_ESPACIOS = re.compile(r"\s+")
+_PALABRAS = re.compile(r"\w+")
+
+
+def normalizar_linea(linea: str) -> str:
+    linea = linea.strip().lower()
+    if _SOLO_PAGINA.match(linea):
+        return "#"
+    return _ESPACIOS.sub(" ", _PAGINACION.sub("página #", linea))
+
+
+def _margenes(lineas: list) -> set:
+    """Posiciones de las MARGEN_LINEAS primeras y últimas líneas no vacías."""
+    con_texto = [i for i, l in enumerate(lineas) if l.strip()]
+    return set(con_texto[:MARGEN_LINEAS] + con_texto[-MARGEN_LINEAS:])
+
+
+def quitar_repetidas(paginas: list, fraccion: float) -> tuple:
+    """
+    Quita de los márgenes de cada página las líneas que se repiten (en el margen) en al menos
+    `fraccion` de las páginas (mínimo MINIMO_PAGINAS). Devuelve (paginas, lineas_quitadas).
+    """
+    if len(paginas) < MINIMO_PAGINAS:
+        return paginas, 0
+    separadas = [pagina.splitlines() for pagina in paginas]
+    por_pagina = Counter()
+    for lineas in separadas:
+        por_pagina.update({normalizar_linea(lineas[i]) for i in _margenes(lineas)})
+    minimo = max(MINIMO_PAGINAS, fraccion * len(paginas))
+    repetidas = {linea for linea, veces in por_pagina.items() if veces >= minimo}
+    if not repetidas:
+        return paginas, 0
+
+    quitadas = 0
+    limpias = []
+    for lineas in separadas:
+        margenes = _margenes(lineas)
+        conservadas = [l for i, l in enumerate(lineas) if i not in margenes or normalizar_linea(l) not in repetidas]
+        quitadas += len(lineas) - len(conservadas)
+        limpias.append("\n".join(conservadas))
+    return limpias, quitadas
+
+
+def simhash(texto: str) -> int:
+    """SimHash de 64 bits sobre trigramas de palabras (en minúsculas)."""
+    palabras = _PALABRAS.findall(texto.lower())
+    tejas = [" ".join(palabras[i:i + 3]) for i in range(max(1, len(palabras) - 2))]
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little") for t in tejas],
+        dtype=np.uint64,
+    )
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votos = (2 * bits.astype(np.int32) - 1).sum(axis=0)
+    return int(np.packbits(votos > 0, bitorder="little").view(np.uint64)[0])
+
+
+def _bandas(h: int):
+    return [(i, (h >> (i * _ANCHO_BANDA)) & _MASCARA_BANDA) for i in range(BANDAS)]
+
+
+class IndiceSimhash:
+    """SimHash por categoría con búsqueda por bandas (distancias de Hamming < BANDAS)."""
+
+    def __init__(self):
+        self._bandas = {}  # (categoría, banda, valor) → [simhash]
+
+    def agregar(self, h: int, categoria: int):
+        for banda, valor in _bandas(h):
+            self._bandas.setdefault((categoria, banda, valor), []).append(h)
+
+    def cercano(self, h: int, categoria: int, distancia: int) -> bool:
+        for banda, valor in _bandas(h):
+            for otro in self._bandas.get((categoria, banda, valor), ()):
+                if (h ^ otro).bit_count() <= distancia:
+                    return True
+        return False
+
+
+def filtrar_chunks(documents: list, tabla, categoria: str) -> tuple:
+    """
+    Descarta los chunks casi duplicados de otros de la misma categoría (ya indexados o
+    anteriores en el documento). Devuelve (documents, simhashes de los conservados, omitidos).
+    """
+    distancia = min(settings.RAG_DEDUP_DISTANCIA, BANDAS - 1)
+    codigo = tabla.codigo_categoria(categoria)
+    locales = IndiceSimhash()
+    conservados, hashes, omitidos = [], [], 0
+    for doc in documents:
+        h = simhash(doc.page_content)
+        if tabla.similares.cercano(h, codigo, distancia) or locales.cercano(h, codigo, distancia):
+            omitidos += 1
+            continue
+        locales.agregar(h, codigo)
+        conservados.append(doc)
+        hashes.append(h)
+    return conservados, hashes, omitidos
+
+
+def filas_nuevas(simhashes: list, tabla, categoria: str) -> list:
+    """Posiciones de los chunks ya filtrados (p. ej. en otro proceso) que no tienen una copia cercana en `tabla`."""
+    codigo = tabla.codigo_categoria(categoria)
+    if codigo is None:
+        return list(range(len(simhashes)))
+    distancia = min(settings.RAG_DEDUP_DISTANCIA, BANDAS - 1)
+    return [i for i, h in enumerate(simhashes) if not tabla.similares.cercano(h, codigo, distancia)]
+
+
+def reportar(nombre: str, lineas: int, omitidos: int, bytes_por_chunk: int):
+    """Métricas y log de lo ahorrado en un documento."""
+    if lineas:
+        metrics.incrementar("chatbot_dedup_lineas_total", lineas)
+    if omitidos:
+        metrics.incrementar("chatbot_dedup_chunks_total", omitidos)
+        metrics.incrementar("chatbot_dedup_bytes_ahorrados_total", omitidos * bytes_por_chunk)
+    if lineas or omitidos:
+        logger.info(
+            f"🧹 Dedup {nombre}: {lineas} líneas repetidas, {omitidos} chunks sin embeber "
+            f"(~{omitidos * bytes_por_chunk / 1024:.1f} KB de índice)"
+        )
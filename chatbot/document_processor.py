@@ -13,6 +13,8 @@ from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from django.conf import settings
 
+from .deduplicacion import quitar_repetidas
+
 logger = logging.getLogger(__name__)
 
 
@@ -33,6 +35,8 @@ class DocumentProcessor:
         
         self.max_file_size_mb = getattr(settings, 'RAG_MAX_FILE_SIZE_MB', 50)
         self.supported_formats = ['pdf', 'docx', 'txt', 'md']
+        # Encabezados/pies repetidos quitados en el último documento cargado (ver deduplicacion.py)
+        self.lineas_repetidas = 0
 
     def load_document(self, file_path: str) -> str:
         """Load and extract text from various document formats."""
@@ -70,6 +74,7 @@ class DocumentProcessor:
     def _load_pdf(self, file_path: Path) -> str:
         """Extract text from PDF files."""
         text = ""
+        paginas = []
         try:
             with open(file_path, 'rb') as file:
                 pdf_reader = pypdf.PdfReader(file)
@@ -79,13 +84,24 @@ class DocumentProcessor:
                     try:
                         page_text = page.extract_text()
                         if page_text.strip():
-                            text += f"\n--- Página {page_num + 1}/{total_pages} ---\n{page_text}\n"
+                            paginas.append((page_num, page_text))
                     except Exception as e:
                         logger.warning(
                             f"⚠️ Error extrayendo página {page_num + 1} de {file_path.name}: {e}"
                         )
                         continue
-                        
+
+            if getattr(settings, 'RAG_DEDUP_ACTIVO', False):
+                # Encabezados/pies se quitan página por página, antes de insertar los marcadores
+                # (normalizados, los marcadores se verían repetidos en todas las páginas)
+                limpias, self.lineas_repetidas = quitar_repetidas(
+                    [t for _, t in paginas], getattr(settings, 'RAG_DEDUP_FRACCION_PAGINAS', 0.5)
+                )
+                paginas = [(page_num, t) for (page_num, _), t in zip(paginas, limpias) if t.strip()]
+
+            for page_num, page_text in paginas:
+                text += f"\n--- Página {page_num + 1}/{total_pages} ---\n{page_text}\n"
+
             if not text.strip():
                 raise ValueError("El PDF no contiene texto extraíble")
                 
@@ -0,0 +1,256 @@
+"""
+Índice vectorial del RAG: plano (IndexFlatL2, por defecto) o compacto (RAG_INDICE_MODO=compacto).
+
+El modo compacto reduce la dimensión (truncado Matryoshka o PCA) y cuantiza (SQ8 o PQ) para
+buscar en memoria, y re-puntúa los mejores candidatos con la distancia exacta usando los
+vectores completos en disco (`vectores.f32`, leídos por memmap). Las distancias devueltas son
+L2² exactas, igual que IndexFlatL2, así el umbral de score no cambia entre modos.
+
+`IndiceCompacto` expone la interfaz de índice FAISS que usan LangChain y `recuperar`
+(`d`, `ntotal`, `add`, `search`).
+"""
+import json
+import logging
+import os
+from pathlib import Path
+
+import faiss
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_PLANO = "index.faiss"
+ARCHIVO_CONFIG = "indice_compacto.json"
+ARCHIVO_VECTORES = "vectores.f32"
+ARCHIVO_REDUCIDO = "reducido.faiss"
+
+# Vectores necesarios antes de entrenar la cuantización; por debajo se busca exacto en disco
+MINIMO_ENTRENAMIENTO = {"sq8": 1000, "pq": 256 * 10}
+MAX_MUESTRA_ENTRENAMIENTO = 100_000
+BLOQUE = 65536
+
+
+def config_indice() -> dict:
+    return {
+        "modo": settings.RAG_INDICE_MODO,
+        "reduccion": settings.RAG_INDICE_REDUCCION,
+        "dimension_reducida": settings.RAG_INDICE_DIMENSION,
+        "cuantizacion": settings.RAG_INDICE_CUANTIZACION,
+        "pq_m": settings.RAG_INDICE_PQ_M,
+        "factor_rescore": settings.RAG_INDICE_FACTOR_RESCORE,
+    }
+
+
+def _escribir_atomico(ruta: Path, escribir):
+    temporal = ruta.with_name(ruta.name + ".tmp")
+    escribir(temporal)
+    os.replace(temporal, ruta)
+
+
+class IndiceCompacto:
+    def __init__(self, directorio, dimension: int, config: dict):
+        self.directorio = Path(directorio)
+        self.d = dimension
+        self.config = {k: v for k, v in config.items() if k != "modo"}
+        self.ntotal = 0
+        self.entrenado_con = 0
+        self._reducido = None  # None hasta tener vectores suficientes para entrenar
+        self._vectores = None  # memmap de solo lectura, se renueva al crecer el archivo
+        self.directorio.mkdir(parents=True, exist_ok=True)
+
+    # --- VECTORES COMPLETOS EN DISCO ---
+    @property
+    def _ruta_vectores(self) -> Path:
+        return self.directorio / ARCHIVO_VECTORES
+
+    def _completos(self) -> np.ndarray:
+        if self._vectores is None or len(self._vectores) < self.ntotal:
+            self._vectores = np.memmap(self._ruta_vectores, dtype=np.float32, mode="r", shape=(self.ntotal, self.d))
+        return self._vectores[:self.ntotal]
+
+    # --- REDUCCIÓN + CUANTIZACIÓN ---
+    def _reducir(self, x: np.ndarray) -> np.ndarray:
+        if self.config["reduccion"] != "truncar":
+            return x  # PCA va dentro del IndexPreTransform
+        x = np.ascontiguousarray(x[:, :self.config["dimension_reducida"]])
+        faiss.normalize_L2(x)
+        return x
+
+    def _nuevo_reducido(self):
+        dr = self.config["dimension_reducida"]
+        if self.config["cuantizacion"] == "pq":
+            cuantizado = faiss.IndexPQ(dr, self.config["pq_m"], 8)
+        else:
+            cuantizado = faiss.IndexScalarQuantizer(dr, faiss.ScalarQuantizer.QT_8bit)
+        if self.config["reduccion"] == "pca":
+            return faiss.IndexPreTransform(faiss.PCAMatrix(self.d, dr), cuantizado)
+        return cuantizado
+
+    def _entrenar(self):
+        """(Re)entrena con una muestra de todos los vectores y vuelve a agregar todo."""
+        completos = self._completos()
+        rng = np.random.default_rng(0)
+        muestra = completos
+        if len(completos) > MAX_MUESTRA_ENTRENAMIENTO:
+            muestra = completos[np.sort(rng.choice(len(completos), MAX_MUESTRA_ENTRENAMIENTO, replace=False))]
+        reducido = self._nuevo_reducido()
+        reducido.train(self._reducir(np.asarray(muestra, dtype=np.float32)))
+        for inicio in range(0, len(completos), BLOQUE):
+            reducido.add(self._reducir(np.asarray(completos[inicio:inicio + BLOQUE], dtype=np.float32)))
+        self._reducido = reducido
+        self.entrenado_con = self.ntotal
+        logger.info(f"🗜️ Índice compacto entrenado con {self.ntotal} vectores ({self.config}).")
+
+    # --- INTERFAZ DE ÍNDICE FAISS ---
+    def add(self, x):
+        x = np.ascontiguousarray(x, dtype=np.float32).reshape(-1, self.d)
+        with open(self._ruta_vectores, "ab") as f:
+            f.write(x.tobytes())
+        self.ntotal += len(x)
+        if self._reducido is not None:
+            self._reducido.add(self._reducir(x.copy()))
+        elif self.ntotal >= MINIMO_ENTRENAMIENTO[self.config["cuantizacion"]]:
+            self._entrenar()
+
+    def search(self, x, k: int):
+        x = np.ascontiguousarray(x, dtype=np.float32).reshape(-1, self.d)
+        distancias = np.full((len(x), k), np.finfo(np.float32).max, dtype=np.float32)
+        etiquetas = np.full((len(x), k), -1, dtype=np.int64)
+        if self.ntotal == 0:
+            return distancias, etiquetas
+
+        completos = self._completos()
+        if self._reducido is None:
+            # Aún sin entrenar (pocos vectores): búsqueda exacta directamente sobre el memmap
+            n = min(k, self.ntotal)
+            distancias[:, :n], etiquetas[:, :n] = faiss.knn(x, completos, n)
+            return distancias, etiquetas
+
+        k_reducido = min(self.ntotal, k * self.config["factor_rescore"])
+        _, aproximados = self._reducido.search(self._reducir(x.copy()), k_reducido)
+        for i, (consulta, filas) in enumerate(zip(x, aproximados)):
+            # Re-score exacto: solo se leen del disco las filas candidatas (ordenadas)
+            filas = np.sort(filas[filas >= 0])
+            exactas = ((completos[filas] - consulta) ** 2).sum(axis=1)
+            n = min(k, len(filas))
+            mejores = np.argsort(exactas, kind="stable")[:n]
+            distancias[i, :n] = exactas[mejores]
+            etiquetas[i, :n] = filas[mejores]
+        return distancias, etiquetas
+
+    def reconstruir_todos(self) -> np.ndarray:
+        return np.array(self._completos(), dtype=np.float32)
+
+    def reconstruir_filas(self, filas: np.ndarray) -> np.ndarray:
+        orden = np.argsort(filas)
+        vectores = np.empty((len(filas), self.d), dtype=np.float32)
+        vectores[orden] = self._completos()[filas[orden]]
+        return vectores
+
+    # --- PERSISTENCIA ---
+    def guardar(self):
+        # Re-entrenar cuando el índice duplicó su tamaño desde el último entrenamiento
+        if self._reducido is not None and self.ntotal >= 2 * self.entrenado_con:
+            self._entrenar()
+        if self._reducido is not None:
+            _escribir_atomico(self.directorio / ARCHIVO_REDUCIDO,
+                              lambda ruta: faiss.write_index(self._reducido, str(ruta)))
+        estado = {"dimension": self.d, "ntotal": self.ntotal, "entrenado_con": self.entrenado_con,
+                  "config": self.config}
+        _escribir_atomico(self.directorio / ARCHIVO_CONFIG,
+                          lambda ruta: ruta.write_text(json.dumps(estado), encoding="utf-8"))
+
+    @classmethod
+    def cargar(cls, directorio) -> "IndiceCompacto":
+        directorio = Path(directorio)
+        estado = json.loads((directorio / ARCHIVO_CONFIG).read_text(encoding="utf-8"))
+        indice = cls(directorio, estado["dimension"], estado["config"])
+        indice.ntotal = estado["ntotal"]
+        indice.entrenado_con = estado["entrenado_con"]
+        # Vectores escritos después del último guardado (corte a mitad de una ingesta)
+        esperado = indice.ntotal * indice.d * 4
+        if indice._ruta_vectores.stat().st_size > esperado:
+            os.truncate(indice._ruta_vectores, esperado)
+        if indice.entrenado_con and (directorio / ARCHIVO_REDUCIDO).exists():
+            indice._reducido = faiss.read_index(str(directorio / ARCHIVO_REDUCIDO))
+            if indice._reducido.ntotal != indice.ntotal:
+                indice._entrenar()
+        return indice
+
+    def borrar_archivos(self):
+        for nombre in (ARCHIVO_CONFIG, ARCHIVO_VECTORES, ARCHIVO_REDUCIDO):
+            (self.directorio / nombre).unlink(missing_ok=True)
+
+
+# --- CREACIÓN / CARGA / CAMBIO DE MODO ---
+def crear(directorio, dimension: int, config: dict = None):
+    config = config or config_indice()
+    if config["modo"] == "compacto":
+        indice = IndiceCompacto(directorio, dimension, config)
+        indice.borrar_archivos()  # restos de un índice sin guardar
+        return indice
+    return faiss.IndexFlatL2(dimension)
+
+
+def cargar(directorio):
+    directorio = Path(directorio)
+    if (directorio / ARCHIVO_CONFIG).exists():
+        return IndiceCompacto.cargar(directorio)
+    if (directorio / ARCHIVO_PLANO).exists():
+        return faiss.read_index(str(directorio / ARCHIVO_PLANO))
+    return None
+
+
+def distancias_filas(indice, x: np.ndarray, filas: np.ndarray) -> np.ndarray:
+    """L2² exacta entre la consulta `x` y las filas indicadas (re-puntuar un conjunto ya recuperado)."""
+    filas = np.asarray(filas, dtype=np.int64)
+    if isinstance(indice, IndiceCompacto):
+        vectores = indice.reconstruir_filas(filas)
+    else:
+        vectores = indice.reconstruct_batch(filas)
+    return ((vectores - np.asarray(x, dtype=np.float32).reshape(1, -1)) ** 2).sum(axis=1)
+
+
+def reconstruir(indice, inicio: int, fin: int) -> np.ndarray:
+    """Vectores completos de las filas [inicio, fin)."""
+    if isinstance(indice, IndiceCompacto):
+        return np.array(indice._completos()[inicio:fin], dtype=np.float32)
+    return indice.reconstruct_n(int(inicio), int(fin - inicio))
+
+
+def guardar(indice, directorio):
+    directorio = Path(directorio)
+    if isinstance(indice, IndiceCompacto):
+        indice.guardar()
+        (directorio / ARCHIVO_PLANO).unlink(missing_ok=True)
+    else:
+        _escribir_atomico(directorio / ARCHIVO_PLANO, lambda ruta: faiss.write_index(indice, str(ruta)))
+
+
+def adaptar(indice, directorio, config: dict = None):
+    """
+    Convierte el índice cargado al modo configurado (plano ↔ compacto, o nueva configuración
+    compacta). Devuelve (indice, cambio); si hubo cambio, el llamador debe guardar.
+    """
+    config = config or config_indice()
+    compacto = isinstance(indice, IndiceCompacto)
+    if config["modo"] != "compacto":
+        if not compacto:
+            return indice, False
+        plano = faiss.IndexFlatL2(indice.d)
+        plano.add(indice.reconstruir_todos())
+        _escribir_atomico(Path(directorio) / ARCHIVO_PLANO, lambda ruta: faiss.write_index(plano, str(ruta)))
+        indice.borrar_archivos()
+        logger.info("🔄 Índice compacto convertido a plano.")
+        return plano, True
+
+    deseada = {k: v for k, v in config.items() if k != "modo"}
+    if compacto and indice.config == deseada:
+        return indice, False
+    vectores = indice.reconstruir_todos() if compacto else indice.reconstruct_n(0, indice.ntotal)
+    nuevo = crear(directorio, indice.d, config)
+    for inicio in range(0, len(vectores), BLOQUE):
+        nuevo.add(vectores[inicio:inicio + BLOQUE])
+    logger.info(f"🔄 Índice convertido a compacto ({deseada}).")
+    return nuevo, True
@@ -0,0 +1,221 @@
+"""
+Ingesta de documentos en segundo plano.
+
+DocumentUploadView guarda los archivos y encola un trabajo; un pool local de hilos
+(sin broker externo) los parsea y embebe en paralelo, y el último archivo de cada
+trabajo persiste el índice una sola vez. El estado se consulta por job_id.
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+
+from . import catalogo, metrics
+
+logger = logging.getLogger(__name__)
+
+# Trabajos terminados que se conservan para consulta (los más antiguos se descartan)
+MAX_TRABAJOS_TERMINADOS = 100
+
+_lock = threading.Lock()
+_trabajos = {}
+_executor = None
+
+
+class TrabajoIngesta:
+    """Estado de un lote de archivos subidos juntos (misma categoría)."""
+
+    def __init__(self, categoria: str, archivos: list):
+        self.id = uuid.uuid4().hex
+        self.categoria = categoria
+        self.creado = time.time()
+        self.inicio = None
+        self.fin = None
+        self.errores = []  # rechazos previos (tamaño) + fallos de ingesta
+        self.omitidos = []  # contenido ya indexado (mismo sha256 en la categoría)
+        self.archivos = [
+            {
+                "filename": a["filename"],
+                "ruta": str(a["ruta"]),
+                "file_size_mb": a["file_size_mb"],
+                "sha256": a.get("sha256"),
+                "estado": "pendiente",
+                "chunks": 0,
+                "segundos": None,
+            }
+            for a in archivos
+        ]
+        self._pendientes = len(self.archivos)
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self) -> str:
+        if self.fin is not None:
+            exito = bool(self.omitidos) or any(a["estado"] == "completado" for a in self.archivos)
+            return "completado" if exito else "error"
+        return "procesando" if self.inicio is not None else "en_cola"
+
+    def marcar(self, indice: int, **cambios):
+        with self._lock:
+            if self.inicio is None:
+                self.inicio = time.perf_counter()
+            self.archivos[indice].update(cambios)
+
+    def archivo_terminado(self) -> bool:
+        """Descuenta un archivo; True si era el último del trabajo."""
+        with self._lock:
+            self._pendientes -= 1
+            return self._pendientes == 0
+
+    def resumen(self) -> dict:
+        """Payload del endpoint de estado (mismas claves que espera KnowledgeBase)."""
+        with self._lock:
+            archivos = [dict(a) for a in self.archivos]
+            errores = list(self.errores)
+        terminados = [a for a in archivos if a["estado"] in ("completado", "error")]
+        completados = [a for a in archivos if a["estado"] == "completado"]
+        chunks = sum(a["chunks"] for a in completados)
+
+        segundos = 0.0
+        if self.inicio is not None:
+            segundos = (self.fin or time.perf_counter()) - self.inicio
+        errores += [{"file": a["filename"], "error": a["error"]} for a in archivos if a["estado"] == "error"]
+
+        datos = {
+            "job_id": self.id,
+            "status": self.estado,
+            "categoria": self.categoria,
+            "progress": round(100 * len(terminados) / len(archivos)) if archivos else 100,
+            "files_total": len(archivos),
+            "files_done": len(terminados),
+            "total_chunks_added": chunks,
+            "elapsed_s": round(segundos, 2),
+            "chunks_per_second": round(chunks / segundos, 1) if segundos else 0.0,
+            "files": [
+                {"filename": a["filename"], "status": a["estado"], "chunks": a["chunks"], "segundos": a["segundos"]}
+                for a in archivos
+            ],
+            "files_processed": [a["filename"] for a in completados],
+            "details": [
+                {
+                    "filename": a["filename"],
+                    "file_type": Path(a["filename"]).suffix.lstrip(".").lower(),
+                    "file_size_mb": a["file_size_mb"],
+                    "chunks_created": a["chunks"],
+                    "categoria": self.categoria,
+                }
+                for a in completados
+            ],
+        }
+        if self.fin is not None:
+            total = len(archivos) + len(self.errores) + len(self.omitidos)
+            datos["message"] = f"Procesados {len(completados)} de {total} archivos."
+        if self.omitidos:
+            datos["skipped"] = list(self.omitidos)
+        if errores:
+            datos["errors"] = errores
+        return datos
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            workers = getattr(settings, "RAG_INGESTA_WORKERS", 2)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingesta")
+        return _executor
+
+
+def _procesar_archivo(servicio, trabajo: TrabajoIngesta, indice: int):
+    archivo = trabajo.archivos[indice]
+    trabajo.marcar(indice, estado="procesando")
+    inicio = time.perf_counter()
+    try:
+        chunks = servicio.ingerir(archivo["ruta"], categoria=trabajo.categoria, content_hash=archivo["sha256"])
+        trabajo.marcar(indice, estado="completado", chunks=chunks,
+                       segundos=round(time.perf_counter() - inicio, 3))
+        metrics.incrementar("chatbot_ingesta_chunks_total", chunks)
+        metrics.incrementar("chatbot_ingesta_archivos_total", estado="completado")
+    except Exception as e:
+        logger.error(f"❌ [INGESTA] {archivo['filename']}: {e}", exc_info=True)
+        trabajo.marcar(indice, estado="error", error=str(e),
+                       segundos=round(time.perf_counter() - inicio, 3))
+        metrics.incrementar("chatbot_ingesta_archivos_total", estado="error")
+
+    if trabajo.archivo_terminado():
+        _cerrar_trabajo(servicio, trabajo)
+
+
+def _cerrar_trabajo(servicio, trabajo: TrabajoIngesta):
+    """Commit único del índice cuando termina el último archivo del trabajo."""
+    guardado = False
+    if any(a["estado"] == "completado" for a in trabajo.archivos):
+        guardado = servicio.guardar_indice()
+        if not guardado:
+            logger.warning("⚠️ Advertencia: No se pudo persistir el índice en disco.")
+            # Lo ingestado no quedó en disco (p. ej. el índice se reconstruyó mientras tanto)
+            for i, a in enumerate(trabajo.archivos):
+                if a["estado"] == "completado":
+                    trabajo.marcar(i, estado="error", chunks=0, error="El índice no se guardó; vuelve a subir el archivo.")
+    _actualizar_catalogo(trabajo, servicio.generacion if guardado else None)
+    trabajo.fin = time.perf_counter()
+    resumen = trabajo.resumen()
+    metrics.observar("chatbot_ingesta_trabajo_duracion_segundos", resumen["elapsed_s"])
+    logger.info(
+        f"📥 [INGESTA] Trabajo {trabajo.id[:8]}: {resumen['files_done']} archivos, "
+        f"{resumen['total_chunks_added']} chunks en {resumen['elapsed_s']}s "
+        f"({resumen['chunks_per_second']} chunks/s)"
+    )
+
+
+def _actualizar_catalogo(trabajo: TrabajoIngesta, generacion):
+    """Registra chunks/generación de lo indexado (si el índice se guardó) y los errores."""
+    try:
+        for a in trabajo.archivos:
+            if a["estado"] == "completado" and generacion is not None:
+                catalogo.registrar_ingesta(trabajo.categoria, a["filename"], a["sha256"], a["chunks"], generacion)
+            elif a["estado"] == "error":
+                catalogo.registrar_error(trabajo.categoria, a["filename"], a["error"])
+    except Exception as e:
+        # El índice ya quedó guardado; el catálogo se corrige con sincronizar_catalogo
+        logger.error(f"❌ [INGESTA] No se pudo actualizar el catálogo: {e}", exc_info=True)
+    finally:
+        connection.close()
+
+
+def _purgar_terminados():
+    terminados = sorted((t for t in _trabajos.values() if t.fin is not None), key=lambda t: t.creado)
+    for trabajo in terminados[:max(0, len(terminados) - MAX_TRABAJOS_TERMINADOS)]:
+        del _trabajos[trabajo.id]
+
+
+def encolar(servicio, categoria: str, archivos: list, errores: list = None, omitidos: list = None) -> TrabajoIngesta:
+    """
+    Registra un trabajo y encola cada archivo en el pool.
+    `archivos`: [{"filename", "ruta", "file_size_mb", "sha256"}] ya guardados en disco.
+    """
+    trabajo = TrabajoIngesta(categoria, archivos)
+    trabajo.errores = list(errores or [])
+    trabajo.omitidos = list(omitidos or [])
+    with _lock:
+        _purgar_terminados()
+        _trabajos[trabajo.id] = trabajo
+
+    if not trabajo.archivos:
+        trabajo.fin = time.perf_counter()
+        return trabajo
+
+    pool = _pool()
+    for indice in range(len(trabajo.archivos)):
+        pool.submit(_procesar_archivo, servicio, trabajo, indice)
+    return trabajo
+
+
+def obtener(job_id: str):
+    with _lock:
+        return _trabajos.get(job_id)
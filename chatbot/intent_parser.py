@@ -1,22 +1,25 @@
-import json
 import re
 import logging
 from django.conf import settings
 from langchain_ollama import ChatOllama
+from . import niveles_llm
+from .llm_json import ESQUEMA_INTENCION, ESQUEMA_INTENCION_COMBINADA
 
 logger = logging.getLogger(__name__)
 
 # --- CONFIGURACIÓN DEL LLM ---
-llm = ChatOllama(
-    model=settings.OLLAMA_MODEL,
-    format="json",
-    temperature=0, 
-    keep_alive="1h",
-    num_predict=settings.OLLAMA_NUM_PREDICT,
-    base_url=settings.OLLAMA_BASE_URL,
-    num_ctx=settings.OLLAMA_NUM_CTX,
-    num_thread=settings.OLLAMA_NUM_THREAD,
-)
+def crear_llm() -> ChatOllama:
+    """LLM del clasificador (nivel de intención, ver niveles_llm) según settings."""
+    return niveles_llm.crear("intencion")
+
+
+def crear_llm_escalado():
+    """LLM al que se escalan las clasificaciones dudosas, o None si no hay nivel mayor."""
+    return niveles_llm.crear_escalado("intencion")
+
+
+llm = crear_llm()
+llm_escalado = crear_llm_escalado()
 
 # --- PROMPT "ROUTER INDUSTRIAL" CON DETECCIÓN DE AMBIGÜEDAD (ESPAÑOL) ---
 SYSTEM_PROMPT = """ERES UN CLASIFICADOR DE INTENCIONES INTELIGENTE.
@@ -83,30 +86,79 @@ REGLAS ADICIONALES:
 3. Si el usuario pregunta "Cómo", "Dónde", "Requisitos", etc., SIEMPRE es "informational".
 """
 
-def procesar_mensaje_usuario(texto_usuario: str) -> dict:
+# --- MODO COMBINADO: intención + reformulación técnica en una sola llamada ---
+SYSTEM_PROMPT_COMBINADO = SYSTEM_PROMPT + """
+MODO COMBINADO (BÚSQUEDA):
+Además de los campos anteriores, agrega SIEMPRE el campo "search_query":
+- TRADUCE la consulta a TERMINOLOGÍA TÉCNICA del reglamento de UNEMI (Grado, Admisión y Procesos Académicos).
+- Ejemplos: "falta" -> "justificación inasistencia" O "sanción disciplinaria"; "borrar materia" -> "retiro de asignatura"; "matricularme" -> "proceso de matrícula".
+- Mantén el sentido original pero usa términos técnicos precisos.
+- Si la consulta es ambigua u operativa, "search_query" puede ser null.
+
+Ejemplo: Input: "¿Cómo borro una materia?"
+Output: {
+  "intent_code": "otro", "accion": "borrar", "objeto": "materia",
+  "is_ambiguous": false, "clarification_prompt": null,
+  "answer_type": "informational", "multi_intent": false, "intents": [],
+  "search_query": "retiro de asignatura"
+}
+"""
+
+
+def construir_mensajes(texto_usuario: str, incluir_busqueda: bool = False) -> list:
+    """
+    Separa el prompt en un mensaje de sistema estático y un mensaje de usuario variable.
+    El prefijo idéntico en cada llamada permite a Ollama reutilizar su caché KV
+    en lugar de volver a procesar todas las instrucciones.
+    """
+    return [
+        ("system", SYSTEM_PROMPT_COMBINADO if incluir_busqueda else SYSTEM_PROMPT),
+        ("human", f"Input: \"{texto_usuario}\"\nOutput:"),
+    ]
+
+
+def procesar_mensaje_usuario(texto_usuario: str, incluir_busqueda: bool = None) -> dict:
+    """
+    Clasifica la intención del usuario.
+    Con incluir_busqueda=True (o RAG_INTENCION_COMBINADA) la misma llamada devuelve
+    también "search_query", y el RAG se salta su propia reformulación.
+    """
+    if incluir_busqueda is None:
+        incluir_busqueda = settings.RAG_INTENCION_COMBINADA
+
     # 1. Filtro de saludo rápido
     if _es_saludo_simple(texto_usuario):
         return _respuesta_rapida("saludo", texto_usuario)
 
     try:
-        prompt = f"{SYSTEM_PROMPT}\nInput: \"{texto_usuario}\"\nOutput:"
-        response = llm.invoke(prompt)
-        raw_content = response.content.strip()
-
-        match = re.search(r"\{[\s\S]*\}", raw_content)
-        if not match:
+        esquema = ESQUEMA_INTENCION_COMBINADA if incluir_busqueda else ESQUEMA_INTENCION
+        resultado = niveles_llm.invocar_escalando(
+            llm, llm_escalado, construir_mensajes(texto_usuario, incluir_busqueda), esquema,
+            etapa="intencion", validar=_motivo_baja_confianza,
+        )
+        if resultado.datos is None:
             return _respuesta_rapida("error_formato", texto_usuario)
-            
-        json_str = match.group(0)
-        data = json.loads(json_str)
 
-        return _normalizar_salida(data, texto_usuario)
+        return _normalizar_salida(resultado.datos, texto_usuario)
 
     except Exception as e:
         logger.error(f"Error critico: {str(e)}")
         return _respuesta_rapida("error_sistema", texto_usuario)
 
 
+def _motivo_baja_confianza(data: dict):
+    """Motivo para escalar una clasificación del modelo pequeño, o None si es utilizable."""
+    if data.get("is_ambiguous"):
+        return None  # pedir aclaración es una salida válida
+    if data.get("answer_type") not in ("informational", "operational"):
+        return "answer_type_invalido"
+    if not (data.get("accion") or "").strip() and not (data.get("objeto") or "").strip():
+        return "sin_accion_objeto"
+    if "search_query" in data and data["answer_type"] == "informational" and not (data["search_query"] or "").strip():
+        return "sin_search_query"
+    return None
+
+
 def _normalizar_salida(data: dict, original_text: str) -> dict:
     base = {
         "intent_code": "otro",
@@ -116,7 +168,8 @@ def _normalizar_salida(data: dict, original_text: str) -> dict:
         "answer_type": "informational", 
         "agent_handoff": False,
         "system_response": "",
-        "multi_intent": False, "intents": [], "original_text": original_text
+        "multi_intent": False, "intents": [], "original_text": original_text,
+        "search_query": None
     }
 
     # Copiar datos del LLM
@@ -0,0 +1,267 @@
+"""
+Salida JSON estructurada del LLM.
+
+- Esquemas JSON de cada respuesta, enviados a Ollama como `format` (decodificación restringida).
+- num_predict ajustado a cada esquema en lugar del 512 global.
+- Parser incremental: corta el stream en cuanto el objeto raíz se cierra, sin esperar
+  a que el modelo siga generando espacios o texto extra.
+"""
+import json
+import logging
+import math
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- ESQUEMAS ---
+_TEXTO_CORTO = {"type": "string", "maxLength": 40}
+
+ESQUEMA_INTENCION = {
+    "type": "object",
+    "properties": {
+        "intent_code": _TEXTO_CORTO,
+        "accion": _TEXTO_CORTO,
+        "objeto": {"type": "string", "maxLength": 80},
+        "is_ambiguous": {"type": "boolean"},
+        "clarification_prompt": {"type": ["string", "null"], "maxLength": 300},
+        "answer_type": {"type": "string", "enum": ["informational", "operational"]},
+        "multi_intent": {"type": "boolean"},
+        "intents": {"type": "array", "items": _TEXTO_CORTO, "maxItems": 3},
+    },
+    "required": [
+        "intent_code", "accion", "objeto", "is_ambiguous", "clarification_prompt",
+        "answer_type", "multi_intent", "intents",
+    ],
+}
+
+ESQUEMA_INTENCION_COMBINADA = {
+    **ESQUEMA_INTENCION,
+    "properties": {
+        **ESQUEMA_INTENCION["properties"],
+        "search_query": {"type": ["string", "null"], "maxLength": 200},
+    },
+    "required": ESQUEMA_INTENCION["required"] + ["search_query"],
+}
+
+ESQUEMA_REFORMULACION = {
+    "type": "object",
+    "properties": {"search_query": {"type": "string", "maxLength": 200}},
+    "required": ["search_query"],
+}
+
+ESQUEMA_RAG = {
+    "type": "object",
+    "properties": {
+        "has_information": {"type": "boolean"},
+        "need_contact": {"type": "boolean"},
+        "response": {"type": "string", "maxLength": 1500},
+        "sources": {"type": "array", "items": {"type": "string", "maxLength": 120}, "maxItems": 5},
+    },
+    "required": ["has_information", "need_contact", "response", "sources"],
+}
+
+# Caracteres por token aproximados para español (conservador)
+_CHARS_POR_TOKEN = 3
+# Tokens de estructura por propiedad: comillas, dos puntos, coma, salto de línea/indentación
+_TOKENS_POR_PROPIEDAD = 4
+
+
+def _tokens_esquema(esquema: dict) -> int:
+    tipo = esquema.get("type")
+    if isinstance(tipo, list):
+        return max(_tokens_esquema({**esquema, "type": t}) for t in tipo)
+    if "enum" in esquema:
+        return max(len(str(e)) for e in esquema["enum"]) // _CHARS_POR_TOKEN + 2
+    if tipo == "object":
+        return 2 + sum(
+            len(nombre) // _CHARS_POR_TOKEN + _TOKENS_POR_PROPIEDAD + _tokens_esquema(sub)
+            for nombre, sub in esquema.get("properties", {}).items()
+        )
+    if tipo == "array":
+        return 2 + esquema.get("maxItems", 5) * (_tokens_esquema(esquema.get("items", {})) + 1)
+    if tipo == "string":
+        return esquema.get("maxLength", 200) // _CHARS_POR_TOKEN + 2
+    if tipo in ("integer", "number"):
+        return 4
+    return 2  # boolean / null
+
+
+def num_predict_para_esquema(esquema: dict) -> int:
+    """Cota de tokens para generar un objeto válido del esquema (con 20% de margen)."""
+    return math.ceil(_tokens_esquema(esquema) * 1.2) + 16
+
+
+class JsonIncremental:
+    """
+    Detecta el cierre del objeto JSON raíz a medida que llegan fragmentos del stream.
+    Lleva la profundidad de llaves ignorando las que aparecen dentro de strings.
+    """
+
+    def __init__(self):
+        self._partes = []
+        self._inicio = None
+        self._fin = None
+        self._profundidad = 0
+        self._en_string = False
+        self._escape = False
+        self._largo = 0
+
+    @property
+    def completo(self) -> bool:
+        return self._fin is not None
+
+    def alimentar(self, fragmento: str) -> bool:
+        """Agrega texto; devuelve True cuando el objeto raíz ya se cerró."""
+        if self.completo:
+            return True
+        base = self._largo
+        self._partes.append(fragmento)
+        self._largo += len(fragmento)
+
+        for i, c in enumerate(fragmento):
+            if self._inicio is None:
+                if c == "{":
+                    self._inicio = base + i
+                    self._profundidad = 1
+                continue
+            if self._en_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._en_string = False
+            elif c == '"':
+                self._en_string = True
+            elif c == "{":
+                self._profundidad += 1
+            elif c == "}":
+                self._profundidad -= 1
+                if self._profundidad == 0:
+                    self._fin = base + i + 1
+                    return True
+        return False
+
+    def texto(self) -> str:
+        """Todo el texto recibido."""
+        return "".join(self._partes)
+
+    def objeto(self) -> str:
+        """Substring del objeto raíz (o desde la primera llave si no llegó a cerrarse)."""
+        texto = self.texto()
+        if self._inicio is None:
+            return texto
+        return texto[self._inicio:self._fin] if self._fin else texto[self._inicio:]
+
+
+def extraer_json(texto: str):
+    """Decodifica el primer objeto JSON del texto, o None si no hay uno válido."""
+    if not texto:
+        return None
+    inicio = texto.find("{")
+    if inicio < 0:
+        return None
+    try:
+        datos, _ = json.JSONDecoder().raw_decode(texto, inicio)
+        return datos if isinstance(datos, dict) else None
+    except json.JSONDecodeError:
+        return None
+
+
+class ResultadoJson:
+    """Resultado de una llamada estructurada al LLM."""
+
+    __slots__ = ("datos", "texto", "tokens_generados", "cortado", "metadata")
+
+    def __init__(self, datos, texto, tokens_generados, cortado, metadata):
+        self.datos = datos
+        self.texto = texto
+        self.tokens_generados = tokens_generados
+        self.cortado = cortado
+        self.metadata = metadata
+
+
+# Con la gramática del esquema el siguiente fragmento tras '}' suele ser el final (done),
+# que trae los conteos de tokens de Ollama; se espera como máximo este número de fragmentos.
+_FRAGMENTOS_TRAS_CIERRE = 2
+
+_llms_por_esquema = {}
+
+
+def _llm_para_esquema(llm, esquema: dict):
+    """Copia del LLM con el esquema como `format` y num_predict ajustado (cacheada)."""
+    clave = (id(llm), json.dumps(esquema, sort_keys=True))
+    entrada = _llms_por_esquema.get(clave)
+    if entrada is None:
+        copia = llm.model_copy(update={
+            "format": esquema,
+            "num_predict": num_predict_para_esquema(esquema),
+        })
+        # Se guarda también el original: mantenerlo vivo evita que otro LLM reutilice su id()
+        entrada = _llms_por_esquema[clave] = (llm, copia)
+    return entrada[1]
+
+
+def invocar_json(llm, mensajes, esquema: dict, etapa: str) -> ResultadoJson:
+    """
+    Llama al LLM con salida restringida al esquema y corta el stream al cerrar el objeto.
+    Registra llamadas, fallos de parseo, cortes tempranos y tokens (prompt y generados) por etapa.
+    """
+    parser = JsonIncremental()
+    fragmentos = 0
+    metadata = {}
+    cortado = False
+    restantes = None  # fragmentos que se aceptan tras el cierre del objeto
+
+    stream = _llm_para_esquema(llm, esquema).stream(mensajes)
+    try:
+        for chunk in stream:
+            fragmentos += 1
+            if chunk.response_metadata:
+                metadata.update(chunk.response_metadata)
+            if restantes is None:
+                if parser.alimentar(chunk.content):
+                    restantes = _FRAGMENTOS_TRAS_CIERRE
+            else:
+                restantes -= 1
+            if metadata.get("done"):
+                break
+            if restantes is not None and restantes <= 0:
+                cortado = True
+                break
+    finally:
+        # Cerrar el generador corta la conexión: Ollama deja de generar
+        stream.close()
+
+    texto = parser.texto()
+    tokens = metadata.get("eval_count") or fragmentos
+
+    with metrics.medir("json_parse"):
+        datos = None
+        try:
+            datos = json.loads(parser.objeto())
+        except json.JSONDecodeError:
+            datos = extraer_json(texto)
+        if not isinstance(datos, dict):
+            datos = None
+
+    metrics.incrementar("chatbot_llm_llamadas_total", etapa=etapa)
+    metrics.incrementar("chatbot_llm_tokens_generados_total", tokens, etapa=etapa)
+    if metadata.get("prompt_eval_count"):
+        metrics.incrementar("chatbot_llm_tokens_prompt_total", metadata["prompt_eval_count"], etapa=etapa)
+    metrics.anotar(
+        etapa,
+        prompt_tokens=metadata.get("prompt_eval_count"),
+        eval_tokens=tokens,
+        prompt_eval_ms=round(metadata.get("prompt_eval_duration", 0) / 1e6, 1),
+        eval_ms=round(metadata.get("eval_duration", 0) / 1e6, 1),
+        cortado=cortado,
+    )
+    if cortado:
+        metrics.incrementar("chatbot_llm_cortes_tempranos_total", etapa=etapa)
+    if datos is None:
+        metrics.incrementar("chatbot_llm_json_fallos_total", etapa=etapa)
+        logger.warning(f"⚠️ JSON inválido del LLM en etapa '{etapa}': {texto[:200]!r}")
+
+    return ResultadoJson(datos, texto, tokens, cortado, metadata)
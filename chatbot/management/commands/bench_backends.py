@@ -0,0 +1,101 @@
+"""
+Benchmark de balanceo entre varias instancias de Ollama (ollama_cliente).
+
+Levanta N+1 Ollama falsos que atienden de a una request (como un Ollama en CPU):
+N para los LLM (intención y generación) y uno dedicado a embeddings. Tras ingestar un
+corpus sintético, ejecuta ChatView con usuarios concurrentes en tres escenarios:
+
+  - uno:         todos los roles contra un único backend (configuración anterior);
+  - balanceado:  LLM repartidos entre los N backends + host de embeddings dedicado;
+  - caida:       igual, pero con un backend LLM detenido (reintento en otro + eyección).
+
+Uso:
+    python manage.py bench_backends --backends 3 --usuarios 6 --consultas 36
+"""
+import logging
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from chatbot import ollama_cliente
+from chatbot.bench.corpus import generar_corpus
+from chatbot.bench.entorno import entorno_benchmark
+from chatbot.bench.estadisticas import resumen_latencias
+from chatbot.bench.stub_ollama import StubOllama
+from chatbot.management.commands.bench_e2e import _chat, _ingestar
+
+
+class Command(BaseCommand):
+    help = "Compara un backend de Ollama contra varios balanceados (y con uno caído) usando Ollama falsos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backends", type=int, default=3, help="Instancias de Ollama para los LLM.")
+        parser.add_argument("--usuarios", type=int, default=6, help="Usuarios concurrentes.")
+        parser.add_argument("--consultas", type=int, default=36, help="Consultas por escenario.")
+        parser.add_argument("--latencia-token", type=float, default=1.0, help="ms por token generado.")
+        parser.add_argument("--latencia-prefill", type=float, default=5.0, help="ms por cada 100 tokens de prefill.")
+        parser.add_argument("--latencia-embedding", type=float, default=2.0, help="ms por texto embebido.")
+
+    def handle(self, *args, **options):
+        if options["verbosity"] < 2:
+            logging.getLogger("chatbot").setLevel(logging.ERROR)
+        latencias = {
+            "latencia_token_ms": options["latencia_token"],
+            "latencia_prefill_ms_por_100_tokens": options["latencia_prefill"],
+            "latencia_embedding_ms": options["latencia_embedding"],
+            "max_paralelo": 1,
+        }
+        llm = [StubOllama(**latencias).iniciar() for _ in range(options["backends"])]
+        embeddings = StubOllama(**latencias).iniciar()
+        todos = llm + [embeddings]
+        urls_llm = [s.url for s in llm]
+        escenarios = [
+            ("uno", {}),
+            ("balanceado", {"OLLAMA_BACKENDS_INTENCION": urls_llm, "OLLAMA_BACKENDS_GENERACION": urls_llm,
+                            "OLLAMA_BACKENDS_EMBEDDINGS": [embeddings.url]}),
+            ("caida", {"OLLAMA_BACKENDS_INTENCION": urls_llm, "OLLAMA_BACKENDS_GENERACION": urls_llm,
+                       "OLLAMA_BACKENDS_EMBEDDINGS": [embeddings.url], "OLLAMA_REINTENTO_BACKOFF_S": 0.01}),
+        ]
+
+        try:
+            with tempfile.TemporaryDirectory(prefix="bench_backends_") as tmp:
+                corpus = generar_corpus(Path(tmp) / "corpus", archivos_por_tema=1, articulos=20)
+                # Todo contra llm[0] salvo que el escenario configure backends
+                with entorno_benchmark(llm[0].url, tmp):
+                    chunks, _ = _ingestar(corpus["archivos"])
+                    self.stdout.write(f"Ingesta: {chunks} chunks")
+                    preguntas = corpus["preguntas"]
+                    lote = [preguntas[i % len(preguntas)] for i in range(options["consultas"])]
+                    for nombre, config in escenarios:
+                        if nombre == "caida":
+                            llm[-1].detener()
+                        self._escenario(nombre, config, lote, options["usuarios"], todos)
+        finally:
+            for stub in todos:
+                stub.detener()
+
+    def _escenario(self, nombre, config, lote, usuarios, stubs):
+        antes = [dict(s.estadisticas) for s in stubs]
+        with override_settings(**config):
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=usuarios) as pool:
+                resultados = list(pool.map(_chat, lote))
+            pared = time.perf_counter() - inicio
+        resumen = resumen_latencias([ms for ms, _ in resultados])
+        fallidas = sum(1 for _, tipo in resultados if tipo == "error")
+        self.stdout.write(
+            f"{nombre:>11}: p50={resumen['p50_ms']}ms p95={resumen['p95_ms']}ms "
+            f"throughput={len(lote) / pared:.2f} req/s errores={fallidas}"
+        )
+        for stub, previas in zip(stubs, antes):
+            chat = stub.estadisticas["chat"] - previas["chat"]
+            embed = stub.estadisticas["embed"] - previas["embed"]
+            if chat or embed:
+                self.stdout.write(f"             {stub.url}: chat={chat} embed={embed}")
+        eyectados = [b.url for b in ollama_cliente._backends.values() if b.eyectado]
+        if eyectados:
+            self.stdout.write(f"             eyectados: {', '.join(eyectados)}")
@@ -0,0 +1,84 @@
+"""
+Benchmark de la deduplicación en la ingesta (chatbot/deduplicacion.py).
+
+Genera un corpus sintético en PDF con lo que se repite en `documentos_unemi` (encabezado y
+"Página N/M" en cada página, el mismo preámbulo legal en todos los archivos) y lo ingesta con
+RAG_DEDUP_ACTIVO apagado y encendido contra un Ollama falso. Reporta chunks embebidos, bytes
+del índice en disco y calidad de la recuperación con las preguntas del corpus. El recall cuenta
+todas las versiones de un reglamento; si dos versiones comparten artículos casi idénticos, solo
+la primera conserva esos chunks, así que hit rate y MRR son la referencia de calidad.
+
+Uso:
+    python manage.py bench_dedup --archivos-por-tema 4 --articulos 40
+"""
+import json
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from chatbot.bench.corpus import generar_corpus_pdf
+from chatbot.bench.entorno import bytes_en_disco, entorno_benchmark
+from chatbot.bench.stub_ollama import StubOllama
+from chatbot.management.commands.evaluar_recuperacion import evaluar
+
+
+class Command(BaseCommand):
+    help = "Compara la ingesta con y sin deduplicación: embeddings, bytes del índice y recall."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--archivos-por-tema", type=int, default=4)
+        parser.add_argument("--articulos", type=int, default=40)
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["verbosity"] < 2:
+            logging.getLogger("chatbot").setLevel(logging.WARNING)
+
+        resultados = []
+        with tempfile.TemporaryDirectory(prefix="bench_dedup_") as tmp, StubOllama() as stub:
+            corpus = generar_corpus_pdf(Path(tmp) / "corpus", options["archivos_por_tema"], options["articulos"])
+            for activo in (False, True):
+                directorio = Path(tmp) / ("con_dedup" if activo else "sin_dedup")
+                with entorno_benchmark(stub.url, directorio, RAG_DEDUP_ACTIVO=activo) as servicio:
+                    inicio = time.perf_counter()
+                    chunks = sum(
+                        servicio.ingerir(a["ruta"], categoria=a["categoria"]) for a in corpus["archivos"]
+                    )
+                    segundos = time.perf_counter() - inicio
+                    servicio.guardar_indice()
+                    calidad = evaluar(servicio, corpus["preguntas"], servicio.config_recuperacion())
+                    resultados.append({
+                        "dedup": activo,
+                        "archivos": len(corpus["archivos"]),
+                        "embeddings": chunks,
+                        "indice_bytes": bytes_en_disco(servicio.index_path),
+                        "ingesta_s": round(segundos, 2),
+                        "recall": calidad["recall"],
+                        "hit_rate": calidad["hit_rate"],
+                        "mrr": calidad["mrr"],
+                        "prompt_tokens_prom": calidad["prompt_tokens_prom"],
+                    })
+
+        sin, con = resultados
+        ahorro = {
+            "embeddings": sin["embeddings"] - con["embeddings"],
+            "indice_bytes": sin["indice_bytes"] - con["indice_bytes"],
+        }
+        if options["json"]:
+            self.stdout.write(json.dumps({"resultados": resultados, "ahorro": ahorro}, indent=2))
+            return
+        self.stdout.write(f"{sin['archivos']} archivos PDF\n")
+        self.stdout.write(f"{'dedup':>6} {'embeddings':>10} {'índice KB':>10} {'ingesta s':>9} {'recall':>6} {'hit':>5} {'mrr':>5} {'tokens':>7}")
+        for r in resultados:
+            self.stdout.write(
+                f"{'sí' if r['dedup'] else 'no':>6} {r['embeddings']:>10} {r['indice_bytes'] / 1024:>10.1f} "
+                f"{r['ingesta_s']:>9} {r['recall']:>6} {r['hit_rate']:>5} {r['mrr']:>5} {r['prompt_tokens_prom']:>7}"
+            )
+        self.stdout.write(
+            f"\nAhorro: {ahorro['embeddings']} embeddings "
+            f"({ahorro['embeddings'] / max(sin['embeddings'], 1):.0%}), "
+            f"{ahorro['indice_bytes'] / 1024:.1f} KB de índice"
+        )
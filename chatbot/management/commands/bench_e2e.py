@@ -0,0 +1,197 @@
+"""
+Benchmark end-to-end reproducible con un Ollama falso (sin modelos ni GPU).
+
+1. Genera un corpus sintético `documentos_unemi` en un directorio temporal.
+2. Lo ingesta a través de DocumentUploadView (chunks/s, tamaño del índice, memoria).
+3. Ejecuta ChatView con N usuarios concurrentes (p50/p95, throughput).
+4. Escribe los resultados en JSON para comparar entre commits.
+
+Uso:
+    python manage.py bench_e2e --usuarios 1,4,8 --salida bench_output.json
+    python manage.py bench_e2e --comparar bench_output.json
+"""
+import json
+import logging
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from chatbot.bench.corpus import generar_corpus, sesion_para
+from chatbot.bench.entorno import bytes_en_disco, commit_actual, entorno_benchmark, rss_bytes
+from chatbot.bench.estadisticas import resumen_latencias
+from chatbot.bench.stub_ollama import StubOllama
+
+URL_CHAT = "/api/chatbot/chat/"
+URL_UPLOAD = "/api/chatbot/upload-documents/"
+
+# Métricas que se comparan entre ejecuciones: (sección, clave, True si "más alto es mejor")
+METRICAS_COMPARABLES = [
+    ("ingesta", "chunks_por_segundo", True),
+    ("ingesta", "indice_disco_bytes", False),
+    ("ingesta", "rss_delta_bytes", False),
+]
+
+
+def _cliente():
+    return Client(HTTP_HOST="localhost")
+
+
+def _ingestar(archivos):
+    """
+    Sube los archivos por categoría a DocumentUploadView y espera a que terminen los
+    trabajos de ingesta; devuelve (chunks, segundos).
+    """
+    por_categoria = {}
+    for archivo in archivos:
+        por_categoria.setdefault(archivo["categoria"], []).append(archivo["ruta"])
+
+    cliente = _cliente()
+    trabajos = []
+    inicio = time.perf_counter()
+    for categoria, rutas in por_categoria.items():
+        manejadores = [open(r, "rb") for r in rutas]
+        try:
+            respuesta = cliente.post(URL_UPLOAD, {"categoria": categoria, "files": manejadores})
+        finally:
+            for m in manejadores:
+                m.close()
+        trabajos.append(respuesta.json()["job_id"])
+
+    chunks = 0
+    for job_id in trabajos:
+        while True:
+            estado = cliente.get(f"{URL_UPLOAD}jobs/{job_id}/").json()
+            if estado["status"] in ("completado", "error"):
+                break
+            time.sleep(0.01)
+        chunks += estado["total_chunks_added"]
+    return chunks, time.perf_counter() - inicio
+
+
+def _chat(pregunta):
+    """Envía una pregunta y consume el stream completo; devuelve (ms, tipo_final)."""
+    cuerpo = {"message": pregunta["pregunta"], "session_data": sesion_para(pregunta["categorias"])}
+    inicio = time.perf_counter()
+    respuesta = _cliente().post(URL_CHAT, cuerpo, content_type="application/json")
+    lineas = b"".join(respuesta.streaming_content).decode().strip().splitlines()
+    ms = (time.perf_counter() - inicio) * 1000
+    final = json.loads(lineas[-1]) if lineas else {}
+    return ms, final.get("data", {}).get("type", final.get("type"))
+
+
+class Command(BaseCommand):
+    help = "Benchmark end-to-end de ingesta y chat contra un Ollama falso; emite resultados JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--usuarios", default="1,4,8", help="Niveles de concurrencia separados por coma.")
+        parser.add_argument("--consultas", type=int, default=32, help="Consultas por nivel de concurrencia.")
+        parser.add_argument("--archivos-por-tema", type=int, default=2)
+        parser.add_argument("--articulos", type=int, default=30, help="Artículos por documento sintético.")
+        parser.add_argument("--latencia-token", type=float, default=2.0, help="ms por token generado.")
+        parser.add_argument("--latencia-prefill", type=float, default=5.0, help="ms por cada 100 tokens de prefill.")
+        parser.add_argument("--latencia-embedding", type=float, default=0.5, help="ms por texto embebido.")
+        parser.add_argument("--etiqueta", default="", help="Nombre libre para identificar la ejecución.")
+        parser.add_argument("--salida", help="Archivo JSON donde escribir los resultados.")
+        parser.add_argument("--comparar", help="JSON de una ejecución previa para mostrar la diferencia.")
+
+    def handle(self, *args, **options):
+        if options["verbosity"] < 2:
+            # El log por request de ChatView taparía los resultados
+            logging.getLogger("chatbot").setLevel(logging.WARNING)
+        niveles = [int(n) for n in options["usuarios"].split(",") if n.strip()]
+        stub = StubOllama(
+            latencia_token_ms=options["latencia_token"],
+            latencia_prefill_ms_por_100_tokens=options["latencia_prefill"],
+            latencia_embedding_ms=options["latencia_embedding"],
+        )
+
+        with tempfile.TemporaryDirectory(prefix="bench_e2e_") as tmp, stub:
+            corpus = generar_corpus(
+                Path(tmp) / "corpus",
+                archivos_por_tema=options["archivos_por_tema"],
+                articulos=options["articulos"],
+            )
+            with entorno_benchmark(stub.url, tmp) as servicio:
+                rss_inicial = rss_bytes()
+                chunks, segundos = _ingestar(corpus["archivos"])
+                ingesta = {
+                    "archivos": len(corpus["archivos"]),
+                    "chunks": chunks,
+                    "segundos": round(segundos, 3),
+                    "chunks_por_segundo": round(chunks / segundos, 1) if segundos else 0.0,
+                    "indice_disco_bytes": bytes_en_disco(servicio.index_path),
+                    "rss_delta_bytes": rss_bytes() - rss_inicial,
+                }
+                self.stdout.write(f"Ingesta: {ingesta}")
+
+                preguntas = corpus["preguntas"]
+                _chat(preguntas[0])  # calentamiento
+                chat = {}
+                for n in niveles:
+                    lote = [preguntas[i % len(preguntas)] for i in range(options["consultas"])]
+                    inicio = time.perf_counter()
+                    with ThreadPoolExecutor(max_workers=n) as pool:
+                        resultados = list(pool.map(_chat, lote))
+                    pared = time.perf_counter() - inicio
+                    resumen = resumen_latencias([ms for ms, _ in resultados])
+                    resumen["throughput_rps"] = round(len(lote) / pared, 2)
+                    resumen["tipos"] = {}
+                    for _, tipo in resultados:
+                        resumen["tipos"][tipo] = resumen["tipos"].get(tipo, 0) + 1
+                    chat[str(n)] = resumen
+                    self.stdout.write(
+                        f"Chat x{n}: p50={resumen['p50_ms']}ms p95={resumen['p95_ms']}ms "
+                        f"throughput={resumen['throughput_rps']} req/s"
+                    )
+
+        resultados = {
+            "version": 1,
+            "etiqueta": options["etiqueta"],
+            "commit": commit_actual(),
+            "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "config": {k: options[k] for k in (
+                "consultas", "archivos_por_tema", "articulos",
+                "latencia_token", "latencia_prefill", "latencia_embedding",
+            )},
+            "ingesta": ingesta,
+            "chat": chat,
+            "stub": stub.estadisticas,
+        }
+
+        if options["salida"]:
+            Path(options["salida"]).write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding="utf-8")
+            self.stdout.write(f"Resultados en {options['salida']}")
+        else:
+            self.stdout.write(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+        if options["comparar"]:
+            self._comparar(json.loads(Path(options["comparar"]).read_text(encoding="utf-8")), resultados)
+
+    def _comparar(self, previo, actual):
+        self.stdout.write(f"\nComparación {previo.get('commit')} → {actual['commit']}")
+        filas = list(METRICAS_COMPARABLES)
+        for nivel in actual["chat"]:
+            filas += [(f"chat.{nivel}", "p50_ms", False), (f"chat.{nivel}", "p95_ms", False),
+                      (f"chat.{nivel}", "throughput_rps", True)]
+        for seccion, clave, mayor_mejor in filas:
+            antes = _valor(previo, seccion, clave)
+            despues = _valor(actual, seccion, clave)
+            if antes is None or despues is None:
+                continue
+            cambio = (despues - antes) / antes * 100 if antes else 0.0
+            mejora = (cambio > 0) == mayor_mejor
+            marca = "✅" if mejora or cambio == 0 else "⚠️"
+            self.stdout.write(f"  {marca} {seccion}.{clave}: {antes} → {despues} ({cambio:+.1f}%)")
+
+
+def _valor(resultados, seccion, clave):
+    nodo = resultados
+    for parte in seccion.split("."):
+        nodo = nodo.get(parte, {}) if isinstance(nodo, dict) else {}
+    valor = nodo.get(clave) if isinstance(nodo, dict) else None
+    return valor if isinstance(valor, (int, float)) else None
@@ -0,0 +1,138 @@
+"""
+Micro-benchmark del post-procesamiento de la búsqueda en `recuperar`.
+
+Compara, sobre un índice FAISS sintético en memoria (sin Ollama):
+  - legacy: similarity_search_with_score_by_vector + bucle Python (score, categoría,
+    hash de page_content, Path(...).name y límite por fuente);
+  - numpy:  index.search + TablaCandidatos.filtrar + Documents solo para los chunks finales.
+
+Verifica además que ambos caminos devuelven los mismos chunks.
+
+Uso:
+    python manage.py bench_filtrado --k 30,300,3000
+"""
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from langchain_community.vectorstores import FAISS
+
+from chatbot.bench.entorno import EmbeddingsNulos
+from chatbot.bench.estadisticas import resumen_latencias
+from chatbot.candidatos import TablaCandidatos
+
+CATEGORIAS = ["general", "estudiantes", "docentes", "administrativos", "admision", "externos"]
+CONFIG = {"umbral": 0.0, "max_total": 5, "limite_reglamento": 3, "limite_fuente": 2}
+
+
+def _indice_sintetico(filas: int, dimension: int, fuentes: int, semilla: int):
+    rng = np.random.default_rng(semilla)
+    vectores = rng.standard_normal((filas, dimension)).astype(np.float32)
+    vectores /= np.linalg.norm(vectores, axis=1, keepdims=True)
+    textos, metadatas = [], []
+    for i in range(filas):
+        fuente = i % fuentes
+        prefijo = "REGLAMENTO" if fuente % 2 == 0 else "INSTRUCTIVO"
+        # ~5% de chunks repetidos (mismo texto en otra fila) para ejercitar el dedup
+        textos.append(f"chunk {i // 2 if i % 20 == 0 else i}")
+        metadatas.append({
+            "source": f"/docs/{CATEGORIAS[fuente % len(CATEGORIAS)]}/{prefijo}_{fuente}.pdf",
+            "categoria": CATEGORIAS[fuente % len(CATEGORIAS)],
+        })
+    store = FAISS.from_embeddings(list(zip(textos, vectores)), EmbeddingsNulos(), metadatas=metadatas)
+    tabla = TablaCandidatos()
+    tabla.agregar(textos, metadatas)
+    return store, tabla, rng
+
+
+def _legacy(store, vectores, k, categorias_permitidas, config):
+    resultados = [store.similarity_search_with_score_by_vector(v, k=k) for v in vectores]
+    candidatos_brutos = []
+    for raw_docs in resultados:
+        for doc, distance in raw_docs:
+            if doc.metadata.get("categoria") not in categorias_permitidas:
+                continue
+            candidatos_brutos.append((doc, 1 / (1 + distance)))
+    candidatos_brutos.sort(key=lambda x: x[1], reverse=True)
+
+    docs_finales, ids_vistos, fuentes_vistas = [], set(), {}
+    for doc, score in candidatos_brutos:
+        if score < config["umbral"]: continue
+        h = hash(doc.page_content)
+        if h in ids_vistos: continue
+        nombre = Path(doc.metadata.get("source", "desc")).name
+        conteo = fuentes_vistas.get(nombre, 0)
+        limite = config["limite_reglamento"] if "REGLAMENTO" in nombre.upper() else config["limite_fuente"]
+        if conteo >= limite and len(docs_finales) >= 2: continue
+        fuentes_vistas[nombre] = conteo + 1
+        ids_vistos.add(h)
+        docs_finales.append((doc, score))
+        if len(docs_finales) >= config["max_total"]: break
+    return [d.page_content for d, _ in docs_finales]
+
+
+def _numpy(store, tabla, vectores, k, categorias_permitidas, config):
+    posiciones, distancias = [], []
+    for v in vectores:
+        d, p = store.index.search(np.asarray([v], dtype=np.float32), k)
+        posiciones.append(p[0])
+        distancias.append(d[0])
+    filas, _, _ = tabla.filtrar(np.concatenate(posiciones), np.concatenate(distancias), categorias_permitidas, config)
+    return [store.docstore.search(store.index_to_docstore_id[int(f)]).page_content for f in filas]
+
+
+def _medir(funcion, consultas):
+    latencias = []
+    for args in consultas:
+        inicio = time.perf_counter()
+        funcion(*args)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return resumen_latencias(latencias)
+
+
+class Command(BaseCommand):
+    help = "Mide el costo por consulta del filtrado de candidatos (legacy vs NumPy) para varios k."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--k", default="30,300,3000", help="Valores de k separados por coma.")
+        parser.add_argument("--filas", type=int, default=20000, help="Chunks en el índice sintético.")
+        parser.add_argument("--dimension", type=int, default=64)
+        parser.add_argument("--fuentes", type=int, default=200, help="Documentos distintos.")
+        parser.add_argument("--consultas", type=int, default=50)
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, **options):
+        store, tabla, rng = _indice_sintetico(options["filas"], options["dimension"], options["fuentes"], 7)
+        permitidas = ["general", "estudiantes", "docentes"]
+        vectores = rng.standard_normal((options["consultas"], 2, options["dimension"])).astype(np.float32)
+
+        resultados = []
+        for k in [int(v) for v in options["k"].split(",") if v.strip()]:
+            consultas = [(list(par), k, permitidas, CONFIG) for par in vectores]
+            iguales = all(
+                _legacy(store, *c) == _numpy(store, tabla, *c) for c in consultas
+            )
+            legacy = _medir(lambda *a: _legacy(store, *a), consultas)
+            vectorizado = _medir(lambda *a: _numpy(store, tabla, *a), consultas)
+            resultados.append({
+                "k": k,
+                "legacy_p50_ms": legacy["p50_ms"],
+                "numpy_p50_ms": vectorizado["p50_ms"],
+                "legacy_p95_ms": legacy["p95_ms"],
+                "numpy_p95_ms": vectorizado["p95_ms"],
+                "aceleracion": round(legacy["p50_ms"] / vectorizado["p50_ms"], 1) if vectorizado["p50_ms"] else None,
+                "mismos_resultados": iguales,
+            })
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+        self.stdout.write(f"{options['filas']} chunks, {options['fuentes']} fuentes, 2 queries por consulta\n")
+        self.stdout.write(f"{'k':>6} {'legacy p50':>11} {'numpy p50':>10} {'x':>6} {'iguales':>8}")
+        for r in resultados:
+            self.stdout.write(
+                f"{r['k']:>6} {r['legacy_p50_ms']:>9}ms {r['numpy_p50_ms']:>8}ms "
+                f"{r['aceleracion']:>6} {str(r['mismos_resultados']):>8}"
+            )
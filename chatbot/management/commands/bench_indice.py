@@ -0,0 +1,120 @@
+"""
+Benchmark del formato del índice: docstore pickle (InMemoryDocstore, formato anterior)
+contra chunks.sqlite3 (AlmacenChunks).
+
+Ingesta el corpus sintético con un Ollama falso, escribe el mismo índice en ambos
+formatos y mide tamaño en disco, tiempo de carga y memoria residente tras cargar
+(cada carga en un proceso hijo para que la medición de RSS sea limpia).
+
+Uso:
+    python manage.py bench_indice --archivos-por-tema 10 --articulos 60
+"""
+import json
+import logging
+import multiprocessing
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from chatbot import almacen_chunks
+from chatbot.bench.corpus import generar_corpus
+from chatbot.bench.entorno import EmbeddingsNulos, bytes_en_disco, entorno_benchmark, rss_bytes
+from chatbot.bench.stub_ollama import StubOllama
+
+
+def _escribir_legacy(vector_store, directorio: Path):
+    """Mismo índice con el docstore pickleado e ids uuid, como lo guardaba FAISS.save_local."""
+    ids = [str(uuid.uuid4()) for _ in range(vector_store.index.ntotal)]
+    docs = {}
+    for fila, id_ in enumerate(ids):
+        doc = vector_store.docstore.search(str(fila))
+        doc.id = id_
+        docs[id_] = doc
+    FAISS(
+        embedding_function=EmbeddingsNulos(),
+        index=vector_store.index,
+        docstore=InMemoryDocstore(docs),
+        index_to_docstore_id=dict(enumerate(ids)),
+    ).save_local(str(directorio))
+
+
+def _cargar(formato: str, directorio: str):
+    if formato == "pickle":
+        return FAISS.load_local(directorio, EmbeddingsNulos(), allow_dangerous_deserialization=True)
+    return almacen_chunks.cargar(directorio, EmbeddingsNulos())
+
+
+def _medir_en_hijo(formato: str, directorio: str, repeticiones: int, cola):
+    rss_inicial = rss_bytes()
+    inicio = time.perf_counter()
+    store = _cargar(formato, directorio)
+    primera = time.perf_counter() - inicio
+    rss_delta = rss_bytes() - rss_inicial
+
+    tiempos = [primera]
+    for _ in range(repeticiones - 1):
+        inicio = time.perf_counter()
+        _cargar(formato, directorio)
+        tiempos.append(time.perf_counter() - inicio)
+    cola.put({"carga_ms": round(statistics.median(tiempos) * 1000, 2), "rss_delta_bytes": rss_delta,
+              "chunks": store.index.ntotal})
+
+
+def _medir(formato: str, directorio: Path, repeticiones: int) -> dict:
+    # spawn: un hijo por fork heredaría el heap liberado del padre y el RSS no crecería al cargar
+    contexto = multiprocessing.get_context("spawn")
+    cola = contexto.Queue()
+    proceso = contexto.Process(target=_medir_en_hijo, args=(formato, str(directorio), repeticiones, cola))
+    proceso.start()
+    resultado = cola.get(timeout=600)
+    proceso.join()
+    resultado["disco_bytes"] = bytes_en_disco(directorio)
+    return resultado
+
+
+class Command(BaseCommand):
+    help = "Compara tamaño, tiempo de carga y RSS del índice con docstore pickle vs SQLite."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--archivos-por-tema", type=int, default=10)
+        parser.add_argument("--articulos", type=int, default=60)
+        parser.add_argument("--repeticiones", type=int, default=5, help="Cargas por formato (se reporta la mediana).")
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["verbosity"] < 2:
+            logging.getLogger("chatbot").setLevel(logging.WARNING)
+
+        with tempfile.TemporaryDirectory(prefix="bench_indice_") as tmp, StubOllama() as stub:
+            corpus = generar_corpus(
+                Path(tmp) / "corpus", archivos_por_tema=options["archivos_por_tema"], articulos=options["articulos"]
+            )
+            with entorno_benchmark(stub.url, tmp) as servicio:
+                for archivo in corpus["archivos"]:
+                    servicio.ingerir(archivo["ruta"], categoria=archivo["categoria"])
+                servicio.guardar_indice()
+                directorio_sqlite = Path(servicio.index_path)
+                directorio_pickle = Path(tmp) / "faiss_index_pickle"
+                _escribir_legacy(servicio.vector_store, directorio_pickle)
+                servicio.vector_store.docstore.cerrar()
+
+            resultados = {
+                "pickle": _medir("pickle", directorio_pickle, options["repeticiones"]),
+                "sqlite": _medir("sqlite", directorio_sqlite, options["repeticiones"]),
+            }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+        self.stdout.write(f"{resultados['sqlite']['chunks']} chunks, {len(corpus['archivos'])} archivos\n")
+        self.stdout.write(f"{'formato':<8} {'disco':>12} {'carga':>10} {'rss delta':>12}")
+        for formato, r in resultados.items():
+            self.stdout.write(
+                f"{formato:<8} {r['disco_bytes']:>12,} {r['carga_ms']:>8}ms {r['rss_delta_bytes']:>12,}"
+            )
@@ -0,0 +1,89 @@
+"""
+Benchmark del tiempo pre-recuperación: intención + reformulación por separado vs modo combinado.
+
+Separado: procesar_mensaje_usuario (1 llamada) + _reformular_consulta (1 llamada).
+Combinado: procesar_mensaje_usuario(incluir_busqueda=True) devuelve ambos en una llamada.
+
+Uso:
+    python manage.py bench_intencion_combinada --iteraciones 2
+"""
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from chatbot.bench.estadisticas import resumen_latencias
+from chatbot.intent_parser import procesar_mensaje_usuario
+from chatbot.rag_service import rag_service
+
+PREGUNTAS = [
+    "¿Cuáles son los requisitos para la matrícula?",
+    "¿Cómo borro una materia?",
+    "¿Cuándo puedo justificar una falta a clases?",
+    "¿Qué becas hay para estudiantes de bajos recursos?",
+    "¿Cómo me inscribo en el proceso de admisión?",
+    "¿Dónde veo el calendario académico?",
+    "¿Qué pasa si repruebo una asignatura por tercera vez?",
+    "¿Cómo solicito el certificado de egresado?",
+]
+
+ROL = "Estudiante"
+
+
+def _pre_recuperacion_separada(pregunta):
+    intent = procesar_mensaje_usuario(pregunta, incluir_busqueda=False)
+    query = None
+    if intent.get("answer_type") == "informational" and not intent.get("is_ambiguous"):
+        query = rag_service._reformular_consulta(pregunta, ROL).get("search_query")
+    return intent, query
+
+
+def _pre_recuperacion_combinada(pregunta):
+    intent = procesar_mensaje_usuario(pregunta, incluir_busqueda=True)
+    return intent, intent.get("search_query")
+
+
+MODOS = {"separado": _pre_recuperacion_separada, "combinado": _pre_recuperacion_combinada}
+
+
+class Command(BaseCommand):
+    help = "Compara la latencia pre-recuperación del modo separado vs combinado (requiere Ollama local)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iteraciones", type=int, default=2, help="Pasadas sobre el set de preguntas por modo.")
+        parser.add_argument("--json", action="store_true", help="Imprime los resultados en JSON.")
+
+    def handle(self, *args, **options):
+        resultados = {}
+        salidas = {}
+        for modo, ejecutar in MODOS.items():
+            ejecutar(PREGUNTAS[0])  # calentamiento
+            latencias = []
+            for _ in range(options["iteraciones"]):
+                for pregunta in PREGUNTAS:
+                    inicio = time.perf_counter()
+                    intent, query = ejecutar(pregunta)
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+                    salidas.setdefault(modo, {})[pregunta] = (intent.get("answer_type"), query)
+            resultados[modo] = resumen_latencias(latencias)
+
+        # Concordancia de la clasificación entre ambos modos
+        coincidencias = sum(
+            1 for p in PREGUNTAS if salidas["separado"][p][0] == salidas["combinado"][p][0]
+        )
+        resultados["concordancia_answer_type"] = round(coincidencias / len(PREGUNTAS), 2)
+        resultados["consultas"] = {
+            p: {"separado": salidas["separado"][p][1], "combinado": salidas["combinado"][p][1]}
+            for p in PREGUNTAS
+        }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resultados, indent=2, ensure_ascii=False))
+            return
+
+        for modo in MODOS:
+            r = resultados[modo]
+            self.stdout.write(f"{modo:<10} prom={r['prom_ms']}ms p50={r['p50_ms']}ms p95={r['p95_ms']}ms (n={r['n']})")
+        self.stdout.write(f"Concordancia answer_type: {resultados['concordancia_answer_type']:.0%}")
+        for pregunta, queries in resultados["consultas"].items():
+            self.stdout.write(f"  {pregunta}\n    separado:  {queries['separado']}\n    combinado: {queries['combinado']}")
@@ -0,0 +1,147 @@
+"""
+Benchmark del k adaptativo de `recuperar` (RAG_BUSQUEDA_K_INICIAL, RAG_BUSQUEDA_MARGEN).
+
+Arma un índice con embeddings sintéticos jerárquicos (corpus.vectores_jerarquicos) repartidos
+en categorías y fuentes, y corre las mismas consultas por `LocalRAGService.recuperar` con k fijo
+(RAG_BUSQUEDA_K) y con k adaptativo. Cada consulta ve solo algunas categorías, así el filtrado
+deja pocos sobrevivientes en parte de las consultas y obliga a ampliar k.
+
+Reporta latencia de recuperar (embeddings precalculados: solo búsqueda y filtrado), k medio,
+consultas que ampliaron k, consultas con los mismos chunks que con k fijo, chunks enviados y
+hit (el documento del que salió la consulta está entre los chunks finales).
+
+Uso:
+    python manage.py bench_k_adaptativo --archivos 1000 --indice compacto --margen 0,0.1
+"""
+import itertools
+import json
+import logging
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from chatbot import almacen_chunks, indice_vectorial
+from chatbot.bench.corpus import normalizar, vectores_jerarquicos
+from chatbot.bench.entorno import entorno_benchmark
+from chatbot.bench.estadisticas import resumen_latencias
+from chatbot.bench.stub_ollama import StubOllama
+
+CATEGORIAS = ["general", "estudiantes", "docentes", "administrativos", "admision", "externos"]
+
+
+class _EmbeddingsPrecalculados:
+    def __init__(self, vectores: dict):
+        self._vectores = vectores
+
+    def embed_query(self, texto):
+        return self._vectores[texto]
+
+
+def _poblar(servicio, vectores: np.ndarray):
+    """Agrega los vectores al índice del servicio como si cada archivo se hubiera ingestado."""
+    servicio.vector_store = almacen_chunks.nuevo_indice(
+        servicio.index_path, servicio.embeddings, indice_vectorial.crear(servicio.index_path, vectores.shape[-1])
+    )
+    for n, bloque in enumerate(vectores):
+        prefijo = "REGLAMENTO" if n % 3 == 0 else "INSTRUCTIVO"
+        textos = [f"archivo {n} chunk {i}" for i in range(len(bloque))]
+        metadatas = [
+            {"source": f"/docs/{prefijo}_{n}.pdf", "categoria": CATEGORIAS[n % len(CATEGORIAS)], "chunk_id": i}
+            for i in range(len(bloque))
+        ]
+        inicio = servicio.vector_store.index.ntotal
+        servicio.vector_store.add_embeddings(
+            list(zip(textos, bloque)), metadatas=metadatas,
+            ids=almacen_chunks.ids_nuevos(servicio.vector_store, len(bloque)),
+        )
+        # SimHash irrelevante aquí (no se deduplica): valores distintos para no calcularlos
+        servicio.candidatos.agregar(textos, metadatas, list(range(inicio, inicio + len(bloque))))
+        servicio.resumenes.agregar(bloque, inicio, int(servicio.candidatos.categoria[inicio]))
+
+
+class Command(BaseCommand):
+    help = "Compara k fijo contra k adaptativo en recuperar: latencia, k medio y chunks finales."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--archivos", type=int, default=2000)
+        parser.add_argument("--chunks-por-archivo", type=int, default=30)
+        parser.add_argument("--dimension", type=int, default=384)
+        parser.add_argument("--indice", choices=["plano", "compacto"], default="plano", help="RAG_INDICE_MODO.")
+        parser.add_argument("--k-inicial", default="4,8", help="Valores de RAG_BUSQUEDA_K_INICIAL, separados por coma.")
+        parser.add_argument("--margen", default="0,0.15", help="Valores de RAG_BUSQUEDA_MARGEN, separados por coma.")
+        parser.add_argument("--consultas", type=int, default=300)
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["verbosity"] < 2:
+            logging.getLogger("chatbot").setLevel(logging.WARNING)
+        rng = np.random.default_rng(7)
+        vectores = vectores_jerarquicos(
+            options["archivos"], options["chunks_por_archivo"], 16, options["dimension"], 50, rng
+        )
+
+        # Consultas: parafraseo (chunk + ruido) de algo indexado, con 1 a 3 categorías visibles
+        planos = vectores.reshape(-1, options["dimension"])
+        origen = rng.integers(0, len(planos), options["consultas"])
+        ruido = normalizar(rng.standard_normal((options["consultas"], options["dimension"])))
+        consultas = []
+        for n, (fila, v) in enumerate(zip(origen, normalizar(planos[origen] + 0.8 * ruido))):
+            propia = CATEGORIAS[(fila // options["chunks_por_archivo"]) % len(CATEGORIAS)]
+            otras = rng.choice(CATEGORIAS, size=rng.integers(0, 3), replace=False).tolist()
+            consultas.append((f"consulta {n}", v, sorted({propia, *otras}), int(fila // options["chunks_por_archivo"])))
+
+        resultados = []
+        with tempfile.TemporaryDirectory(prefix="bench_k_") as tmp, StubOllama() as stub, \
+                entorno_benchmark(stub.url, tmp, RAG_INDICE_MODO=options["indice"]) as servicio:
+            _poblar(servicio, vectores)
+            servicio.embeddings = _EmbeddingsPrecalculados({texto: v for texto, v, _, _ in consultas})
+
+            configs = [("fijo", servicio.config_recuperacion(k_inicial=0))]
+            for k_inicial, margen in itertools.product(
+                [int(v) for v in options["k_inicial"].split(",") if v.strip()],
+                [float(v) for v in options["margen"].split(",") if v.strip()],
+            ):
+                configs.append((f"k0={k_inicial} margen={margen}",
+                                servicio.config_recuperacion(k_inicial=k_inicial, margen=margen)))
+
+            referencia = None
+            for nombre, config in configs:
+                for texto, _, categorias, _ in consultas[:20]:  # calentamiento
+                    servicio.recuperar(texto, texto, categorias, config)
+                latencias, ks, filas, aciertos = [], [], [], []
+                for texto, _, categorias, archivo in consultas:
+                    inicio = time.perf_counter()
+                    resultado = servicio.recuperar(texto, texto, categorias, config)
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+                    ks.append(resultado["k"])
+                    filas.append(sorted((doc.metadata["source"], doc.metadata["chunk_id"]) for doc, _ in resultado["docs"]))
+                    aciertos.append(any(doc.metadata["source"].endswith(f"_{archivo}.pdf") for doc, _ in resultado["docs"]))
+                referencia = referencia or filas
+                latencia = resumen_latencias(latencias)
+                resultados.append({
+                    "config": nombre,
+                    "p50_ms": latencia["p50_ms"],
+                    "p95_ms": latencia["p95_ms"],
+                    "k_medio": round(float(np.mean(ks)), 1),
+                    "ampliadas": round(float(np.mean([k > config["k_inicial"] for k in ks])), 3)
+                    if config["k_inicial"] else 0.0,
+                    "mismos_chunks": round(float(np.mean([a == b for a, b in zip(filas, referencia)])), 3),
+                    "chunks_medio": round(float(np.mean([len(f) for f in filas])), 2),
+                    "hit": round(float(np.mean(aciertos)), 3),
+                })
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+        self.stdout.write(
+            f"{len(planos)} chunks (índice {options['indice']}), {len(consultas)} consultas, k máximo={configs[0][1]['k']}, "
+            f"max_total={configs[0][1]['max_total']}\n"
+        )
+        self.stdout.write(f"{'configuración':<22} {'p50 ms':>7} {'p95 ms':>7} {'k medio':>8} {'ampliadas':>9} {'mismos':>7} {'chunks':>6} {'hit':>6}")
+        for r in resultados:
+            self.stdout.write(
+                f"{r['config']:<22} {r['p50_ms']:>7} {r['p95_ms']:>7} {r['k_medio']:>8} "
+                f"{r['ampliadas']:>9.0%} {r['mismos_chunks']:>7.0%} {r['chunks_medio']:>6} {r['hit']:>6.1%}"
+            )
@@ -0,0 +1,140 @@
+"""
+Benchmark de niveles de modelo (niveles_llm): latencia vs precisión de la clasificación.
+
+Para cada nivel ejecuta intención + reformulación sobre un set etiquetado y mide:
+latencia pre-recuperación (p50/p95), aciertos de answer_type/is_ambiguous, reformulaciones
+vacías y llamadas escaladas al modelo mayor.
+
+  - pequeno:           intención y reformulación con --modelo-pequeno, sin escalamiento;
+  - pequeno+escalado:  igual, escalando al --modelo-grande las salidas inválidas o dudosas;
+  - grande:            todo con --modelo-grande (configuración anterior).
+
+Requiere Ollama local con ambos modelos. Con --stub corre contra el Ollama falso (solo
+verifica el circuito: el stub responde igual para cualquier modelo).
+
+Uso:
+    python manage.py bench_niveles --modelo-pequeno qwen2.5:0.5b-instruct --modelo-grande qwen2.5:3b-instruct-q4_K_M
+"""
+import json
+import time
+from contextlib import ExitStack
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from chatbot import intent_parser, metrics, niveles_llm
+from chatbot.bench.estadisticas import resumen_latencias
+from chatbot.bench.stub_ollama import StubOllama
+from chatbot.rag_service import rag_service
+
+ROL = "Estudiante"
+
+# (pregunta, answer_type esperado, is_ambiguous esperado)
+PREGUNTAS = [
+    ("¿Cuáles son los requisitos para la matrícula?", "informational", False),
+    ("¿Cómo borro una materia?", "informational", False),
+    ("¿Cuándo puedo justificar una falta a clases?", "informational", False),
+    ("¿Qué becas hay para estudiantes de bajos recursos?", "informational", False),
+    ("¿Dónde veo el calendario académico?", "informational", False),
+    ("¿Qué pasa si repruebo una asignatura por tercera vez?", "informational", False),
+    ("Quiero solicitar mi certificado de matrícula", "operational", False),
+    ("Necesito tramitar el retiro de una asignatura", "operational", False),
+    ("Solicito el cambio de carrera", "operational", False),
+    ("Tengo una falta", None, True),
+    ("papeles", None, True),
+    ("dinero", None, True),
+]
+
+
+def _escalamientos() -> float:
+    return sum(v for (nombre, _), v in metrics.instantanea().items() if nombre == "chatbot_llm_escalamientos_total")
+
+
+def _pre_recuperacion(pregunta):
+    intent = intent_parser.procesar_mensaje_usuario(pregunta, incluir_busqueda=False)
+    query = None
+    if intent.get("answer_type") == "informational" and not intent.get("is_ambiguous"):
+        query = rag_service._reformular_consulta(pregunta, ROL).get("search_query")
+    return intent, query
+
+
+class Command(BaseCommand):
+    help = "Compara niveles de modelo para intención/reformulación: latencia vs precisión."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modelo-pequeno", default=None, help="Modelo del nivel pequeño (por defecto OLLAMA_MODELO_INTENCION).")
+        parser.add_argument("--modelo-grande", default=None, help="Modelo del nivel grande (por defecto OLLAMA_MODELO_GENERACION).")
+        parser.add_argument("--iteraciones", type=int, default=1, help="Pasadas sobre el set etiquetado por nivel.")
+        parser.add_argument("--stub", action="store_true", help="Usar el Ollama falso en lugar de Ollama local.")
+        parser.add_argument("--json", action="store_true", help="Imprime los resultados en JSON.")
+
+    def handle(self, *args, **options):
+        pequeno = options["modelo_pequeno"] or settings.OLLAMA_MODELO_INTENCION
+        grande = options["modelo_grande"] or settings.OLLAMA_MODELO_GENERACION
+        if pequeno == grande:
+            self.stderr.write("⚠️ Ambos niveles usan el mismo modelo: el escalamiento queda desactivado.")
+        niveles = {
+            "pequeno": {"modelo": pequeno, "escalamiento": False},
+            "pequeno+escalado": {"modelo": pequeno, "escalamiento": True},
+            "grande": {"modelo": grande, "escalamiento": False},
+        }
+
+        with ExitStack() as pila:
+            base = {"OLLAMA_MODELO_GENERACION": grande}
+            if options["stub"]:
+                stub = pila.enter_context(StubOllama(modelos=[pequeno, grande]))
+                base.update(OLLAMA_BASE_URL=stub.url, OLLAMA_BACKENDS_INTENCION=[], OLLAMA_BACKENDS_GENERACION=[])
+            resultados = {nombre: self._nivel(base, config, options["iteraciones"]) for nombre, config in niveles.items()}
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resultados, indent=2, ensure_ascii=False))
+            return
+        for nombre, r in resultados.items():
+            self.stdout.write(
+                f"{nombre:<17} p50={r['p50_ms']}ms p95={r['p95_ms']}ms answer_type={r['acierto_answer_type']:.0%} "
+                f"ambiguedad={r['acierto_ambiguedad']:.0%} reformulaciones_vacias={r['reformulaciones_vacias']} "
+                f"escaladas={r['escaladas']}"
+            )
+
+    def _nivel(self, base: dict, config: dict, iteraciones: int) -> dict:
+        ajustes = {
+            **base,
+            "OLLAMA_MODELO_INTENCION": config["modelo"],
+            "OLLAMA_MODELO_REFORMULACION": config["modelo"],
+            "OLLAMA_ESCALAMIENTO": config["escalamiento"],
+        }
+        with override_settings(**ajustes), ExitStack() as pila:
+            pila.enter_context(mock.patch.object(intent_parser, "llm", intent_parser.crear_llm()))
+            pila.enter_context(mock.patch.object(intent_parser, "llm_escalado", intent_parser.crear_llm_escalado()))
+            pila.enter_context(mock.patch.object(rag_service, "llm_reformulacion", niveles_llm.crear("reformulacion")))
+            pila.enter_context(mock.patch.object(
+                rag_service, "llm_reformulacion_escalado", niveles_llm.crear_escalado("reformulacion")
+            ))
+
+            _pre_recuperacion(PREGUNTAS[0][0])  # calentamiento (carga del modelo)
+            escalamientos_inicio = _escalamientos()
+            latencias, aciertos_tipo, aciertos_ambiguedad, vacias = [], 0, 0, 0
+            total_tipo = 0
+            for _ in range(iteraciones):
+                for pregunta, tipo, ambigua in PREGUNTAS:
+                    inicio = time.perf_counter()
+                    intent, query = _pre_recuperacion(pregunta)
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+                    aciertos_ambiguedad += bool(intent.get("is_ambiguous")) == ambigua
+                    if tipo is not None:
+                        total_tipo += 1
+                        aciertos_tipo += intent.get("answer_type") == tipo
+                    if tipo == "informational" and not (query or "").strip():
+                        vacias += 1
+
+        resultado = resumen_latencias(latencias)
+        resultado.update({
+            "modelo": config["modelo"],
+            "acierto_answer_type": round(aciertos_tipo / total_tipo, 2) if total_tipo else 0.0,
+            "acierto_ambiguedad": round(aciertos_ambiguedad / len(latencias), 2) if latencias else 0.0,
+            "reformulaciones_vacias": vacias,
+            "escaladas": int(_escalamientos() - escalamientos_inicio),
+        })
+        return resultado
@@ -0,0 +1,133 @@
+"""
+Benchmark de bytes por chat entre el frontend y ChatView.
+
+Ingesta el corpus sintético contra un Ollama falso y envía las mismas preguntas en cuatro modos:
+  - antes:      session_data completo en cada mensaje, eventos v1 con intent_debug/debug_context;
+  - v1:         session_token (registrado una vez en /session/), eventos v1 sin campos de debug;
+  - v2:         además, eventos compactos (`"v": 2`, ver views.ESQUEMA_EVENTOS);
+  - v2+gzip:    además, `Accept-Encoding: gzip` (flush por evento).
+
+La sesión es `frontend/public/data_unemi.json` (si existe, `--sesion`) más un perfil con acceso
+a las categorías de la pregunta. Reporta bytes de request y de respuesta por chat y, para gzip,
+verifica que cada bloque recibido se descomprime solo en líneas NDJSON completas (el cliente
+puede mostrar cada estado apenas llega).
+
+Uso:
+    python manage.py bench_payload --consultas 40
+"""
+import json
+import logging
+import tempfile
+import zlib
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from chatbot.bench.corpus import generar_corpus, sesion_para
+from chatbot.bench.entorno import entorno_benchmark
+from chatbot.bench.stub_ollama import StubOllama
+from chatbot.management.commands.bench_e2e import URL_CHAT, _ingestar
+
+URL_SESION = "/api/chatbot/session/"
+
+MODOS = [
+    # (nombre, session_token, cuerpo extra, gzip)
+    ("antes", False, {"debug": True}, False),
+    ("v1", True, {}, False),
+    ("v2", True, {"v": 2}, False),
+    ("v2+gzip", True, {"v": 2}, True),
+]
+
+
+def _chat(cliente, cuerpo, gzip):
+    """Devuelve (bytes de la respuesta, eventos, flush por evento)."""
+    extra = {"HTTP_ACCEPT_ENCODING": "gzip"} if gzip else {}
+    respuesta = cliente.post(URL_CHAT, cuerpo, content_type="application/json", **extra)
+    bloques = list(respuesta.streaming_content)
+    if not gzip:
+        texto = b"".join(bloques).decode("utf-8")
+        return sum(len(b) for b in bloques), texto.strip().splitlines(), True
+
+    assert respuesta["Content-Encoding"] == "gzip"
+    descompresor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    texto, incremental = "", True
+    for bloque in bloques:
+        parte = descompresor.decompress(bloque).decode("utf-8")
+        # Cada bloque con datos debe cerrar su línea: nada queda retenido en el compresor
+        incremental &= not parte or parte.endswith("\n")
+        texto += parte
+    return sum(len(b) for b in bloques), texto.strip().splitlines(), incremental
+
+
+class Command(BaseCommand):
+    help = "Mide bytes por chat (request y respuesta) con y sin debug, esquema compacto y gzip."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--consultas", type=int, default=40)
+        parser.add_argument("--archivos-por-tema", type=int, default=2)
+        parser.add_argument("--articulos", type=int, default=30)
+        parser.add_argument("--sesion", default=str(Path(settings.BASE_DIR) / "frontend" / "public" / "data_unemi.json"),
+                            help="JSON de sesión real para medir el request anterior.")
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["verbosity"] < 2:
+            logging.getLogger("chatbot").setLevel(logging.WARNING)
+        ruta_sesion = Path(options["sesion"])
+        sesion_real = json.loads(ruta_sesion.read_text(encoding="utf-8")) if ruta_sesion.exists() else {}
+
+        resultados = []
+        with tempfile.TemporaryDirectory(prefix="bench_payload_") as tmp, StubOllama() as stub:
+            corpus = generar_corpus(Path(tmp) / "corpus", options["archivos_por_tema"], options["articulos"])
+            with entorno_benchmark(stub.url, tmp, CHAT_DEBUG_PAYLOAD=False, CHAT_GZIP=True):
+                _ingestar(corpus["archivos"])
+                cliente = Client(HTTP_HOST="localhost")
+                preguntas = corpus["preguntas"]
+                lote = [preguntas[i % len(preguntas)] for i in range(options["consultas"])]
+
+                for nombre, con_token, extra, gzip in MODOS:
+                    request_bytes = respuesta_bytes = eventos = 0
+                    incremental, tipos = True, {}
+                    for pregunta in lote:
+                        sesion = {**sesion_real, **sesion_para(pregunta["categorias"])}
+                        cuerpo = {"message": pregunta["pregunta"], "session_id": "bench-payload", **extra}
+                        if con_token:
+                            token = cliente.post(URL_SESION, {"session_data": sesion},
+                                                 content_type="application/json").json()["session_token"]
+                            cuerpo["session_token"] = token
+                        else:
+                            cuerpo["session_data"] = sesion
+                        request_bytes += len(json.dumps(cuerpo).encode("utf-8"))
+                        n_bytes, lineas, flush = _chat(cliente, cuerpo, gzip)
+                        respuesta_bytes += n_bytes
+                        eventos += len(lineas)
+                        incremental &= flush
+                        final = json.loads(lineas[-1]) if lineas else {}
+                        tipo = final.get("f") or final.get("data", {}).get("type", final.get("type", "error"))
+                        tipos[tipo] = tipos.get(tipo, 0) + 1
+                    resultados.append({
+                        "modo": nombre,
+                        "request_bytes": round(request_bytes / len(lote)),
+                        "respuesta_bytes": round(respuesta_bytes / len(lote)),
+                        "eventos": round(eventos / len(lote), 1),
+                        "incremental": incremental,
+                        "tipos": tipos,
+                    })
+
+        antes = resultados[0]
+        for r in resultados:
+            total = r["request_bytes"] + r["respuesta_bytes"]
+            r["ahorro"] = round(1 - total / max(antes["request_bytes"] + antes["respuesta_bytes"], 1), 3)
+        if options["json"]:
+            self.stdout.write(json.dumps(resultados, indent=2, ensure_ascii=False))
+            return
+        self.stdout.write(f"{options['consultas']} chats, sesión de {len(json.dumps(sesion_real))} bytes\n")
+        self.stdout.write(f"{'modo':<8} {'request B':>9} {'respuesta B':>11} {'eventos':>7} {'incremental':>11} {'ahorro':>7}")
+        for r in resultados:
+            self.stdout.write(
+                f"{r['modo']:<8} {r['request_bytes']:>9} {r['respuesta_bytes']:>11} {r['eventos']:>7} "
+                f"{'sí' if r['incremental'] else 'no':>11} {r['ahorro']:>7.1%}"
+            )
+        self.stdout.write(f"\nRespuestas finales: {resultados[-1]['tipos']}")
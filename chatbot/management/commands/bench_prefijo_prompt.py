@@ -0,0 +1,164 @@
+"""
+Benchmark de prefill: prompts planos (formato anterior) vs mensajes sistema + usuario.
+
+Ejecuta el ciclo real de una consulta informativa (intención → reformulación → RAG)
+contra el Ollama local y compara el tiempo de prefill (prompt_eval_duration) y los
+tokens de prompt evaluados por llamada. Con el prefijo estático Ollama reutiliza la
+caché KV y solo evalúa la parte variable del mensaje.
+
+Nota: con OLLAMA_NUM_PARALLEL=1 las tres etapas comparten un único slot, así que solo
+se reutiliza el prefijo común con la llamada anterior. Con >= 3 slots cada prompt de
+sistema conserva su propia caché.
+
+Uso:
+    python manage.py bench_prefijo_prompt --iteraciones 3
+"""
+import json
+import statistics
+
+from django.core.management.base import BaseCommand
+
+from chatbot import intent_parser
+from chatbot.bench.estadisticas import percentil
+from chatbot.rag_service import rag_service
+
+PREGUNTAS = [
+    "¿Cuáles son los requisitos para la matrícula?",
+    "¿Cómo solicito una beca socioeconómica?",
+    "¿Cuál es el plazo para el retiro de asignatura?",
+    "¿Cómo justifico una inasistencia por enfermedad?",
+    "¿Qué necesito para la titulación?",
+]
+
+ROL = "Estudiante"
+
+CONTEXTO_FIJO = "\n\n".join(
+    f"DOC: REGLAMENTO_DE_REGIMEN_ACADEMICO.pdf\nTXT: Artículo {n}. "
+    + "El estudiante podrá solicitar el trámite correspondiente ante la unidad académica "
+    "dentro de los plazos establecidos en el calendario académico vigente, adjuntando "
+    "los documentos de respaldo y cumpliendo los requisitos previstos en este reglamento. " * 5
+    for n in range(1, 6)
+)
+
+# --- Prompts en formato anterior (un único string con el contenido variable incrustado) ---
+LEGACY_RAG_PROMPT = """ERES UN ASISTENTE EXPERTO PARA UNEMI.
+        ROL ACTUAL DEL USUARIO: {user_role}
+        Responde exclusivamente con JSON válido.
+
+        CONTEXTO:
+        {context}
+
+        CONSULTA DEL USUARIO:
+        {query}
+
+        INSTRUCCIONES:
+        1. RESPONDE DIRECTAMENTE usando SOLO el contexto proporcionado.
+        2. Adapta el tono al rol {user_role}.
+        3. Si el contexto contiene la respuesta, establece "has_information": true.
+        4. Si no, establece "has_information": false.
+
+        FORMATO JSON DE SALIDA:
+        {{
+          "has_information": boolean,
+          "need_contact": boolean,
+          "response": "Respuesta precisa en español",
+          "sources": ["nombre_de_archivo"]
+        }}
+        """
+
+LEGACY_REFORMER_PROMPT = """ACTÚA COMO UN EXPERTO EN TRÁMITES UNIVERSITARIOS.
+        DOMINIO: Reglamento de Grado, Admisión y Procesos Académicos (UNEMI).
+
+        TAREA: TRADUCE la consulta del usuario a TERMINOLOGÍA TÉCNICA del reglamento.
+
+        INSTRUCCIONES:
+        - Reescribe usando TERMINOLOGÍA DE REGLAMENTO.
+        - Ejemplos:
+          * "falta" -> "justificación inasistencia" O "sanción disciplinaria"
+          * "borrar materia" -> "retiro de asignatura"
+          * "matricularme" -> "proceso de matrícula"
+        - Mantén el sentido original pero usa términos técnicos precisos.
+
+        CONSULTA: "{query}"
+        ROL: "{user_role}"
+
+        JSON DE SALIDA:
+        {{
+          "search_query": "string (Término técnico optimizado para búsqueda)"
+        }}
+        """
+
+
+def _mensajes_planos(pregunta):
+    """Formato anterior: cada llamada envía un único string."""
+    return {
+        "intencion": (intent_parser.llm, f"{intent_parser.SYSTEM_PROMPT}\nInput: \"{pregunta}\"\nOutput:"),
+        "reformulacion": (rag_service.llm_reformulacion, LEGACY_REFORMER_PROMPT.format(query=pregunta, user_role=ROL)),
+        "generacion": (rag_service.llm, LEGACY_RAG_PROMPT.format(context=CONTEXTO_FIJO, query=pregunta, user_role=ROL)),
+    }
+
+
+def _mensajes_separados(pregunta):
+    """Formato actual: sistema estático + usuario variable."""
+    return {
+        "intencion": (intent_parser.llm, intent_parser.construir_mensajes(pregunta)),
+        "reformulacion": (rag_service.llm_reformulacion, rag_service._mensajes(
+            rag_service.reformer_system_prompt,
+            rag_service.reformer_user_prompt.format(query=pregunta, user_role=ROL),
+        )),
+        "generacion": (rag_service.llm, rag_service._mensajes(
+            rag_service.rag_system_prompt,
+            rag_service.rag_user_prompt.format(context=CONTEXTO_FIJO, query=pregunta, user_role=ROL),
+        )),
+    }
+
+
+MODOS = {"plano": _mensajes_planos, "mensajes": _mensajes_separados}
+
+
+class Command(BaseCommand):
+    help = "Mide el prefill por llamada con prompts planos vs sistema + usuario (requiere Ollama local)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iteraciones", type=int, default=3, help="Pasadas sobre el set de preguntas por modo.")
+        parser.add_argument("--json", action="store_true", help="Imprime los resultados en JSON.")
+
+    def handle(self, *args, **options):
+        resultados = {}
+        for modo, construir in MODOS.items():
+            muestras = {}
+            # Llamada de calentamiento: carga el modelo y descarta el tiempo de carga
+            for llm, mensajes in construir(PREGUNTAS[0]).values():
+                llm.invoke(mensajes)
+
+            for _ in range(options["iteraciones"]):
+                for pregunta in PREGUNTAS:
+                    for etapa, (llm, mensajes) in construir(pregunta).items():
+                        meta = llm.invoke(mensajes).response_metadata or {}
+                        muestras.setdefault(etapa, []).append((
+                            meta.get("prompt_eval_count") or 0,
+                            (meta.get("prompt_eval_duration") or 0) / 1e6,
+                        ))
+
+            resultados[modo] = {
+                etapa: {
+                    "llamadas": len(valores),
+                    "prompt_tokens_prom": round(statistics.mean(v[0] for v in valores), 1),
+                    "prefill_ms_prom": round(statistics.mean(v[1] for v in valores), 1),
+                    "prefill_ms_p50": round(percentil([v[1] for v in valores], 50), 1),
+                    "prefill_ms_p95": round(percentil([v[1] for v in valores], 95), 1),
+                }
+                for etapa, valores in muestras.items()
+            }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resultados, indent=2, ensure_ascii=False))
+            return
+
+        self.stdout.write(f"{'modo':<10} {'etapa':<14} {'tokens eval':>12} {'prefill ms':>11} {'p50':>8} {'p95':>8}")
+        for modo, etapas in resultados.items():
+            for etapa, r in etapas.items():
+                self.stdout.write(
+                    f"{modo:<10} {etapa:<14} {r['prompt_tokens_prom']:>12} {r['prefill_ms_prom']:>11} "
+                    f"{r['prefill_ms_p50']:>8} {r['prefill_ms_p95']:>8}"
+                )
@@ -0,0 +1,95 @@
+"""
+Benchmark de la reconstrucción del índice en paralelo (chatbot/reconstruccion.py).
+
+Genera un corpus PDF sintético y lo indexa contra un Ollama falso (latencia de embedding por
+texto, requests atendidas a la vez limitadas como OLLAMA_NUM_PARALLEL):
+  - ingerir:  el camino anterior, `ingerir` archivo por archivo en un solo hilo;
+  - N workers: `reconstruir` con 1..N procesos.
+
+Reporta segundos, speedup y eficiencia frente a 1 worker, y verifica que todas las
+configuraciones producen los mismos chunks.
+
+Uso:
+    python manage.py bench_reconstruccion --workers 1,2,4 --archivos-por-tema 6 --latencia-embedding 2
+"""
+import json
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from chatbot import reconstruccion
+from chatbot.bench.corpus import generar_corpus_pdf
+from chatbot.bench.entorno import entorno_benchmark
+from chatbot.bench.stub_ollama import StubOllama
+
+
+class Command(BaseCommand):
+    help = "Mide la reconstrucción del índice con 1..N procesos frente a la ingesta secuencial."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", default="1,2,4", help="Procesos a probar, separados por coma.")
+        parser.add_argument("--embeddings-por-worker", type=int, default=2)
+        parser.add_argument("--lote", type=int, default=32)
+        parser.add_argument("--archivos-por-tema", type=int, default=6)
+        parser.add_argument("--articulos", type=int, default=40)
+        parser.add_argument("--latencia-embedding", type=float, default=2.0, help="ms por texto embebido.")
+        parser.add_argument("--paralelo-stub", type=int, default=8, help="Requests que el stub atiende a la vez.")
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["verbosity"] < 2:
+            logging.getLogger("chatbot").setLevel(logging.WARNING)
+        stub = StubOllama(latencia_embedding_ms=options["latencia_embedding"], max_paralelo=options["paralelo_stub"])
+
+        resultados = []
+        with tempfile.TemporaryDirectory(prefix="bench_reconstruccion_") as tmp, stub, \
+                entorno_benchmark(stub.url, tmp) as servicio:
+            corpus = generar_corpus_pdf(Path(tmp) / "corpus", options["archivos_por_tema"], options["articulos"])
+            base = Path(tmp) / "corpus"
+
+            inicio = time.perf_counter()
+            chunks = sum(servicio.ingerir(a["ruta"], categoria=a["categoria"]) for a in corpus["archivos"])
+            servicio.guardar_indice()
+            resultados.append({"config": "ingerir", "segundos": round(time.perf_counter() - inicio, 2),
+                               "chunks": chunks})
+
+            for workers in [int(v) for v in options["workers"].split(",") if v.strip()]:
+                resumen = reconstruccion.reconstruir(
+                    base, Path(tmp) / f"indice_{workers}", workers, options["embeddings_por_worker"], options["lote"]
+                )
+                resultados.append({
+                    "config": f"{workers} workers",
+                    "workers": workers,
+                    "particiones": resumen["particiones"],
+                    "segundos": resumen["total_s"],
+                    "construccion_s": resumen["construccion_s"],
+                    "fusion_s": resumen["fusion_s"],
+                    "chunks": resumen["chunks"],
+                })
+
+        base_1 = next((r for r in resultados if r.get("workers") == 1), None)
+        for r in resultados:
+            if base_1 and "workers" in r:
+                r["speedup"] = round(base_1["segundos"] / r["segundos"], 2)
+                r["eficiencia"] = round(r["speedup"] / r["workers"], 2)
+        iguales = len({r["chunks"] for r in resultados}) == 1
+
+        if options["json"]:
+            self.stdout.write(json.dumps({"resultados": resultados, "mismos_chunks": iguales}, indent=2))
+            return
+        self.stdout.write(
+            f"{len(corpus['archivos'])} archivos PDF, embedding {options['latencia_embedding']} ms/texto, "
+            f"stub con {options['paralelo_stub']} requests a la vez, "
+            f"{options['embeddings_por_worker']} requests por worker\n"
+        )
+        self.stdout.write(f"{'config':<12} {'particiones':>11} {'total s':>8} {'paralelo s':>10} {'fusión s':>8} "
+                          f"{'chunks':>6} {'speedup':>7} {'eficiencia':>10}")
+        for r in resultados:
+            self.stdout.write(
+                f"{r['config']:<12} {r.get('particiones', '-'):>11} {r['segundos']:>8} {r.get('construccion_s', '-'):>10} "
+                f"{r.get('fusion_s', '-'):>8} {r['chunks']:>6} {r.get('speedup', '-'):>7} {r.get('eficiencia', '-'):>10}"
+            )
+        self.stdout.write(f"\nMismos chunks en todas las configuraciones: {'sí' if iguales else 'no'}")
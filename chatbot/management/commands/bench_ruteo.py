@@ -0,0 +1,116 @@
+"""
+Benchmark del ruteo en dos etapas de `recuperar` (chatbot/resumenes.py) a medida que crece el corpus.
+
+Genera embeddings sintéticos jerárquicos (tema → documento → sección → chunk, ver
+corpus.vectores_jerarquicos) y, para cada tamaño del corpus, compara por consulta:
+  - plano:  IndexFlatL2.search sobre todos los chunks (el camino actual);
+  - ruteo:  TablaResumenes.filas (mejores documentos y secciones) + distancia exacta solo
+            contra los chunks de esas secciones.
+
+Reporta latencia p50/p95, chunks puntuados y recall@k del ruteo frente a la búsqueda exacta.
+
+Uso:
+    python manage.py bench_ruteo --archivos 250,1000,4000 --chunks-por-archivo 30
+    python manage.py bench_ruteo --documentos 10,20,40 --secciones 12 --json
+"""
+import json
+import time
+
+import faiss
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from chatbot import indice_vectorial
+from chatbot.bench.corpus import normalizar, vectores_jerarquicos
+from chatbot.bench.estadisticas import resumen_latencias
+from chatbot.resumenes import TablaResumenes
+
+
+def _medir(funcion, consultas):
+    latencias, resultados = [], []
+    for vector in consultas:
+        inicio = time.perf_counter()
+        resultados.append(funcion(vector))
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return resumen_latencias(latencias), resultados
+
+
+class Command(BaseCommand):
+    help = "Compara la búsqueda plana contra el ruteo documento → sección → chunks al crecer el corpus."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--archivos", default="250,1000,4000", help="Tamaños del corpus (archivos), separados por coma.")
+        parser.add_argument("--chunks-por-archivo", type=int, default=30)
+        parser.add_argument("--dimension", type=int, default=384)
+        parser.add_argument("--temas", type=int, default=50, help="Temas compartidos entre documentos.")
+        parser.add_argument("--k", type=int, default=30, help="Candidatos por query (RAG_BUSQUEDA_K).")
+        parser.add_argument("--documentos", default="20", help="RAG_RUTEO_DOCUMENTOS a probar, separados por coma.")
+        parser.add_argument("--secciones", type=int, default=12, help="RAG_RUTEO_SECCIONES.")
+        parser.add_argument("--chunks-seccion", type=int, default=16, help="RAG_RUTEO_CHUNKS_SECCION.")
+        parser.add_argument("--consultas", type=int, default=200)
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(7)
+        k = options["k"]
+        resultados = []
+        for archivos in [int(v) for v in options["archivos"].split(",") if v.strip()]:
+            vectores = vectores_jerarquicos(archivos, options["chunks_por_archivo"], options["chunks_seccion"],
+                               options["dimension"], options["temas"], rng)
+            indice = faiss.IndexFlatL2(options["dimension"])
+            tabla = TablaResumenes(options["dimension"], options["chunks_seccion"])
+            for bloque in vectores:
+                tabla.agregar(bloque, indice.ntotal, 0)
+                indice.add(bloque)
+            permitidas = np.ones(1, dtype=bool)
+
+            # Consultas: un chunk al azar con ruido (parafraseo de algo que sí está en el corpus)
+            planos = vectores.reshape(-1, options["dimension"])
+            origen = rng.integers(0, len(planos), options["consultas"])
+            consultas = normalizar(planos[origen] + 0.8 * normalizar(rng.standard_normal(planos[origen].shape)))
+
+            plano, exactos = _medir(lambda v: indice.search(v.reshape(1, -1), k)[1][0], consultas)
+            for documentos in [int(v) for v in options["documentos"].split(",") if v.strip()]:
+                puntuados = []
+
+                def rutear(v):
+                    filas = tabla.filas(v, permitidas, documentos, options["secciones"])
+                    puntuados.append(len(filas))
+                    distancias = indice_vectorial.distancias_filas(indice, v, filas)
+                    if len(filas) > k:
+                        filas = filas[np.argpartition(distancias, k)[:k]]
+                    return filas
+
+                ruteo, obtenidos = _medir(rutear, consultas)
+                recall = np.mean([len(set(e) & set(o)) / len(e) for e, o in zip(exactos, obtenidos)])
+                top1 = np.mean([e[0] in set(o) for e, o in zip(exactos, obtenidos)])
+                resultados.append({
+                    "archivos": archivos,
+                    "chunks": int(indice.ntotal),
+                    "documentos": documentos,
+                    "plano_p50_ms": plano["p50_ms"],
+                    "plano_p95_ms": plano["p95_ms"],
+                    "ruteo_p50_ms": ruteo["p50_ms"],
+                    "ruteo_p95_ms": ruteo["p95_ms"],
+                    "chunks_puntuados": int(np.mean(puntuados)),
+                    f"recall@{k}": round(float(recall), 3),
+                    "top1": round(float(top1), 3),
+                })
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+        self.stdout.write(
+            f"dimension={options['dimension']} k={k} secciones={options['secciones']} "
+            f"chunks/sección={options['chunks_seccion']}\n"
+        )
+        self.stdout.write(
+            f"{'chunks':>8} {'docs':>5} {'plano p50/p95':>15} {'ruteo p50/p95':>15} {'puntuados':>9} "
+            f"{'recall@' + str(k):>9} {'top1':>5}"
+        )
+        for r in resultados:
+            self.stdout.write(
+                f"{r['chunks']:>8} {r['documentos']:>5} {r['plano_p50_ms']:>7}/{r['plano_p95_ms']:<6}ms "
+                f"{r['ruteo_p50_ms']:>7}/{r['ruteo_p95_ms']:<6}ms {r['chunks_puntuados']:>9} "
+                f"{r[f'recall@{k}']:>9} {r['top1']:>5}"
+            )
@@ -0,0 +1,125 @@
+"""
+Benchmark del índice vectorial: plano (IndexFlatL2) contra el modo compacto
+(truncado Matryoshka / PCA + SQ8 / PQ, con re-score exacto desde disco).
+
+Los vectores son sintéticos con estructura de clusters y varianza decreciente por
+dimensión (como los embeddings Matryoshka, donde las primeras dimensiones concentran
+la información). Para cada configuración se mide la memoria del índice en RAM, la
+latencia por consulta y el recall@k contra la búsqueda exacta del índice plano.
+
+Uso:
+    python manage.py bench_vectores --filas 50000 --dimension 768 --k 10
+"""
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from chatbot import indice_vectorial
+from chatbot.bench.estadisticas import resumen_latencias
+
+CONFIGURACIONES = [
+    ("truncar", "sq8"),
+    ("truncar", "pq"),
+    ("pca", "sq8"),
+    ("pca", "pq"),
+]
+
+
+def _vectores_sinteticos(filas: int, consultas: int, dimension: int, semilla: int):
+    rng = np.random.default_rng(semilla)
+    escala = (1.0 / np.sqrt(1.0 + np.arange(dimension) / 32.0)).astype(np.float32)
+    centros = rng.standard_normal((max(filas // 50, 1), dimension)).astype(np.float32) * escala
+    asignacion = rng.integers(0, len(centros), filas)
+    base = centros[asignacion] + 0.5 * rng.standard_normal((filas, dimension)).astype(np.float32) * escala
+    faiss.normalize_L2(base)
+    # Consultas cercanas a chunks existentes (como una pregunta sobre un tema indexado)
+    xq = base[rng.choice(filas, consultas, replace=False)]
+    xq = xq + 0.3 * rng.standard_normal(xq.shape).astype(np.float32) * escala
+    xq = np.ascontiguousarray(xq, dtype=np.float32)
+    faiss.normalize_L2(xq)
+    return base, xq
+
+
+def _bytes_en_ram(indice) -> int:
+    if isinstance(indice, indice_vectorial.IndiceCompacto):
+        # Solo el índice reducido vive en RAM; los vectores completos se leen por memmap
+        return len(faiss.serialize_index(indice._reducido)) if indice._reducido is not None else 0
+    return len(faiss.serialize_index(indice))
+
+
+def _medir(indice, xq, k: int, exactas: np.ndarray) -> dict:
+    latencias, aciertos = [], 0
+    for i, consulta in enumerate(xq):
+        inicio = time.perf_counter()
+        _, etiquetas = indice.search(consulta.reshape(1, -1), k)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        aciertos += len(np.intersect1d(etiquetas[0], exactas[i]))
+    resumen = resumen_latencias(latencias)
+    return {
+        "ram_bytes": _bytes_en_ram(indice),
+        "p50_ms": resumen["p50_ms"],
+        "p95_ms": resumen["p95_ms"],
+        "recall": round(aciertos / (len(xq) * k), 4),
+    }
+
+
+class Command(BaseCommand):
+    help = "Compara memoria, latencia y recall@k del índice plano contra las configuraciones compactas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--filas", type=int, default=50000)
+        parser.add_argument("--dimension", type=int, default=768)
+        parser.add_argument("--dimension-reducida", type=int, default=256)
+        parser.add_argument("--pq-m", type=int, default=32)
+        parser.add_argument("--factor-rescore", type=int, default=4)
+        parser.add_argument("--consultas", type=int, default=200)
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, **options):
+        k = options["k"]
+        base, xq = _vectores_sinteticos(options["filas"], options["consultas"], options["dimension"], 11)
+
+        plano = faiss.IndexFlatL2(options["dimension"])
+        plano.add(base)
+        _, exactas = plano.search(xq, k)
+        resultados = [{"modo": "plano", **_medir(plano, xq, k, exactas)}]
+
+        for reduccion, cuantizacion in CONFIGURACIONES:
+            config = {
+                "modo": "compacto",
+                "reduccion": reduccion,
+                "dimension_reducida": options["dimension_reducida"],
+                "cuantizacion": cuantizacion,
+                "pq_m": options["pq_m"],
+                "factor_rescore": options["factor_rescore"],
+            }
+            with tempfile.TemporaryDirectory(prefix="bench_vectores_") as tmp:
+                indice = indice_vectorial.crear(Path(tmp), options["dimension"], config)
+                inicio = time.perf_counter()
+                for desde in range(0, len(base), indice_vectorial.BLOQUE):
+                    indice.add(base[desde:desde + indice_vectorial.BLOQUE])
+                construccion = round(time.perf_counter() - inicio, 2)
+                resultados.append({
+                    "modo": f"{reduccion}+{cuantizacion}",
+                    **_medir(indice, xq, k, exactas),
+                    "construccion_s": construccion,
+                })
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+        self.stdout.write(
+            f"{options['filas']} vectores de {options['dimension']} dims → {options['dimension_reducida']}, "
+            f"k={k}, factor re-score {options['factor_rescore']}\n"
+        )
+        self.stdout.write(f"{'modo':<12} {'RAM índice':>14} {'p50':>9} {'p95':>9} {'recall@k':>9}")
+        for r in resultados:
+            self.stdout.write(
+                f"{r['modo']:<12} {r['ram_bytes']:>14,} {r['p50_ms']:>7}ms {r['p95_ms']:>7}ms {r['recall']:>9}"
+            )
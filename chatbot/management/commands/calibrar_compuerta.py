@@ -0,0 +1,113 @@
+"""
+Calibra la compuerta de confianza de la recuperación (chatbot/compuerta.py).
+
+Lee el registro de generaciones (características de los scores + has_information obtenido),
+ajusta una regresión logística y elige el umbral de probabilidad más alto que conserva
+--recall-minimo de las respuestas con información. Las filas de exploración (consultas que la
+compuerta habría omitido y se generaron igual) pesan 1/RAG_COMPUERTA_EXPLORACION, porque
+representan a todas las omitidas. Escribe FAISS_INDEX_PATH/compuerta.json,
+que el servicio relee en caliente.
+
+Uso:
+    python manage.py calibrar_compuerta --recall-minimo 0.98
+    python manage.py calibrar_compuerta --registro otro_registro.jsonl --dry-run
+    python manage.py calibrar_compuerta --sintetico
+"""
+import json
+import logging
+import os
+import tempfile
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from chatbot import compuerta
+
+
+class Command(BaseCommand):
+    help = "Ajusta la compuerta de confianza con el registro de resultados de generación."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--registro", help="Registro JSONL (por defecto FAISS_INDEX_PATH/compuerta_registro.jsonl).")
+        parser.add_argument("--recall-minimo", type=float, default=0.98,
+                            help="Fracción mínima de respuestas con información que deben seguir generándose.")
+        parser.add_argument("--minimo-muestras", type=int, default=20)
+        parser.add_argument("--dry-run", action="store_true", help="Muestra la calibración sin escribirla.")
+        parser.add_argument("--sintetico", action="store_true",
+                            help="Genera el registro con el corpus sintético y un Ollama falso (directorio temporal).")
+
+    def handle(self, *args, **options):
+        if options["verbosity"] < 2:
+            logging.getLogger("chatbot").setLevel(logging.WARNING)
+
+        with ExitStack() as pila:
+            if options["sintetico"]:
+                self._registro_sintetico(pila)
+            ruta = Path(options["registro"] or compuerta.ruta_registro())
+            if not ruta.exists():
+                raise CommandError(f"No existe el registro {ruta}.")
+            X, y, pesos = compuerta.leer_registro(ruta)
+            if len(y) < options["minimo_muestras"]:
+                raise CommandError(f"Solo {len(y)} muestras en {ruta}; se necesitan {options['minimo_muestras']}.")
+            if y.min() == y.max():
+                raise CommandError("El registro tiene un solo tipo de resultado; no hay nada que separar.")
+
+            modelo = compuerta.ajustar(X, y, pesos)
+            probabilidades = np.array([
+                compuerta.probabilidad(modelo, dict(zip(compuerta.CARACTERISTICAS, fila))) for fila in X
+            ])
+            seleccion = compuerta.elegir_umbral(probabilidades, y, options["recall_minimo"], pesos)
+            # Referencia: mismo recall con solo un umbral sobre el mejor score
+            referencia = compuerta.elegir_umbral(X[:, 0], y, options["recall_minimo"], pesos)
+
+            calibracion = {
+                **modelo,
+                "umbral": seleccion["umbral"],
+                "recall": round(seleccion["recall"], 4),
+                "omitidas": round(seleccion["omitidas"], 4),
+                "muestras": int(len(y)),
+                "exploracion": int((pesos > 1).sum()),
+                "con_informacion": int(y.sum()),
+                "creado": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            }
+            self.stdout.write(
+                f"Muestras: {len(y)} ({int(y.sum())} con información, {int((pesos > 1).sum())} de exploración)\n"
+                f"Logística:   umbral p={seleccion['umbral']:.3f} recall={seleccion['recall']:.1%} "
+                f"generaciones evitadas={seleccion['omitidas']:.1%}\n"
+                f"Score máximo: umbral={referencia['umbral']:.3f} recall={referencia['recall']:.1%} "
+                f"generaciones evitadas={referencia['omitidas']:.1%}"
+            )
+            if options["dry_run"] or options["sintetico"]:
+                self.stdout.write(json.dumps(calibracion, indent=2))
+                return
+
+            destino = compuerta.ruta_calibracion()
+            temporal = destino.with_name(destino.name + ".tmp")
+            temporal.write_text(json.dumps(calibracion, indent=2), encoding="utf-8")
+            os.replace(temporal, destino)
+            self.stdout.write(self.style.SUCCESS(f"✅ Calibración escrita en {destino}"))
+
+    def _registro_sintetico(self, pila):
+        """Consultas respondibles y no respondibles del corpus sintético, todas generadas y registradas."""
+        from chatbot.bench.corpus import CATEGORIAS, PREGUNTAS_SIN_RESPUESTA, generar_corpus
+        from chatbot.bench.entorno import entorno_benchmark
+        from chatbot.bench.stub_ollama import StubOllama
+
+        tmp = pila.enter_context(tempfile.TemporaryDirectory(prefix="calibrar_compuerta_"))
+        stub = pila.enter_context(StubOllama())
+        servicio = pila.enter_context(entorno_benchmark(stub.url, tmp))
+        pila.enter_context(override_settings(RAG_COMPUERTA_SCORE_MIN=0.0, RAG_COMPUERTA_REGISTRAR=True))
+        corpus = generar_corpus(Path(tmp) / "corpus")
+        for archivo in corpus["archivos"]:
+            servicio.ingerir_documento(archivo["ruta"], categoria=archivo["categoria"], auto_save=False)
+
+        todas = sorted(CATEGORIAS)
+        consultas = [(p["pregunta"], p["categorias"]) for p in corpus["preguntas"]]
+        consultas += [(p, todas) for p in PREGUNTAS_SIN_RESPUESTA]
+        for pregunta, categorias in consultas:
+            for rol in ("Estudiante", "Profesor"):
+                servicio.consultar(pregunta, {}, categorias, rol)
@@ -0,0 +1,191 @@
+"""
+Evaluación offline de la recuperación de `consultar` (sin generación).
+
+Corre un set etiquetado pregunta → fuentes esperadas por `LocalRAGService.recuperar` y reporta
+por configuración: recall, hit rate, MRR, chunks enviados, k medio de la búsqueda adaptativa, tokens de prompt
+estimados y latencia de búsqueda. Con --sweep prueba todas las combinaciones y recomienda la más barata
+que mantiene el recall mínimo.
+
+Formato del set (JSON o JSONL):
+    {"pregunta": "...", "fuentes": ["REGLAMENTO_X.pdf"], "categorias": ["general", "estudiantes"],
+     "search_query": "opcional, consulta técnica ya reformulada"}
+
+Uso:
+    python manage.py evaluar_recuperacion --preguntas set.jsonl
+    python manage.py evaluar_recuperacion --preguntas set.jsonl --sweep "k=10,20,30 umbral=0.25,0.3 max_total=3,5"
+    python manage.py evaluar_recuperacion --sintetico --sweep "k=5,10,30"
+"""
+import itertools
+import json
+import logging
+import tempfile
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.bench.estadisticas import resumen_latencias
+
+CHARS_POR_TOKEN = 4
+PARAMETROS = ("k", "k_inicial", "margen", "umbral", "max_total", "limite_reglamento", "limite_fuente",
+              "ruteo_min_chunks", "ruteo_documentos", "ruteo_secciones")
+_TIPOS = {"k": int, "k_inicial": int, "margen": float, "umbral": float, "max_total": int,
+          "limite_reglamento": int, "limite_fuente": int,
+          "ruteo_min_chunks": int, "ruteo_documentos": int, "ruteo_secciones": int}
+
+
+class _EmbeddingsCacheados:
+    """Memoiza embed_query para que el sweep mida solo búsqueda y filtrado."""
+
+    def __init__(self, embeddings):
+        self._embeddings = embeddings
+        self._cache = {}
+
+    def embed_query(self, texto):
+        if texto not in self._cache:
+            self._cache[texto] = self._embeddings.embed_query(texto)
+        return self._cache[texto]
+
+    def __getattr__(self, nombre):
+        return getattr(self._embeddings, nombre)
+
+
+def _cargar_set(ruta) -> list:
+    texto = Path(ruta).read_text(encoding="utf-8")
+    if ruta.endswith(".jsonl"):
+        return [json.loads(linea) for linea in texto.splitlines() if linea.strip()]
+    return json.loads(texto)
+
+
+def _parsear_sweep(texto: str) -> list:
+    """'k=10,30 umbral=0.3' → [{"k": 10, "umbral": 0.3}, {"k": 30, "umbral": 0.3}]"""
+    ejes = {}
+    for parte in texto.replace(";", " ").split():
+        nombre, _, valores = parte.partition("=")
+        if nombre not in _TIPOS:
+            raise CommandError(f"Parámetro desconocido en --sweep: {nombre} (válidos: {', '.join(PARAMETROS)})")
+        ejes[nombre] = [_TIPOS[nombre](v) for v in valores.split(",") if v]
+    nombres = list(ejes)
+    return [dict(zip(nombres, combinacion)) for combinacion in itertools.product(*ejes.values())]
+
+
+def evaluar(servicio, preguntas: list, config: dict) -> dict:
+    """Métricas de recuperación para una configuración."""
+    recalls, hits, rr, chunks, tokens, latencias, ks = [], [], [], [], [], [], []
+    for item in preguntas:
+        esperadas = set(item["fuentes"])
+        query_tecnica = item.get("search_query") or item["pregunta"]
+
+        inicio = time.perf_counter()
+        resultado = servicio.recuperar(item["pregunta"], query_tecnica, item["categorias"], config)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        ks.append(resultado["k"])
+
+        fuentes = [Path(doc.metadata.get("source", "")).name for doc, _ in resultado["docs"]]
+        encontradas = esperadas & set(fuentes)
+        recalls.append(len(encontradas) / len(esperadas) if esperadas else 1.0)
+        hits.append(1.0 if encontradas else 0.0)
+        rango = next((i + 1 for i, f in enumerate(fuentes) if f in esperadas), None)
+        rr.append(1 / rango if rango else 0.0)
+
+        docs = [doc for doc, _ in resultado["docs"]]
+        chunks.append(len(docs))
+        mensajes = servicio.mensajes_generacion(servicio.construir_contexto(docs), item["pregunta"], "Estudiante")
+        tokens.append(sum(len(contenido) for _, contenido in mensajes) / CHARS_POR_TOKEN)
+
+    n = len(preguntas)
+    busqueda = resumen_latencias(latencias)
+    return {
+        "config": config,
+        "recall": round(sum(recalls) / n, 3),
+        "hit_rate": round(sum(hits) / n, 3),
+        "mrr": round(sum(rr) / n, 3),
+        "chunks_prom": round(sum(chunks) / n, 2),
+        "k_prom": round(sum(ks) / n, 1),
+        "prompt_tokens_prom": round(sum(tokens) / n, 1),
+        "busqueda_p50_ms": busqueda["p50_ms"],
+        "busqueda_p95_ms": busqueda["p95_ms"],
+    }
+
+
+class Command(BaseCommand):
+    help = "Evalúa recall/MRR/costo de la recuperación por configuración (sin generación)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--preguntas", help="Set etiquetado (.json o .jsonl).")
+        parser.add_argument("--sintetico", action="store_true",
+                            help="Usa el corpus sintético y un Ollama falso en un directorio temporal.")
+        parser.add_argument("--sweep", help='Combinaciones, ej: "k=10,30 umbral=0.25,0.3 max_total=3,5".')
+        parser.add_argument("--recall-minimo", type=float,
+                            help="Recall mínimo aceptable (por defecto, el de la configuración actual).")
+        for nombre in PARAMETROS:
+            parser.add_argument(f"--{nombre.replace('_', '-')}", type=_TIPOS[nombre], dest=nombre)
+        parser.add_argument("--json", action="store_true", help="Imprime los resultados en JSON.")
+
+    def handle(self, *args, **options):
+        if not options["preguntas"] and not options["sintetico"]:
+            raise CommandError("Indica --preguntas <archivo> o --sintetico.")
+        if options["verbosity"] < 2:
+            logging.getLogger("chatbot").setLevel(logging.WARNING)
+
+        with ExitStack() as pila:
+            if options["sintetico"]:
+                servicio, preguntas = self._entorno_sintetico(pila)
+            else:
+                from chatbot.rag_service import rag_service as servicio
+            if options["preguntas"]:
+                preguntas = _cargar_set(options["preguntas"])
+
+            if not servicio.vector_store:
+                raise CommandError("No hay índice FAISS cargado.")
+
+            servicio.embeddings = _EmbeddingsCacheados(servicio.embeddings)
+            base = servicio.config_recuperacion(**{p: options[p] for p in PARAMETROS})
+            configs = [base]
+            if options["sweep"]:
+                configs += [{**base, **c} for c in _parsear_sweep(options["sweep"])]
+
+            # Pasada de calentamiento: calcula y cachea los embeddings de todas las consultas
+            evaluar(servicio, preguntas, base)
+            resultados = [evaluar(servicio, preguntas, c) for c in configs]
+
+        recall_minimo = options["recall_minimo"]
+        if recall_minimo is None:
+            recall_minimo = resultados[0]["recall"]
+        aceptables = [r for r in resultados if r["recall"] >= recall_minimo]
+        recomendada = min(aceptables, key=lambda r: (r["prompt_tokens_prom"], r["busqueda_p50_ms"])) if aceptables else None
+
+        if options["json"]:
+            self.stdout.write(json.dumps({
+                "preguntas": len(preguntas),
+                "recall_minimo": recall_minimo,
+                "resultados": resultados,
+                "recomendada": recomendada,
+            }, indent=2, ensure_ascii=False))
+            return
+
+        self.stdout.write(f"{len(preguntas)} preguntas, {len(resultados)} configuraciones\n")
+        self.stdout.write(f"{'configuración':<66} {'recall':>6} {'hit':>5} {'mrr':>5} {'chunks':>6} {'k':>5} {'tokens':>7} {'p50ms':>7}")
+        for r in resultados:
+            etiqueta = " ".join(f"{k}={v}" for k, v in r["config"].items())
+            self.stdout.write(
+                f"{etiqueta:<66} {r['recall']:>6} {r['hit_rate']:>5} {r['mrr']:>5} "
+                f"{r['chunks_prom']:>6} {r['k_prom']:>5} {r['prompt_tokens_prom']:>7} {r['busqueda_p50_ms']:>7}"
+            )
+        if recomendada:
+            etiqueta = " ".join(f"{k}={v}" for k, v in recomendada["config"].items())
+            self.stdout.write(f"\nMás barata con recall >= {recall_minimo}: {etiqueta}")
+
+    def _entorno_sintetico(self, pila):
+        from chatbot.bench.corpus import generar_corpus
+        from chatbot.bench.entorno import entorno_benchmark
+        from chatbot.bench.stub_ollama import StubOllama
+
+        tmp = pila.enter_context(tempfile.TemporaryDirectory(prefix="eval_recuperacion_"))
+        stub = pila.enter_context(StubOllama())
+        servicio = pila.enter_context(entorno_benchmark(stub.url, tmp))
+        corpus = generar_corpus(Path(tmp) / "corpus")
+        for archivo in corpus["archivos"]:
+            servicio.ingerir_documento(archivo["ruta"], categoria=archivo["categoria"], auto_save=False)
+        return servicio, corpus["preguntas"]
@@ -0,0 +1,128 @@
+"""
+Precalcula las respuestas de las preguntas frecuentes con el pipeline RAG completo
+(intención + `consultar`) y las guarda en RespuestaPrecalculada para que ChatView
+las sirva sin LLM.
+
+Correr tras cada reindexado (las respuestas quedan ligadas a la generación del índice
+y dejan de servirse cuando cambia), por ejemplo cada noche.
+
+Formato del archivo (por defecto RAG_FAQ_ARCHIVO):
+    {
+      "perfiles": [{"rol": "Estudiante", "categorias": ["estudiantes"]}, ...],
+      "preguntas": [{"pregunta": "...", "perfiles": ["Estudiante"]}, ...]
+    }
+Una pregunta sin "perfiles" se precalcula para todos. "general" siempre está permitida.
+Las preguntas que el intent_parser clasifica con la misma accion/objeto se reportan como
+ambiguas: se siguen sirviendo por similitud, pero no por intención.
+
+Uso:
+    python manage.py precalcular_respuestas [--preguntas archivo.json] [--limpiar]
+"""
+import json
+import logging
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot import respuestas_frecuentes
+from chatbot.models import RespuestaPrecalculada
+
+
+class Command(BaseCommand):
+    help = "Precalcula respuestas RAG para las preguntas frecuentes de cada perfil."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--preguntas", default=None, help="JSON de preguntas (por defecto RAG_FAQ_ARCHIVO).")
+        parser.add_argument("--limpiar", action="store_true",
+                            help="Elimina también las respuestas de preguntas que ya no están en el archivo.")
+
+    def handle(self, *args, **options):
+        from chatbot.intent_parser import procesar_mensaje_usuario
+        from chatbot.rag_service import rag_service
+
+        if options["verbosity"] < 2:
+            logging.getLogger("chatbot").setLevel(logging.WARNING)
+
+        ruta = Path(options["preguntas"] or settings.RAG_FAQ_ARCHIVO)
+        if not ruta.exists():
+            raise CommandError(f"No existe {ruta}")
+        definicion = json.loads(ruta.read_text(encoding="utf-8"))
+        perfiles = {p["rol"]: p for p in definicion.get("perfiles", [])}
+        if not rag_service.vector_store:
+            raise CommandError("No hay índice FAISS cargado; ingesta documentos antes de precalcular.")
+
+        generacion = rag_service.generacion
+        guardadas, omitidas, vigentes = 0, [], set()
+        for entrada in definicion.get("preguntas", []):
+            pregunta = entrada["pregunta"]
+            # Una sola clasificación por pregunta (modo combinado: trae también search_query)
+            intent_data = procesar_mensaje_usuario(pregunta, incluir_busqueda=True)
+            if intent_data.get("is_ambiguous") or intent_data.get("answer_type") != "informational":
+                omitidas.append(f"{pregunta} (no informativa)")
+                continue
+            embedding = respuestas_frecuentes.vector_normalizado(rag_service.embeddings, pregunta)
+
+            for rol in entrada.get("perfiles") or list(perfiles):
+                if rol not in perfiles:
+                    raise CommandError(f"Perfil desconocido '{rol}' en la pregunta '{pregunta}'")
+                categorias = sorted({"general", *perfiles[rol]["categorias"]})
+                inicio = time.perf_counter()
+                resultado = rag_service.consultar(
+                    query=pregunta,
+                    intent_data=intent_data,
+                    categorias_permitidas=categorias,
+                    user_role_name=rol,
+                    search_query=intent_data.get("search_query"),
+                )
+                if not resultado.get("has_information") or not resultado.get("sources"):
+                    omitidas.append(f"{pregunta} [{rol}] (sin información en el índice)")
+                    continue
+
+                clave = respuestas_frecuentes.clave_categorias(categorias)
+                RespuestaPrecalculada.objects.update_or_create(
+                    pregunta=pregunta,
+                    categorias=clave,
+                    defaults={
+                        "rol": rol,
+                        "accion": intent_data.get("accion") or "",
+                        "objeto": intent_data.get("objeto") or "",
+                        "search_query": resultado.get("search_query") or "",
+                        "respuesta": {
+                            "response": resultado["response"],
+                            "sources": resultado["sources"],
+                            "need_contact": resultado.get("need_contact", False),
+                        },
+                        "filas_candidatas": resultado.get("filas_candidatas", []),
+                        "embedding": embedding.tobytes(),
+                        "generacion": generacion,
+                    },
+                )
+                vigentes.add((pregunta, clave))
+                guardadas += 1
+                self.stdout.write(f"  ✅ [{rol}] {pregunta} ({time.perf_counter() - inicio:.1f}s)")
+
+        # Las de otra generación ya no se sirven: se eliminan
+        obsoletas, _ = RespuestaPrecalculada.objects.exclude(generacion=generacion).delete()
+        retiradas = 0
+        if options["limpiar"]:
+            for fila in RespuestaPrecalculada.objects.filter(generacion=generacion).only("pregunta", "categorias"):
+                if (fila.pregunta, fila.categorias) not in vigentes:
+                    fila.delete()
+                    retiradas += 1
+
+        for motivo in omitidas:
+            self.stdout.write(f"  ⚠️ Omitida: {motivo}")
+        # Varias preguntas con la misma accion/objeto: ninguna se sirve por intención
+        ambiguas = respuestas_frecuentes.intenciones_ambiguas(
+            RespuestaPrecalculada.objects.filter(generacion=generacion).only("pregunta", "categorias", "accion", "objeto")
+        )
+        for (categorias, clave), preguntas in ambiguas.items():
+            self.stdout.write(
+                f"  ⚠️ Intención ambigua '{clave}' [{categorias}]: {' / '.join(preguntas)} (solo por similitud)"
+            )
+        self.stdout.write(
+            f"Respuestas precalculadas: {guardadas} guardadas (generación {generacion}), "
+            f"{obsoletas} obsoletas eliminadas, {retiradas} retiradas, {len(omitidas)} omitidas."
+        )
@@ -0,0 +1,55 @@
+"""
+Reconstruye el índice completo desde `documentos_unemi/` con varios procesos (chatbot/reconstruccion.py).
+
+El índice nuevo se arma en `faiss_index.reconstruccion/` y reemplaza al actual, que queda en
+`faiss_index.anterior/`. El servidor sigue usando el índice cargado hasta reiniciarse; después
+correr `precalcular_respuestas` (la generación del índice cambia).
+
+Uso:
+    python manage.py reconstruir_indice --workers 4 --embeddings-por-worker 2
+"""
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot import reconstruccion
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice FAISS desde el directorio de documentos en paralelo."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=settings.RAG_RECONSTRUCCION_WORKERS,
+                            help="Procesos (RAG_RECONSTRUCCION_WORKERS).")
+        parser.add_argument("--embeddings-por-worker", type=int, default=settings.RAG_RECONSTRUCCION_EMBEDDINGS,
+                            help="Requests de embeddings a la vez por proceso (RAG_RECONSTRUCCION_EMBEDDINGS).")
+        parser.add_argument("--lote", type=int, default=settings.RAG_RECONSTRUCCION_LOTE,
+                            help="Textos por request de embeddings (RAG_RECONSTRUCCION_LOTE).")
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, **options):
+        base_dir = Path(settings.DOCUMENTOS_DIR)
+        if not base_dir.exists():
+            raise CommandError(f"No existe {base_dir}")
+        try:
+            resumen = reconstruccion.reconstruir(
+                base_dir, settings.FAISS_INDEX_PATH,
+                options["workers"], options["embeddings_por_worker"], options["lote"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resumen, indent=2, ensure_ascii=False))
+            return
+        self.stdout.write(
+            f"Índice reconstruido (generación {resumen['generacion']}): {resumen['chunks']} chunks de "
+            f"{resumen['archivos']} archivos en {resumen['total_s']}s "
+            f"({resumen['particiones']} particiones: {resumen['construccion_s']}s en paralelo, "
+            f"{resumen['fusion_s']}s de fusión)."
+        )
+        for error in resumen["errores"]:
+            self.stdout.write(f"  ❌ {error['categoria']}/{error['nombre']}: {error['error']}")
+        self.stdout.write("Reinicia el servidor para cargar el índice nuevo y corre precalcular_respuestas.")
@@ -0,0 +1,152 @@
+"""
+Re-ejecuta un archivo de trazas de chat (chatbot/trazas.py) contra el código actual y compara
+latencias por etapa y resultados (tipo de respuesta, query reformulada, chunks recuperados).
+
+Cada traza se envía a ChatView en el orden original, con su mensaje, su session_id (la memoria
+de sesión se reconstruye igual) y un session_data que da acceso a las mismas carpetas.
+
+  --stub llm   intención/reformulación/generación contra un Ollama falso; los embeddings siguen
+               en Ollama real, así la recuperación es comparable con la traza original.
+  --stub todo  todo contra el Ollama falso (útil con trazas grabadas sobre un índice del stub).
+
+Uso:
+    python manage.py reproducir_trazas trazas/chat.jsonl --limite 200
+    python manage.py reproducir_trazas trazas/chat.jsonl --stub llm --salida comparacion.json
+"""
+import json
+import logging
+import tempfile
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from chatbot import permisos, trazas
+from chatbot.bench.estadisticas import resumen_latencias
+
+URL_CHAT = "/api/chatbot/chat/"
+
+
+def _sesion_con_categorias(categorias) -> dict:
+    """session_data con un perfil activo por cada carpeta (inverso de permisos.MAPA_ROLES)."""
+    perfil = {"status": True}
+    for bandera, carpeta in permisos.MAPA_ROLES.items():
+        if carpeta in (categorias or []):
+            perfil[bandera] = True
+    return {"reproduccion": {"perfiles": [perfil]}}
+
+
+def _jaccard(a, b) -> float:
+    a, b = set(a), set(b)
+    return 1.0 if not a and not b else len(a & b) / len(a | b)
+
+
+def comparar(original: dict, nueva: dict) -> dict:
+    """Diferencias entre una traza y su reproducción."""
+    etapas_original, etapas_nueva = trazas.duraciones(original), trazas.duraciones(nueva)
+    chunks_original, chunks_nueva = trazas.chunks(original), trazas.chunks(nueva)
+    query_original = original.get("datos", {}).get("recuperacion", {}).get("search_query")
+    query_nueva = nueva.get("datos", {}).get("recuperacion", {}).get("search_query")
+    return {
+        "mensaje": original.get("mensaje"),
+        "total_ms": [original.get("total_ms"), nueva.get("total_ms")],
+        "etapas_ms": {
+            etapa: [etapas_original.get(etapa), etapas_nueva.get(etapa)]
+            for etapa in dict.fromkeys([*etapas_original, *etapas_nueva])
+        },
+        "tipo": [original.get("tipo"), nueva.get("tipo")],
+        "search_query": [query_original, query_nueva],
+        "chunks_jaccard": round(_jaccard(chunks_original, chunks_nueva), 3),
+        "top1_igual": chunks_original[:1] == chunks_nueva[:1],
+    }
+
+
+class Command(BaseCommand):
+    help = "Reproduce trazas de chat contra el código actual y compara latencias y resultados."
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="Archivo JSONL de trazas (RAG_TRAZAS_ARCHIVO).")
+        parser.add_argument("--limite", type=int, help="Reproducir solo las primeras N trazas.")
+        parser.add_argument("--stub", choices=["llm", "todo"], help="Usar un Ollama falso para el LLM o para todo.")
+        parser.add_argument("--latencia-token", type=float, default=0.0, help="ms por token generado en el stub.")
+        parser.add_argument("--umbral-regresion", type=float, default=1.5,
+                            help="Marca las trazas cuyo total reproducido supera N veces el original.")
+        parser.add_argument("--salida", help="Archivo JSON con la comparación por traza.")
+
+    def handle(self, *args, **options):
+        if options["verbosity"] < 2:
+            logging.getLogger("chatbot").setLevel(logging.WARNING)
+        if not Path(options["archivo"]).exists():
+            raise CommandError(f"No existe {options['archivo']}.")
+        originales = trazas.leer(options["archivo"])[:options["limite"]]
+        if not originales:
+            raise CommandError("El archivo no tiene trazas.")
+
+        with ExitStack() as pila:
+            tmp = pila.enter_context(tempfile.TemporaryDirectory(prefix="reproducir_trazas_"))
+            destino = Path(tmp) / "reproduccion.jsonl"
+            ajustes = {"RAG_TRAZAS_ARCHIVO": str(destino)}
+            if options["stub"]:
+                from chatbot.bench.stub_ollama import StubOllama
+
+                stub = pila.enter_context(StubOllama(latencia_token_ms=options["latencia_token"]))
+                ajustes.update(OLLAMA_BACKENDS_INTENCION=[stub.url], OLLAMA_BACKENDS_GENERACION=[stub.url])
+                if options["stub"] == "todo":
+                    ajustes["OLLAMA_BACKENDS_EMBEDDINGS"] = [stub.url]
+            pila.enter_context(override_settings(**ajustes))
+
+            cliente = Client(HTTP_HOST="localhost")
+            for original in originales:
+                cuerpo = {
+                    "message": original.get("mensaje", ""),
+                    "session_data": _sesion_con_categorias(original.get("categorias")),
+                }
+                if original.get("session_id"):
+                    # Prefijo propio: no mezclar con la memoria de la sesión original si sigue viva
+                    cuerpo["session_id"] = f"rep-{original['session_id']}"[:64]
+                respuesta = cliente.post(URL_CHAT, cuerpo, content_type="application/json")
+                b"".join(respuesta.streaming_content)  # consumir el stream completo
+            nuevas = trazas.leer(destino)
+
+        if len(nuevas) != len(originales):
+            raise CommandError(f"Se reprodujeron {len(nuevas)} de {len(originales)} trazas.")
+        comparaciones = [comparar(o, n) for o, n in zip(originales, nuevas)]
+        self._reportar(comparaciones, options["umbral_regresion"])
+        if options["salida"]:
+            Path(options["salida"]).write_text(json.dumps(comparaciones, indent=2, ensure_ascii=False), encoding="utf-8")
+            self.stdout.write(f"Comparación escrita en {options['salida']}")
+
+    def _reportar(self, comparaciones, umbral):
+        antes = resumen_latencias([c["total_ms"][0] for c in comparaciones if c["total_ms"][0] is not None])
+        despues = resumen_latencias([c["total_ms"][1] for c in comparaciones if c["total_ms"][1] is not None])
+        self.stdout.write(f"Trazas: {len(comparaciones)}")
+        self.stdout.write(f"  original:    p50={antes['p50_ms']}ms p95={antes['p95_ms']}ms")
+        self.stdout.write(f"  reproducida: p50={despues['p50_ms']}ms p95={despues['p95_ms']}ms")
+
+        etapas = {}
+        for c in comparaciones:
+            for etapa, (a, b) in c["etapas_ms"].items():
+                par = etapas.setdefault(etapa, ([], []))
+                if a is not None:
+                    par[0].append(a)
+                if b is not None:
+                    par[1].append(b)
+        for etapa, (a, b) in etapas.items():
+            self.stdout.write(
+                f"  {etapa:<14} p50 {resumen_latencias(a)['p50_ms']}ms → {resumen_latencias(b)['p50_ms']}ms"
+            )
+
+        tipos = sum(1 for c in comparaciones if c["tipo"][0] != c["tipo"][1])
+        queries = sum(1 for c in comparaciones if c["search_query"][0] != c["search_query"][1])
+        top1 = sum(1 for c in comparaciones if not c["top1_igual"])
+        jaccard = sum(c["chunks_jaccard"] for c in comparaciones) / len(comparaciones)
+        self.stdout.write(
+            f"  resultados: tipo distinto={tipos} search_query distinta={queries} "
+            f"top1 distinto={top1} jaccard chunks medio={jaccard:.2f}"
+        )
+        for c in comparaciones:
+            a, b = c["total_ms"]
+            if a and b and b > a * umbral:
+                self.stdout.write(self.style.WARNING(f"  ⚠️ {a:.0f}ms → {b:.0f}ms: {c['mensaje'][:80]!r}"))
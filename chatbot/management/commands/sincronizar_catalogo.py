@@ -0,0 +1,33 @@
+"""
+Reconcilia el catálogo de documentos (DocumentoIndexado) con `documentos_unemi/`.
+
+Necesario una vez tras migrar (documentos subidos antes del catálogo) o si se copian
+archivos a mano. Solo se rehashean archivos nuevos o con tamaño distinto.
+
+Uso:
+    python manage.py sincronizar_catalogo
+"""
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chatbot import catalogo
+
+
+class Command(BaseCommand):
+    help = "Sincroniza el catálogo de documentos con el directorio de documentos y el índice FAISS."
+
+    def handle(self, *args, **options):
+        from chatbot.rag_service import hash_archivo, rag_service
+
+        base_dir = Path(settings.DOCUMENTOS_DIR)
+        if not base_dir.exists():
+            self.stdout.write(f"No existe {base_dir}; nada que sincronizar.")
+            return
+
+        cambios = catalogo.sincronizar(base_dir, rag_service, hash_archivo)
+        self.stdout.write(
+            f"Catálogo sincronizado: {cambios['nuevos']} nuevos, "
+            f"{cambios['actualizados']} actualizados, {cambios['eliminados']} eliminados."
+        )
@@ -0,0 +1,211 @@
+"""
+Métricas en memoria del proceso: contadores, histogramas de latencia y trazas por request.
+Thread-safe: los usan a la vez el hilo del request y el stream de respuesta.
+
+Se exponen en formato de texto de Prometheus en /api/chatbot/metrics/.
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Buckets de latencia en segundos (de FAISS en ms a generación en CPU de decenas de s)
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+DESCRIPCIONES = {
+    "chatbot_etapa_duracion_segundos": ("histogram", "Duración de cada etapa del pipeline de chat."),
+    "chatbot_llm_llamadas_total": ("counter", "Llamadas estructuradas al LLM por etapa."),
+    "chatbot_llm_tokens_generados_total": ("counter", "Tokens generados por el LLM por etapa."),
+    "chatbot_llm_tokens_prompt_total": ("counter", "Tokens de prompt evaluados por Ollama por etapa."),
+    "chatbot_llm_cortes_tempranos_total": ("counter", "Streams cortados al cerrarse el objeto JSON."),
+    "chatbot_llm_json_fallos_total": ("counter", "Respuestas del LLM que no se pudieron parsear como JSON."),
+    "chatbot_llm_escalamientos_total": ("counter", "Llamadas repetidas con el nivel de generación por etapa y motivo."),
+    "chatbot_busqueda_consultas_total": ("counter", "Búsquedas vectoriales por número de rondas del k adaptativo."),
+    "chatbot_busqueda_k_total": ("counter", "Suma del k final por búsqueda (k medio = este total / búsquedas)."),
+    "chatbot_compuerta_total": ("counter", "Decisiones de la compuerta de confianza (omitir = generación evitada)."),
+    "chatbot_chat_requests_total": ("counter", "Requests de chat por tipo de respuesta final."),
+    "chatbot_ingesta_archivos_total": ("counter", "Archivos procesados por la ingesta en segundo plano."),
+    "chatbot_ingesta_chunks_total": ("counter", "Chunks embebidos y agregados al índice."),
+    "chatbot_dedup_lineas_total": ("counter", "Líneas de encabezado/pie repetidas quitadas antes de partir en chunks."),
+    "chatbot_dedup_chunks_total": ("counter", "Chunks casi duplicados descartados antes de embeber."),
+    "chatbot_dedup_bytes_ahorrados_total": ("counter", "Bytes de índice (vector + texto) no escritos por la deduplicación."),
+    "chatbot_ingesta_trabajo_duracion_segundos": ("histogram", "Duración de cada trabajo de ingesta."),
+    "chatbot_ollama_http_requests_total": ("counter", "Requests HTTP a Ollama por ruta y código (error = sin respuesta)."),
+    "chatbot_ollama_http_reintentos_total": ("counter", "Reintentos con backoff de requests a Ollama."),
+    "chatbot_ollama_pool_conexiones": ("gauge", "Conexiones del pool HTTP compartido con Ollama por estado."),
+    "chatbot_ollama_health_cache_total": ("counter", "Health checks respondidos desde caché o consultando a Ollama."),
+    "chatbot_ollama_backend_requests_total": ("counter", "Requests por instancia de Ollama y rol (ok/error)."),
+    "chatbot_ollama_backend_duracion_segundos": ("histogram", "Duración de las requests exitosas por instancia de Ollama y rol."),
+    "chatbot_ollama_backend_en_curso": ("gauge", "Requests en curso por instancia de Ollama."),
+    "chatbot_ollama_backend_eyectado": ("gauge", "1 si la instancia de Ollama está fuera del balanceo."),
+    "chatbot_respuestas_precalculadas_total": ("counter", "Respuestas servidas desde el almacén precalculado."),
+    "chatbot_memoria_sesion_total": ("counter", "Turnos resueltos con la memoria de sesión (seguimiento/aclaración)."),
+}
+
+_lock = threading.Lock()
+_contadores = {}
+_histogramas = {}
+_recolectores = []  # funciones que devuelven [(nombre, etiquetas, valor)] al exponer (gauges)
+
+
+def _clave(nombre: str, etiquetas: dict) -> tuple:
+    return nombre, tuple(sorted(etiquetas.items()))
+
+
+def incrementar(nombre: str, valor: float = 1, **etiquetas):
+    """Suma `valor` al contador `nombre` con las etiquetas dadas."""
+    clave = _clave(nombre, etiquetas)
+    with _lock:
+        _contadores[clave] = _contadores.get(clave, 0) + valor
+
+
+def obtener(nombre: str, **etiquetas) -> float:
+    with _lock:
+        return _contadores.get(_clave(nombre, etiquetas), 0)
+
+
+def observar(nombre: str, valor: float, **etiquetas):
+    """Registra una observación en el histograma `nombre`."""
+    clave = _clave(nombre, etiquetas)
+    with _lock:
+        h = _histogramas.get(clave)
+        if h is None:
+            h = _histogramas[clave] = {"buckets": [0] * len(BUCKETS_SEGUNDOS), "suma": 0.0, "cuenta": 0}
+        for i, limite in enumerate(BUCKETS_SEGUNDOS):
+            if valor <= limite:
+                h["buckets"][i] += 1
+        h["suma"] += valor
+        h["cuenta"] += 1
+
+
+def registrar_recolector(funcion):
+    """Registra una función que se evalúa en cada exposición y devuelve gauges [(nombre, {etiquetas}, valor)]."""
+    with _lock:
+        _recolectores.append(funcion)
+
+
+def instantanea() -> dict:
+    """Copia de todos los contadores: {(nombre, ((etiqueta, valor), ...)): total}."""
+    with _lock:
+        return dict(_contadores)
+
+
+# --- TRAZA POR REQUEST ---
+_traza_actual = contextvars.ContextVar("chatbot_traza", default=None)
+
+
+class Traza:
+    """Spans y anotaciones de un request de chat."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.spans = []  # [(etapa, ms)]
+        self.datos = {}
+
+    def agregar_span(self, etapa: str, segundos: float):
+        self.spans.append((etapa, round(segundos * 1000, 2)))
+
+    def anotar(self, etapa: str, **datos):
+        self.datos.setdefault(etapa, {}).update(datos)
+
+    def resumen(self) -> dict:
+        total_ms = round((time.perf_counter() - self.inicio) * 1000, 2)
+        return {"total_ms": total_ms, "spans": self.spans, "datos": self.datos}
+
+
+@contextmanager
+def traza_request():
+    """Activa una Traza para el request en curso; medir() y anotar() la alimentan."""
+    traza = Traza()
+    token = _traza_actual.set(traza)
+    try:
+        yield traza
+    finally:
+        _traza_actual.reset(token)
+
+
+def traza_actual():
+    return _traza_actual.get()
+
+
+def anotar(etapa: str, **datos):
+    """Agrega datos (tokens, tamaños) a la traza activa, si la hay."""
+    traza = _traza_actual.get()
+    if traza is not None:
+        traza.anotar(etapa, **datos)
+
+
+@contextmanager
+def medir(etapa: str):
+    """Mide la duración de una etapa: histograma global + span en la traza activa."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        segundos = time.perf_counter() - inicio
+        observar("chatbot_etapa_duracion_segundos", segundos, etapa=etapa)
+        traza = _traza_actual.get()
+        if traza is not None:
+            traza.agregar_span(etapa, segundos)
+
+
+# --- EXPOSICIÓN PROMETHEUS ---
+def _etiquetas_texto(etiquetas) -> str:
+    if not etiquetas:
+        return ""
+    partes = []
+    for k, v in etiquetas:
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        partes.append(f'{k}="{v}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def _encabezado(lineas, nombre, tipo_defecto, vistos):
+    if nombre in vistos:
+        return
+    vistos.add(nombre)
+    tipo, ayuda = DESCRIPCIONES.get(nombre, (tipo_defecto, ""))
+    if ayuda:
+        lineas.append(f"# HELP {nombre} {ayuda}")
+    lineas.append(f"# TYPE {nombre} {tipo}")
+
+
+def render_prometheus() -> str:
+    """Todas las métricas en formato de exposición de texto de Prometheus 0.0.4."""
+    with _lock:
+        contadores = sorted(_contadores.items())
+        histogramas = sorted(
+            (clave, {"buckets": list(h["buckets"]), "suma": h["suma"], "cuenta": h["cuenta"]})
+            for clave, h in _histogramas.items()
+        )
+        recolectores = list(_recolectores)
+
+    lineas = []
+    vistos = set()
+    for recolector in recolectores:
+        try:
+            medidas = recolector()
+        except Exception as e:
+            logger.warning(f"⚠️ Recolector de métricas falló: {e}")
+            continue
+        # Agrupadas por nombre: Prometheus exige las muestras de una métrica contiguas
+        for nombre, etiquetas, valor in sorted(medidas, key=lambda m: m[0]):
+            _encabezado(lineas, nombre, "gauge", vistos)
+            lineas.append(f"{nombre}{_etiquetas_texto(tuple(sorted(etiquetas.items())))} {valor}")
+
+    for (nombre, etiquetas), valor in contadores:
+        _encabezado(lineas, nombre, "counter", vistos)
+        lineas.append(f"{nombre}{_etiquetas_texto(etiquetas)} {valor}")
+
+    for (nombre, etiquetas), h in histogramas:
+        _encabezado(lineas, nombre, "histogram", vistos)
+        for limite, cuenta in zip(BUCKETS_SEGUNDOS, h["buckets"]):
+            lineas.append(f"{nombre}_bucket{_etiquetas_texto(etiquetas + (('le', limite),))} {cuenta}")
+        lineas.append(f"{nombre}_bucket{_etiquetas_texto(etiquetas + (('le', '+Inf'),))} {h['cuenta']}")
+        lineas.append(f"{nombre}_sum{_etiquetas_texto(etiquetas)} {round(h['suma'], 6)}")
+        lineas.append(f"{nombre}_count{_etiquetas_texto(etiquetas)} {h['cuenta']}")
+
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoIndexado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('categoria', models.CharField(max_length=100)),
+                ('nombre', models.CharField(max_length=255)),
+                ('tamano_bytes', models.BigIntegerField(default=0)),
+                ('sha256', models.CharField(max_length=64)),
+                ('sha256_indexado', models.CharField(blank=True, max_length=64, null=True)),
+                ('chunks', models.PositiveIntegerField(default=0)),
+                ('ingestado_en', models.DateTimeField(blank=True, null=True)),
+                ('generacion', models.PositiveIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['categoria', 'nombre'],
+                'indexes': [models.Index(fields=['sha256'], name='chatbot_doc_sha256_368344_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='documentoindexado',
+            constraint=models.UniqueConstraint(fields=('categoria', 'nombre'), name='documento_unico_por_categoria'),
+        ),
+    ]
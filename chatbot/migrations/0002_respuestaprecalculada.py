@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RespuestaPrecalculada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pregunta', models.TextField()),
+                ('categorias', models.CharField(max_length=500)),
+                ('rol', models.CharField(default='Visitante', max_length=200)),
+                ('accion', models.CharField(blank=True, default='', max_length=200)),
+                ('objeto', models.CharField(blank=True, default='', max_length=200)),
+                ('search_query', models.TextField(blank=True, default='')),
+                ('respuesta', models.JSONField()),
+                ('filas_candidatas', models.JSONField(default=list)),
+                ('embedding', models.BinaryField()),
+                ('generacion', models.PositiveIntegerField()),
+                ('creado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['categorias', 'pregunta'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='respuestaprecalculada',
+            constraint=models.UniqueConstraint(fields=('pregunta', 'categorias'), name='respuesta_unica_por_categorias'),
+        ),
+    ]
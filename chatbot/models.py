@@ -1,3 +1,68 @@
 from django.db import models
 
-# Create your models here.
+
+class DocumentoIndexado(models.Model):
+    """
+    Catálogo de documentos subidos: lo mantiene la ingesta y lo lee
+    DocumentUploadView.get sin recorrer `documentos_unemi/` en cada request.
+    """
+    categoria = models.CharField(max_length=100)
+    nombre = models.CharField(max_length=255)
+    tamano_bytes = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64)  # contenido actual en disco
+    sha256_indexado = models.CharField(max_length=64, null=True, blank=True)  # contenido en FAISS
+    chunks = models.PositiveIntegerField(default=0)
+    ingestado_en = models.DateTimeField(null=True, blank=True)
+    generacion = models.PositiveIntegerField(null=True, blank=True)  # generación del índice que lo contiene
+    error = models.TextField(blank=True, default="")
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["categoria", "nombre"]
+        constraints = [
+            models.UniqueConstraint(fields=["categoria", "nombre"], name="documento_unico_por_categoria"),
+        ]
+        indexes = [models.Index(fields=["sha256"])]
+
+    def __str__(self):
+        return f"{self.categoria}/{self.nombre}"
+
+    def estado(self, generacion_actual: int) -> str:
+        """pendiente | indexado | desactualizado | error"""
+        if self.sha256_indexado is None:
+            return "error" if self.error else "pendiente"
+        if self.sha256_indexado != self.sha256:
+            # Reemplazado en disco: el índice aún tiene la versión anterior
+            return "error" if self.error else "desactualizado"
+        if self.generacion is None or self.generacion > generacion_actual:
+            # El índice en disco es anterior a esta ingesta (se restauró o se perdió)
+            return "desactualizado"
+        return "indexado"
+
+
+class RespuestaPrecalculada(models.Model):
+    """
+    Respuesta RAG calculada offline (precalcular_respuestas) para una pregunta frecuente
+    y un conjunto de carpetas permitidas. Solo se sirve mientras el índice siga en la
+    misma generación con la que se calculó.
+    """
+    pregunta = models.TextField()
+    categorias = models.CharField(max_length=500)  # carpetas permitidas, ordenadas y separadas por coma
+    rol = models.CharField(max_length=200, default="Visitante")
+    accion = models.CharField(max_length=200, blank=True, default="")  # del intent_parser, normalizada
+    objeto = models.CharField(max_length=200, blank=True, default="")
+    search_query = models.TextField(blank=True, default="")
+    respuesta = models.JSONField()  # {"response", "sources", "need_contact"}
+    filas_candidatas = models.JSONField(default=list)  # para seguimientos en la misma sesión
+    embedding = models.BinaryField()  # float32 normalizado de la pregunta
+    generacion = models.PositiveIntegerField()
+    creado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["categorias", "pregunta"]
+        constraints = [
+            models.UniqueConstraint(fields=["pregunta", "categorias"], name="respuesta_unica_por_categorias"),
+        ]
+
+    def __str__(self):
+        return f"[{self.categorias}] {self.pregunta[:60]}"
@@ -0,0 +1,80 @@
+"""
+Niveles de modelo por etapa del pipeline (intención, reformulación, generación).
+
+Clasificar la intención y reformular la consulta son tareas cortas y estructuradas: pueden
+ir a un modelo pequeño y rápido (OLLAMA_MODELO_INTENCION / _REFORMULACION) en el pool de
+backends de intención, mientras la respuesta RAG usa el modelo mayor (OLLAMA_MODELO_GENERACION).
+Cada etapa tiene su propio num_ctx y num_thread; num_predict lo fija el esquema JSON de la
+etapa (ver llm_json.num_predict_para_esquema).
+
+Escalamiento: si el modelo pequeño devuelve JSON inválido o una salida de baja confianza
+(según el validador de la etapa), la misma llamada se repite una vez con el nivel de
+generación. Solo se escala cuando ese nivel es realmente distinto (otro modelo o contexto):
+repetir el mismo modelo a temperatura 0 daría la misma salida.
+"""
+import logging
+
+from django.conf import settings
+from langchain_ollama import ChatOllama
+
+from . import metrics, ollama_cliente
+from .llm_json import invocar_json
+
+logger = logging.getLogger(__name__)
+
+# Etapa → rol de backends en ollama_cliente (la reformulación comparte el pool del modelo pequeño)
+ROL_ETAPA = {"intencion": "intencion", "reformulacion": "intencion", "generacion": "generacion"}
+
+
+def config_etapa(etapa: str) -> dict:
+    sufijo = etapa.upper()
+    return {
+        "modelo": getattr(settings, f"OLLAMA_MODELO_{sufijo}"),
+        "num_ctx": getattr(settings, f"OLLAMA_NUM_CTX_{sufijo}"),
+        "num_thread": getattr(settings, f"OLLAMA_NUM_THREAD_{sufijo}"),
+    }
+
+
+def crear(etapa: str) -> ChatOllama:
+    """LLM de la etapa según la configuración actual de settings."""
+    config = config_etapa(etapa)
+    return ChatOllama(
+        model=config["modelo"],
+        format="json",
+        temperature=0,
+        keep_alive="1h",
+        base_url=settings.OLLAMA_BASE_URL,
+        num_ctx=config["num_ctx"],
+        num_thread=config["num_thread"],
+        **ollama_cliente.kwargs_cliente(ROL_ETAPA[etapa], settings.OLLAMA_TIMEOUT_LLM_S),
+    )
+
+
+def crear_escalado(etapa: str):
+    """LLM al que escala la etapa (nivel de generación), o None si no hay un nivel mayor distinto."""
+    if not settings.OLLAMA_ESCALAMIENTO or etapa == "generacion":
+        return None
+    propia, mayor = config_etapa(etapa), config_etapa("generacion")
+    if (propia["modelo"], propia["num_ctx"]) == (mayor["modelo"], mayor["num_ctx"]):
+        return None
+    return crear("generacion")
+
+
+def invocar_escalando(llm, llm_escalado, mensajes, esquema: dict, etapa: str, validar=None):
+    """
+    invocar_json con el LLM de la etapa; si la salida es inválida o `validar(datos)` devuelve
+    un motivo (str) de baja confianza, repite una vez con `llm_escalado` (si lo hay).
+    """
+    resultado = invocar_json(llm, mensajes, esquema, etapa=etapa)
+    if llm_escalado is None:
+        return resultado
+    motivo = "json_invalido" if resultado.datos is None else (validar(resultado.datos) if validar else None)
+    if motivo is None:
+        return resultado
+
+    logger.debug(f"⬆️ [ESCALAMIENTO] {etapa}: {motivo}; se repite con {llm_escalado.model}.")
+    metrics.incrementar("chatbot_llm_escalamientos_total", etapa=etapa, motivo=motivo)
+    metrics.anotar(etapa, escalado=motivo)
+    escalado = invocar_json(llm_escalado, mensajes, esquema, etapa=etapa)
+    # Si el nivel mayor tampoco produce JSON válido se conserva la primera salida
+    return escalado if escalado.datos is not None else resultado
@@ -0,0 +1,331 @@
+"""
+Capa HTTP compartida con Ollama, con balanceo entre varias instancias.
+
+Todos los clientes (ChatOllama del intent_parser y del RAG, OllamaEmbeddings y el
+health check) usan un único pool de conexiones keep-alive (httpx). Cada cliente tiene
+un rol y su transporte elige, request a request, a qué instancia de Ollama enviarlo:
+
+  - intencion   → OLLAMA_BACKENDS_INTENCION   (clasificación y reformulación, p. ej. un modelo pequeño)
+  - generacion  → OLLAMA_BACKENDS_GENERACION  (respuesta RAG y escalamientos, ver niveles_llm.py)
+  - embeddings  → OLLAMA_BACKENDS_EMBEDDINGS  (p. ej. un host dedicado)
+
+Sin backends configurados para un rol se usa OLLAMA_BASE_URL. Entre los backends del
+rol gana el que tiene menos requests en curso (un Ollama en CPU atiende de a una).
+Tras OLLAMA_EYECCION_FALLOS fallos seguidos un backend queda fuera OLLAMA_EYECCION_S
+segundos; el health check también eyecta o readmite. Los errores de conexión y los
+502/503/504 se reintentan con backoff exponencial en otro backend si lo hay.
+
+El health check se cachea OLLAMA_HEALTH_CACHE_S segundos para que los sondeos
+frecuentes (frontend, balanceador) no golpeen a Ollama en cada request.
+"""
+import logging
+import threading
+import time
+
+import httpx
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+ROLES = ("intencion", "generacion", "embeddings")
+CODIGOS_REINTENTABLES = {502, 503, 504}
+# Fallos antes de recibir respuesta: reintentar no duplica trabajo en Ollama
+ERRORES_REINTENTABLES = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+
+_lock = threading.Lock()
+_http = None  # httpx.HTTPTransport compartido (un pool para todos los hosts)
+_transportes = {}  # rol → TransporteOllama
+_backends = {}  # url → Backend (compartido entre roles: es la misma máquina)
+_salud = None  # (clave de configuración, expira, resultado)
+
+
+def urls_rol(rol: str) -> list:
+    return list(getattr(settings, f"OLLAMA_BACKENDS_{rol.upper()}")) or [settings.OLLAMA_BASE_URL]
+
+
+def modelos_rol(rol: str) -> tuple:
+    """Modelos que deben estar en los backends del rol (la reformulación va al pool de intención)."""
+    if rol == "intencion":
+        return tuple(sorted({settings.OLLAMA_MODELO_INTENCION, settings.OLLAMA_MODELO_REFORMULACION}))
+    return (getattr(settings, f"OLLAMA_MODELO_{rol.upper()}"),)
+
+
+class Backend:
+    """Una instancia de Ollama: requests en curso, fallos seguidos y latencias."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.destino = httpx.URL(self.url)
+        self.en_curso = 0
+        self.fallos_seguidos = 0
+        self.eyectado_hasta = 0.0
+        self.requests = 0
+        self.errores = 0
+        self.segundos = 0.0
+
+    @property
+    def eyectado(self) -> bool:
+        return time.monotonic() < self.eyectado_hasta
+
+    def resumen(self) -> dict:
+        return {
+            "url": self.url,
+            "en_curso": self.en_curso,
+            "requests": self.requests,
+            "errores": self.errores,
+            "latencia_promedio_ms": round(self.segundos / self.requests * 1000, 1) if self.requests else None,
+            "eyectado": self.eyectado,
+        }
+
+
+def _backend(url: str) -> Backend:
+    url = url.rstrip("/")
+    if url not in _backends:
+        _backends[url] = Backend(url)
+    return _backends[url]
+
+
+def elegir(rol: str, excluir=()) -> Backend:
+    """Backend del rol con menos requests en curso (sin eyectados); lo marca como ocupado."""
+    with _lock:
+        candidatos = [_backend(u) for u in urls_rol(rol)]
+        restantes = [b for b in candidatos if b.url not in excluir] or candidatos
+        sanos = [b for b in restantes if not b.eyectado]
+        if not sanos:
+            # Todos eyectados: se prueba el que vuelve antes en lugar de fallar sin intentar
+            sanos = [min(restantes, key=lambda b: b.eyectado_hasta)]
+        elegido = min(sanos, key=lambda b: (b.en_curso, b.requests))
+        elegido.en_curso += 1
+        return elegido
+
+
+def _eyectar(backend: Backend, motivo: str):
+    backend.eyectado_hasta = time.monotonic() + settings.OLLAMA_EYECCION_S
+    logger.warning(f"⛔ Backend Ollama {backend.url} eyectado {settings.OLLAMA_EYECCION_S}s ({motivo}).")
+
+
+def liberar(backend: Backend, rol: str, exito: bool, segundos: float):
+    with _lock:
+        backend.en_curso -= 1
+        if exito:
+            backend.fallos_seguidos = 0
+            backend.requests += 1
+            backend.segundos += segundos
+        else:
+            backend.errores += 1
+            backend.fallos_seguidos += 1
+            if backend.fallos_seguidos >= settings.OLLAMA_EYECCION_FALLOS and not backend.eyectado:
+                _eyectar(backend, f"{backend.fallos_seguidos} fallos seguidos")
+    metrics.incrementar("chatbot_ollama_backend_requests_total", backend=backend.url, rol=rol,
+                        resultado="ok" if exito else "error")
+    if exito:
+        metrics.observar("chatbot_ollama_backend_duracion_segundos", segundos, backend=backend.url, rol=rol)
+
+
+class _StreamContado(httpx.SyncByteStream):
+    """Mantiene el backend como ocupado hasta que se cierra la respuesta (streams de generación)."""
+
+    def __init__(self, stream, al_cerrar):
+        self._stream = stream
+        self._al_cerrar = al_cerrar
+        self._cerrado = False
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        if self._cerrado:
+            return
+        self._cerrado = True
+        try:
+            self._stream.close()
+        finally:
+            self._al_cerrar()
+
+
+class TransporteOllama(httpx.BaseTransport):
+    """Transporte de un rol: balanceo entre sus backends + reintentos con backoff y métricas por ruta."""
+
+    def __init__(self, rol: str, http: httpx.HTTPTransport, reintentos: int, backoff_s: float):
+        self.rol = rol
+        self.reintentos = reintentos
+        self.backoff_s = backoff_s
+        self._http = http
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        ruta = request.url.path
+        probados = []
+        for intento in range(self.reintentos + 1):
+            ultimo = intento == self.reintentos
+            backend = elegir(self.rol, excluir=probados)
+            probados.append(backend.url)
+            request.url = request.url.copy_with(
+                scheme=backend.destino.scheme, host=backend.destino.host, port=backend.destino.port
+            )
+            request.headers["Host"] = backend.destino.netloc.decode("ascii")
+            inicio = time.perf_counter()
+            try:
+                respuesta = self._http.handle_request(request)
+            except ERRORES_REINTENTABLES as e:
+                liberar(backend, self.rol, False, 0.0)
+                if ultimo:
+                    metrics.incrementar("chatbot_ollama_http_requests_total", ruta=ruta, codigo="error")
+                    raise
+                logger.warning(f"⚠️ Ollama {backend.url}{ruta}: {type(e).__name__}; reintento {intento + 1}/{self.reintentos}")
+            else:
+                if respuesta.status_code not in CODIGOS_REINTENTABLES or ultimo:
+                    metrics.incrementar("chatbot_ollama_http_requests_total", ruta=ruta, codigo=respuesta.status_code)
+                    exito = respuesta.status_code < 500
+                    respuesta.stream = _StreamContado(
+                        respuesta.stream,
+                        lambda: liberar(backend, self.rol, exito, time.perf_counter() - inicio),
+                    )
+                    return respuesta
+                respuesta.close()
+                liberar(backend, self.rol, False, 0.0)
+                logger.warning(f"⚠️ Ollama {backend.url}{ruta}: HTTP {respuesta.status_code}; reintento {intento + 1}/{self.reintentos}")
+            metrics.incrementar("chatbot_ollama_http_reintentos_total", ruta=ruta)
+            time.sleep(self.backoff_s * 2 ** intento)
+
+    def close(self):
+        # El pool es compartido entre roles y clientes: se cierra solo al terminar el proceso
+        pass
+
+
+def _pool_http() -> httpx.HTTPTransport:
+    global _http
+    if _http is None:
+        _http = httpx.HTTPTransport(limits=httpx.Limits(
+            max_connections=settings.OLLAMA_POOL_MAX_CONEXIONES,
+            max_keepalive_connections=settings.OLLAMA_POOL_MAX_CONEXIONES,
+            keepalive_expiry=settings.OLLAMA_KEEPALIVE_S,
+        ))
+        metrics.registrar_recolector(_medidas)
+    return _http
+
+
+def transporte(rol: str) -> TransporteOllama:
+    with _lock:
+        if rol not in _transportes:
+            _transportes[rol] = TransporteOllama(
+                rol, _pool_http(),
+                reintentos=settings.OLLAMA_REINTENTOS,
+                backoff_s=settings.OLLAMA_REINTENTO_BACKOFF_S,
+            )
+        return _transportes[rol]
+
+
+def _conexiones_pool():
+    """
+    (activas, ociosas) del pool httpcore, o None si la versión instalada no lo expone: httpx no
+    publica el estado del pool, así que el gauge se omite en lugar de romper /metrics.
+    """
+    conexiones = getattr(getattr(_http, "_pool", None), "connections", None)
+    if conexiones is None:
+        return None
+    try:
+        ociosas = sum(1 for c in list(conexiones) if c.is_idle())
+    except (AttributeError, TypeError):
+        return None
+    return len(conexiones) - ociosas, ociosas
+
+
+def _medidas():
+    medidas = []
+    conexiones = _conexiones_pool()
+    if conexiones is not None:
+        activas, ociosas = conexiones
+        medidas.append(("chatbot_ollama_pool_conexiones", {"estado": "activas"}, activas))
+        medidas.append(("chatbot_ollama_pool_conexiones", {"estado": "ociosas"}, ociosas))
+    with _lock:
+        for backend in _backends.values():
+            medidas.append(("chatbot_ollama_backend_en_curso", {"backend": backend.url}, backend.en_curso))
+            medidas.append(("chatbot_ollama_backend_eyectado", {"backend": backend.url}, int(backend.eyectado)))
+    return medidas
+
+
+def timeout(lectura_s: float) -> httpx.Timeout:
+    return httpx.Timeout(lectura_s, connect=settings.OLLAMA_TIMEOUT_CONEXION_S)
+
+
+def kwargs_cliente(rol: str, lectura_s: float) -> dict:
+    """Argumentos para ChatOllama/OllamaEmbeddings: transporte balanceado del rol y timeout propio."""
+    return {
+        "client_kwargs": {"timeout": timeout(lectura_s)},
+        # El transporte es síncrono: el cliente async de langchain_ollama no se usa
+        "sync_client_kwargs": {"transport": transporte(rol)},
+    }
+
+
+# --- HEALTH CHECK CACHEADO ---
+def _sondear(url: str) -> dict:
+    """GET /api/tags directo a un backend (sin balanceo ni reintentos)."""
+    try:
+        # Sin `with`: cerrar el cliente cerraría también el pool compartido
+        with _lock:
+            http = _pool_http()
+        cliente = httpx.Client(base_url=url, transport=http, timeout=timeout(settings.OLLAMA_TIMEOUT_HEALTH_S))
+        respuesta = cliente.get("/api/tags")
+        if respuesta.status_code != 200:
+            return {"ok": False, "codigo": respuesta.status_code, "modelos": [],
+                    "error": f"Ollama respondió con código {respuesta.status_code}"}
+        return {"ok": True, "codigo": 200, "modelos": [m.get("name") for m in respuesta.json().get("models", [])],
+                "error": None}
+    except httpx.ConnectError:
+        return {"ok": False, "codigo": None, "modelos": [], "error": "No se pudo conectar con Ollama"}
+    except Exception as e:
+        return {"ok": False, "codigo": None, "modelos": [], "error": str(e)}
+
+
+def salud() -> dict:
+    """
+    Estado de los backends de Ollama, cacheado OLLAMA_HEALTH_CACHE_S segundos.
+    {"ok", "codigo", "modelos", "modelos_disponibles", "error", "backends"}: ok si cada rol
+    tiene al menos un backend que responde; modelos_disponibles si además tiene su modelo.
+    Los backends que no responden se eyectan y los que vuelven a responder se readmiten.
+    """
+    global _salud
+    configuracion = tuple((rol, tuple(urls_rol(rol)), modelos_rol(rol)) for rol in ROLES)
+    with _lock:
+        if _salud is not None and _salud[0] == configuracion and time.monotonic() < _salud[1]:
+            metrics.incrementar("chatbot_ollama_health_cache_total", origen="cache")
+            return _salud[2]
+
+    metrics.incrementar("chatbot_ollama_health_cache_total", origen="ollama")
+    urls = list(dict.fromkeys(u.rstrip("/") for _, rol_urls, _ in configuracion for u in rol_urls))
+    sondeos = {url: _sondear(url) for url in urls}
+
+    with _lock:
+        for url, sondeo in sondeos.items():
+            backend = _backend(url)
+            if sondeo["ok"]:
+                backend.eyectado_hasta = 0.0
+                backend.fallos_seguidos = 0
+            elif not backend.eyectado:
+                _eyectar(backend, sondeo["error"])
+        backends = [{**_backend(url).resumen(), "ok": sondeos[url]["ok"], "modelos": sondeos[url]["modelos"]}
+                    for url in urls]
+
+    ok, modelos_disponibles = True, True
+    for rol, rol_urls, modelos in configuracion:
+        sanos = [sondeos[u.rstrip("/")] for u in rol_urls if sondeos[u.rstrip("/")]["ok"]]
+        ok = ok and bool(sanos)
+        modelos_disponibles = modelos_disponibles and all(
+            any(modelo in (m or "") for s in sanos for m in s["modelos"]) for modelo in modelos
+        )
+
+    errores = [s["error"] for s in sondeos.values() if s["error"]]
+    resultado = {
+        "ok": ok,
+        # None si ningún backend respondió (la vista devuelve 503)
+        "codigo": next((s["codigo"] for s in sondeos.values() if s["codigo"] is not None), None),
+        "modelos": sorted({m for s in sondeos.values() for m in s["modelos"]}),
+        "modelos_disponibles": modelos_disponibles,
+        "error": None if ok else (errores[0] if errores else "Sin backends disponibles"),
+        "backends": backends,
+    }
+    with _lock:
+        _salud = (configuracion, time.monotonic() + settings.OLLAMA_HEALTH_CACHE_S, resultado)
+    return resultado
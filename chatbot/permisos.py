@@ -0,0 +1,95 @@
+"""
+Resolución de permisos (carpetas accesibles + rol) a partir del JSON de sesión.
+
+El JSON de perfiles (data_unemi.json) pesa decenas de KB por persona y antes viajaba y se
+parseaba en cada mensaje. POST /api/chatbot/session/ lo registra una vez y devuelve un
+`session_token` (digest del JSON completo) que el chat envía en lugar del blob.
+
+Cuando un cliente antiguo sigue enviando el blob, los perfiles se recorren directamente:
+leer las banderas de MAPA_ROLES cuesta unos pocos µs, mientras que memoizar por persona
+obligaba a serializar y hashear sus datos completos (~100 µs para 12 KB) en cada mensaje.
+
+Si el token no está en caché (expiró o se reinició el servidor) el chat responde
+`session_token_invalid` y el cliente vuelve a registrar su sesión.
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+ALIAS_CACHE = "permisos"
+PREFIJO_TOKEN = "permisos:token:"
+
+# Mapeo exacto de la base de datos a las carpetas del disco
+MAPA_ROLES = {
+    "es_estudiante": "estudiantes",
+    "es_profesor": "docentes",
+    "es_administrativo": "administrativos",
+    "es_externo": "externos",
+    "es_inscripcionaspirante": "aspirantes",
+    "es_inscripcionpostulante": "postulantes",
+    "es_postulante": "postulantes",
+    "es_postulanteempleo": "empleo",
+    "es_inscripcionadmision": "admision"
+}
+
+VISITANTE = (["general"], "Visitante")
+
+
+def digest(datos) -> str:
+    serializado = json.dumps(datos, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(serializado.encode("utf-8")).hexdigest()[:32]
+
+
+def _resolver_persona(datos: dict):
+    """(carpetas, roles) de los perfiles activos de una persona."""
+    categorias, roles = set(), set()
+    perfiles = datos.get("perfiles", []) if isinstance(datos, dict) else []
+    for perfil in perfiles:
+        # Verificamos que el perfil esté activo
+        if not isinstance(perfil, dict) or perfil.get("status") is not True:
+            continue
+        for flag_db, carpeta in MAPA_ROLES.items():
+            if perfil.get(flag_db) is True:
+                categorias.add(carpeta)
+                # Nombre legible para debug (ej: "Estudiante")
+                roles.add(flag_db.replace("es_", "").replace("inscripcion", "").capitalize())
+    return categorias, roles
+
+
+def resolver(session_data):
+    """
+    Carpetas permitidas y rol legible del JSON de sesión ({cedula: {"perfiles": [...]}}).
+    """
+    if not session_data or not isinstance(session_data, dict):
+        return VISITANTE
+
+    categorias, roles = {"general"}, set()  # general siempre accesible
+    for datos in session_data.values():
+        carpetas, nombres = _resolver_persona(datos)
+        categorias |= carpetas
+        roles |= nombres
+    return sorted(categorias), ", ".join(sorted(roles)) or "Visitante"
+
+
+def registrar(session_data) -> dict:
+    """Resuelve y guarda los permisos de la sesión; devuelve el token para los mensajes siguientes."""
+    categorias, rol = resolver(session_data)
+    token = digest(session_data or {})
+    caches[ALIAS_CACHE].set(PREFIJO_TOKEN + token, (categorias, rol), timeout=settings.RAG_PERMISOS_TTL_S)
+    return {"session_token": token, "categories": categorias, "role": rol}
+
+
+def por_token(token):
+    """(categorias, rol) de un token registrado, o None si no existe o expiró."""
+    if not isinstance(token, str) or len(token) != 32:
+        return None
+    cache = caches[ALIAS_CACHE]
+    permisos = cache.get(PREFIJO_TOKEN + token)
+    if permisos is not None:
+        cache.touch(PREFIJO_TOKEN + token, timeout=settings.RAG_PERMISOS_TTL_S)
+    return permisos
@@ -1,111 +1,152 @@
-import os
 import json
-import re
+import hashlib
 import logging
+import threading
 from pathlib import Path
+import numpy as np
 from django.conf import settings
-from langchain_ollama import ChatOllama, OllamaEmbeddings
-from langchain_community.vectorstores import FAISS
+from langchain_ollama import OllamaEmbeddings
 
+from . import almacen_chunks, compuerta, deduplicacion, indice_vectorial, metrics, niveles_llm, ollama_cliente
+from .candidatos import TablaCandidatos
+from .resumenes import TablaResumenes
 # Tu procesador actual
 from .document_processor import DocumentProcessor
+from .llm_json import ESQUEMA_RAG, ESQUEMA_REFORMULACION, invocar_json
 
 logger = logging.getLogger(__name__)
 
-FAISS_INDEX_PATH = os.path.join(settings.BASE_DIR, "faiss_index")
+
+def hash_archivo(file_path: str) -> str:
+    """sha256 del contenido, leído por bloques."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+def _motivo_reformulacion_dudosa(data: dict):
+    """Reformulación vacía o de una sola letra: se escala al nivel de generación."""
+    if len((data.get("search_query") or "").strip()) < 3:
+        return "search_query_vacia"
+    return None
+
 
 class LocalRAGService:
-    def __init__(self):
+    def __init__(self, index_path: str = None):
+        self.index_path = str(index_path or settings.FAISS_INDEX_PATH)
+
         # 1. Embeddings
         self.embeddings = OllamaEmbeddings(
-            model="nomic-embed-text", 
-            base_url=settings.OLLAMA_BASE_URL
+            model=settings.OLLAMA_MODELO_EMBEDDINGS,
+            base_url=settings.OLLAMA_BASE_URL,  # el transporte elige el backend del rol
+            **ollama_cliente.kwargs_cliente("embeddings", settings.OLLAMA_TIMEOUT_EMBEDDINGS_S),
         )
         
         self.vector_store = None
+        # Serializa escrituras al índice (ingesta en segundo plano) frente a las búsquedas
+        self._lock = threading.RLock()
+        # (sha256 del archivo, categoría) ya indexados: evita re-ingestar el mismo contenido
+        self._hashes = set()
+        # Categoría/fuente/dedup por fila del índice, para filtrar con NumPy
+        self.candidatos = TablaCandidatos()
+        # Centroides por documento/sección para el ruteo en dos etapas
+        self.resumenes = TablaResumenes(chunks_seccion=settings.RAG_RUTEO_CHUNKS_SECCION)
         self._cargar_indice()
 
-        # 2. LLM (Optimizado)
-        self.llm = ChatOllama(
-            model=settings.OLLAMA_MODEL,
-            format="json", 
-            temperature=0, 
-            base_url=settings.OLLAMA_BASE_URL,
-            keep_alive="1h",
-            num_ctx=3072,
-            num_thread=settings.OLLAMA_NUM_THREAD,
-        )
+        # 2. LLM por nivel (ver niveles_llm): la reformulación puede usar un modelo pequeño
+        # y escalar al de generación si su salida no sirve. Si dos etapas usan el mismo modelo
+        # con distinto num_ctx, Ollama lo recarga y se pierde la caché KV del prefijo.
+        self.llm = niveles_llm.crear("generacion")
+        self.llm_reformulacion = niveles_llm.crear("reformulacion")
+        self.llm_reformulacion_escalado = niveles_llm.crear_escalado("reformulacion")
         
+        # Los prompts se dividen en SISTEMA (estático, idéntico en cada llamada)
+        # y USUARIO (variable). Así Ollama reutiliza la caché KV del prefijo y
+        # solo procesa el contenido nuevo.
+
         # 3. Prompt RAG (Español y Directo)
-        self.rag_prompt = """ERES UN ASISTENTE EXPERTO PARA UNEMI.
-        ROL ACTUAL DEL USUARIO: {user_role}
-        Responde exclusivamente con JSON válido.
-
-        CONTEXTO:
-        {context}
-
-        CONSULTA DEL USUARIO:
-        {query}
-
-        INSTRUCCIONES:
-        1. RESPONDE DIRECTAMENTE usando SOLO el contexto proporcionado.
-        2. Adapta el tono al rol {user_role}.
-        3. Si el contexto contiene la respuesta, establece "has_information": true.
-        4. Si no, establece "has_information": false.
-
-        FORMATO JSON DE SALIDA:
-        {{
-          "has_information": boolean,
-          "need_contact": boolean,
-          "response": "Respuesta precisa en español",
-          "sources": ["nombre_de_archivo"]
-        }}
-        """
+        self.rag_system_prompt = """ERES UN ASISTENTE EXPERTO PARA UNEMI.
+Responde exclusivamente con JSON válido.
+
+INSTRUCCIONES:
+1. RESPONDE DIRECTAMENTE usando SOLO el contexto proporcionado.
+2. Adapta el tono al ROL DEL USUARIO indicado en el mensaje.
+3. Si el contexto contiene la respuesta, establece "has_information": true.
+4. Si no, establece "has_information": false.
+
+FORMATO JSON DE SALIDA:
+{
+  "has_information": boolean,
+  "need_contact": boolean,
+  "response": "Respuesta precisa en español",
+  "sources": ["nombre_de_archivo"]
+}
+"""
+        self.rag_user_prompt = """ROL ACTUAL DEL USUARIO: {user_role}
+
+CONTEXTO:
+{context}
+
+CONSULTA DEL USUARIO:
+{query}
+"""
 
         # 4. Prompt Reformulador (HyDE - Solo Normalización Técnica)
-        self.reformer_prompt = """ACTÚA COMO UN EXPERTO EN TRÁMITES UNIVERSITARIOS.
-        DOMINIO: Reglamento de Grado, Admisión y Procesos Académicos (UNEMI).
-        
-        TAREA: TRADUCE la consulta del usuario a TERMINOLOGÍA TÉCNICA del reglamento.
-        
-        INSTRUCCIONES:
-        - Reescribe usando TERMINOLOGÍA DE REGLAMENTO.
-        - Ejemplos:
-          * "falta" -> "justificación inasistencia" O "sanción disciplinaria"
-          * "borrar materia" -> "retiro de asignatura"
-          * "matricularme" -> "proceso de matrícula"
-        - Mantén el sentido original pero usa términos técnicos precisos.
-        
-        CONSULTA: "{query}"
-        ROL: "{user_role}"
-        
-        JSON DE SALIDA:
-        {{
-          "search_query": "string (Término técnico optimizado para búsqueda)"
-        }}
-        """
+        self.reformer_system_prompt = """ACTÚA COMO UN EXPERTO EN TRÁMITES UNIVERSITARIOS.
+DOMINIO: Reglamento de Grado, Admisión y Procesos Académicos (UNEMI).
+
+TAREA: TRADUCE la consulta del usuario a TERMINOLOGÍA TÉCNICA del reglamento.
+
+INSTRUCCIONES:
+- Reescribe usando TERMINOLOGÍA DE REGLAMENTO.
+- Ejemplos:
+  * "falta" -> "justificación inasistencia" O "sanción disciplinaria"
+  * "borrar materia" -> "retiro de asignatura"
+  * "matricularme" -> "proceso de matrícula"
+- Mantén el sentido original pero usa términos técnicos precisos.
+
+JSON DE SALIDA:
+{
+  "search_query": "string (Término técnico optimizado para búsqueda)"
+}
+"""
+        self.reformer_user_prompt = """CONSULTA: "{query}"
+ROL: "{user_role}"
+"""
+
+    def _mensajes(self, system_prompt: str, user_prompt: str) -> list:
+        """Arma la conversación [sistema estático, usuario variable] para el LLM."""
+        return [("system", system_prompt), ("human", user_prompt)]
+
+    def _generacion_en_disco(self) -> int:
+        ruta_meta = Path(self.index_path) / "meta.json"
+        if ruta_meta.exists():
+            return json.loads(ruta_meta.read_text(encoding="utf-8")).get("generacion", 0)
+        return 0
 
     def _cargar_indice(self):
-        if os.path.exists(FAISS_INDEX_PATH):
-            try:
-                self.vector_store = FAISS.load_local(
-                    FAISS_INDEX_PATH, 
-                    self.embeddings, 
-                    allow_dangerous_deserialization=True
-                )
+        self.generacion = self._generacion_en_disco()
+        try:
+            self.vector_store = almacen_chunks.cargar(self.index_path, self.embeddings)
+            if self.vector_store is not None:
                 logger.info("✅ Índice FAISS cargado.")
-            except Exception as e: 
-                logger.error(f"❌ Error cargando índice: {e}")
-                self.vector_store = None
-        else: 
+                # RAG_INDICE_MODO cambió desde el último guardado: convertir (plano ↔ compacto)
+                self.vector_store.index, convertido = indice_vectorial.adaptar(
+                    self.vector_store.index, self.index_path
+                )
+                if convertido:
+                    almacen_chunks.guardar(self.vector_store, self.index_path)
+                self.candidatos = TablaCandidatos.cargar(self.index_path, self.vector_store)
+                self.resumenes = TablaResumenes.cargar(
+                    self.index_path, self.vector_store.index, self.candidatos, settings.RAG_RUTEO_CHUNKS_SECCION
+                )
+                self._hashes = self.vector_store.docstore.hashes()
+        except Exception as e: 
+            logger.error(f"❌ Error cargando índice: {e}")
             self.vector_store = None
 
-    def _extraer_json(self, texto):
-        try:
-            match = re.search(r"\{[\s\S]*\}", texto)
-            return json.loads(match.group(0)) if match else json.loads(texto)
-        except: return None
-
 
     def _reformular_consulta(self, query: str, user_role: str) -> dict:
         """
@@ -113,95 +154,273 @@ class LocalRAGService:
         Nota: La ambigüedad ya se maneja en intent_parser, aquí solo reformulamos.
         """
         try:
-            prompt = self.reformer_prompt.format(query=query, user_role=user_role)
-            res = self.llm.invoke(prompt)
-            data = self._extraer_json(res.content)
+            mensajes = self._mensajes(
+                self.reformer_system_prompt,
+                self.reformer_user_prompt.format(query=query, user_role=user_role)
+            )
+            with metrics.medir("reformulacion"):
+                data = niveles_llm.invocar_escalando(
+                    self.llm_reformulacion, self.llm_reformulacion_escalado, mensajes, ESQUEMA_REFORMULACION,
+                    etapa="reformulacion", validar=_motivo_reformulacion_dudosa,
+                ).datos
             
             # Extraer search_query (ignoramos cualquier is_ambiguous que venga del LLM)
             query_tecnica = data.get("search_query", query) if data else query
             
-            # DEBUG PRINT: Ver reformulación
-            print(f"\n🤖 [REFORMULADO] '{query}' -> '{query_tecnica}'")
+            logger.debug(f"🤖 [REFORMULADO] '{query}' -> '{query_tecnica}'")
             
             return {"search_query": query_tecnica}
         except Exception as e:
             logger.error(f"Error reformulando: {e}")
             return {"search_query": query}
 
-    def consultar(self, query: str, intent_data: dict, categorias_permitidas: list, user_role_name: str):
+    def config_recuperacion(self, **cambios) -> dict:
+        """Parámetros de recuperación desde settings, con cambios puntuales (evaluación/sweep)."""
+        config = {
+            "k": settings.RAG_BUSQUEDA_K,
+            "k_inicial": settings.RAG_BUSQUEDA_K_INICIAL,
+            "margen": settings.RAG_BUSQUEDA_MARGEN,
+            "umbral": settings.RAG_UMBRAL_SCORE,
+            "max_total": settings.RAG_MAX_CHUNKS,
+            "limite_reglamento": settings.RAG_LIMITE_REGLAMENTO,
+            "limite_fuente": settings.RAG_LIMITE_FUENTE,
+            "ruteo_min_chunks": settings.RAG_RUTEO_MIN_CHUNKS,
+            "ruteo_documentos": settings.RAG_RUTEO_DOCUMENTOS,
+            "ruteo_secciones": settings.RAG_RUTEO_SECCIONES,
+        }
+        config.update({k: v for k, v in cambios.items() if v is not None})
+        return config
+
+    def recuperar(self, query: str, query_tecnica: str, categorias_permitidas: list, config: dict = None,
+                  filas_previas: list = None, cache_vectores: dict = None) -> dict:
+        """
+        Búsqueda vectorial + filtrado por categoría, umbral, dedup y límite por fuente (sin generación).
+        Con `filas_previas` (seguimiento en la misma sesión) no se busca en el índice: se re-puntúan
+        esas filas contra las nuevas queries. Con índices grandes (ruteo_min_chunks) la búsqueda
+        va en dos etapas: mejores documentos/secciones por sus centroides y, después, distancia
+        exacta solo contra los chunks de esas secciones (ver resumenes.py).
+        Devuelve {"docs": [(doc, score)], "fuentes": {nombre: chunks}, "candidatos": int,
+        "filas_candidatas": [fila], "k": int} (filas_candidatas: conjunto a reutilizar en el próximo
+        seguimiento; k: candidatos por query con que terminó la búsqueda adaptativa).
+        `cache_vectores` (texto → embedding, de la misma petición) evita embeber dos veces un texto.
+        """
+        config = config or self.config_recuperacion()
+        cache_vectores = {} if cache_vectores is None else cache_vectores
+
+        # Multi-query: Buscar con original + reformulada (boost sin keywords)
+        queries_finales = list(dict.fromkeys([query, query_tecnica]))
+        logger.debug(f"🤖 [BUSQUEDA] Queries: {queries_finales}")
+
+        # 1. EMBEDDINGS DE LAS QUERIES
+        vectores = []
+        for q in queries_finales:
+            if q not in cache_vectores:
+                with metrics.medir("embedding"):
+                    cache_vectores[q] = self.embeddings.embed_query(q)
+            vectores.append(cache_vectores[q])
+
+        # 2. BÚSQUEDA SOLO VECTORIAL. Seguimiento, ruteo e índice plano calculan sus candidatos
+        # una vez (hasta k, ordenados por distancia: en el plano el costo no depende de k); el
+        # índice compacto re-puntúa k candidatos desde disco y se vuelve a buscar si k se amplía.
+        rutear = 0 < config["ruteo_min_chunks"] <= self.vector_store.index.ntotal and not filas_previas
+        with metrics.medir("busqueda"), self._lock:
+            if filas_previas:
+                posiciones = np.asarray(filas_previas, dtype=np.int64)
+                precalculados = [
+                    (posiciones, indice_vectorial.distancias_filas(self.vector_store.index, v, posiciones))
+                    for v in vectores
+                ]
+            elif rutear:
+                precalculados = [self._buscar_ruteado(v, categorias_permitidas, config) for v in vectores]
+            elif not isinstance(self.vector_store.index, indice_vectorial.IndiceCompacto):
+                # FAISS directo: los Documents se construyen solo para los chunks finales
+                distancias, posiciones = self.vector_store.index.search(
+                    np.asarray(vectores, dtype=np.float32), config["k"]
+                )
+                precalculados = list(zip(posiciones, distancias))
+            else:
+                precalculados = None
+
+        # 3. FILTRADO, RE-RANKING Y BUCKETING (vectorizado sobre TablaCandidatos), con k adaptativo:
+        # se empieza con k_inicial y se duplica (hasta k) solo si sobreviven menos de max_total
+        # chunks y la cola de alguna query sigue en la zona relevante (ver _ampliar_k)
+        adaptativo = config["k_inicial"] > 0 and not filas_previas
+        k = min(config["k_inicial"], config["k"]) if adaptativo else config["k"]
+        rondas = 0
+        while True:
+            rondas += 1
+            if filas_previas:
+                resultados_busqueda = precalculados
+            elif precalculados is not None:
+                resultados_busqueda = [(p[:k], d[:k]) for p, d in precalculados]
+            else:
+                with metrics.medir("busqueda"), self._lock:
+                    distancias, posiciones = self.vector_store.index.search(np.asarray(vectores, dtype=np.float32), k)
+                resultados_busqueda = list(zip(posiciones, distancias))
+
+            with metrics.medir("filtrado"):
+                posiciones = np.concatenate([p for p, _ in resultados_busqueda])
+                with self._lock:
+                    tabla = self.candidatos
+                    filas, scores, candidatos = tabla.filtrar(
+                        posiciones,
+                        np.concatenate([d for _, d in resultados_busqueda]),
+                        categorias_permitidas,
+                        config,
+                    )
+            if (not adaptativo or k >= config["k"] or len(filas) >= config["max_total"]
+                    or not self._ampliar_k(resultados_busqueda, k, config)):
+                break
+            k = min(2 * k, config["k"])
+
+        metrics.incrementar("chatbot_busqueda_consultas_total", rondas=str(rondas))
+        metrics.incrementar("chatbot_busqueda_k_total", k)
+        metrics.anotar("busqueda", k=k, rondas=rondas)
+
+        with metrics.medir("filtrado"):
+            with self._lock:
+                docs_finales = [
+                    (self.vector_store.docstore.search(self.vector_store.index_to_docstore_id[int(fila)]), float(score))
+                    for fila, score in zip(filas, scores)
+                ]
+
+            fuentes_vistas = {}
+            for fila in filas:
+                nombre = tabla.fuentes[tabla.fuente[fila]]
+                fuentes_vistas[nombre] = fuentes_vistas.get(nombre, 0) + 1
+
+        metrics.anotar("filtrado", candidatos=candidatos, chunks=len(docs_finales), reutilizado=bool(filas_previas))
+        metrics.anotar("recuperacion", chunks=[
+            [f"{Path(doc.metadata.get('source', '?')).name}#{doc.metadata.get('chunk_id')}", round(score, 4)]
+            for doc, score in docs_finales
+        ])
+        return {
+            "docs": docs_finales,
+            "fuentes": fuentes_vistas,
+            "candidatos": candidatos,
+            "filas_candidatas": np.unique(posiciones[posiciones >= 0]).tolist(),
+            "k": k,
+        }
+
+    @staticmethod
+    def _ampliar_k(resultados_busqueda: list, k: int, config: dict) -> bool:
+        """
+        True si alguna query devolvió sus k resultados y el último sigue en la zona relevante:
+        score >= umbral y a menos de `margen` del mejor score de esa query (un salto mayor indica
+        que lo que sigue ya no es relevante). Si no, ampliar k no puede aportar chunks útiles.
+        """
+        for posiciones, distancias in resultados_busqueda:
+            scores = 1.0 / (1.0 + distancias[posiciones >= 0])
+            if len(scores) < k:
+                continue  # la query ya devolvió todo lo que había
+            piso = config["umbral"]
+            if config["margen"] > 0:
+                piso = max(piso, scores[0] - config["margen"])
+            if scores[-1] >= piso:
+                return True
+        return False
+
+    def _buscar_ruteado(self, vector, categorias_permitidas: list, config: dict) -> tuple:
+        """Las k filas más cercanas entre los chunks de las secciones elegidas (llamar con el lock)."""
+        filas = self.resumenes.filas(
+            vector, self.candidatos.mascara_categorias(categorias_permitidas),
+            config["ruteo_documentos"], config["ruteo_secciones"],
+        )
+        distancias = indice_vectorial.distancias_filas(self.vector_store.index, vector, filas)
+        metrics.anotar("ruteo", filas=int(len(filas)))
+        if len(filas) > config["k"]:
+            mejores = np.argpartition(distancias, config["k"])[:config["k"]]
+            filas, distancias = filas[mejores], distancias[mejores]
+        orden = np.argsort(distancias, kind="stable")
+        return filas[orden], distancias[orden]
+
+    def construir_contexto(self, docs: list) -> str:
+        return "\n\n".join([f"DOC: {Path(d.metadata.get('source','?')).name}\nTXT: {d.page_content}" for d in docs])
+
+    def mensajes_generacion(self, context: str, query: str, user_role_name: str) -> list:
+        return self._mensajes(
+            self.rag_system_prompt,
+            self.rag_user_prompt.format(context=context, query=query, user_role=user_role_name)
+        )
+
+    def consultar(self, query: str, intent_data: dict, categorias_permitidas: list, user_role_name: str,
+                  search_query: str = None, seguimiento: dict = None, cache_vectores: dict = None):
+        """
+        Responde una consulta informativa con RAG.
+        Si se recibe search_query (modo combinado del intent_parser) no se reformula de nuevo.
+        `seguimiento` (turno anterior de la sesión, ver conversacion.py): la consulta continúa esa
+        pregunta; se re-puntúan sus filas candidatas y solo se busca en el índice si no alcanzan.
+        El resultado incluye "search_query" y "filas_candidatas" para guardar el turno.
+        `cache_vectores`: embeddings ya calculados en la petición (p. ej. por respuestas_frecuentes).
+        """
         if not self.vector_store: self._cargar_indice()
+        cache_vectores = {} if cache_vectores is None else cache_vectores
         if not self.vector_store: return self._respuesta_fallback("Sistema en mantenimiento.")
 
         try:
-            # 1. REFORMULACIÓN INTELIGENTE (Solo normalización técnica)
-            analisis = self._reformular_consulta(query, user_role_name)
-            query_tecnica = analisis.get("search_query", query)
-            
-            # Multi-query: Buscar con original + reformulada (boost sin keywords)
-            queries_finales = list(dict.fromkeys([query, query_tecnica]))
-            print(f"🤖 [BUSQUEDA] Queries: {queries_finales}")
-
-            # 2. BÚSQUEDA WIDE SOLO VECTORIAL
-            candidatos_brutos = []
-            for q in queries_finales:
-                raw_docs = self.vector_store.similarity_search_with_score(q, k=30)
-                
-                for doc, distance in raw_docs:
-                    if doc.metadata.get("categoria") not in categorias_permitidas:
-                        continue
-                    
-                    # Score vectorial normalizado (0 a 1)
-                    vector_score = 1 / (1 + distance)
-                    candidatos_brutos.append((doc, vector_score))
-
-            # 3. RE-RANKING Y BUCKETING
-            candidatos_brutos.sort(key=lambda x: x[1], reverse=True)
-            
-            docs_finales = []
-            ids_vistos = set()
-            fuentes_vistas = {}
-            
-            MAX_TOTAL = 5
-            UMBRAL = 0.30  # Más permisivo con solo embeddings
-            
-            for doc, score in candidatos_brutos:
-                if score < UMBRAL: continue
-                
-                h = hash(doc.page_content)
-                if h in ids_vistos: continue
-                
-                nombre = Path(doc.metadata.get("source", "desc")).name
-                conteo = fuentes_vistas.get(nombre, 0)
-                
-                limite = 3 if "REGLAMENTO" in nombre.upper() else 2
-                if conteo >= limite and len(docs_finales) >= 2: continue
-                
-                fuentes_vistas[nombre] = conteo + 1
-                ids_vistos.add(h)
-                docs_finales.append(doc)
-                if len(docs_finales) >= MAX_TOTAL: break
+            if seguimiento:
+                # Seguimiento: la pregunta anterior da el contexto; no se reformula de nuevo
+                query_tecnica = f"{seguimiento['query_busqueda'] or seguimiento['pregunta']} {query}"
+                recuperacion = self.recuperar(
+                    query, query_tecnica, categorias_permitidas, filas_previas=seguimiento["filas"],
+                    cache_vectores=cache_vectores,
+                )
+                if not recuperacion["docs"]:
+                    logger.debug("🔁 [SESION] Las filas del turno anterior no alcanzan; búsqueda completa.")
+                    recuperacion = self.recuperar(query, query_tecnica, categorias_permitidas,
+                                                  cache_vectores=cache_vectores)
+                query = f"{seguimiento['pregunta']}\nSEGUIMIENTO: {query}"
+            else:
+                # 1. REFORMULACIÓN INTELIGENTE (Solo normalización técnica)
+                if search_query:
+                    query_tecnica = search_query
+                else:
+                    analisis = self._reformular_consulta(query, user_role_name)
+                    query_tecnica = analisis.get("search_query", query)
+
+                # 2. RECUPERACIÓN (búsqueda + filtrado)
+                recuperacion = self.recuperar(query, query_tecnica, categorias_permitidas,
+                                              cache_vectores=cache_vectores)
+            metrics.anotar("recuperacion", search_query=query_tecnica)
+            docs_finales = [doc for doc, _ in recuperacion["docs"]]
+            fuentes_vistas = recuperacion["fuentes"]
 
             if not docs_finales:
-                print("❌ [RAG] No se encontraron documentos relevantes tras filtrado.")
+                logger.debug("❌ [RAG] No se encontraron documentos relevantes tras filtrado.")
                 return self._respuesta_fallback(f"No encontré normativa específica sobre '{query_tecnica}'.")
 
+            # 3. COMPUERTA: con evidencia insuficiente se responde sin llamar al LLM
+            evaluacion = compuerta.evaluar([score for _, score in recuperacion["docs"]])
+            if not evaluacion["generar"]:
+                logger.debug(f"🚧 [COMPUERTA] Evidencia insuficiente para '{query_tecnica}': {evaluacion['caracteristicas']}")
+                resultado = self._respuesta_fallback(
+                    f"Revisé la normativa sobre '{query_tecnica}' pero no hallé el dato exacto."
+                )
+                resultado["search_query"] = query_tecnica
+                resultado["filas_candidatas"] = recuperacion["filas_candidatas"]
+                return resultado
+
             # 4. GENERACIÓN
-            context = "\n\n".join([f"DOC: {Path(d.metadata.get('source','?')).name}\nTXT: {d.page_content}" for d in docs_finales])
+            context = self.construir_contexto(docs_finales)
             
-            # DEBUG PRINT: Ver contexto enviado
-            print(f"\n📄 [CONTEXTO] {len(docs_finales)} chunks enviados al LLM:\n{context[:500]}...\n")
+            logger.debug(f"📄 [CONTEXTO] {len(docs_finales)} chunks enviados al LLM:\n{context[:500]}...")
+            metrics.anotar("generacion", contexto_chars=len(context))
             
-            final_prompt = self.rag_prompt.format(context=context, query=query, user_role=user_role_name)
-            ai_response = self.llm.invoke(final_prompt)
+            mensajes = self.mensajes_generacion(context, query, user_role_name)
+            with metrics.medir("generacion"):
+                ai_response = invocar_json(self.llm, mensajes, ESQUEMA_RAG, etapa="generacion")
             
-            # DEBUG PRINT: Ver respuesta cruda del LLM
-            print(f"\n📥 [LLM OUTPUT]:\n{ai_response.content}\n")
+            logger.debug(f"📥 [LLM OUTPUT]:\n{ai_response.texto}")
             
-            resultado = self._extraer_json(ai_response.content)
-            if not resultado: 
-                resultado = {"has_information": True, "need_contact": False, "response": ai_response.content}
+            resultado = ai_response.datos
+            if resultado:
+                compuerta.registrar(evaluacion, resultado.get("has_information"))
+            else: 
+                resultado = {"has_information": True, "need_contact": False, "response": ai_response.texto}
             
             resultado["sources"] = list(fuentes_vistas.keys())
+            resultado["search_query"] = query_tecnica
+            resultado["filas_candidatas"] = recuperacion["filas_candidatas"]
             
             if not resultado.get("has_information"):
                 resultado["response"] = f"Revisé la normativa sobre '{query_tecnica}' pero no hallé el dato exacto."
@@ -216,30 +435,101 @@ class LocalRAGService:
     def _respuesta_fallback(self, mensaje: str):
         return {"has_information": False, "need_contact": True, "response": mensaje, "sources": []}
 
-    # ... (El método ingerir_documento sigue igual, es correcto) ...
-    def ingerir_documento(self, file_path: str, categoria: str = "general", auto_save: bool = True):
+    def ya_indexado(self, content_hash: str, categoria: str) -> bool:
+        with self._lock:
+            return (content_hash, categoria) in self._hashes
+
+    def ingerir(self, file_path: str, categoria: str = "general", content_hash: str = None) -> int:
+        """
+        Procesa y embebe un documento y lo agrega al índice en memoria (sin persistir).
+        El parseo y los embeddings corren fuera del lock, así varios archivos se procesan
+        en paralelo; solo la escritura en FAISS se serializa. Devuelve los chunks agregados
+        (0 si el mismo contenido ya estaba indexado en la categoría). Con RAG_DEDUP_ACTIVO no
+        se embeben los chunks casi duplicados de otros de la misma categoría.
+        """
+        content_hash = content_hash or hash_archivo(file_path)
+        if self.ya_indexado(content_hash, categoria):
+            return 0
+
         processor = DocumentProcessor()
-        try:
-            documents = processor.process_document(
-                file_path,
-                additional_metadata={"categoria": categoria, "role_filter": categoria}
-            )
+        documents = processor.process_document(
+            file_path,
+            additional_metadata={"categoria": categoria, "role_filter": categoria, "content_hash": content_hash}
+        )
+        simhashes, omitidos = None, 0
+        if settings.RAG_DEDUP_ACTIVO:
+            # Sin lock: en el peor caso dos archivos simultáneos conservan la misma copia
+            documents, simhashes, omitidos = deduplicacion.filtrar_chunks(documents, self.candidatos, categoria)
+        textos = [d.page_content for d in documents]
+        if not textos:
+            deduplicacion.reportar(Path(file_path).name, processor.lineas_repetidas, omitidos, 0)
+            return 0
+        with metrics.medir("ingesta_embedding"):
+            vectores = self.embeddings.embed_documents(textos)
+        # Bytes por chunk en el índice: vector float32 + texto en chunks.sqlite3
+        bytes_por_chunk = 4 * len(vectores[0]) + sum(len(t.encode("utf-8")) for t in textos) // len(textos)
+        deduplicacion.reportar(Path(file_path).name, processor.lineas_repetidas, omitidos, bytes_por_chunk)
+
+        return self.agregar_embebidos(textos, vectores, [d.metadata for d in documents], simhashes,
+                                      content_hash, categoria)
+
+    def agregar_embebidos(self, textos: list, vectores: list, metadatas: list, simhashes: list,
+                          content_hash: str, categoria: str) -> int:
+        """
+        Agrega al índice en memoria los chunks ya embebidos de un archivo (ingerir, o la
+        reconstrucción en paralelo de reconstruccion.py). Devuelve los chunks agregados.
+        """
+        pares = list(zip(textos, vectores))
+        with self._lock:
+            # Dos subidas simultáneas del mismo archivo: solo la primera se agrega
+            if (content_hash, categoria) in self._hashes:
+                return 0
             if self.vector_store is None:
-                self.vector_store = FAISS.from_documents(documents, self.embeddings)
-            else:
-                self.vector_store.add_documents(documents)
-            
+                self.vector_store = almacen_chunks.nuevo_indice(
+                    self.index_path, self.embeddings, indice_vectorial.crear(self.index_path, len(vectores[0]))
+                )
+            inicio = self.vector_store.index.ntotal
+            self.vector_store.add_embeddings(
+                pares, metadatas=metadatas, ids=almacen_chunks.ids_nuevos(self.vector_store, len(pares))
+            )
+            self.candidatos.agregar(textos, metadatas, simhashes)
+            self.resumenes.agregar(vectores, inicio, int(self.candidatos.categoria[inicio]))
+            self._hashes.add((content_hash, categoria))
+        return len(pares)
+
+    def ingerir_documento(self, file_path: str, categoria: str = "general", auto_save: bool = True):
+        try:
+            chunks = self.ingerir(file_path, categoria)
             if auto_save:
-                self.vector_store.save_local(FAISS_INDEX_PATH)
-            return True, f"Ingestado: {len(documents)} fragmentos."
+                self.guardar_indice()
+            return True, f"Ingestado: {chunks} fragmentos."
         except Exception as e:
             logger.error(f"Error ingesta {file_path}: {e}")
             return False, str(e)
 
     def guardar_indice(self):
-        if self.vector_store:
-            self.vector_store.save_local(FAISS_INDEX_PATH)
-            return True
+        with self._lock:
+            if self.generacion != self._generacion_en_disco():
+                # Otro proceso reemplazó el índice (reconstruir_indice): escribir el de memoria
+                # mezclaría sus vectores con el chunks.sqlite3 nuevo. Se descarta lo no guardado.
+                logger.error(
+                    f"❌ El índice en disco cambió (generación {self._generacion_en_disco()}, "
+                    f"cargada {self.generacion}); se recarga sin guardar los cambios en memoria."
+                )
+                self.candidatos = TablaCandidatos()
+                self.resumenes = TablaResumenes(chunks_seccion=settings.RAG_RUTEO_CHUNKS_SECCION)
+                self._hashes = set()
+                self._cargar_indice()
+                return False
+            if self.vector_store:
+                almacen_chunks.guardar(self.vector_store, self.index_path)
+                self.candidatos.guardar(self.index_path)
+                self.resumenes.guardar(self.index_path)
+                # Cada guardado es una nueva generación; el catálogo la registra por documento
+                self.generacion += 1
+                ruta_meta = Path(self.index_path) / "meta.json"
+                ruta_meta.write_text(json.dumps({"generacion": self.generacion}), encoding="utf-8")
+                return True
         return False
 
 rag_service = LocalRAGService()
\ No newline at end of file
@@ -0,0 +1,299 @@
+"""
+Reconstrucción completa del índice con varios procesos.
+
+La ingesta normal (ingestion.py) agrega archivos de a uno a un índice en memoria; para
+reindexar todo `documentos_unemi/` eso deja el parseo (pypdf, chunking, SimHash) en un solo
+proceso y los embeddings en pocas requests a la vez. Aquí:
+
+  1. Los archivos se reparten en particiones: una categoría entera por partición mientras
+     quepa en su parte del total (así la deduplicación por categoría es la misma que en la
+     ingesta secuencial); las categorías más grandes se parten por archivo.
+  2. Cada partición corre en un proceso propio: parsea, deduplica contra lo ya visto en la
+     partición, embebe con RAG_RECONSTRUCCION_EMBEDDINGS requests a la vez (lotes de
+     RAG_RECONSTRUCCION_LOTE textos) y escribe un índice parcial (IndexFlatL2 + chunks.jsonl).
+  3. El proceso principal fusiona los parciales en orden (categoría, archivo) en un índice
+     nuevo, descarta los casi duplicados entre particiones de una misma categoría, lo guarda
+     en `<indice>.reconstruccion` y lo intercambia con el actual (que queda en `<indice>.anterior`).
+
+El orden de fusión no depende del número de workers: el índice resultante es el mismo.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import faiss
+import numpy as np
+from django.conf import settings
+from langchain_ollama import OllamaEmbeddings
+
+from . import deduplicacion, ollama_cliente
+from .candidatos import TablaCandidatos
+from .document_processor import DocumentProcessor
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_PARCIAL = "index.faiss"
+ARCHIVO_CHUNKS_PARCIAL = "chunks.jsonl"
+# Settings que los workers copian del proceso principal (incluye override_settings de los benchmarks)
+PREFIJOS_AJUSTES = ("RAG_", "OLLAMA_")
+
+
+def listar_archivos(base_dir) -> list:
+    """Archivos soportados de `base_dir/<categoria>/`, ordenados, con su sha256 y tamaño."""
+    # Import diferido: los workers importan este módulo antes de django.setup()
+    from .catalogo import EXTENSIONES_SOPORTADAS
+    from .rag_service import hash_archivo
+
+    archivos, vistos = [], set()
+    for carpeta in sorted(p for p in Path(base_dir).iterdir() if p.is_dir() and not p.name.startswith('.')):
+        for ruta in sorted(carpeta.iterdir()):
+            if not ruta.is_file() or ruta.suffix.lower() not in EXTENSIONES_SOPORTADAS:
+                continue
+            sha256 = hash_archivo(str(ruta))
+            # Mismo contenido dos veces en la categoría: la ingesta también lo indexa una vez
+            if (sha256, carpeta.name) in vistos:
+                continue
+            vistos.add((sha256, carpeta.name))
+            archivos.append({"ruta": str(ruta), "categoria": carpeta.name, "nombre": ruta.name,
+                             "sha256": sha256, "tamano": ruta.stat().st_size})
+    return archivos
+
+
+def particionar(archivos: list, n: int) -> list:
+    """
+    Reparte los archivos en hasta `n` particiones de tamaño parecido (en bytes). Una categoría
+    se parte por archivo solo si supera 1/n del total.
+    """
+    total = sum(a["tamano"] for a in archivos)
+    por_categoria = {}
+    for archivo in archivos:
+        por_categoria.setdefault(archivo["categoria"], []).append(archivo)
+    unidades = []
+    for grupo in por_categoria.values():
+        if n > 1 and sum(a["tamano"] for a in grupo) > total / n:
+            unidades.extend([a] for a in grupo)
+        else:
+            unidades.append(grupo)
+
+    # Mayor primero a la partición más liviana
+    particiones = [[] for _ in range(max(1, n))]
+    pesos = [0] * len(particiones)
+    for unidad in sorted(unidades, key=lambda u: -sum(a["tamano"] for a in u)):
+        destino = pesos.index(min(pesos))
+        particiones[destino].extend(unidad)
+        pesos[destino] += sum(a["tamano"] for a in unidad)
+    return [sorted(p, key=lambda a: (a["categoria"], a["nombre"])) for p in particiones if p]
+
+
+# --- WORKER ---
+def _contexto_procesos():
+    """
+    Sin fork directo: el proceso principal tiene hilos (pool HTTP, ingesta) que no sobreviven
+    a un fork. Con forkserver este módulo (langchain, faiss, pypdf) se importa una vez en el
+    servidor y cada worker nace ya con él cargado; spawn donde no existe (Windows).
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    contexto = multiprocessing.get_context("forkserver")
+    contexto.set_forkserver_preload([__name__])
+    return contexto
+
+
+def _iniciar_worker(ajustes: dict, nivel_log: int):
+    import django
+
+    django.setup()
+    for nombre, valor in ajustes.items():
+        setattr(settings, nombre, valor)
+    logging.getLogger("chatbot").setLevel(nivel_log)
+
+
+def _cliente_embeddings() -> OllamaEmbeddings:
+    return OllamaEmbeddings(
+        model=settings.OLLAMA_MODELO_EMBEDDINGS,
+        base_url=settings.OLLAMA_BASE_URL,
+        **ollama_cliente.kwargs_cliente("embeddings", settings.OLLAMA_TIMEOUT_EMBEDDINGS_S),
+    )
+
+
+def construir_parcial(particion: list, directorio, concurrentes: int, lote: int) -> dict:
+    """
+    Parsea, deduplica y embebe una partición; escribe el índice parcial en `directorio`.
+    Los lotes de cada archivo se embeben (hasta `concurrentes` requests a la vez) mientras
+    se parsean los siguientes.
+    """
+    directorio = Path(directorio)
+    directorio.mkdir(parents=True, exist_ok=True)
+    inicio = time.perf_counter()
+    embeddings = _cliente_embeddings()
+    procesador = DocumentProcessor()
+    tabla = TablaCandidatos()
+    registros, lotes, errores = [], [], []
+    chunks = omitidos_total = 0
+    with ThreadPoolExecutor(max_workers=concurrentes, thread_name_prefix="embeddings") as pool:
+        for archivo in particion:
+            try:
+                documents = procesador.process_document(
+                    archivo["ruta"],
+                    additional_metadata={"categoria": archivo["categoria"], "role_filter": archivo["categoria"],
+                                         "content_hash": archivo["sha256"]},
+                )
+            except Exception as e:
+                logger.error(f"❌ [RECONSTRUCCIÓN] {archivo['nombre']}: {e}")
+                errores.append({**archivo, "error": str(e)})
+                continue
+            simhashes, omitidos = None, 0
+            if settings.RAG_DEDUP_ACTIVO:
+                documents, simhashes, omitidos = deduplicacion.filtrar_chunks(documents, tabla, archivo["categoria"])
+            deduplicacion.reportar(archivo["nombre"], procesador.lineas_repetidas, omitidos, 0)
+            omitidos_total += omitidos
+            textos = [d.page_content for d in documents]
+            metadatas = [d.metadata for d in documents]
+            if textos:
+                tabla.agregar(textos, metadatas, simhashes)
+                lotes.extend(pool.submit(embeddings.embed_documents, textos[i:i + lote])
+                             for i in range(0, len(textos), lote))
+            registros.append({**archivo, "textos": textos, "metadatas": metadatas,
+                              "simhashes": [int(h) for h in tabla.simhash[len(tabla) - len(textos):]],
+                              "inicio": chunks, "fin": chunks + len(textos)})
+            chunks += len(textos)
+        parseo = time.perf_counter() - inicio
+        vectores = np.asarray([v for futuro in lotes for v in futuro.result()], dtype=np.float32)
+
+    if chunks:
+        indice = faiss.IndexFlatL2(vectores.shape[1])
+        indice.add(vectores)
+        faiss.write_index(indice, str(directorio / ARCHIVO_PARCIAL))
+    with open(directorio / ARCHIVO_CHUNKS_PARCIAL, "w", encoding="utf-8") as f:
+        for registro in registros:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    return {
+        "directorio": str(directorio),
+        "archivos": len(particion),
+        "chunks": chunks,
+        "omitidos": omitidos_total,
+        "errores": errores,
+        "parseo_s": round(parseo, 3),
+        # Embeddings pendientes al terminar de parsear
+        "espera_embedding_s": round(time.perf_counter() - inicio - parseo, 3),
+    }
+
+
+def _leer_parcial(directorio: Path):
+    ruta = directorio / ARCHIVO_PARCIAL
+    indice = faiss.read_index(str(ruta)) if ruta.exists() else None
+    with open(directorio / ARCHIVO_CHUNKS_PARCIAL, encoding="utf-8") as f:
+        for linea in f:
+            registro = json.loads(linea)
+            n = registro["fin"] - registro["inicio"]
+            registro["vectores"] = indice.reconstruct_n(registro["inicio"], n) if n else None
+            yield registro
+
+
+# --- PROCESO PRINCIPAL ---
+def generacion_actual(index_path) -> int:
+    ruta_meta = Path(index_path) / "meta.json"
+    if ruta_meta.exists():
+        return json.loads(ruta_meta.read_text(encoding="utf-8")).get("generacion", 0)
+    return 0
+
+
+def reconstruir(base_dir, index_path, workers: int = None, concurrentes: int = None, lote: int = None) -> dict:
+    """
+    Reconstruye el índice de `index_path` con todos los documentos de `base_dir` y actualiza
+    el catálogo. Los procesos ya corriendo (servidor) siguen con el índice anterior hasta reiniciar.
+    """
+    from . import catalogo
+    from .rag_service import LocalRAGService
+
+    workers = workers or settings.RAG_RECONSTRUCCION_WORKERS
+    concurrentes = concurrentes or settings.RAG_RECONSTRUCCION_EMBEDDINGS
+    lote = lote or settings.RAG_RECONSTRUCCION_LOTE
+    index_path = Path(index_path)
+    nuevo = index_path.with_name(index_path.name + ".reconstruccion")
+    anterior = index_path.with_name(index_path.name + ".anterior")
+    shutil.rmtree(nuevo, ignore_errors=True)
+
+    inicio = time.perf_counter()
+    archivos = listar_archivos(base_dir)
+    particiones = particionar(archivos, workers)
+    logger.info(f"🏗️ Reconstruyendo {len(archivos)} archivos en {len(particiones)} particiones")
+    ajustes = {k: getattr(settings, k) for k in dir(settings) if k.startswith(PREFIJOS_AJUSTES)}
+    with tempfile.TemporaryDirectory(prefix="parciales_", dir=index_path.parent) as tmp:
+        with ProcessPoolExecutor(max_workers=max(1, len(particiones)), mp_context=_contexto_procesos(),
+                                 initializer=_iniciar_worker,
+                                 initargs=(ajustes, logging.getLogger("chatbot").getEffectiveLevel())) as pool:
+            futuros = [
+                pool.submit(construir_parcial, particion, Path(tmp) / f"parcial_{i}", concurrentes, lote)
+                for i, particion in enumerate(particiones)
+            ]
+            parciales = [f.result() for f in futuros]
+        construccion = time.perf_counter() - inicio
+
+        # Fusión en orden (categoría, archivo), independiente del reparto
+        # La generación sigue a la del índice reemplazado: invalida respuestas precalculadas
+        nuevo.mkdir(parents=True)
+        (nuevo / "meta.json").write_text(json.dumps({"generacion": generacion_actual(index_path)}), encoding="utf-8")
+        servicio = LocalRAGService(index_path=nuevo)
+        registros = sorted(
+            (r for p in parciales for r in _leer_parcial(Path(p["directorio"]))),
+            key=lambda r: (r["categoria"], r["nombre"]),
+        )
+        chunks, omitidos_fusion = {}, 0
+        for r in registros:
+            if not r["textos"]:
+                chunks[(r["categoria"], r["nombre"], r["sha256"])] = 0
+                continue
+            filas = list(range(len(r["textos"])))
+            if settings.RAG_DEDUP_ACTIVO:
+                filas = deduplicacion.filas_nuevas(r["simhashes"], servicio.candidatos, r["categoria"])
+                omitidos_fusion += len(r["textos"]) - len(filas)
+            agregados = 0
+            if filas:
+                agregados = servicio.agregar_embebidos(
+                    [r["textos"][i] for i in filas], r["vectores"][filas], [r["metadatas"][i] for i in filas],
+                    [r["simhashes"][i] for i in filas], r["sha256"], r["categoria"],
+                )
+            chunks[(r["categoria"], r["nombre"], r["sha256"])] = agregados
+
+    if servicio.vector_store is None or not servicio.guardar_indice():
+        raise ValueError("No se generó ningún chunk: el índice actual no se reemplaza")
+    servicio.vector_store.docstore.cerrar()
+    shutil.rmtree(anterior, ignore_errors=True)
+    if index_path.exists():
+        os.replace(index_path, anterior)
+    os.replace(nuevo, index_path)
+
+    errores = [e for p in parciales for e in p["errores"]]
+    try:
+        for (categoria, nombre, sha256), n in chunks.items():
+            catalogo.registrar_ingesta(categoria, nombre, sha256, n, servicio.generacion)
+        for e in errores:
+            catalogo.registrar_error(e["categoria"], e["nombre"], e["error"])
+    except Exception as e:
+        logger.error(f"❌ [RECONSTRUCCIÓN] No se pudo actualizar el catálogo: {e}", exc_info=True)
+
+    total = time.perf_counter() - inicio
+    resumen = {
+        "archivos": len(archivos),
+        "particiones": len(particiones),
+        "chunks": sum(chunks.values()),
+        "omitidos_dedup": sum(p["omitidos"] for p in parciales) + omitidos_fusion,
+        "errores": errores,
+        "generacion": servicio.generacion,
+        "construccion_s": round(construccion, 3),
+        "fusion_s": round(total - construccion, 3),
+        "total_s": round(total, 3),
+        "parciales": [{k: p[k] for k in ("archivos", "chunks", "parseo_s", "espera_embedding_s")} for p in parciales],
+    }
+    logger.info(
+        f"✅ Índice reconstruido: {resumen['chunks']} chunks de {resumen['archivos']} archivos "
+        f"en {resumen['total_s']}s ({resumen['particiones']} particiones)"
+    )
+    return resumen
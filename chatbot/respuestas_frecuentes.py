@@ -0,0 +1,122 @@
+"""
+Respuestas precalculadas para preguntas frecuentes (modelo RespuestaPrecalculada).
+
+`python manage.py precalcular_respuestas` las genera offline con `consultar`; ChatView
+las sirve sin pasar por el LLM cuando:
+  - el mensaje es casi idéntico a una pregunta precalculada (similitud de embeddings
+    ≥ RAG_FAQ_SIMILITUD), antes incluso de clasificar la intención; o
+  - la intención clasificada tiene la misma accion/objeto que una pregunta precalculada.
+    Si varias preguntas del mismo conjunto de carpetas comparten accion/objeto la clave es
+    ambigua y no se usa: esas preguntas solo se sirven por similitud.
+
+Solo se consideran respuestas del mismo conjunto de carpetas permitidas y de la
+generación actual del índice: tras una ingesta quedan invalidadas hasta recalcularlas.
+Cada proceso mantiene una copia en memoria, recargada al cambiar la generación o
+cada RAG_FAQ_RECARGA_S segundos.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .conversacion import normalizar
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_tabla = None  # (generacion, cargada_en, {clave_categorias: grupo})
+
+
+def clave_categorias(categorias) -> str:
+    return ",".join(sorted(set(categorias)))
+
+
+def clave_intencion(accion: str, objeto: str) -> str:
+    return f"{normalizar(accion or '')}|{normalizar(objeto or '')}"
+
+
+def vector_normalizado(embeddings, texto: str, cache_vectores: dict = None) -> np.ndarray:
+    """
+    Embedding normalizado de `texto`. Con `cache_vectores` (texto → embedding de la petición)
+    reutiliza o guarda el vector sin normalizar, que `recuperar` usa tal cual.
+    """
+    vector = cache_vectores.get(texto) if cache_vectores is not None else None
+    if vector is None:
+        vector = embeddings.embed_query(texto)
+        if cache_vectores is not None:
+            cache_vectores[texto] = vector
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+def intenciones_ambiguas(filas) -> dict:
+    """{(categorias, clave_intencion): [preguntas]} de las claves que comparten varias preguntas."""
+    preguntas = {}
+    for fila in filas:
+        if fila.accion:
+            preguntas.setdefault((fila.categorias, clave_intencion(fila.accion, fila.objeto)), []).append(fila.pregunta)
+    return {clave: lista for clave, lista in preguntas.items() if len(lista) > 1}
+
+
+def _cargar(generacion: int) -> dict:
+    from .models import RespuestaPrecalculada
+
+    filas = list(RespuestaPrecalculada.objects.filter(generacion=generacion))
+    ambiguas = intenciones_ambiguas(filas)
+    for (categorias, clave), preguntas in ambiguas.items():
+        logger.warning(f"⚠️ Intención '{clave}' ambigua en [{categorias}] ({len(preguntas)} preguntas); solo por similitud.")
+    grupos = {}
+    for fila in filas:
+        grupo = grupos.setdefault(fila.categorias, {"intencion": {}, "respuestas": [], "vectores": []})
+        respuesta = {
+            "pregunta": fila.pregunta,
+            "search_query": fila.search_query,
+            "filas_candidatas": fila.filas_candidatas,
+            **fila.respuesta,
+        }
+        clave = clave_intencion(fila.accion, fila.objeto)
+        if fila.accion and (fila.categorias, clave) not in ambiguas:
+            grupo["intencion"][clave] = respuesta
+        grupo["respuestas"].append(respuesta)
+        grupo["vectores"].append(np.frombuffer(bytes(fila.embedding), dtype=np.float32))
+    for grupo in grupos.values():
+        grupo["vectores"] = np.vstack(grupo["vectores"])
+    logger.info(f"⚡ Respuestas precalculadas cargadas: {sum(len(g['respuestas']) for g in grupos.values())} (gen {generacion}).")
+    return grupos
+
+
+def _grupo(categorias, generacion: int):
+    global _tabla
+    with _lock:
+        if _tabla is None or _tabla[0] != generacion or time.monotonic() - _tabla[1] > settings.RAG_FAQ_RECARGA_S:
+            _tabla = (generacion, time.monotonic(), _cargar(generacion))
+        return _tabla[2].get(clave_categorias(categorias))
+
+
+def por_similitud(texto: str, categorias, generacion: int, embeddings, cache_vectores: dict = None):
+    """
+    Respuesta precalculada cuya pregunta es casi idéntica al mensaje, o None.
+    El embedding del mensaje queda en `cache_vectores` para no repetirlo en `consultar`.
+    """
+    if settings.RAG_FAQ_SIMILITUD <= 0:
+        return None
+    grupo = _grupo(categorias, generacion)
+    if not grupo:
+        return None  # sin respuestas para estas carpetas: no se gasta un embedding
+    similitudes = grupo["vectores"] @ vector_normalizado(embeddings, texto, cache_vectores)
+    mejor = int(np.argmax(similitudes))
+    if similitudes[mejor] < settings.RAG_FAQ_SIMILITUD:
+        return None
+    return grupo["respuestas"][mejor]
+
+
+def por_intencion(intent_data: dict, categorias, generacion: int):
+    """Respuesta precalculada con la misma accion/objeto que la intención clasificada, o None."""
+    if not intent_data.get("accion"):
+        return None
+    grupo = _grupo(categorias, generacion)
+    if not grupo:
+        return None
+    return grupo["intencion"].get(clave_intencion(intent_data.get("accion"), intent_data.get("objeto")))
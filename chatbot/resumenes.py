@@ -0,0 +1,166 @@
+"""
+Vectores resumen por documento y por sección, para una búsqueda en dos etapas.
+
+Cada archivo ingestado ocupa filas consecutivas del índice FAISS. Al ingestar se guarda,
+por documento y por sección (bloques de RAG_RUTEO_CHUNKS_SECCION chunks consecutivos), el
+centroide normalizado de sus embeddings. `recuperar` puede entonces:
+
+  1. elegir los RAG_RUTEO_DOCUMENTOS documentos más cercanos (entre las categorías
+     permitidas) y, dentro de ellos, las RAG_RUTEO_SECCIONES secciones más cercanas;
+  2. calcular la distancia exacta solo contra los chunks de esas secciones.
+
+Se activa cuando el índice supera RAG_RUTEO_MIN_CHUNKS (con pocos chunks la búsqueda
+completa ya es barata). Persistencia en `faiss_index/resumenes.npz`; si falta o no coincide
+con el índice se reconstruye desde los vectores del índice.
+"""
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from . import indice_vectorial
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO = "resumenes.npz"
+BLOQUE = 65536
+
+
+def _normalizar(x: np.ndarray) -> np.ndarray:
+    normas = np.linalg.norm(x, axis=-1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return (x / normas).astype(np.float32)
+
+
+def _mejores(similitudes: np.ndarray, n: int) -> np.ndarray:
+    """Índices de las n similitudes más altas (sin orden entre ellos)."""
+    if len(similitudes) <= n:
+        return np.arange(len(similitudes))
+    return np.argpartition(-similitudes, n)[:n]
+
+
+class TablaResumenes:
+    def __init__(self, dimension: int = 0, chunks_seccion: int = 16):
+        self.chunks_seccion = chunks_seccion
+        # Por documento: filas [inicio, fin), código de categoría (TablaCandidatos) y secciones [sec_inicio, sec_fin)
+        self.doc_inicio = np.empty(0, dtype=np.int64)
+        self.doc_fin = np.empty(0, dtype=np.int64)
+        self.doc_categoria = np.empty(0, dtype=np.int16)
+        self.doc_secciones = np.empty((0, 2), dtype=np.int64)
+        self.doc_vector = np.empty((0, dimension), dtype=np.float32)
+        # Por sección: filas [inicio, fin)
+        self.sec_inicio = np.empty(0, dtype=np.int64)
+        self.sec_fin = np.empty(0, dtype=np.int64)
+        self.sec_vector = np.empty((0, dimension), dtype=np.float32)
+        # Documentos agregados aún no concatenados (evita copiar los arrays en cada archivo)
+        self._pendientes = []
+        self._total_filas = 0
+        self._total_secciones = 0
+
+    @property
+    def total_filas(self) -> int:
+        return self._total_filas
+
+    def agregar(self, vectores, inicio: int, categoria: int):
+        """Registra un documento cuyos chunks ocupan las filas [inicio, inicio + len(vectores))."""
+        vectores = np.asarray(vectores, dtype=np.float32)
+        if len(vectores) == 0:
+            return
+        cortes = np.arange(0, len(vectores), self.chunks_seccion)
+        sec_inicio = inicio + cortes
+        centroides = np.add.reduceat(vectores, cortes, axis=0)
+        self._pendientes.append({
+            "doc_inicio": [inicio],
+            "doc_fin": [inicio + len(vectores)],
+            "doc_categoria": [categoria],
+            "doc_secciones": [[self._total_secciones, self._total_secciones + len(cortes)]],
+            "doc_vector": _normalizar(centroides.sum(axis=0, keepdims=True)),
+            "sec_inicio": sec_inicio,
+            "sec_fin": np.minimum(sec_inicio + self.chunks_seccion, inicio + len(vectores)),
+            "sec_vector": _normalizar(centroides),
+        })
+        self._total_filas = inicio + len(vectores)
+        self._total_secciones += len(cortes)
+
+    def _consolidar(self):
+        if not self._pendientes:
+            return
+        for campo in ("doc_inicio", "doc_fin", "doc_categoria", "doc_secciones", "sec_inicio", "sec_fin"):
+            actual = getattr(self, campo)
+            nuevos = np.asarray([v for p in self._pendientes for v in p[campo]], dtype=actual.dtype)
+            setattr(self, campo, np.concatenate([actual, nuevos.reshape(-1, *actual.shape[1:])]))
+        for campo in ("doc_vector", "sec_vector"):
+            actual = getattr(self, campo)
+            nuevos = [p[campo] for p in self._pendientes]
+            if len(actual) == 0:
+                actual = np.empty((0, nuevos[0].shape[1]), dtype=np.float32)
+            setattr(self, campo, np.vstack([actual, *nuevos]))
+        self._pendientes = []
+
+    def filas(self, vector, categorias_permitidas: np.ndarray, documentos: int, secciones: int) -> np.ndarray:
+        """
+        Filas del índice a puntuar para la consulta: chunks de las mejores secciones dentro de
+        los mejores documentos. `categorias_permitidas`: máscara por código de categoría.
+        """
+        self._consolidar()
+        consulta = _normalizar(np.asarray(vector, dtype=np.float32))
+        en_categoria = np.flatnonzero(categorias_permitidas[self.doc_categoria])
+        if len(en_categoria) == 0:
+            return np.empty(0, dtype=np.int64)
+        elegidos = en_categoria[_mejores(self.doc_vector[en_categoria] @ consulta, documentos)]
+
+        rangos = self.doc_secciones[elegidos]
+        candidatas = np.concatenate([np.arange(a, b) for a, b in rangos])
+        candidatas = candidatas[_mejores(self.sec_vector[candidatas] @ consulta, secciones)]
+        return np.concatenate([
+            np.arange(a, b) for a, b in zip(self.sec_inicio[candidatas], self.sec_fin[candidatas])
+        ])
+
+    # --- PERSISTENCIA ---
+    def guardar(self, directorio):
+        self._consolidar()
+        np.savez(
+            Path(directorio) / ARCHIVO,
+            chunks_seccion=self.chunks_seccion,
+            doc_inicio=self.doc_inicio, doc_fin=self.doc_fin, doc_categoria=self.doc_categoria,
+            doc_secciones=self.doc_secciones, doc_vector=self.doc_vector,
+            sec_inicio=self.sec_inicio, sec_fin=self.sec_fin, sec_vector=self.sec_vector,
+        )
+
+    @classmethod
+    def cargar(cls, directorio, indice, candidatos, chunks_seccion: int) -> "TablaResumenes":
+        """Lee la tabla persistida; si falta, no cubre el índice o cambió el tamaño de sección, la reconstruye."""
+        ruta = Path(directorio) / ARCHIVO
+        if ruta.exists():
+            try:
+                with np.load(ruta) as datos:
+                    tabla = cls(chunks_seccion=int(datos["chunks_seccion"]))
+                    for campo in ("doc_inicio", "doc_fin", "doc_categoria", "doc_secciones", "doc_vector",
+                                  "sec_inicio", "sec_fin", "sec_vector"):
+                        setattr(tabla, campo, datos[campo])
+                tabla._total_filas = int(tabla.doc_fin[-1]) if len(tabla.doc_fin) else 0
+                tabla._total_secciones = len(tabla.sec_inicio)
+                if tabla.total_filas == indice.ntotal and tabla.chunks_seccion == chunks_seccion:
+                    return tabla
+                logger.warning(f"⚠️ {ARCHIVO} desalineado con el índice; reconstruyendo.")
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo leer {ARCHIVO}: {e}; reconstruyendo.")
+        return cls.desde_indice(indice, candidatos, chunks_seccion)
+
+    @classmethod
+    def desde_indice(cls, indice, candidatos, chunks_seccion: int) -> "TablaResumenes":
+        """Documentos = tramos de filas consecutivas con la misma fuente y categoría."""
+        tabla = cls(indice.d, chunks_seccion)
+        total = indice.ntotal
+        if total == 0:
+            return tabla
+        clave = candidatos.fuente.astype(np.int64) * 65536 + candidatos.categoria
+        cortes = np.r_[0, np.flatnonzero(np.diff(clave)) + 1, total]
+        for inicio, fin in zip(cortes[:-1], cortes[1:]):
+            vectores = np.vstack([
+                indice_vectorial.reconstruir(indice, a, min(a + BLOQUE, fin)) for a in range(inicio, fin, BLOQUE)
+            ])
+            tabla.agregar(vectores, int(inicio), int(candidatos.categoria[inicio]))
+        tabla._consolidar()
+        logger.info(f"🧭 Resúmenes reconstruidos: {len(tabla.doc_inicio)} documentos, {len(tabla.sec_inicio)} secciones.")
+        return tabla
@@ -1,3 +1,1213 @@
-from django.test import TestCase
+import hashlib
+import json
+import shutil
+import threading
+import time
+import types
+import zlib
+from unittest import mock
+import tempfile
+from pathlib import Path
 
-# Create your tests here.
+import httpx
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from chatbot import almacen_chunks, catalogo, compuerta, conversacion, document_processor, indice_vectorial, ingestion, llm_json, ollama_cliente, permisos, reconstruccion, respuestas_frecuentes, views
+from chatbot.deduplicacion import quitar_repetidas
+from chatbot.bench.entorno import EmbeddingsNulos
+from chatbot.bench.stub_ollama import StubOllama
+from chatbot.candidatos import TablaCandidatos
+from chatbot.models import DocumentoIndexado, RespuestaPrecalculada
+from chatbot.rag_service import LocalRAGService
+
+
+def _texto(tema: str, parrafos: int = 6) -> str:
+    return "\n\n".join(
+        f"Artículo {i + 1}.- Sobre {tema}: el estudiante deberá presentar la solicitud {tema} número {i} "
+        f"ante la secretaría dentro del plazo establecido para {tema}."
+        for i in range(parrafos)
+    )
+
+
+class ServicioStubTestCase(TestCase):
+    """Índice en un directorio temporal contra el Ollama falso."""
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="test_reconstruccion_"))
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.stub = StubOllama()
+        self.stub.iniciar()
+        self.addCleanup(self.stub.detener)
+        ajustes = override_settings(
+            OLLAMA_BASE_URL=self.stub.url,
+            OLLAMA_BACKENDS_INTENCION=[], OLLAMA_BACKENDS_GENERACION=[], OLLAMA_BACKENDS_EMBEDDINGS=[],
+            DOCUMENTOS_DIR=self.tmp / "documentos", FAISS_INDEX_PATH=self.tmp / "faiss_index",
+            RAG_TRAZAS_ARCHIVO="", RAG_INDICE_MODO="plano",
+        )
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.documentos = self.tmp / "documentos" / "general"
+        self.documentos.mkdir(parents=True)
+        self.indice = self.tmp / "faiss_index"
+
+
+class ReconstruccionIngestaTests(ServicioStubTestCase):
+    """reconstruir_indice con el servidor corriendo: una subida posterior no debe pisar el índice nuevo."""
+
+    def _archivo(self, nombre: str, tema: str) -> str:
+        ruta = self.documentos / nombre
+        ruta.write_text(_texto(tema), encoding="utf-8")
+        return str(ruta)
+
+    def test_subida_tras_reconstruir_no_pisa_el_indice_nuevo(self):
+        servidor = LocalRAGService(index_path=self.indice)
+        servidor.ingerir(self._archivo("matricula.txt", "matrícula"), "general")
+        self.assertTrue(servidor.guardar_indice())
+        self._archivo("becas.txt", "becas")
+
+        # Un trabajo de ingesta del servidor embebe antes del reemplazo y guarda después
+        tardio = Path(tempfile.mkdtemp(dir=self.tmp)) / "titulacion.txt"
+        tardio.write_text(_texto("titulación"), encoding="utf-8")
+        self.assertGreater(servidor.ingerir(str(tardio), "general"), 0)
+
+        resumen = reconstruccion.reconstruir(self.tmp / "documentos", self.indice, 1, 1, 8)
+        self.assertEqual(resumen["generacion"], 2)
+
+        self.assertFalse(servidor.guardar_indice())
+        self.assertEqual(servidor.generacion, 2)
+
+        cargado = LocalRAGService(index_path=self.indice)
+        indice = cargado.vector_store.index
+        self.assertEqual(indice.ntotal, resumen["chunks"])
+        self.assertEqual(len(cargado.candidatos), indice.ntotal)
+        fuentes = set()
+        for fila in range(indice.ntotal):
+            doc = cargado.vector_store.docstore.search(str(fila))
+            fuentes.add(doc.metadata["filename"])
+            # Cada vector corresponde al texto de su fila en chunks.sqlite3
+            np.testing.assert_allclose(indice.reconstruct(fila), self.stub.embedding(doc.page_content), rtol=1e-5)
+        self.assertEqual(fuentes, {"matricula.txt", "becas.txt"})
+
+        # Recargado, el servidor sigue ingestando sobre el índice nuevo
+        self.assertEqual(servidor.vector_store.index.ntotal, indice.ntotal)
+        self.assertGreater(servidor.ingerir(str(tardio), "general"), 0)
+        self.assertTrue(servidor.guardar_indice())
+        self.assertEqual(LocalRAGService(index_path=self.indice).vector_store.index.ntotal, servidor.vector_store.index.ntotal)
+
+
+class EncabezadosRepetidosTests(TestCase):
+    """quitar_repetidas: solo encabezados/pies de los márgenes, nunca títulos de artículos."""
+
+    def _reglamento(self, paginas: int = 10) -> list:
+        return [
+            "\n".join([
+                "UNIVERSIDAD ESTATAL DE MILAGRO",
+                "Reglamento de Régimen Académico (versión 2)",
+                f"Artículo {n}.-",
+                f"El estudiante podrá solicitar {n} créditos adicionales en el periodo {2020 + n}.",
+                "Se garantiza el debido proceso.",
+                f"La solicitud se presenta según el formato de la página {n} del anexo.",
+                f"Artículo {n + 100}.- De las matrículas especiales",
+                f"Las matrículas especiales se aprueban en {n + 5} días hábiles.",
+                f"Página {n}/{paginas}",
+            ])
+            for n in range(1, paginas + 1)
+        ]
+
+    def test_quita_encabezado_y_paginacion(self):
+        limpias, quitadas = quitar_repetidas(self._reglamento(), 0.5)
+        self.assertEqual(quitadas, 30)
+        texto = "\n".join(limpias)
+        self.assertNotIn("UNIVERSIDAD ESTATAL DE MILAGRO", texto)
+        self.assertNotIn("versión 2", texto)
+        self.assertNotIn("Página", texto)
+
+    def test_conserva_titulos_de_articulos_y_cuerpo_con_numeros(self):
+        limpias, _ = quitar_repetidas(self._reglamento(), 0.5)
+        for n, pagina in enumerate(limpias, start=1):
+            self.assertIn(f"Artículo {n}.-", pagina)
+            self.assertIn(f"Artículo {n + 100}.- De las matrículas especiales", pagina)
+            self.assertIn(f"solicitar {n} créditos adicionales", pagina)
+            # Repetida en todas las páginas, pero fuera de los márgenes
+            self.assertIn("Se garantiza el debido proceso.", pagina)
+            self.assertIn(f"formato de la página {n} del anexo", pagina)
+            self.assertIn(f"se aprueban en {n + 5} días hábiles", pagina)
+
+    def test_numero_suelto_como_pie(self):
+        paginas = [f"Encabezado\nCapítulo {n}\nTexto propio de la página {n}.\n- {n} -" for n in range(1, 6)]
+        limpias, quitadas = quitar_repetidas(paginas, 0.5)
+        self.assertEqual(quitadas, 10)
+        self.assertEqual(limpias[2], "Capítulo 3\nTexto propio de la página 3.")
+
+    @override_settings(RAG_DEDUP_ACTIVO=True, RAG_DEDUP_FRACCION_PAGINAS=0.5)
+    def test_pdf_conserva_marcadores_de_pagina(self):
+        paginas = self._reglamento() + [""]  # página sin texto: no lleva marcador
+        lector = types.SimpleNamespace(pages=[types.SimpleNamespace(extract_text=lambda t=t: t) for t in paginas])
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf, \
+                mock.patch.object(document_processor.pypdf, "PdfReader", return_value=lector):
+            procesador = document_processor.DocumentProcessor()
+            texto = procesador._load_pdf(Path(pdf.name))
+
+        self.assertEqual(procesador.lineas_repetidas, 30)
+        self.assertNotIn("UNIVERSIDAD ESTATAL DE MILAGRO", texto)
+        marcadores = [linea for linea in texto.splitlines() if linea.startswith("--- Página")]
+        self.assertEqual(marcadores, [f"--- Página {n}/11 ---" for n in range(1, 11)])
+        # Cada marcador precede al contenido (ya limpio) de su página
+        self.assertIn("--- Página 3/11 ---\nArtículo 3.-", texto)
+
+
+class CompuertaPonderadaTests(TestCase):
+    """La calibración pesa cada fila por 1/muestreo: equivale a repetirla 1/muestreo veces."""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.X = rng.random((200, len(compuerta.CARACTERISTICAS)))
+        self.y = (self.X[:, 0] + 0.3 * rng.standard_normal(200) > 0.5).astype(float)
+        # Las filas bajas son exploración muestreada al 25 %
+        self.pesos = np.where(self.X[:, 0] < 0.4, 4.0, 1.0)
+        repeticiones = self.pesos.astype(int)
+        self.X_rep = np.repeat(self.X, repeticiones, axis=0)
+        self.y_rep = np.repeat(self.y, repeticiones)
+
+    def test_ajustar_ponderado_equivale_a_filas_repetidas(self):
+        ponderado = compuerta.ajustar(self.X, self.y, self.pesos)
+        repetido = compuerta.ajustar(self.X_rep, self.y_rep)
+        for clave in ("media", "escala", "pesos"):
+            np.testing.assert_allclose(ponderado[clave], repetido[clave], rtol=1e-6)
+        self.assertAlmostEqual(ponderado["sesgo"], repetido["sesgo"], places=6)
+
+    def test_elegir_umbral_ponderado_equivale_a_filas_repetidas(self):
+        for recall in (0.8, 0.9, 0.98, 1.0):
+            ponderado = compuerta.elegir_umbral(self.X[:, 0], self.y, recall, self.pesos)
+            repetido = compuerta.elegir_umbral(np.repeat(self.X[:, 0], self.pesos.astype(int)), self.y_rep, recall)
+            for clave in ("umbral", "recall", "omitidas"):
+                self.assertAlmostEqual(ponderado[clave], repetido[clave], places=9)
+            self.assertGreaterEqual(ponderado["recall"], recall)
+
+    def test_sin_pesos_la_exploracion_infla_el_recall(self):
+        sin_pesos = compuerta.elegir_umbral(self.X[:, 0], self.y, 0.9)
+        ponderado = compuerta.elegir_umbral(self.X[:, 0], self.y, 0.9, self.pesos)
+        self.assertLessEqual(ponderado["umbral"], sin_pesos["umbral"])
+
+    def test_leer_registro_pesa_la_exploracion(self):
+        ruta = Path(tempfile.mkdtemp(prefix="test_compuerta_")) / "registro.jsonl"
+        self.addCleanup(shutil.rmtree, ruta.parent, ignore_errors=True)
+        fila = {n: 0.5 for n in compuerta.CARACTERISTICAS}
+        lineas = [
+            {**fila, "decision": "generar", "muestreo": 1.0, "has_information": True},
+            {**fila, "decision": "exploracion", "muestreo": 0.05, "has_information": True},
+            {**fila, "decision": "exploracion", "has_information": False},  # registro anterior, sin muestreo
+        ]
+        ruta.write_text("\n".join(json.dumps(l) for l in lineas) + "\nilegible\n", encoding="utf-8")
+        with override_settings(RAG_COMPUERTA_EXPLORACION=0.1):
+            X, y, pesos = compuerta.leer_registro(ruta)
+        self.assertEqual(X.shape, (3, len(compuerta.CARACTERISTICAS)))
+        np.testing.assert_allclose(pesos, [1.0, 20.0, 10.0])
+        np.testing.assert_array_equal(y, [1.0, 1.0, 0.0])
+
+
+class PermisosTests(TestCase):
+    def _sesion(self, **banderas):
+        perfil = {"status": True, **banderas}
+        return {"0912345678": {"perfiles": [perfil, {"status": False, "es_administrativo": True}]}}
+
+    def test_resolver_lee_solo_perfiles_activos(self):
+        categorias, rol = permisos.resolver(self._sesion(es_estudiante=True, es_postulante=True))
+        self.assertEqual(categorias, ["estudiantes", "general", "postulantes"])
+        self.assertEqual(rol, "Estudiante, Postulante")
+
+    def test_resolver_refleja_cambios_de_perfil(self):
+        self.assertEqual(permisos.resolver(self._sesion(es_estudiante=True))[0], ["estudiantes", "general"])
+        self.assertEqual(permisos.resolver(self._sesion(es_profesor=True))[0], ["docentes", "general"])
+        self.assertEqual(permisos.resolver({}), permisos.VISITANTE)
+
+    def test_token_registrado(self):
+        registro = permisos.registrar(self._sesion(es_profesor=True))
+        self.assertEqual(permisos.por_token(registro["session_token"]), (["docentes", "general"], "Profesor"))
+        self.assertIsNone(permisos.por_token("0" * 32))
+
+
+def _filtrar_bucle(textos, metadatas, posiciones, distancias, categorias_permitidas, config):
+    """Bucle original de `recuperar` (antes de TablaCandidatos), como referencia."""
+    candidatos_brutos = []
+    for fila, distancia in zip(posiciones.tolist(), distancias.tolist()):
+        if fila < 0 or metadatas[fila].get("categoria") not in categorias_permitidas:
+            continue
+        candidatos_brutos.append((fila, 1 / (1 + distancia)))
+    candidatos_brutos.sort(key=lambda x: x[1], reverse=True)
+
+    finales, ids_vistos, fuentes_vistas = [], set(), {}
+    for fila, score in candidatos_brutos:
+        if score < config["umbral"]: continue
+        h = hash(textos[fila])
+        if h in ids_vistos: continue
+        nombre = Path(metadatas[fila].get("source", "desc")).name
+        conteo = fuentes_vistas.get(nombre, 0)
+        limite = config["limite_reglamento"] if "REGLAMENTO" in nombre.upper() else config["limite_fuente"]
+        if conteo >= limite and len(finales) >= 2: continue
+        fuentes_vistas[nombre] = conteo + 1
+        ids_vistos.add(h)
+        finales.append(fila)
+        if len(finales) >= config["max_total"]: break
+    return finales
+
+
+class FiltrarCandidatosTests(TestCase):
+    """TablaCandidatos.filtrar devuelve las mismas filas que el bucle original."""
+
+    CATEGORIAS = ["general", "estudiantes", "docentes", "externos"]
+
+    def _tabla(self, rng, filas: int, fuentes: int):
+        textos, metadatas = [], []
+        for i in range(filas):
+            fuente = int(rng.integers(fuentes))
+            prefijo = "REGLAMENTO" if fuente % 3 == 0 else "INSTRUCTIVO"
+            # Textos repetidos dentro de la misma fuente y entre fuentes distintas
+            textos.append(f"chunk {int(rng.integers(filas // 4)) if rng.random() < 0.3 else i}")
+            metadatas.append({
+                "source": f"/docs/{self.CATEGORIAS[fuente % 4]}/{prefijo}_{fuente}.pdf",
+                "categoria": self.CATEGORIAS[fuente % 4],
+            })
+        tabla = TablaCandidatos()
+        tabla.agregar(textos, metadatas)
+        return tabla, textos, metadatas
+
+    def test_equivale_al_bucle_con_candidatos_aleatorios(self):
+        rng = np.random.default_rng(35)
+        for caso in range(300):
+            filas, fuentes = int(rng.integers(5, 200)), int(rng.integers(1, 12))
+            tabla, textos, metadatas = self._tabla(rng, filas, fuentes)
+            k = int(rng.integers(1, 60))
+            # Varias queries concatenadas: la misma fila puede aparecer más de una vez, y FAISS rellena con -1
+            posiciones = rng.integers(-1, filas, size=k * int(rng.integers(1, 4)))
+            distancias = rng.random(len(posiciones)).astype(np.float32) * 2
+            config = {
+                "umbral": float(rng.choice([0.0, 0.4, 0.6])),
+                "max_total": int(rng.integers(1, 12)),
+                "limite_reglamento": int(rng.integers(1, 4)),
+                "limite_fuente": int(rng.integers(1, 3)),
+            }
+            permitidas = list(rng.choice(self.CATEGORIAS, size=int(rng.integers(1, 5)), replace=False))
+            with self.subTest(caso=caso):
+                obtenidas, _, _ = tabla.filtrar(posiciones, distancias, permitidas, config)
+                self.assertEqual(obtenidas.tolist(),
+                                 _filtrar_bucle(textos, metadatas, posiciones, distancias, permitidas, config))
+
+    def test_limite_por_fuente_y_dos_primeros(self):
+        textos = [f"chunk {i}" for i in range(6)]
+        metadatas = [{"source": "/docs/general/instructivo.pdf", "categoria": "general"}] * 5
+        metadatas += [{"source": "/docs/general/otro.pdf", "categoria": "general"}]
+        tabla = TablaCandidatos()
+        tabla.agregar(textos, metadatas)
+        config = {"umbral": 0.5, "max_total": 5, "limite_reglamento": 3, "limite_fuente": 1}
+        posiciones = np.arange(6)
+        distancias = np.array([0.0, 0.1, 0.2, 0.3, 0.4, 0.5], dtype=np.float32)
+        filas, scores, candidatos = tabla.filtrar(posiciones, distancias, ["general"], config)
+        # Las dos primeras pasan aunque superen el límite de 1 por fuente; luego solo la otra fuente
+        self.assertEqual(filas.tolist(), [0, 1, 5])
+        self.assertEqual(candidatos, 6)
+        self.assertTrue((scores >= config["umbral"]).all())
+        # El umbral descarta las que quedan por debajo
+        config["umbral"] = 1 / 1.15
+        self.assertEqual(tabla.filtrar(posiciones, distancias, ["general"], config)[0].tolist(), [0, 1])
+
+
+class _LlmFalso:
+    """LLM con `stream` que entrega fragmentos fijos y registra cuántos se consumieron."""
+
+    def __init__(self, fragmentos, metadata_final=None):
+        self.fragmentos = fragmentos
+        self.metadata_final = metadata_final or {}
+        self.consumidos = 0
+        self.cerrado = False
+
+    def model_copy(self, update):
+        return self
+
+    def stream(self, mensajes):
+        try:
+            for i, contenido in enumerate(self.fragmentos):
+                self.consumidos += 1
+                ultimo = i == len(self.fragmentos) - 1
+                yield types.SimpleNamespace(content=contenido,
+                                            response_metadata=self.metadata_final if ultimo else {})
+        finally:
+            self.cerrado = True
+
+
+class JsonIncrementalTests(TestCase):
+    def _alimentar(self, fragmentos):
+        parser = llm_json.JsonIncremental()
+        for i, fragmento in enumerate(fragmentos):
+            if parser.alimentar(fragmento):
+                return parser, i
+        return parser, None
+
+    def test_llaves_y_comillas_escapadas_dentro_de_strings(self):
+        objeto = '{"response": "usa {llaves} y \\"comillas\\" }", "sources": ["a\\\\"]}'
+        parser, cierre = self._alimentar(list(objeto) + [" texto extra"])
+        self.assertEqual(cierre, len(objeto) - 1)
+        self.assertEqual(json.loads(parser.objeto()),
+                         {"response": 'usa {llaves} y "comillas" }', "sources": ["a\\"]})
+
+    def test_texto_antes_del_objeto_y_fragmentos_partidos(self):
+        parser, cierre = self._alimentar(['Claro, aquí va: {"a": {"b"', ': 1}', ', "c": "x\\', '"y"}', '\n'])
+        self.assertEqual(cierre, 3)
+        self.assertEqual(json.loads(parser.objeto()), {"a": {"b": 1}, "c": 'x"y'})
+        self.assertTrue(parser.alimentar("más"))
+
+    def test_salida_truncada(self):
+        parser, cierre = self._alimentar(['{"response": "incompleto', ' } todavía"'])
+        self.assertIsNone(cierre)
+        self.assertFalse(parser.completo)
+        self.assertEqual(parser.objeto(), '{"response": "incompleto } todavía"')
+
+    def test_extraer_json(self):
+        self.assertEqual(llm_json.extraer_json('Respuesta: {"a": "}"} y {"b": 2}'), {"a": "}"})
+        self.assertIsNone(llm_json.extraer_json('{"a": "sin cerrar'))
+        self.assertIsNone(llm_json.extraer_json("sin objeto"))
+        self.assertIsNone(llm_json.extraer_json(""))
+
+
+class InvocarJsonTests(TestCase):
+    ESQUEMA = llm_json.ESQUEMA_REFORMULACION
+
+    def test_corta_el_stream_tras_cerrar_el_objeto(self):
+        llm = _LlmFalso(['{"search_query": ', '"becas {2024}"', "}", " ", " ", " ", " ", " "])
+        resultado = llm_json.invocar_json(llm, [], self.ESQUEMA, "test")
+        self.assertEqual(resultado.datos, {"search_query": "becas {2024}"})
+        self.assertTrue(resultado.cortado)
+        self.assertEqual(llm.consumidos, 3 + llm_json._FRAGMENTOS_TRAS_CIERRE)
+        self.assertTrue(llm.cerrado)
+
+    def test_done_termina_sin_corte(self):
+        llm = _LlmFalso(['{"search_query": "x"}', ""], {"done": True, "eval_count": 7, "prompt_eval_count": 30})
+        resultado = llm_json.invocar_json(llm, [], self.ESQUEMA, "test")
+        self.assertEqual(resultado.datos, {"search_query": "x"})
+        self.assertFalse(resultado.cortado)
+        self.assertEqual(resultado.tokens_generados, 7)
+
+    def test_texto_previo_y_salida_truncada(self):
+        previo = llm_json.invocar_json(_LlmFalso(['Claro: {"search_query"', ': "y"}']), [], self.ESQUEMA, "test")
+        self.assertEqual(previo.datos, {"search_query": "y"})
+        with self.assertLogs("chatbot.llm_json", "WARNING"):
+            truncado = llm_json.invocar_json(_LlmFalso(['{"search_query": "sin ci']), [], self.ESQUEMA, "test")
+        self.assertIsNone(truncado.datos)
+        self.assertFalse(truncado.cortado)
+        self.assertEqual(truncado.texto, '{"search_query": "sin ci')
+
+
+class RespuestasPorIntencionTests(TestCase):
+    def setUp(self):
+        respuestas_frecuentes._tabla = None
+        self.addCleanup(setattr, respuestas_frecuentes, "_tabla", None)
+
+    def _crear(self, pregunta, accion, objeto, categorias="estudiantes,general"):
+        RespuestaPrecalculada.objects.create(
+            pregunta=pregunta, categorias=categorias, accion=accion, objeto=objeto,
+            respuesta={"response": f"Respuesta a {pregunta}", "sources": ["a.pdf"]},
+            embedding=np.ones(4, dtype=np.float32).tobytes(), generacion=1,
+        )
+
+    def test_clave_compartida_no_se_sirve_por_intencion(self):
+        self._crear("¿Cómo solicito una beca?", "solicitar", "beca")
+        self._crear("¿Cómo solicito una beca de deportes?", "Solicitar", "Beca")
+        self._crear("¿Cuándo es la matrícula?", "consultar", "matrícula")
+        self._crear("¿Cómo solicito una beca?", "solicitar", "beca", categorias="docentes,general")
+        categorias = ["estudiantes", "general"]
+
+        with self.assertLogs("chatbot.respuestas_frecuentes", "WARNING"):
+            ambigua = respuestas_frecuentes.por_intencion({"accion": "solicitar", "objeto": "beca"}, categorias, 1)
+        self.assertIsNone(ambigua)
+        unica = respuestas_frecuentes.por_intencion({"accion": "consultar", "objeto": "matricula"}, categorias, 1)
+        self.assertEqual(unica["pregunta"], "¿Cuándo es la matrícula?")
+        # En otro conjunto de carpetas la misma clave es única
+        otra = respuestas_frecuentes.por_intencion({"accion": "solicitar", "objeto": "beca"}, ["docentes", "general"], 1)
+        self.assertEqual(otra["pregunta"], "¿Cómo solicito una beca?")
+        self.assertEqual(
+            respuestas_frecuentes.intenciones_ambiguas(RespuestaPrecalculada.objects.all()),
+            {("estudiantes,general", "solicitar|beca"): ["¿Cómo solicito una beca de deportes?", "¿Cómo solicito una beca?"]},
+        )
+
+
+class _EmbeddingsContados:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.textos = []
+
+    def embed_query(self, texto):
+        self.textos.append(texto)
+        return self.embeddings.embed_query(texto)
+
+
+class EmbeddingPorPeticionTests(ServicioStubTestCase):
+    """El embedding del mensaje calculado para las preguntas frecuentes se reutiliza en la búsqueda."""
+
+    def test_mensaje_se_embebe_una_vez(self):
+        ruta = self.documentos / "becas.txt"
+        ruta.write_text(_texto("becas"), encoding="utf-8")
+        servicio = LocalRAGService(index_path=self.indice)
+        servicio.ingerir(str(ruta), "general")
+        respuestas_frecuentes._tabla = None
+        self.addCleanup(setattr, respuestas_frecuentes, "_tabla", None)
+        RespuestaPrecalculada.objects.create(
+            pregunta="¿Cuál es el horario de la biblioteca?", categorias="general", respuesta={"response": "-"},
+            embedding=respuestas_frecuentes.vector_normalizado(servicio.embeddings, "horario biblioteca").tobytes(),
+            generacion=servicio.generacion,
+        )
+        contados = servicio.embeddings = _EmbeddingsContados(servicio.embeddings)
+
+        mensaje, reformulada = "¿Cómo pido una beca?", "solicitud de becas"
+        cache_vectores = {}
+        self.assertIsNone(respuestas_frecuentes.por_similitud(
+            mensaje, ["general"], servicio.generacion, servicio.embeddings, cache_vectores
+        ))
+        recuperacion = servicio.recuperar(mensaje, reformulada, ["general"], cache_vectores=cache_vectores)
+        self.assertTrue(recuperacion["docs"])
+        self.assertEqual(contados.textos, [mensaje, reformulada])
+        # Sin caché compartida, el mismo resultado con un embedding extra
+        sin_cache = servicio.recuperar(mensaje, reformulada, ["general"])
+        self.assertEqual([d.page_content for d, _ in sin_cache["docs"]],
+                         [d.page_content for d, _ in recuperacion["docs"]])
+        self.assertEqual(len(contados.textos), 4)
+
+
+class CatalogoVacioTests(TestCase):
+    """Despliegues anteriores al catálogo: el primer listado llena la tabla desde el disco."""
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="test_catalogo_"))
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        for categoria, nombre in (("general", "calendario.pdf"), ("estudiantes", "becas.docx")):
+            (self.tmp / categoria).mkdir(exist_ok=True)
+            (self.tmp / categoria / nombre).write_bytes(b"contenido de " + nombre.encode())
+        (self.tmp / "general" / "notas.tmp").write_text("no soportado")
+        catalogo._revisado = False
+        self.addCleanup(setattr, catalogo, "_revisado", False)
+
+    def test_primer_listado_llena_el_catalogo(self):
+        with override_settings(DOCUMENTOS_DIR=self.tmp):
+            datos = self.client.get("/api/chatbot/upload-documents/").json()
+        self.assertEqual(datos["stats"]["total_files"], 2)
+        self.assertEqual(datos["categories"]["general"][0]["name"], "calendario.pdf")
+        self.assertEqual(datos["categories"]["estudiantes"][0]["status"], "pendiente")
+
+        # Solo una vez por proceso: lo que se copie después lo reconcilia sincronizar_catalogo
+        DocumentoIndexado.objects.all().delete()
+        with override_settings(DOCUMENTOS_DIR=self.tmp):
+            self.assertEqual(self.client.get("/api/chatbot/upload-documents/").json()["stats"]["total_files"], 0)
+
+    def test_catalogo_con_filas_no_se_toca(self):
+        catalogo.registrar_subida("general", "calendario.pdf", 10, "a" * 64)
+        self.assertIsNone(catalogo.sincronizar_si_vacio(self.tmp, None, None))
+        self.assertEqual(DocumentoIndexado.objects.count(), 1)
+
+
+class EmbeddingsNulosTests(TestCase):
+    def test_embeber_texto_falla_con_mensaje_claro(self):
+        with self.assertRaisesMessage(RuntimeError, "sin servidor de embeddings"):
+            EmbeddingsNulos().embed_query("hola")
+        with self.assertRaisesMessage(RuntimeError, "embed_documents (2 textos)"):
+            EmbeddingsNulos().embed_documents(["a", "b"])
+
+
+class SeguimientoTests(TestCase):
+    def _turno_rag(self, estado, categorias=("general",), generacion=1):
+        estado.agregar_turno("¿Cómo solicito una beca?", "rag_response", query_busqueda="solicitud de beca",
+                             filas=[3, 7], categorias=list(categorias), generacion=generacion)
+
+    def test_es_seguimiento_requiere_turno_anterior(self):
+        turno = {"pregunta": "¿Cómo solicito una beca?"}
+        for texto in ("¿y cuáles son los plazos?", "E inglés?", "pero eso cuánto cuesta", "¿Qué más necesito?",
+                      "¿dónde entrego eso?"):
+            self.assertTrue(conversacion.es_seguimiento(texto, turno), texto)
+            self.assertFalse(conversacion.es_seguimiento(texto, None), texto)
+        for texto in ("¿Cuáles son los plazos de matrícula?", "", "y " + "palabra " * 20):
+            self.assertFalse(conversacion.es_seguimiento(texto, turno), texto)
+
+    def test_contexto_seguimiento(self):
+        estado = conversacion.EstadoConversacion("sesion-prueba")
+        self.assertIsNone(estado.contexto_seguimiento(["general"], 1))
+        self._turno_rag(estado)
+        self.assertEqual(estado.contexto_seguimiento(["general"], 1)["filas"], [3, 7])
+        # Otras carpetas, otro índice o un turno que no es RAG: no se reutiliza
+        self.assertIsNone(estado.contexto_seguimiento(["general", "estudiantes"], 1))
+        self.assertIsNone(estado.contexto_seguimiento(["general"], 2))
+        estado.agregar_turno("quiero hablar con un asesor", "agent_handoff")
+        self.assertIsNone(estado.contexto_seguimiento(["general"], 1))
+
+    @override_settings(RAG_SESION_TURNOS=3)
+    def test_turnos_acotados_y_persistencia(self):
+        estado = conversacion.obtener("sesion-prueba-2")
+        for i in range(5):
+            estado.agregar_turno(f"pregunta {i}", "simple")
+        estado.aclaracion_pendiente = "¿Cómo pido el certificado?"
+        estado.guardar()
+        cargado = conversacion.obtener("sesion-prueba-2")
+        self.assertEqual([t["pregunta"] for t in cargado.turnos], ["pregunta 2", "pregunta 3", "pregunta 4"])
+        self.assertEqual(cargado.aclaracion_pendiente, "¿Cómo pido el certificado?")
+        self.assertIsNone(conversacion.obtener("corto"))
+        self.assertIsNone(conversacion.obtener(None))
+
+
+def _intencion(answer_type="informational", ambigua=False, **extra):
+    datos = {
+        "intent_code": "consulta", "accion": "consultar", "objeto": "beca", "answer_type": answer_type,
+        "is_ambiguous": ambigua, "agent_handoff": answer_type == "operational",
+        "system_response": "respuesta del sistema", "search_query": None,
+    }
+    if ambigua:
+        datos["answer_type"] = "clarification"
+    return {**datos, **extra}
+
+
+class ChatMemoriaSesionTests(TestCase):
+    """ChatView con memoria de sesión: aclaraciones, seguimientos y handoff."""
+
+    SESION = "sesion-chat-prueba"
+
+    def setUp(self):
+        conversacion.caches[conversacion.ALIAS_CACHE].clear()
+        self.servicio = mock.MagicMock(generacion=1)
+        self.servicio.consultar.side_effect = lambda **kw: {
+            "response": "respuesta", "sources": ["becas.pdf"], "search_query": "query",
+            "filas_candidatas": [5, 9],
+        }
+        for objetivo in (
+            mock.patch.object(views, "rag_service", self.servicio),
+            mock.patch.object(views.respuestas_frecuentes, "por_similitud", return_value=None),
+            mock.patch.object(views.respuestas_frecuentes, "por_intencion", return_value=None),
+        ):
+            objetivo.start()
+            self.addCleanup(objetivo.stop)
+        self.intenciones = []
+        parcheo = mock.patch.object(views, "procesar_mensaje_usuario", side_effect=self._clasificar)
+        self.clasificador = parcheo.start()
+        self.addCleanup(parcheo.stop)
+
+    def _clasificar(self, texto):
+        return {**self.intenciones.pop(0), "original_text": texto}
+
+    def _chat(self, mensaje, intencion):
+        self.intenciones.append(intencion)
+        respuesta = self.client.post("/api/chatbot/chat/", {"message": mensaje, "session_id": self.SESION},
+                                     content_type="application/json")
+        eventos = [json.loads(l) for l in b"".join(respuesta.streaming_content).decode().splitlines()]
+        return eventos[-1]["data"]
+
+    def test_seguimiento_informativo_reutiliza_filas(self):
+        self._chat("¿Cómo solicito una beca?", _intencion())
+        final = self._chat("¿y cuáles son los plazos?", _intencion())
+        self.assertEqual(final["type"], "rag_response")
+        seguimiento = self.servicio.consultar.call_args.kwargs["seguimiento"]
+        self.assertEqual(seguimiento["filas"], [5, 9])
+        self.assertEqual(self.clasificador.call_count, 2)
+
+    def test_seguimiento_operativo_va_al_handoff(self):
+        self._chat("¿Cómo solicito una beca?", _intencion())
+        final = self._chat("y quiero hablar con un agente", _intencion("operational"))
+        self.assertEqual(final["type"], "agent_handoff")
+        self.assertEqual(self.servicio.consultar.call_count, 1)
+
+    def test_seguimiento_ambiguo_usa_el_turno_anterior(self):
+        self._chat("¿Cómo solicito una beca?", _intencion())
+        final = self._chat("¿y eso cuánto tarda?", _intencion(ambigua=True))
+        self.assertEqual(final["type"], "rag_response")
+        self.assertIsNotNone(self.servicio.consultar.call_args.kwargs["seguimiento"])
+
+    def test_sin_turno_anterior_no_hay_seguimiento(self):
+        self._chat("y los requisitos de titulación?", _intencion())
+        self.assertIsNone(self.servicio.consultar.call_args.kwargs["seguimiento"])
+
+    def test_aclaracion_se_fusiona_con_la_pregunta_original(self):
+        final = self._chat("certificado", _intencion(ambigua=True))
+        self.assertEqual(final["type"], "clarification")
+        # La respuesta a la aclaración se clasifica junto con la pregunta original, una sola ronda
+        final = self._chat("de matrícula", _intencion(ambigua=True))
+        self.assertEqual(final["type"], "rag_response")
+        self.assertEqual(self.clasificador.call_args.args[0], "certificado (de matrícula)")
+        self.assertEqual(self.servicio.consultar.call_args.kwargs["query"], "certificado (de matrícula)")
+
+
+class AlmacenChunksTests(TestCase):
+    DIMENSION = 8
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="test_almacen_"))
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.rng = np.random.default_rng(36)
+
+    def _agregar(self, vector_store, nombre: str, chunks: int):
+        textos = [f"{nombre} chunk {i}" for i in range(chunks)]
+        vectores = self.rng.random((chunks, self.DIMENSION)).astype(np.float32)
+        metadatas = [{"source": f"/docs/general/{nombre}", "filename": nombre, "categoria": "general",
+                      "content_hash": f"hash-{nombre}", "chunk_id": i, "pagina": i + 1} for i in range(chunks)]
+        vector_store.add_embeddings(list(zip(textos, vectores)), metadatas,
+                                    ids=almacen_chunks.ids_nuevos(vector_store, chunks))
+        return textos
+
+    def _cargar(self):
+        vector_store = almacen_chunks.cargar(self.tmp, EmbeddingsNulos())
+        self.addCleanup(vector_store.docstore.cerrar)
+        return vector_store
+
+    def test_guardar_y_recargar(self):
+        import faiss
+        vector_store = almacen_chunks.nuevo_indice(self.tmp, EmbeddingsNulos(), faiss.IndexFlatL2(self.DIMENSION))
+        textos = self._agregar(vector_store, "a.pdf", 3) + self._agregar(vector_store, "b.pdf", 2)
+        almacen_chunks.guardar(vector_store, self.tmp)
+        vector_store.docstore.cerrar()
+
+        cargado = self._cargar()
+        self.assertEqual(cargado.index.ntotal, 5)
+        self.assertEqual([cargado.docstore.search(str(i)).page_content for i in range(5)], textos)
+        doc = cargado.docstore.search("4")
+        self.assertEqual((doc.metadata["filename"], doc.metadata["chunk_id"], doc.metadata["pagina"]), ("b.pdf", 1, 2))
+        self.assertEqual(cargado.docstore.hashes(), {("hash-a.pdf", "general"), ("hash-b.pdf", "general")})
+
+    def test_truncar_descarta_documentos_sin_chunks(self):
+        import faiss
+        vector_store = almacen_chunks.nuevo_indice(self.tmp, EmbeddingsNulos(), faiss.IndexFlatL2(self.DIMENSION))
+        self._agregar(vector_store, "a.pdf", 3)
+        almacen_chunks.guardar(vector_store, self.tmp)
+        # Corte entre el commit de chunks.sqlite3 y la escritura de index.faiss
+        self._agregar(vector_store, "b.pdf", 2)
+        vector_store.docstore.confirmar()
+        vector_store.docstore.cerrar()
+
+        cargado = self._cargar()
+        self.assertEqual(cargado.index.ntotal, 3)
+        self.assertEqual(cargado.docstore.search("3"), "ID 3 not found.")
+        # b.pdf no quedó indexado: su re-subida no debe omitirse
+        self.assertEqual(cargado.docstore.hashes(), {("hash-a.pdf", "general")})
+        self._agregar(cargado, "b.pdf", 2)
+        self.assertEqual(cargado.docstore.search("4").metadata["filename"], "b.pdf")
+        self.assertEqual(len(cargado.docstore.hashes()), 2)
+
+    def test_migra_el_indice_pickle(self):
+        from langchain_community.vectorstores import FAISS
+        textos = [f"texto {i}" for i in range(4)]
+        vectores = self.rng.random((4, self.DIMENSION)).astype(np.float32)
+        metadatas = [{"source": "/docs/general/c.pdf", "filename": "c.pdf", "categoria": "general",
+                      "content_hash": "hash-c", "chunk_id": i} for i in range(4)]
+        FAISS.from_embeddings(list(zip(textos, vectores)), EmbeddingsNulos(), metadatas=metadatas).save_local(str(self.tmp))
+
+        migrado = self._cargar()
+        self.assertTrue((self.tmp / almacen_chunks.ARCHIVO_CHUNKS).exists())
+        self.assertTrue((self.tmp / f"{almacen_chunks.ARCHIVO_LEGACY}.bak").exists())
+        self.assertFalse((self.tmp / almacen_chunks.ARCHIVO_LEGACY).exists())
+        self.assertEqual([migrado.docstore.search(str(i)).page_content for i in range(4)], textos)
+        np.testing.assert_allclose(migrado.index.reconstruct(2), vectores[2])
+        migrado.docstore.cerrar()
+        # La siguiente carga ya usa chunks.sqlite3
+        self.assertEqual(self._cargar().docstore.search("3").metadata["chunk_id"], 3)
+
+
+class IndiceCompactoTests(TestCase):
+    DIMENSION = 64
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="test_compacto_"))
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        rng = np.random.default_rng(37)
+        # Energía concentrada en las primeras dimensiones (como un embedding Matryoshka), normalizados
+        escala = np.exp(-np.arange(self.DIMENSION) / 12).astype(np.float32)
+        self.base = self._normalizar(rng.standard_normal((1500, self.DIMENSION)).astype(np.float32) * escala)
+        ruido = rng.standard_normal((20, self.DIMENSION)).astype(np.float32) * escala * 0.3
+        self.consultas = self._normalizar(self.base[rng.choice(len(self.base), 20, replace=False)] + ruido)
+
+    @staticmethod
+    def _normalizar(x):
+        return np.ascontiguousarray(x / np.linalg.norm(x, axis=1, keepdims=True), dtype=np.float32)
+
+    def _config(self, **cambios):
+        config = {"modo": "compacto", "reduccion": "truncar", "dimension_reducida": 16,
+                  "cuantizacion": "sq8", "pq_m": 8, "factor_rescore": 10}
+        config.update(cambios)
+        return config
+
+    def _plano(self):
+        import faiss
+        plano = faiss.IndexFlatL2(self.DIMENSION)
+        plano.add(self.base)
+        return plano
+
+    def _compacto(self, **cambios):
+        indice = indice_vectorial.crear(self.tmp, self.DIMENSION, self._config(**cambios))
+        indice.add(self.base)
+        return indice
+
+    def _assert_igual_al_plano(self, indice, k=5):
+        esperadas, etiquetas_planas = self._plano().search(self.consultas, k)
+        distancias, etiquetas = indice.search(self.consultas, k)
+        np.testing.assert_array_equal(etiquetas, etiquetas_planas)
+        np.testing.assert_allclose(distancias, esperadas, rtol=1e-4, atol=1e-5)
+
+    def test_rescore_exacto_desde_el_memmap(self):
+        indice = self._compacto()
+        self.assertIsNotNone(indice._reducido)
+        self.assertEqual((self.tmp / indice_vectorial.ARCHIVO_VECTORES).stat().st_size, self.base.nbytes)
+        self.assertIsInstance(indice._completos(), np.memmap)
+
+        distancias, etiquetas = indice.search(self.consultas, 5)
+        for consulta, filas, obtenidas in zip(self.consultas, etiquetas, distancias):
+            # L2² exacta sobre los vectores completos, no la distancia cuantizada
+            exactas = ((self.base[filas] - consulta) ** 2).sum(axis=1)
+            np.testing.assert_allclose(obtenidas, exactas, rtol=1e-5, atol=1e-6)
+            self.assertTrue(np.all(np.diff(obtenidas) >= 0))
+
+    def test_top_k_coincide_con_indice_plano(self):
+        self._assert_igual_al_plano(self._compacto())
+
+    def test_sin_entrenar_busca_exacto(self):
+        indice = indice_vectorial.crear(self.tmp, self.DIMENSION, self._config())
+        indice.add(self.base[:100])
+        self.assertIsNone(indice._reducido)
+        distancias, etiquetas = indice.search(self.consultas[:1], 120)
+        self.assertEqual(etiquetas[0, 100:].tolist(), [-1] * 20)
+        self.assertEqual(sorted(etiquetas[0, :100].tolist()), list(range(100)))
+
+    def test_guardar_y_cargar(self):
+        indice = self._compacto()
+        indice_vectorial.guardar(indice, self.tmp)
+        esperadas = indice.search(self.consultas, 5)
+        # Vectores agregados después del último guardado (ingesta cortada): se descartan al cargar
+        indice.add(self.base[:10])
+
+        cargado = indice_vectorial.cargar(self.tmp)
+        self.assertIsInstance(cargado, indice_vectorial.IndiceCompacto)
+        self.assertEqual((cargado.ntotal, cargado.entrenado_con), (len(self.base), len(self.base)))
+        self.assertEqual(cargado.config, indice.config)
+        self.assertEqual((self.tmp / indice_vectorial.ARCHIVO_VECTORES).stat().st_size, self.base.nbytes)
+        self.assertIsNotNone(cargado._reducido)
+        for obtenido, esperado in zip(cargado.search(self.consultas, 5), esperadas):
+            np.testing.assert_array_equal(obtenido, esperado)
+
+    def test_adaptar_plano_a_compacto(self):
+        for reduccion in ("truncar", "pca"):
+            with self.subTest(reduccion=reduccion):
+                config = self._config(reduccion=reduccion)
+                indice, cambio = indice_vectorial.adaptar(self._plano(), self.tmp, config)
+                self.assertTrue(cambio)
+                self.assertIsInstance(indice, indice_vectorial.IndiceCompacto)
+                self.assertEqual(indice.config["reduccion"], reduccion)
+                np.testing.assert_array_equal(indice.reconstruir_todos(), self.base)
+                self._assert_igual_al_plano(indice)
+                # Misma configuración: no hay nada que convertir
+                self.assertEqual(indice_vectorial.adaptar(indice, self.tmp, config), (indice, False))
+
+    def test_adaptar_compacto_a_plano(self):
+        indice = self._compacto(reduccion="pca")
+        indice_vectorial.guardar(indice, self.tmp)
+        plano, cambio = indice_vectorial.adaptar(indice, self.tmp, self._config(modo="plano"))
+        self.assertTrue(cambio)
+        self.assertNotIsInstance(plano, indice_vectorial.IndiceCompacto)
+        np.testing.assert_array_equal(plano.reconstruct_n(0, plano.ntotal), self.base)
+        self.assertFalse((self.tmp / indice_vectorial.ARCHIVO_CONFIG).exists())
+        self.assertNotIsInstance(indice_vectorial.cargar(self.tmp), indice_vectorial.IndiceCompacto)
+
+
+class _PoolManual:
+    """Pool de ingesta falso: guarda las tareas y las corre en un hilo cuando el test lo pide."""
+
+    def __init__(self):
+        self.tareas = []
+
+    def submit(self, funcion, *args):
+        self.tareas.append((funcion, args))
+
+    def correr(self):
+        # En otro hilo, como el pool real: _actualizar_catalogo cierra la conexión de su hilo
+        hilo = threading.Thread(target=lambda: [funcion(*args) for funcion, args in self.tareas])
+        hilo.start()
+        hilo.join()
+        self.tareas.clear()
+
+
+class SubidaDocumentosTests(TransactionTestCase):
+    """DocumentUploadView + SubidaDirectaHandler + trabajos de ingesta, con un servicio falso."""
+
+    URL = "/api/chatbot/upload-documents/"
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="test_subida_"))
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        ajustes = override_settings(DOCUMENTOS_DIR=self.tmp, RAG_MAX_FILE_SIZE_MB=0.001)  # ~1 KB
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        catalogo._revisado = True
+        self.addCleanup(setattr, catalogo, "_revisado", False)
+
+        self.servicio = mock.MagicMock(generacion=4)
+        self.servicio.ya_indexado.side_effect = lambda sha256, categoria: sha256 == self._sha(b"ya indexado")
+        self.servicio.ingerir.side_effect = self._ingerir
+        self.servicio.guardar_indice.return_value = True
+        self.pool = _PoolManual()
+        for objetivo in (mock.patch.object(views, "rag_service", self.servicio),
+                         mock.patch.object(ingestion, "_pool", return_value=self.pool)):
+            objetivo.start()
+            self.addCleanup(objetivo.stop)
+
+    @staticmethod
+    def _sha(contenido: bytes) -> str:
+        return hashlib.sha256(contenido).hexdigest()
+
+    @staticmethod
+    def _ingerir(ruta, categoria, content_hash):
+        if Path(ruta).name == "roto.pdf":
+            raise ValueError("PDF ilegible")
+        return 3
+
+    def _subir(self, *archivos, categoria="estudiantes"):
+        return self.client.post(self.URL, {
+            "files": [SimpleUploadedFile(nombre, contenido) for nombre, contenido in archivos],
+            "categoria": categoria,
+        })
+
+    def _estado(self, job_id):
+        return self.client.get(f"{self.URL}jobs/{job_id}/").json()
+
+    def test_subida_encolada_y_progreso(self):
+        respuesta = self._subir(("a.txt", b"contenido a"), ("roto.pdf", b"%PDF roto"),
+                                ("copia.txt", b"ya indexado"), ("grande.txt", b"x" * 2048))
+        self.assertEqual(respuesta.status_code, 202)
+        datos = respuesta.json()
+        self.assertEqual(datos["status"], "en_cola")
+        self.assertEqual(datos["progress"], 0)
+        self.assertEqual(datos["status_url"], f"{self.URL}jobs/{datos['job_id']}/")
+        self.assertEqual(datos["skipped"], [{"file": "copia.txt", "reason": "Contenido ya indexado"}])
+        self.assertEqual(datos["errors"], [{"file": "grande.txt", "error": "Excede 0.001MB"}])
+
+        # Guardado en su carpeta con el sha256 calculado durante el streaming; sin restos en .incoming
+        self.assertEqual((self.tmp / "estudiantes" / "a.txt").read_bytes(), b"contenido a")
+        self.assertFalse((self.tmp / "estudiantes" / "copia.txt").exists())
+        self.assertFalse((self.tmp / "estudiantes" / "grande.txt").exists())
+        self.assertEqual(list((self.tmp / ".incoming").iterdir()), [])
+        self.assertEqual(DocumentoIndexado.objects.get(nombre="a.txt").sha256, self._sha(b"contenido a"))
+        self.assertEqual(self.servicio.ingerir.call_count, 0)
+
+        with self.assertLogs("chatbot.ingestion", "ERROR"):
+            self.pool.correr()
+        estado = self._estado(datos["job_id"])
+        self.assertEqual(estado["status"], "completado")
+        self.assertEqual(estado["progress"], 100)
+        self.assertEqual(estado["total_chunks_added"], 3)
+        self.assertEqual({a["filename"]: a["status"] for a in estado["files"]}, {"a.txt": "completado", "roto.pdf": "error"})
+        self.assertIn({"file": "roto.pdf", "error": "PDF ilegible"}, estado["errors"])
+        self.assertEqual(estado["message"], "Procesados 1 de 4 archivos.")
+        self.servicio.guardar_indice.assert_called_once()
+        self.servicio.ingerir.assert_any_call(str(self.tmp / "estudiantes" / "a.txt"), categoria="estudiantes",
+                                              content_hash=self._sha(b"contenido a"))
+        documento = DocumentoIndexado.objects.get(nombre="a.txt")
+        self.assertEqual((documento.chunks, documento.generacion), (3, 4))
+        self.assertEqual(DocumentoIndexado.objects.get(nombre="roto.pdf").error, "PDF ilegible")
+
+    def test_indice_no_guardado_marca_error(self):
+        self.servicio.guardar_indice.return_value = False
+        job_id = self._subir(("a.txt", b"contenido a")).json()["job_id"]
+        with self.assertLogs("chatbot.ingestion", "WARNING"):
+            self.pool.correr()
+        estado = self._estado(job_id)
+        self.assertEqual(estado["status"], "error")
+        self.assertEqual(estado["files"][0]["status"], "error")
+
+    def test_todo_rechazado_responde_400(self):
+        respuesta = self._subir(("grande.txt", b"x" * 2048))
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()["errors"], [{"file": "grande.txt", "error": "Excede 0.001MB"}])
+        self.assertEqual(self.pool.tareas, [])
+        self.assertEqual(self.client.post(self.URL, {}).status_code, 400)
+
+    def test_solo_omitidos_completa_sin_ingestar(self):
+        datos = self._subir(("copia.txt", b"ya indexado")).json()
+        self.assertEqual(datos["status"], "completado")
+        self.assertEqual(self.pool.tareas, [])
+
+    def test_tamano_declarado_se_rechaza_sin_escribir(self):
+        from chatbot.uploads import SubidaDirectaHandler
+        handler = SubidaDirectaHandler()
+        handler.new_file("files", "grande.pdf", "application/pdf", 4096)
+        self.assertIsNone(handler.receive_data_chunk(b"x" * 512, 0))
+        archivo = handler.file_complete(512)
+        self.assertEqual((archivo.error, archivo.ruta, archivo.sha256), ("Excede 0.001MB", None, None))
+        self.assertEqual(list((self.tmp / ".incoming").iterdir()), [])
+
+    def test_trabajo_inexistente(self):
+        self.assertEqual(self.client.get(f"{self.URL}jobs/noexiste/").status_code, 404)
+
+
+@override_settings(
+    OLLAMA_BACKENDS_GENERACION=["http://ollama-a:11434", "http://ollama-b:11434"],
+    OLLAMA_EYECCION_FALLOS=2, OLLAMA_EYECCION_S=30,
+)
+class OllamaBalanceoTests(TestCase):
+    """Elección por menos requests en curso, eyección tras fallos seguidos y reintentos en otro backend."""
+
+    def setUp(self):
+        parche = mock.patch.dict(ollama_cliente._backends, clear=True)
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.hosts = []
+        self.cabeceras_host = []
+        self.respuestas = {}  # host → lista de códigos o excepciones a devolver en orden
+
+    def _responder(self, request):
+        host = request.url.host
+        self.hosts.append(host)
+        self.cabeceras_host.append(request.headers["Host"])
+        respuesta = self.respuestas[host].pop(0) if self.respuestas.get(host) else 200
+        if isinstance(respuesta, Exception):
+            raise respuesta
+        # Cuerpo como iterador: la respuesta queda abierta igual que un stream real de Ollama
+        return httpx.Response(respuesta, content=iter([b"{}"]))
+
+    def _transporte(self, reintentos=2):
+        return ollama_cliente.TransporteOllama("generacion", httpx.MockTransport(self._responder),
+                                               reintentos=reintentos, backoff_s=0)
+
+    def _pedir(self, transporte):
+        return transporte.handle_request(httpx.Request("POST", "http://localhost:11434/api/chat", json={}))
+
+    def _backend(self, host):
+        return ollama_cliente._backends[f"http://{host}:11434"]
+
+    def test_elige_el_de_menos_requests_en_curso(self):
+        transporte = self._transporte()
+        primera = self._pedir(transporte)
+        # La respuesta abierta (stream de generación) mantiene ocupado a su backend
+        self.assertEqual(self._backend("ollama-a").en_curso, 1)
+        segunda = self._pedir(transporte)
+        self.assertEqual(self.hosts, ["ollama-a", "ollama-b"])
+
+        primera.close()
+        self.assertEqual(self._backend("ollama-a").en_curso, 0)
+        self._pedir(transporte).close()
+        self.assertEqual(self.hosts[-1], "ollama-a")
+        segunda.close()
+        self.assertEqual([self._backend(h).en_curso for h in ("ollama-a", "ollama-b")], [0, 0])
+
+    def test_reintenta_en_otro_backend(self):
+        self.respuestas["ollama-a"] = [503]
+        with self.assertLogs("chatbot.ollama_cliente", "WARNING"):
+            respuesta = self._pedir(self._transporte())
+        respuesta.close()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.hosts, ["ollama-a", "ollama-b"])
+        self.assertEqual(self.cabeceras_host, ["ollama-a:11434", "ollama-b:11434"])
+        self.assertEqual((self._backend("ollama-a").errores, self._backend("ollama-b").requests), (1, 1))
+
+    def test_error_de_conexion_se_reintenta_y_el_ultimo_se_propaga(self):
+        error = httpx.ConnectError("rechazada")
+        self.respuestas = {"ollama-a": [error, error], "ollama-b": [error]}
+        with self.assertLogs("chatbot.ollama_cliente", "WARNING"), self.assertRaises(httpx.ConnectError):
+            self._pedir(self._transporte(reintentos=2))
+        self.assertEqual(self.hosts, ["ollama-a", "ollama-b", "ollama-a"])
+        self.assertEqual([self._backend(h).en_curso for h in ("ollama-a", "ollama-b")], [0, 0])
+
+    def test_ultimo_intento_devuelve_el_503(self):
+        self.respuestas = {"ollama-a": [503], "ollama-b": [503]}
+        with self.assertLogs("chatbot.ollama_cliente", "WARNING"):
+            respuesta = self._pedir(self._transporte(reintentos=1))
+        respuesta.close()
+        self.assertEqual(respuesta.status_code, 503)
+
+    def test_eyeccion_tras_fallos_seguidos(self):
+        self.respuestas["ollama-a"] = [httpx.ConnectError("caído")] * 2
+        transporte = self._transporte(reintentos=0)
+        with self.assertLogs("chatbot.ollama_cliente", "WARNING") as logs:
+            for _ in range(2):
+                with self.assertRaises(httpx.ConnectError):
+                    self._pedir(transporte)
+        self.assertEqual(self.hosts, ["ollama-a", "ollama-a"])
+        self.assertTrue(self._backend("ollama-a").eyectado)
+        self.assertIn("eyectado", logs.output[-1])
+
+        for _ in range(3):
+            self._pedir(transporte).close()
+        self.assertEqual(self.hosts[-3:], ["ollama-b"] * 3)
+
+        # Vencida la eyección vuelve a recibir tráfico
+        self._backend("ollama-a").eyectado_hasta = 0.0
+        self._pedir(transporte).close()
+        self.assertEqual(self.hosts[-1], "ollama-a")
+
+    def test_todos_eyectados_prueba_el_que_vuelve_antes(self):
+        self._pedir(self._transporte()).close()  # registra los backends del rol
+        self._backend("ollama-a").eyectado_hasta = time.monotonic() + 60
+        self._backend("ollama-b").eyectado_hasta = time.monotonic() + 30
+        backend = ollama_cliente.elegir("generacion")
+        ollama_cliente.liberar(backend, "generacion", True, 0.0)
+        self.assertEqual(backend.url, "http://ollama-b:11434")
+
+    def test_medidas_sin_pool_expuesto(self):
+        ollama_cliente.elegir("generacion")
+        with mock.patch.object(ollama_cliente, "_http", httpx.MockTransport(self._responder)):
+            medidas = ollama_cliente._medidas()
+        nombres = {nombre for nombre, _, _ in medidas}
+        self.assertNotIn("chatbot_ollama_pool_conexiones", nombres)
+        self.assertIn(("chatbot_ollama_backend_en_curso", {"backend": "http://ollama-a:11434"}, 1), medidas)
+
+
+class KAdaptativoTests(ServicioStubTestCase):
+    """Búsqueda con k adaptativo: empieza en k_inicial, se duplica hasta k solo si la cola sigue relevante."""
+
+    def setUp(self):
+        super().setUp()
+        ajustes = override_settings(RAG_INDICE_MODO="compacto", RAG_CHUNK_SIZE=200, RAG_CHUNK_OVERLAP=0)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        ruta = self.documentos / "becas.txt"
+        rng = np.random.default_rng(48)
+        vocabulario = ["beca", "matrícula", "plazo", "solicitud", "crédito", "periodo", "rector", "tutor",
+                       "examen", "horario", "pago", "título", "práctica", "convenio", "sede", "aula"]
+        ruta.write_text("\n\n".join(
+            f"Artículo {i}.- " + " ".join(rng.choice(vocabulario, 20)) for i in range(40)
+        ), encoding="utf-8")
+        self.servicio = LocalRAGService(index_path=self.indice)
+        self.servicio.ingerir(str(ruta), "general")
+        self.assertGreaterEqual(self.servicio.vector_store.index.ntotal, 16)
+        self.ks = []
+
+    def _recuperar(self, perfil, **cambios):
+        """`perfil(k)`: distancias que devuelve el índice para las k filas más cercanas."""
+        indice = self.servicio.vector_store.index
+        buscar = indice.search
+
+        def buscar_con_perfil(x, k):
+            self.ks.append(k)
+            distancias, etiquetas = buscar(x, k)
+            return np.broadcast_to(perfil(k), distancias.shape).astype(np.float32), etiquetas
+
+        config = self.servicio.config_recuperacion(**{
+            "k": 16, "k_inicial": 2, "umbral": 0.0, "margen": 0.1,
+            "max_total": 100, "limite_fuente": 100, "limite_reglamento": 100, **cambios,
+        })
+        with mock.patch.object(indice, "search", side_effect=buscar_con_perfil):
+            return self.servicio.recuperar("becas", "becas", ["general"], config)
+
+    @staticmethod
+    def _plano(k):
+        return np.full(k, 0.5)
+
+    @staticmethod
+    def _empinado(k):
+        return np.arange(k, dtype=np.float32)
+
+    def test_scores_planos_amplian_hasta_k(self):
+        resultado = self._recuperar(self._plano)
+        self.assertEqual(self.ks, [2, 4, 8, 16])
+        self.assertEqual(resultado["k"], 16)
+        self.assertEqual(len(resultado["docs"]), 16)
+
+    def test_caida_de_score_no_amplia(self):
+        resultado = self._recuperar(self._empinado)
+        self.assertEqual(self.ks, [2])
+        self.assertEqual(resultado["k"], 2)
+
+    def test_se_detiene_al_completar_max_total(self):
+        resultado = self._recuperar(self._plano, max_total=3)
+        self.assertEqual(self.ks, [2, 4])
+        self.assertEqual(len(resultado["docs"]), 3)
+
+    def test_k_dentro_de_los_limites(self):
+        casos = [
+            ({"k": 16, "k_inicial": 32}, [16]),  # k_inicial por encima del máximo
+            ({"k": 12, "k_inicial": 5}, [5, 10, 12]),  # la última ronda se recorta a k
+            ({"k": 16, "k_inicial": 0}, [16]),  # 0 = k fijo
+        ]
+        for cambios, esperados in casos:
+            with self.subTest(**cambios):
+                self.ks = []
+                resultado = self._recuperar(self._plano, **cambios)
+                self.assertEqual(self.ks, esperados)
+                self.assertEqual(resultado["k"], esperados[-1])
+                self.assertTrue(all(min(cambios["k_inicial"] or cambios["k"], cambios["k"]) <= k <= cambios["k"]
+                                    for k in self.ks))
+
+    def test_ampliar_k(self):
+        config = {"umbral": 0.3, "margen": 0.1}
+        plano = (np.arange(4), np.full(4, 0.5, dtype=np.float32))
+        empinado = (np.arange(4), np.array([0.0, 0.2, 0.5, 1.0], dtype=np.float32))
+        incompleto = (np.array([0, 1, -1, -1]), np.full(4, 0.5, dtype=np.float32))
+        self.assertTrue(LocalRAGService._ampliar_k([plano], 4, config))
+        self.assertFalse(LocalRAGService._ampliar_k([empinado], 4, config))
+        # La query ya devolvió todo lo que había en el índice
+        self.assertFalse(LocalRAGService._ampliar_k([incompleto], 4, config))
+        # Basta con que una query siga en la zona relevante
+        self.assertTrue(LocalRAGService._ampliar_k([empinado, plano], 4, config))
+        # Cola plana pero bajo el umbral
+        self.assertFalse(LocalRAGService._ampliar_k([plano], 4, {"umbral": 0.9, "margen": 0.1}))
+
+
+@override_settings(CHAT_GZIP=True, CHAT_DEBUG_PAYLOAD=False)
+class EventosCompactosTests(TestCase):
+    """Esquema de eventos v2 comprimido con gzip incremental: mismos eventos que v1."""
+
+    def setUp(self):
+        servicio = mock.MagicMock(generacion=1)
+        servicio.consultar.side_effect = lambda **kw: {
+            "response": "Puedes solicitarla en la secretaría.", "sources": ["becas.pdf"], "search_query": "becas",
+            "filas_candidatas": [], "debug_context": "contexto", "is_fallback": False,
+        }
+        for objetivo in (
+            mock.patch.object(views, "rag_service", servicio),
+            mock.patch.object(views.respuestas_frecuentes, "por_similitud", return_value=None),
+            mock.patch.object(views.respuestas_frecuentes, "por_intencion", return_value=None),
+            mock.patch.object(views, "procesar_mensaje_usuario",
+                              side_effect=lambda texto: {**_intencion(), "original_text": texto}),
+        ):
+            objetivo.start()
+            self.addCleanup(objetivo.stop)
+
+    def _descomprimir(self, bloques):
+        """Cada bloque del stream se descomprime por sí solo en líneas NDJSON completas."""
+        descompresor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        lineas = []
+        for bloque in bloques:
+            texto = descompresor.decompress(bloque).decode("utf-8")
+            if texto:
+                self.assertTrue(texto.endswith("\n"), texto)
+                lineas += texto.splitlines()
+        self.assertTrue(descompresor.eof)
+        return [json.loads(linea) for linea in lineas]
+
+    def _chat(self, **cuerpo):
+        respuesta = self.client.post("/api/chatbot/chat/", {"message": "¿Cómo pido una beca?", **cuerpo},
+                                     content_type="application/json", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(respuesta["Content-Encoding"], "gzip")
+        return respuesta, self._descomprimir(list(respuesta.streaming_content))
+
+    def test_gzip_incremental_un_evento_por_bloque(self):
+        v1 = [
+            {"type": "status", "text": "Entendiendo tu intención"},
+            {"type": "status", "text": "Buscando documentos"},
+            {"type": "final", "data": {"type": "rag_response", "text": "ñandú €", "sources": [],
+                                       "is_fallback": False, "search_query": None}},
+            {"type": "error", "text": "falló", "code": "timeout"},
+        ]
+        lineas = [json.dumps(views._evento_compacto(e), ensure_ascii=False) + "\n" for e in v1]
+        bloques = list(views._gzip_incremental(iter(lineas)))
+        self.assertEqual(len(bloques), len(lineas) + 1)  # + cierre del gzip
+        self.assertEqual(self._descomprimir(bloques), [
+            {"s": "intencion"}, {"s": "busqueda"}, {"f": "rag_response", "text": "ñandú €"},
+            {"error": "falló", "code": "timeout"},
+        ])
+
+    def test_stream_compacto_equivale_a_v1(self):
+        respuesta_v1, v1 = self._chat()
+        respuesta_v2, v2 = self._chat(v=views.ESQUEMA_EVENTOS)
+        self.assertEqual(respuesta_v1["X-Chat-Esquema"], "1")
+        self.assertEqual(respuesta_v2["X-Chat-Esquema"], str(views.ESQUEMA_EVENTOS))
+        self.assertEqual(v1[-1]["data"]["type"], "rag_response")
+        self.assertNotIn("debug_context", v1[-1]["data"])
+        self.assertEqual(v2, [views._evento_compacto(evento) for evento in v1])
+        self.assertNotIn("is_fallback", v2[-1])
+
+    def test_sin_gzip_el_stream_va_plano(self):
+        respuesta = self.client.post("/api/chatbot/chat/", {"message": "hola", "v": views.ESQUEMA_EVENTOS},
+                                     content_type="application/json")
+        self.assertFalse(respuesta.has_header("Content-Encoding"))
+        eventos = [json.loads(l) for l in b"".join(respuesta.streaming_content).decode().splitlines()]
+        self.assertEqual(eventos[0], {"s": "intencion"})
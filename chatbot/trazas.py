@@ -0,0 +1,81 @@
+"""
+Registro de trazas de chat (JSONL append-only) para analizar y reproducir requests lentos.
+
+Cada request de ChatView escribe una línea compacta con el mensaje, la sesión, las carpetas
+y el rol resueltos, el tipo de respuesta y la Traza de metrics (spans por etapa en ms y
+anotaciones: intención, query reformulada, chunks recuperados con su score, tokens de
+prompt/generados, decisión de la compuerta...). `python manage.py reproducir_trazas`
+re-ejecuta un archivo de trazas contra el código actual y compara latencias y resultados.
+
+Desactivado por defecto (RAG_TRAZAS_ARCHIVO vacío): las trazas contienen los mensajes de los
+usuarios. El archivo rota al superar RAG_TRAZAS_MAX_MB (se conserva un `.1`).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+
+_lock = threading.Lock()
+
+
+def _ruta():
+    return Path(settings.RAG_TRAZAS_ARCHIVO) if settings.RAG_TRAZAS_ARCHIVO else None
+
+
+def registrar(mensaje: str, session_id, categorias, rol, tipo: str, resumen: dict):
+    """Agrega la traza de un request (resumen = Traza.resumen())."""
+    ruta = _ruta()
+    if ruta is None:
+        return
+    linea = json.dumps({
+        "v": VERSION,
+        "ts": round(time.time(), 3),
+        "session_id": session_id,
+        "mensaje": mensaje,
+        "categorias": categorias,
+        "rol": rol,
+        "tipo": tipo,
+        **resumen,
+    }, ensure_ascii=False, separators=(",", ":"), default=str)
+    try:
+        with _lock:
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            if ruta.exists() and ruta.stat().st_size > settings.RAG_TRAZAS_MAX_MB * 1024 * 1024:
+                os.replace(ruta, ruta.with_name(ruta.name + ".1"))
+            with open(ruta, "a", encoding="utf-8") as f:
+                f.write(linea + "\n")
+    except OSError as e:
+        logger.warning(f"⚠️ No se pudo escribir la traza de chat: {e}")
+
+
+def leer(ruta) -> list:
+    """Trazas de un archivo JSONL, en orden; ignora líneas ilegibles."""
+    trazas = []
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            try:
+                trazas.append(json.loads(linea))
+            except ValueError:
+                continue
+    return trazas
+
+
+def duraciones(traza: dict) -> dict:
+    """Milisegundos por etapa (sumando las etapas repetidas, p. ej. un embedding por query)."""
+    total = {}
+    for etapa, ms in traza.get("spans", []):
+        total[etapa] = round(total.get(etapa, 0.0) + ms, 2)
+    return total
+
+
+def chunks(traza: dict) -> list:
+    """Ids de los chunks recuperados ("archivo#chunk"), en orden de score."""
+    return [c[0] for c in traza.get("datos", {}).get("recuperacion", {}).get("chunks", [])]
@@ -0,0 +1,93 @@
+"""
+Subida de documentos sin buffers intermedios.
+
+El handler escribe cada parte del multipart directamente en `DOCUMENTOS_DIR/.incoming`
+(mismo disco que el destino final, así `os.replace` es un rename atómico) mientras calcula
+el sha256 y el tamaño. Un archivo que supera RAG_MAX_FILE_SIZE_MB se descarta en cuanto
+cruza el límite, sin terminar de escribirlo.
+"""
+import hashlib
+import logging
+import os
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_ENTRANTE = ".incoming"
+
+
+class ArchivoEntrante(UploadedFile):
+    """Archivo ya escrito en disco: ruta temporal, sha256 y motivo de rechazo (si lo hay)."""
+
+    def __init__(self, name, size, ruta, sha256, error=None):
+        super().__init__(file=None, name=name, size=size)
+        self.ruta = ruta
+        self.sha256 = sha256
+        self.error = error
+
+    def mover(self, destino: Path):
+        os.replace(self.ruta, destino)
+        self.ruta = destino
+
+    def descartar(self):
+        if self.ruta:
+            Path(self.ruta).unlink(missing_ok=True)
+            self.ruta = None
+
+
+class SubidaDirectaHandler(FileUploadHandler):
+    """Reemplaza a los handlers de memoria/temporales de Django para DocumentUploadView."""
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_mb = getattr(settings, "RAG_MAX_FILE_SIZE_MB", 50)
+        self.max_bytes = self.max_mb * 1024 * 1024
+        self._entrantes = []
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        directorio = Path(settings.DOCUMENTOS_DIR) / DIRECTORIO_ENTRANTE
+        directorio.mkdir(parents=True, exist_ok=True)
+        self.ruta = directorio / f"{uuid.uuid4().hex}.part"
+        self.destino = open(self.ruta, "wb")
+        self._entrantes.append(self.ruta)
+        self.digest = hashlib.sha256()
+        self.tamano = 0
+        self.error = None
+        # Algunos clientes declaran el tamaño de la parte: se rechaza sin leer nada
+        if content_length and content_length > self.max_bytes:
+            self._rechazar()
+
+    def _rechazar(self):
+        self.error = f"Excede {self.max_mb}MB"
+        self.destino.close()
+        self.ruta.unlink(missing_ok=True)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error:
+            return None  # el resto de la parte se drena sin escribirse
+        self.tamano += len(raw_data)
+        if self.tamano > self.max_bytes:
+            self._rechazar()
+            return None
+        self.digest.update(raw_data)
+        self.destino.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.error:
+            return ArchivoEntrante(self.file_name, self.tamano, None, None, error=self.error)
+        self.destino.close()
+        return ArchivoEntrante(self.file_name, self.tamano, self.ruta, self.digest.hexdigest())
+
+    def upload_interrupted(self):
+        # Conexión cortada a mitad de la subida: no dejar .part huérfanos
+        if getattr(self, "destino", None) and not self.destino.closed:
+            self.destino.close()
+        for ruta in self._entrantes:
+            Path(ruta).unlink(missing_ok=True)
@@ -1,11 +1,14 @@
 from django.urls import path
-from .views import ChatView, health, DocumentUploadView
+from .views import ChatView, SessionView, health, metrics_view, DocumentUploadView, IngestionJobView
 
 app_name = 'chatbot'
 
 urlpatterns = [
     path('chat/', ChatView.as_view(), name='chat'),
+    path('session/', SessionView.as_view(), name='session'),
     path('health/', health, name='health'),
+    path('metrics/', metrics_view, name='metrics'),
     path('upload-documents/', DocumentUploadView.as_view(), name='upload_documents'),
+    path('upload-documents/jobs/<str:job_id>/', IngestionJobView.as_view(), name='ingestion_job'),
 ]
 
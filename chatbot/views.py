@@ -1,184 +1,315 @@
 import json
-import requests
+import time
 import logging
+import zlib
+from pathlib import Path
 from django.conf import settings
-from django.http import JsonResponse, StreamingHttpResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from . import catalogo, conversacion, ingestion, metrics, ollama_cliente, permisos, respuestas_frecuentes, trazas
 from .intent_parser import procesar_mensaje_usuario
-from .rag_service import rag_service
+from .rag_service import hash_archivo, rag_service
+from .uploads import SubidaDirectaHandler
 
 logger = logging.getLogger(__name__)
 
+# Formato compacto de eventos (el cliente lo pide con "v": 2 en el body):
+#   {"s": "busqueda"}                                   estado (código; el cliente tiene las etiquetas)
+#   {"f": "rag_response", "text": ..., "sources": [...]} final, sin campos vacíos ni en falso
+#   {"error": "...", "code": "..."}                     error
+ESQUEMA_EVENTOS = 2
+_CODIGOS_ESTADO = {
+    "Entendiendo tu intención": "intencion",
+    "Buscando documentos": "busqueda",
+    "Generando respuesta": "generacion",
+}
+_CAMPOS_DEBUG = ("intent_debug", "debug_context")
 
-class ChatView(APIView):
-    # Mapeo exacto de tu base de datos a las carpetas del disco
-    MAPA_ROLES = {
-        "es_estudiante": "estudiantes",
-        "es_profesor": "docentes",
-        "es_administrativo": "administrativos",
-        "es_externo": "externos",
-        "es_inscripcionaspirante": "aspirantes",
-        "es_inscripcionpostulante": "postulantes",
-        "es_postulante": "postulantes",
-        "es_postulanteempleo": "empleo",
-        "es_inscripcionadmision": "admision"
-    }
 
+def _evento_compacto(evento: dict) -> dict:
+    if evento["type"] == "status":
+        return {"s": _CODIGOS_ESTADO.get(evento["text"], evento["text"])}
+    if evento["type"] == "final":
+        data = evento["data"]
+        return {"f": data["type"], **{k: v for k, v in data.items() if k != "type" and v not in (None, False, [], {})}}
+    return {"error": evento.get("text", ""), **{k: v for k, v in evento.items() if k not in ("type", "text")}}
+
+
+def _gzip_incremental(lineas):
+    """
+    Comprime el stream NDJSON con un flush por evento (Z_SYNC_FLUSH): el navegador puede
+    descomprimir y mostrar cada evento apenas llega. GZipMiddleware bufferiza hasta juntar
+    bloques completos y retrasaría los estados.
+    """
+    compresor = zlib.compressobj(settings.CHAT_GZIP_NIVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for linea in lineas:
+        yield compresor.compress(linea.encode("utf-8")) + compresor.flush(zlib.Z_SYNC_FLUSH)
+    yield compresor.flush()
+
+
+class ChatView(APIView):
     def _obtener_permisos(self, session_data):
         """
-        Analiza el JSON de sesión y devuelve las carpetas permitidas.
+        Analiza el JSON de sesión y devuelve las carpetas permitidas (memoizado por persona).
         """
-        categorias = ["general"] # Siempre accesible
-        roles_texto = []
-
-        if not session_data or not isinstance(session_data, dict):
-            return categorias, "Visitante"
-
-        # Tu JSON tiene la cédula como clave principal: {"070...": {}}
-        # Iteramos sobre todas las personas en la sesión (usualmente una)
-        for cedula, datos in session_data.items():
-            perfiles = datos.get("perfiles", [])
-            
-            for perfil in perfiles:
-                # Verificamos que el perfil esté activo
-                if perfil.get("status") is True:
-                    
-                    # Revisamos cada bandera del mapa
-                    for flag_db, carpeta in self.MAPA_ROLES.items():
-                        if perfil.get(flag_db) is True:
-                            categorias.append(carpeta)
-                            # Guardar nombre para debug (ej: "Estudiante")
-                            nombre = flag_db.replace("es_", "").replace("inscripcion", "").capitalize()
-                            roles_texto.append(nombre)
-
-        return list(set(categorias)), ", ".join(set(roles_texto)) or "Visitante"
+        return permisos.resolver(session_data)
     
     def post(self, request):
+        # Memoria de la sesión (None si el cliente no envía session_id)
+        estado = conversacion.obtener(request.data.get('session_id'))
+        # Permisos resueltos dentro del stream, para la traza del request
+        resueltos_traza = {"categorias": None, "rol": None}
+        # intent_debug/debug_context solo si el cliente los pide (o CHAT_DEBUG_PAYLOAD)
+        incluir_debug = settings.CHAT_DEBUG_PAYLOAD or bool(request.data.get('debug'))
+        compacto = request.data.get('v') == ESQUEMA_EVENTOS
+
         # Envolvemos toda la lógica en un generador
         def event_stream():
+            with metrics.traza_request() as traza:
+                tipo_final = "error"
+                for evento in _eventos():
+                    tipo_final = evento.get("data", {}).get("type", evento["type"])
+                    if evento["type"] == "final" and not incluir_debug:
+                        evento["data"] = {k: v for k, v in evento["data"].items() if k not in _CAMPOS_DEBUG}
+                    if compacto:
+                        evento = _evento_compacto(evento)
+                    yield json.dumps(evento, ensure_ascii=False, separators=(",", ":")) + "\n"
+                if estado is not None:
+                    estado.guardar()
+                metrics.incrementar("chatbot_chat_requests_total", tipo=tipo_final)
+                metrics.observar("chatbot_etapa_duracion_segundos", time.perf_counter() - traza.inicio, etapa="total")
+                resumen = traza.resumen()
+                logger.info(f"⏱️ [CHAT] tipo={tipo_final} {json.dumps(resumen, ensure_ascii=False)}")
+                trazas.registrar(
+                    request.data.get('message', ''), request.data.get('session_id'),
+                    resueltos_traza["categorias"], resueltos_traza["rol"], tipo_final, resumen,
+                )
+
+        def _eventos():
             try:
                 # 1. Fase Inicial
-                yield json.dumps({"type": "status", "text": "Entendiendo tu intención"}) + "\n"
+                yield {"type": "status", "text": "Entendiendo tu intención"}
                 
                 user_message = request.data.get('message', '')
-                session_data = request.data.get('session_data', {})
-                
-                #  (Tu lógica de obtención de permisos) 
-                categorias_permitidas, rol_usuario = self._obtener_permisos(session_data)
+
+                # Permisos: token de /session/ (preferido) o el JSON de sesión completo
+                session_token = request.data.get('session_token')
+                if session_token:
+                    resueltos = permisos.por_token(session_token)
+                    if resueltos is None:
+                        yield {"type": "error", "code": "session_token_invalid", "text": "Sesión expirada, vuelve a registrarla."}
+                        return
+                    categorias_permitidas, rol_usuario = resueltos
+                else:
+                    categorias_permitidas, rol_usuario = self._obtener_permisos(request.data.get('session_data', {}))
+                resueltos_traza.update(categorias=categorias_permitidas, rol=rol_usuario)
+
+                # Memoria de sesión: respuesta a una aclaración o seguimiento de la pregunta anterior
+                seguimiento, aclarada = None, False
+                if estado is not None and estado.aclaracion_pendiente:
+                    user_message = f"{estado.aclaracion_pendiente} ({user_message})"
+                    estado.aclaracion_pendiente = None
+                    aclarada = True
+                    metrics.incrementar("chatbot_memoria_sesion_total", tipo="aclaracion")
+                elif estado is not None:
+                    turno_anterior = estado.contexto_seguimiento(categorias_permitidas, rag_service.generacion)
+                    if conversacion.es_seguimiento(user_message, turno_anterior):
+                        seguimiento = turno_anterior
+
+                # Pregunta frecuente casi idéntica a una precalculada: se sirve sin clasificar.
+                # Su embedding del mensaje se reutiliza en la búsqueda si no hay coincidencia.
+                precalculada, cache_vectores = None, {}
+                if not seguimiento and not aclarada:
+                    precalculada = respuestas_frecuentes.por_similitud(
+                        user_message, categorias_permitidas, rag_service.generacion, rag_service.embeddings,
+                        cache_vectores,
+                    )
 
                 # 2. Intent Parsing
-                intent_data = procesar_mensaje_usuario(user_message)
-                
+                if precalculada:
+                    # Ya tiene respuesta: no se clasifica
+                    intent_data = {
+                        "intent_code": "precalculada",
+                        "answer_type": "informational", "is_ambiguous": False,
+                        "agent_handoff": False, "original_text": user_message, "search_query": None,
+                    }
+                else:
+                    with metrics.medir("intencion"):
+                        intent_data = procesar_mensaje_usuario(user_message)
+                    if (aclarada or seguimiento) and intent_data.get("is_ambiguous"):
+                        # Una sola ronda de aclaración, y un seguimiento toma el contexto del turno
+                        # anterior: se responden tal cual
+                        intent_data.update(is_ambiguous=False, answer_type="informational")
+                    if seguimiento and (intent_data.get("agent_handoff")
+                                        or intent_data.get("answer_type") != "informational"):
+                        # "y quiero hablar con un asesor": camino normal (handoff), sin filas previas
+                        seguimiento = None
+                    if seguimiento:
+                        metrics.incrementar("chatbot_memoria_sesion_total", tipo="seguimiento")
+                metrics.anotar(
+                    "chat", intent_code=intent_data.get("intent_code"), answer_type=intent_data.get("answer_type"),
+                    ambigua=bool(intent_data.get("is_ambiguous")), seguimiento=bool(seguimiento), aclarada=aclarada,
+                )
+
                 # CASO 0: AMBIGÜEDAD DETECTADA (Pedimos aclaración)
                 if intent_data.get("is_ambiguous"):
-                    yield json.dumps({
+                    if estado is not None:
+                        estado.aclaracion_pendiente = user_message
+                        estado.agregar_turno(user_message, "clarification")
+                    yield {
                         "type": "final",
                         "data": {
                             "type": "clarification",
                             "text": intent_data["system_response"],
                             "intent_debug": intent_data
                         }
-                    }) + "\n"
+                    }
                     return  # Cortamos aquí. No gastamos RAG.
                 
                 # CASO 1: OPERATIVO (Agent Handoff)
                 if intent_data.get("answer_type") == "operational":
-                    yield json.dumps({
+                    if estado is not None:
+                        estado.agregar_turno(user_message, "agent_handoff")
+                    yield {
                         "type": "final",
                         "data": {
                             "type": "agent_handoff",
                             "text": intent_data["system_response"],
                             "intent_debug": intent_data
                         }
-                    }) + "\n"
+                    }
                     return
 
                 # CASO 2: INFORMATIVO (RAG)
                 if intent_data.get("answer_type") == "informational":
-                    yield json.dumps({"type": "status", "text": "Buscando documentos"}) + "\n"
+                    if precalculada is None and not seguimiento:
+                        precalculada = respuestas_frecuentes.por_intencion(
+                            intent_data, categorias_permitidas, rag_service.generacion
+                        )
 
-                    rag_response = rag_service.consultar(
-                        query=user_message,
-                        intent_data=intent_data,
-                        categorias_permitidas=categorias_permitidas,
-                        user_role_name=rol_usuario
-                    )
-                    
-                    yield json.dumps({"type": "status", "text": "Generando respuesta"}) + "\n"
+                    if precalculada is not None:
+                        metrics.incrementar(
+                            "chatbot_respuestas_precalculadas_total",
+                            via="similitud" if intent_data["intent_code"] == "precalculada" else "intencion",
+                        )
+                        rag_response = precalculada
+                    else:
+                        yield {"type": "status", "text": "Buscando documentos"}
+
+                        rag_response = rag_service.consultar(
+                            query=user_message,
+                            intent_data=intent_data,
+                            categorias_permitidas=categorias_permitidas,
+                            user_role_name=rol_usuario,
+                            search_query=intent_data.get("search_query"),
+                            seguimiento=seguimiento,
+                            cache_vectores=cache_vectores,
+                        )
+                        yield {"type": "status", "text": "Generando respuesta"}
+
+                    if estado is not None:
+                        # Un seguimiento conserva la pregunta raíz como contexto de los siguientes
+                        estado.agregar_turno(
+                            seguimiento["pregunta"] if seguimiento else user_message,
+                            "rag_response",
+                            query_busqueda=seguimiento["query_busqueda"] if seguimiento else rag_response.get("search_query"),
+                            filas=rag_response.get("filas_candidatas"),
+                            categorias=categorias_permitidas,
+                            generacion=rag_service.generacion,
+                        )
 
-                    yield json.dumps({
+                    yield {
                         "type": "final",
                         "data": {
                             "type": "rag_response",
                             "text": rag_response["response"],
                             "sources": rag_response["sources"],
                             "need_contact": rag_response.get("need_contact", False),
+                            "precomputed": precalculada is not None,
                             "intent_debug": intent_data,
                             "debug_context": {
                                 "rol_detectado": rol_usuario,
                                 "carpetas_acceso": categorias_permitidas
                             }
                         }
-                    }) + "\n"
+                    }
                 else:
                     # Respuesta default
-                    yield json.dumps({
+                    if estado is not None:
+                        estado.agregar_turno(user_message, "simple")
+                    yield {
                         "type": "final",
                         "data": {"type": "simple", "text": intent_data["system_response"]}
-                    }) + "\n"
+                    }
 
             except Exception as e:
-                yield json.dumps({"type": "error", "text": str(e)}) + "\n"
+                yield {"type": "error", "text": str(e)}
 
         # Retornamos el Streaming
-        response = StreamingHttpResponse(event_stream(), content_type="application/x-ndjson")
+        stream = event_stream()
+        gzip = settings.CHAT_GZIP and "gzip" in request.headers.get("Accept-Encoding", "")
+        if gzip:
+            stream = _gzip_incremental(stream)
+        response = StreamingHttpResponse(stream, content_type="application/x-ndjson; charset=utf-8")
         response['X-Accel-Buffering'] = 'no'  # Vital para Nginx/Producción
+        response['X-Chat-Esquema'] = str(ESQUEMA_EVENTOS if compacto else 1)
+        response['Vary'] = 'Accept-Encoding'
+        if gzip:
+            response['Content-Encoding'] = 'gzip'
         return response
 
 
+class SessionView(APIView):
+    """
+    Registra el JSON de sesión una vez y devuelve el token que ChatView acepta
+    en lugar del JSON completo en cada mensaje.
+    """
+
+    def post(self, request):
+        session_data = request.data.get('session_data', {})
+        if session_data and not isinstance(session_data, dict):
+            return Response({"error": "session_data debe ser un objeto JSON"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(permisos.registrar(session_data))
+
+
 @require_http_methods(["GET"])
 def health(request):
     """
-    Endpoint para verificar el estado de Ollama y el servicio
+    Endpoint para verificar el estado de Ollama y el servicio (cacheado, ver ollama_cliente.salud)
     """
-    try:
-        ollama_url = f'{settings.OLLAMA_BASE_URL}/api/tags'
-        response = requests.get(ollama_url, timeout=5)
-        
-        if response.status_code == 200:
-            models = response.json().get('models', [])
-            model_available = any(settings.OLLAMA_MODEL in model.get('name', '') for model in models)
-            
-            return JsonResponse({
-                'status': 'ok',
-                'service': 'balcon_chatbot',
-                'ollama_connected': True,
-                'model_available': model_available,
-                'model_configured': settings.OLLAMA_MODEL,
-                'models': [model.get('name') for model in models]
-            })
-        else:
-            return JsonResponse({
-                'status': 'error',
-                'ollama_connected': False,
-                'error': f'Ollama respondió con código {response.status_code}'
-            }, status=500)
-            
-    except requests.exceptions.ConnectionError:
-        return JsonResponse({
-            'status': 'error',
-            'ollama_connected': False,
-            'error': 'No se pudo conectar con Ollama'
-        }, status=503)
-    except Exception as e:
+    estado = ollama_cliente.salud()
+    if estado["ok"]:
+        models = estado["modelos"]
         return JsonResponse({
-            'status': 'error',
-            'ollama_connected': False,
-            'error': str(e)
-        }, status=500)
+            'status': 'ok',
+            'service': 'balcon_chatbot',
+            'ollama_connected': True,
+            'model_available': estado["modelos_disponibles"],
+            'model_configured': settings.OLLAMA_MODELO_GENERACION,
+            'models': models,
+            'backends': estado["backends"]
+        })
+    return JsonResponse({
+        'status': 'error',
+        'ollama_connected': False,
+        'error': estado["error"],
+        'backends': estado["backends"]
+    }, status=503 if estado["codigo"] is None else 500)  # 503: Ollama no respondió
+
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """
+    Métricas del chatbot en formato de texto de Prometheus
+    (latencias por etapa, tokens y fallos del LLM).
+    """
+    return HttpResponse(
+        metrics.render_prometheus(),
+        content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 class DocumentUploadView(APIView):
@@ -186,57 +317,49 @@ class DocumentUploadView(APIView):
     Endpoint para carga de documentos multi-formato con batch processing y soporte de roles.
     
     Soporta: PDF, DOCX, TXT, MD
-    Lógica: Batch processing en memoria (auto_save=False) y commit único al final.
+    Lógica: Ingesta en segundo plano (chatbot.ingestion) y commit único del índice al final del trabajo.
     """
     
     def get(self, request):
         """
-        Lista los documentos organizados por categoría (rol).
-        Response: { "general": [{"name": "doc.pdf", "size_mb": 2.5}], ... }
+        Lista los documentos del catálogo organizados por categoría (rol), paginado.
+        Query: ?page=1&page_size=100&categoria=general
+        Response: { "categories": {"general": [{"name": "doc.pdf", "size_mb": 2.5, "status": "indexado"}]},
+                    "stats": {...}, "pagination": {...} }
         """
         try:
-            base_dir = Path(settings.BASE_DIR) / "documentos_unemi"
-            
-            if not base_dir.exists():
-                return Response({'categories': {}}, status=status.HTTP_200_OK)
-            
-            categories = {}
-            supported_extensions = {'.pdf', '.docx', '.txt', '.md'}
-            
-            for category_dir in base_dir.iterdir():
-                if category_dir.is_dir():
-                    files = []
-                    for file_path in category_dir.iterdir():
-                        if file_path.is_file() and file_path.suffix.lower() in supported_extensions:
-                            file_size_mb = file_path.stat().st_size / (1024 * 1024)
-                            files.append({
-                                'name': file_path.name,
-                                'size_mb': round(file_size_mb, 2),
-                                'type': file_path.suffix.lower().lstrip('.')
-                            })
-                    
-                    if files:
-                        categories[category_dir.name] = sorted(files, key=lambda x: x['name'])
-            
-            total_files = sum(len(f) for f in categories.values())
-            return Response({
-                'categories': categories,
-                'stats': {
-                    'total_categories': len(categories),
-                    'total_files': total_files
-                }
-            }, status=status.HTTP_200_OK)
+            pagina = int(request.GET.get('page', 1))
+            por_pagina = int(request.GET.get('page_size', catalogo.POR_PAGINA_DEFECTO))
+        except ValueError:
+            return Response({'error': 'page y page_size deben ser enteros'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            catalogo.sincronizar_si_vacio(Path(settings.DOCUMENTOS_DIR), rag_service, hash_archivo)
+            datos = catalogo.listar(
+                rag_service.generacion,
+                categoria=request.GET.get('categoria'),
+                pagina=pagina,
+                por_pagina=por_pagina
+            )
+            return Response(datos, status=status.HTTP_200_OK)
         
         except Exception as e:
             logger.error(f"Error listando documentos: {e}", exc_info=True)
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    def initialize_request(self, request, *args, **kwargs):
+        # El handler debe instalarse antes de que algo lea request.POST/FILES
+        if request.method == 'POST':
+            request.upload_handlers = [SubidaDirectaHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+    
     def post(self, request):
         """
-        Procesa archivos subidos. 
+        Guarda los archivos subidos y encola su ingesta (202 + job_id).
         Parámetros: 
           - files: Lista de archivos
           - categoria: (Opcional) Rol asociado (default: 'general')
+        Progreso: GET upload-documents/jobs/<job_id>/
         """
         try:
             files = request.FILES.getlist('files')
@@ -246,84 +369,72 @@ class DocumentUploadView(APIView):
             categoria = request.POST.get('categoria', 'general')
             
             # Configuración
-            max_size_mb = getattr(settings, 'RAG_MAX_FILE_SIZE_MB', 50)
-            base_dir = Path(settings.BASE_DIR) / "documentos_unemi"
+            base_dir = Path(settings.DOCUMENTOS_DIR)
             category_dir = base_dir / categoria
             category_dir.mkdir(parents=True, exist_ok=True)
             
-            # Métricas
-            processed_files = []
+            guardados = []
+            omitidos = []
             errors = []
-            total_chunks = 0
-            file_details = []
             
-            # --- FASE 1: Procesamiento en Lote (Memoria) ---
+            # SubidaDirectaHandler ya escribió cada archivo en disco con su sha256 y tamaño;
+            # aquí solo se mueve a su carpeta. Parseo y embeddings corren en el pool de ingesta.
             for file in files:
                 try:
-                    # 1. Validación de Tamaño
-                    file_size_mb = file.size / (1024 * 1024)
-                    if file_size_mb > max_size_mb:
-                        errors.append({'file': file.name, 'error': f'Excede {max_size_mb}MB'})
+                    # 1. Validación de Tamaño (rechazado durante el streaming)
+                    if file.error:
+                        errors.append({'file': file.name, 'error': file.error})
                         continue
                     
-                    # 2. Guardado en Disco (Permanente)
-                    final_path = category_dir / file.name
-                    with open(final_path, 'wb+') as destination:
-                        for chunk in file.chunks():
-                            destination.write(chunk)
+                    # 2. Mismo contenido ya indexado en esta categoría: no se re-ingesta
+                    if rag_service.ya_indexado(file.sha256, categoria):
+                        file.descartar()
+                        omitidos.append({'file': file.name, 'reason': 'Contenido ya indexado'})
+                        continue
                     
-                    # 3. Ingesta (Sin guardar índice todavía)
-                    # auto_save=False es la clave de la velocidad
-                    success, msg = rag_service.ingerir_documento(
-                        str(final_path),
-                        categoria=categoria,
-                        auto_save=False 
-                    )
+                    # 3. Rename atómico al destino final (mismo disco)
+                    final_path = category_dir / file.name
+                    catalogo.registrar_subida(categoria, file.name, file.size, file.sha256)
+                    file.mover(final_path)
                     
-                    if success:
-                        # Extraer métricas del mensaje (ej: "Ingestado: 25 fragmentos")
-                        import re
-                        match = re.search(r'(\d+)\s+fragmentos', msg)
-                        chunks_count = int(match.group(1)) if match else 0
-                        
-                        total_chunks += chunks_count
-                        processed_files.append(file.name)
-                        
-                        file_details.append({
-                            'filename': file.name,
-                            'chunks': chunks_count,
-                            'size_mb': round(file_size_mb, 2),
-                            'type': Path(file.name).suffix
-                        })
-                    else:
-                        errors.append({'file': file.name, 'error': msg})
-                        # Opcional: Borrar archivo si falló la ingesta
-                        # final_path.unlink(missing_ok=True) 
+                    guardados.append({
+                        'filename': file.name,
+                        'ruta': final_path,
+                        'file_size_mb': round(file.size / (1024 * 1024), 2),
+                        'sha256': file.sha256
+                    })
                 
                 except Exception as e:
+                    file.descartar()
                     errors.append({'file': file.name, 'error': str(e)})
             
-            # --- FASE 2: Guardado del Índice (Commit Único) ---
-            if processed_files:
-                if not rag_service.guardar_indice():
-                    logger.warning("⚠️ Advertencia: No se pudo persistir el índice en disco.")
+            if not guardados and not omitidos:
+                return Response({
+                    'message': f'Procesados 0 de {len(files)} archivos.',
+                    'errors': errors
+                }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Respuesta
-            response_data = {
-                'message': f'Procesados {len(processed_files)} de {len(files)} archivos.',
-                'files_processed': processed_files,
-                'total_chunks_added': total_chunks,
-                'details': file_details
-            }
+            # 4. Ingesta en segundo plano: el cliente consulta el progreso con el job_id
+            trabajo = ingestion.encolar(rag_service, categoria, guardados, errores=errors, omitidos=omitidos)
+            logger.info(f"📥 [UPLOAD] Trabajo {trabajo.id[:8]} encolado: {len(guardados)} archivos ({categoria})")
             
-            if errors:
-                response_data['errors'] = errors
-                status_code = status.HTTP_207_MULTI_STATUS if processed_files else status.HTTP_400_BAD_REQUEST
-            else:
-                status_code = status.HTTP_200_OK
-                
-            return Response(response_data, status=status_code)
+            response_data = trabajo.resumen()
+            response_data['status_url'] = f"{request.path.rstrip('/')}/jobs/{trabajo.id}/"
+            return Response(response_data, status=status.HTTP_202_ACCEPTED)
         
         except Exception as e:
             logger.error(f"Error crítico en upload: {e}", exc_info=True)
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class IngestionJobView(APIView):
+    """
+    Estado de un trabajo de ingesta encolado por DocumentUploadView.
+    Response: { "status": "en_cola|procesando|completado|error", "progress": 0-100, "files": [...], ... }
+    """
+    
+    def get(self, request, job_id):
+        trabajo = ingestion.obtener(job_id)
+        if trabajo is None:
+            return Response({'error': 'Trabajo no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(trabajo.resumen(), status=status.HTTP_200_OK)
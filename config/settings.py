@@ -43,13 +43,60 @@ if sys.platform == 'win32':
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # RAG Configuration (FAISS)
-FAISS_INDEX_PATH = BASE_DIR / "faiss_index"
-DOCUMENTOS_DIR = BASE_DIR / "documentos_unemi"
+FAISS_INDEX_PATH = Path(os.getenv('FAISS_INDEX_PATH', BASE_DIR / "faiss_index"))
+DOCUMENTOS_DIR = Path(os.getenv('DOCUMENTOS_DIR', BASE_DIR / "documentos_unemi"))
 
 # RAG Document Processing Configuration
 RAG_CHUNK_SIZE = int(os.getenv('RAG_CHUNK_SIZE', '1024'))
 RAG_CHUNK_OVERLAP = int(os.getenv('RAG_CHUNK_OVERLAP', '512'))
+
+# Deduplicación en la ingesta (ver chatbot/deduplicacion.py)
+RAG_DEDUP_ACTIVO = os.getenv('RAG_DEDUP_ACTIVO', 'True').lower() in ('1', 'true', 'yes')  # Quitar encabezados repetidos y chunks casi duplicados
+RAG_DEDUP_FRACCION_PAGINAS = float(os.getenv('RAG_DEDUP_FRACCION_PAGINAS', '0.5'))  # Fracción de páginas en que se repite una línea de encabezado o pie para quitarla
+RAG_DEDUP_DISTANCIA = int(os.getenv('RAG_DEDUP_DISTANCIA', '3'))  # Distancia de Hamming máxima entre SimHash (0-3)
 RAG_MAX_FILE_SIZE_MB = int(os.getenv('RAG_MAX_FILE_SIZE_MB', '50'))
+RAG_INGESTA_WORKERS = int(os.getenv('RAG_INGESTA_WORKERS', '2'))  # Hilos de ingesta en segundo plano
+RAG_RECONSTRUCCION_WORKERS = int(os.getenv('RAG_RECONSTRUCCION_WORKERS', str(min(4, os.cpu_count() or 1))))  # Procesos de reconstruir_indice
+RAG_RECONSTRUCCION_EMBEDDINGS = int(os.getenv('RAG_RECONSTRUCCION_EMBEDDINGS', '2'))  # Requests de embeddings a la vez por proceso
+RAG_RECONSTRUCCION_LOTE = int(os.getenv('RAG_RECONSTRUCCION_LOTE', '32'))  # Textos por request de embeddings al reconstruir
+
+# RAG Retrieval Configuration (evaluar con: python manage.py evaluar_recuperacion)
+RAG_BUSQUEDA_K = int(os.getenv('RAG_BUSQUEDA_K', '30'))  # Candidatos por query en FAISS (máximo con k adaptativo)
+RAG_BUSQUEDA_K_INICIAL = int(os.getenv('RAG_BUSQUEDA_K_INICIAL', '8'))  # k de la primera ronda; se duplica si faltan chunks (0 = k fijo)
+RAG_BUSQUEDA_MARGEN = float(os.getenv('RAG_BUSQUEDA_MARGEN', '0.1'))  # Salto de score bajo el mejor que corta la ampliación (0 = solo umbral)
+RAG_UMBRAL_SCORE = float(os.getenv('RAG_UMBRAL_SCORE', '0.30'))  # Score mínimo 1/(1+distancia)
+RAG_MAX_CHUNKS = int(os.getenv('RAG_MAX_CHUNKS', '5'))  # Chunks enviados al LLM
+RAG_LIMITE_REGLAMENTO = int(os.getenv('RAG_LIMITE_REGLAMENTO', '3'))  # Máx. chunks por reglamento
+RAG_LIMITE_FUENTE = int(os.getenv('RAG_LIMITE_FUENTE', '2'))  # Máx. chunks por otra fuente
+
+# Ruteo en dos etapas documento → sección → chunks (ver chatbot/resumenes.py)
+RAG_RUTEO_MIN_CHUNKS = int(os.getenv('RAG_RUTEO_MIN_CHUNKS', '50000'))  # Chunks en el índice para activarlo (0 = nunca)
+RAG_RUTEO_DOCUMENTOS = int(os.getenv('RAG_RUTEO_DOCUMENTOS', '20'))  # Documentos más cercanos a explorar
+RAG_RUTEO_SECCIONES = int(os.getenv('RAG_RUTEO_SECCIONES', '12'))  # Secciones puntuadas chunk por chunk
+RAG_RUTEO_CHUNKS_SECCION = int(os.getenv('RAG_RUTEO_CHUNKS_SECCION', '16'))  # Chunks consecutivos por sección
+
+# Respuestas de ChatView
+CHAT_DEBUG_PAYLOAD = os.getenv('CHAT_DEBUG_PAYLOAD', 'False').lower() in ('1', 'true', 'yes')  # intent_debug/debug_context siempre (si no, solo con "debug": true)
+CHAT_GZIP = os.getenv('CHAT_GZIP', 'True').lower() in ('1', 'true', 'yes')  # Comprimir el NDJSON si el cliente acepta gzip
+CHAT_GZIP_NIVEL = int(os.getenv('CHAT_GZIP_NIVEL', '6'))  # Nivel zlib (1 = rápido, 9 = máximo)
+
+# Trazas de chat para reproducir requests (ver chatbot/trazas.py). Guardan los mensajes de los
+# usuarios: desactivadas por defecto, se activan con p. ej. RAG_TRAZAS_ARCHIVO=trazas/chat.jsonl
+RAG_TRAZAS_ARCHIVO = os.getenv('RAG_TRAZAS_ARCHIVO', '')  # JSONL append-only (vacío = desactivado)
+RAG_TRAZAS_MAX_MB = int(os.getenv('RAG_TRAZAS_MAX_MB', '100'))  # Tamaño antes de rotar a .1
+
+# Compuerta de confianza antes de generar (ver chatbot/compuerta.py)
+RAG_COMPUERTA_SCORE_MIN = float(os.getenv('RAG_COMPUERTA_SCORE_MIN', '0.0'))  # Mejor score mínimo sin calibración (0 = desactivada)
+RAG_COMPUERTA_EXPLORACION = float(os.getenv('RAG_COMPUERTA_EXPLORACION', '0.05'))  # Fracción de omisiones que se generan igual
+RAG_COMPUERTA_REGISTRAR = os.getenv('RAG_COMPUERTA_REGISTRAR', 'True').lower() in ('1', 'true', 'yes')  # Registrar resultados para calibrar
+
+# RAG Vector Index (benchmark: python manage.py bench_vectores)
+RAG_INDICE_MODO = os.getenv('RAG_INDICE_MODO', 'plano')  # plano (IndexFlatL2) | compacto
+RAG_INDICE_REDUCCION = os.getenv('RAG_INDICE_REDUCCION', 'truncar')  # truncar (Matryoshka) | pca
+RAG_INDICE_DIMENSION = int(os.getenv('RAG_INDICE_DIMENSION', '256'))  # Dimensión tras reducir
+RAG_INDICE_CUANTIZACION = os.getenv('RAG_INDICE_CUANTIZACION', 'sq8')  # sq8 | pq
+RAG_INDICE_PQ_M = int(os.getenv('RAG_INDICE_PQ_M', '32'))  # Subcuantizadores PQ (divide la dimensión)
+RAG_INDICE_FACTOR_RESCORE = int(os.getenv('RAG_INDICE_FACTOR_RESCORE', '4'))  # Candidatos re-puntuados = k × factor
 
 
 # Quick-start development settings - unsuitable for production
@@ -165,6 +212,26 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Logging: los mensajes de depuración del chatbot (reformulación, contexto, salida del LLM)
+# solo aparecen con CHATBOT_LOG_LEVEL=DEBUG
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '{levelname} {name}: {message}', 'style': '{'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'chatbot': {
+            'handlers': ['console'],
+            'level': os.getenv('CHATBOT_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -183,3 +250,68 @@ OLLAMA_TEMPERATURE = float(os.getenv('OLLAMA_TEMPERATURE', '0.0'))  # Máxima pr
 OLLAMA_NUM_CTX = int(os.getenv('OLLAMA_NUM_CTX', '8192'))  # Ventana de contexto
 OLLAMA_FORMAT = os.getenv('OLLAMA_FORMAT', 'json')  # Fuerza estructura JSON
 OLLAMA_NUM_THREAD = int(os.getenv('OLLAMA_NUM_THREAD', '6'))  # Threads CPU (8 cores - 2 para sistema)
+
+# Cliente HTTP compartido con Ollama (ver chatbot/ollama_cliente.py)
+OLLAMA_POOL_MAX_CONEXIONES = int(os.getenv('OLLAMA_POOL_MAX_CONEXIONES', '16'))  # Conexiones keep-alive del pool
+OLLAMA_KEEPALIVE_S = float(os.getenv('OLLAMA_KEEPALIVE_S', '60'))  # Cierre de conexiones ociosas
+OLLAMA_TIMEOUT_CONEXION_S = float(os.getenv('OLLAMA_TIMEOUT_CONEXION_S', '5'))  # Establecer conexión
+OLLAMA_TIMEOUT_LLM_S = float(os.getenv('OLLAMA_TIMEOUT_LLM_S', '300'))  # Lectura en intención/reformulación/generación
+OLLAMA_TIMEOUT_EMBEDDINGS_S = float(os.getenv('OLLAMA_TIMEOUT_EMBEDDINGS_S', '60'))  # Lectura en embeddings
+OLLAMA_TIMEOUT_HEALTH_S = float(os.getenv('OLLAMA_TIMEOUT_HEALTH_S', '5'))  # Lectura en health check
+OLLAMA_REINTENTOS = int(os.getenv('OLLAMA_REINTENTOS', '2'))  # Reintentos ante error de conexión o 502/503/504
+OLLAMA_REINTENTO_BACKOFF_S = float(os.getenv('OLLAMA_REINTENTO_BACKOFF_S', '0.5'))  # Espera base (se duplica por intento)
+OLLAMA_HEALTH_CACHE_S = float(os.getenv('OLLAMA_HEALTH_CACHE_S', '10'))  # Vigencia del resultado de /health/
+
+# Varias instancias de Ollama por rol (URLs separadas por comas; vacío = OLLAMA_BASE_URL)
+OLLAMA_BACKENDS_INTENCION = [u.strip() for u in os.getenv('OLLAMA_BACKENDS_INTENCION', '').split(',') if u.strip()]  # Clasificación de intención y reformulación
+OLLAMA_BACKENDS_GENERACION = [u.strip() for u in os.getenv('OLLAMA_BACKENDS_GENERACION', '').split(',') if u.strip()]  # Respuesta RAG y etapas escaladas
+OLLAMA_BACKENDS_EMBEDDINGS = [u.strip() for u in os.getenv('OLLAMA_BACKENDS_EMBEDDINGS', '').split(',') if u.strip()]  # Embeddings (host dedicado)
+OLLAMA_MODELO_INTENCION = os.getenv('OLLAMA_MODELO_INTENCION', OLLAMA_MODEL)  # Modelo pequeño para intención
+OLLAMA_MODELO_GENERACION = os.getenv('OLLAMA_MODELO_GENERACION', OLLAMA_MODEL)  # Modelo de generación
+OLLAMA_MODELO_REFORMULACION = os.getenv('OLLAMA_MODELO_REFORMULACION', OLLAMA_MODELO_INTENCION)  # Reformulación (pool de intención)
+OLLAMA_MODELO_EMBEDDINGS = os.getenv('OLLAMA_MODELO_EMBEDDINGS', 'nomic-embed-text')  # Modelo de embeddings
+# Niveles por etapa (ver chatbot/niveles_llm.py); mismo modelo ⇒ mismo num_ctx o Ollama lo recarga
+OLLAMA_NUM_CTX_INTENCION = int(os.getenv('OLLAMA_NUM_CTX_INTENCION', str(OLLAMA_NUM_CTX)))  # Contexto del clasificador
+OLLAMA_NUM_CTX_REFORMULACION = int(os.getenv('OLLAMA_NUM_CTX_REFORMULACION', str(OLLAMA_NUM_CTX_INTENCION)))  # Contexto de la reformulación
+OLLAMA_NUM_CTX_GENERACION = int(os.getenv('OLLAMA_NUM_CTX_GENERACION', str(OLLAMA_NUM_CTX)))  # Contexto de la respuesta RAG
+OLLAMA_NUM_THREAD_INTENCION = int(os.getenv('OLLAMA_NUM_THREAD_INTENCION', str(OLLAMA_NUM_THREAD)))  # Threads CPU del clasificador
+OLLAMA_NUM_THREAD_REFORMULACION = int(os.getenv('OLLAMA_NUM_THREAD_REFORMULACION', str(OLLAMA_NUM_THREAD_INTENCION)))  # Threads CPU de la reformulación
+OLLAMA_NUM_THREAD_GENERACION = int(os.getenv('OLLAMA_NUM_THREAD_GENERACION', str(OLLAMA_NUM_THREAD)))  # Threads CPU de la generación
+OLLAMA_ESCALAMIENTO = os.getenv('OLLAMA_ESCALAMIENTO', 'True').lower() in ('1', 'true', 'yes')  # Repetir con el nivel de generación si el pequeño falla
+OLLAMA_EYECCION_FALLOS = int(os.getenv('OLLAMA_EYECCION_FALLOS', '3'))  # Fallos seguidos antes de sacar un backend
+OLLAMA_EYECCION_S = float(os.getenv('OLLAMA_EYECCION_S', '30'))  # Tiempo fuera de un backend eyectado
+
+# Modo combinado: una sola llamada devuelve intención + search_query técnica
+RAG_INTENCION_COMBINADA = os.getenv('RAG_INTENCION_COMBINADA', 'False').lower() in ('1', 'true', 'yes')
+
+# Memoria de conversación por sesión (caché local del proceso, ver chatbot/conversacion.py)
+RAG_SESION_TURNOS = int(os.getenv('RAG_SESION_TURNOS', '6'))  # Turnos recientes por sesión (buffer circular)
+RAG_SESION_TTL_S = int(os.getenv('RAG_SESION_TTL_S', '1800'))  # Inactividad antes de olvidar la sesión
+RAG_SESION_MAX = int(os.getenv('RAG_SESION_MAX', '5000'))  # Sesiones en caché (las más antiguas se descartan)
+RAG_SESION_MAX_PALABRAS_SEGUIMIENTO = int(os.getenv('RAG_SESION_MAX_PALABRAS_SEGUIMIENTO', '8'))  # Largo máx. de un seguimiento
+
+# Permisos resueltos por session_token (ver chatbot/permisos.py)
+RAG_PERMISOS_TTL_S = int(os.getenv('RAG_PERMISOS_TTL_S', '86400'))  # Vigencia de un session_token sin uso
+
+# Respuestas precalculadas (python manage.py precalcular_respuestas, tras cada reindexado)
+RAG_FAQ_ARCHIVO = Path(os.getenv('RAG_FAQ_ARCHIVO', BASE_DIR / "chatbot" / "preguntas_frecuentes.json"))  # Preguntas canónicas por perfil
+RAG_FAQ_SIMILITUD = float(os.getenv('RAG_FAQ_SIMILITUD', '0.95'))  # Coseno mínimo para servir sin clasificar (0 = desactivado)
+RAG_FAQ_RECARGA_S = int(os.getenv('RAG_FAQ_RECARGA_S', '300'))  # Cada cuánto se releen de la base de datos
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'conversaciones': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'conversaciones',
+        'TIMEOUT': RAG_SESION_TTL_S,
+        'OPTIONS': {'MAX_ENTRIES': RAG_SESION_MAX},
+    },
+    'permisos': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'permisos',
+        'TIMEOUT': RAG_PERMISOS_TTL_S,
+        'OPTIONS': {'MAX_ENTRIES': RAG_SESION_MAX},
+    },
+}